@@ -1,7 +1,10 @@
 import { paginationOptsValidator } from "convex/server";
 import { v } from "convex/values";
-import { query } from "../_generated/server";
+import { httpAction, internalQuery, query } from "../_generated/server";
+import { internal } from "../_generated/api";
+import { Doc } from "../_generated/dataModel";
 import { requirePermission } from "../lib/auth";
+import { checkExportToken } from "../galaxies/batch_ingest";
 
 const classificationExportRowValidator = v.object({
   _id: v.id("classifications"),
@@ -19,6 +22,24 @@ const classificationExportRowValidator = v.object({
   timeSpent: v.number(),
 });
 
+function formatClassificationForExport(classification: Doc<"classifications">) {
+  return {
+    _id: classification._id,
+    _creationTime: classification._creationTime,
+    userId: classification.userId,
+    galaxyExternalId: classification.galaxyExternalId,
+    lsb_class: classification.lsb_class,
+    morphology: classification.morphology,
+    awesome_flag: classification.awesome_flag,
+    valid_redshift: classification.valid_redshift,
+    visible_nucleus: classification.visible_nucleus,
+    failed_fitting: classification.failed_fitting,
+    comments: classification.comments,
+    sky_bkg: classification.sky_bkg,
+    timeSpent: classification.timeSpent,
+  };
+}
+
 export const getAdminExportBatch = query({
   args: {
     userId: v.optional(v.id("users")),
@@ -42,23 +63,108 @@ export const getAdminExportBatch = query({
       : await ctx.db.query("classifications").paginate(args.paginationOpts);
 
     return {
-      page: paginationResult.page.map((classification) => ({
-        _id: classification._id,
-        _creationTime: classification._creationTime,
-        userId: classification.userId,
-        galaxyExternalId: classification.galaxyExternalId,
-        lsb_class: classification.lsb_class,
-        morphology: classification.morphology,
-        awesome_flag: classification.awesome_flag,
-        valid_redshift: classification.valid_redshift,
-        visible_nucleus: classification.visible_nucleus,
-        failed_fitting: classification.failed_fitting,
-        comments: classification.comments,
-        sky_bkg: classification.sky_bkg,
-        timeSpent: classification.timeSpent,
-      })),
+      page: paginationResult.page.map(formatClassificationForExport),
       isDone: paginationResult.isDone,
       continueCursor: paginationResult.isDone ? null : paginationResult.continueCursor,
     };
   },
-});
\ No newline at end of file
+});
+
+const MAX_EXPORT_PAGE_SIZE = 2000;
+// Longest a mutation can take to commit; a classification created before now - this is visible to every query
+const DEFAULT_SETTLE_MS = 60_000;
+
+/**
+ * Classifications created in (after, upTo], oldest first, from the built-in creation-time index.
+ * upTo is always an argument: a query that read the clock could be answered from the query cache
+ * with an old upTo, and the watermark would stop moving.
+ */
+export const exportClassificationsSinceInternal = internalQuery({
+  args: {
+    after: v.optional(v.number()),
+    upTo: v.number(),
+    cursor: v.optional(v.union(v.string(), v.null())),
+    batchSize: v.optional(v.number()),
+  },
+  returns: v.object({
+    classifications: v.array(classificationExportRowValidator),
+    upTo: v.number(),
+    cursor: v.union(v.string(), v.null()),
+    isDone: v.boolean(),
+  }),
+  handler: async (ctx, args) => {
+    const after = args.after ?? 0;
+    const upTo = args.upTo;
+    const numItems = Math.min(Math.max(1, Math.floor(args.batchSize ?? 1000)), MAX_EXPORT_PAGE_SIZE);
+
+    if (upTo <= after) {
+      return { classifications: [], upTo: after, cursor: null, isDone: true };
+    }
+    const page = await ctx.db
+      .query("classifications")
+      .withIndex("by_creation_time", (q) => q.gt("_creationTime", after).lte("_creationTime", upTo))
+      .order("asc")
+      .paginate({ cursor: args.cursor ?? null, numItems });
+
+    return {
+      classifications: page.page.map(formatClassificationForExport),
+      upTo,
+      cursor: page.isDone ? null : page.continueCursor,
+      isDone: page.isDone,
+    };
+  },
+});
+
+function jsonResponse(payload: unknown, status = 200): Response {
+  return new Response(JSON.stringify(payload), {
+    status,
+    headers: { "Content-Type": "application/json" },
+  });
+}
+
+/**
+ * HTTP export for scripts, authorized with the export token (`Authorization: Bearer <EXPORT_TOKEN>`).
+ *
+ * POST /export/classifications  { after?, upTo?, settleMs?, cursor?, batchSize? }
+ *   -> exportClassificationsSinceInternal
+ * The first page of a run sends no upTo; it is set here, settleMs (default 60s) behind the clock, and
+ * returned so the client sends it with every following page.
+ *
+ * Only inserts are visible this way: edits keep their _creationTime and deleted classifications are not reported.
+ */
+export const exportClassificationsHttp = httpAction(async (ctx, request) => {
+  const unauthorized = checkExportToken(request);
+  if (unauthorized) return unauthorized;
+
+  let body: any;
+  try {
+    body = await request.json();
+  } catch {
+    return jsonResponse({ error: "Invalid JSON body" }, 400);
+  }
+  if (!body || typeof body !== "object" || Array.isArray(body)) {
+    return jsonResponse({ error: "Invalid body structure", detail: "Expected a JSON object" }, 400);
+  }
+
+  const settleMs = body.settleMs ?? DEFAULT_SETTLE_MS;
+  if (typeof settleMs !== "number" || !Number.isFinite(settleMs)) {
+    return jsonResponse({ error: "Invalid settleMs", detail: "Expected a number of milliseconds" }, 400);
+  }
+  const upTo = body.upTo ?? Date.now() - Math.max(0, settleMs);
+
+  try {
+    const page = await ctx.runQuery(internal.classifications.export.exportClassificationsSinceInternal, {
+      after: body.after ?? undefined,
+      upTo,
+      cursor: body.cursor ?? null,
+      batchSize: body.batchSize ?? undefined,
+    });
+    return jsonResponse(page);
+  } catch (err) {
+    const errorMessage = String(err);
+    console.error("Classification export failed:", errorMessage);
+    // Argument validation errors are the caller's; anything else is worth a retry
+    const status = errorMessage.includes("ArgumentValidationError") ? 400 : 500;
+    return jsonResponse({ error: "Export failed", detail: errorMessage }, status);
+  }
+});
@@ -6,6 +6,7 @@ import {
 } from "../_generated/server";
 import { internal } from "../_generated/api";
 import { v } from "convex/values";
+import { gunzipSync, strFromU8, unzlibSync } from "fflate";
 import { galaxySchemaDefinition, photometryBandSchema, photometryBandSchemaR, photometryBandSchemaI, sourceExtractorSchema, thuruthipillySchema } from "../schema";
 // Ingestion now expects each array element shaped as:
 // {
@@ -31,6 +32,67 @@ function timingSafeEqual(a: string, b: string): boolean {
   return result === 0;
 }
 
+/**
+ * Check the `Authorization: Bearer <token>` header of a script request against
+ * the secret `expected`. Returns the 401 response to send, or null when it matches.
+ */
+function checkBearerToken(request: Request, expected: string): Response | null {
+  const auth = request.headers.get("authorization") || "";
+  if (!auth.startsWith("Bearer ")) {
+    return new Response(JSON.stringify({ error: "Missing Bearer token" }), {
+      status: 401,
+      headers: { "Content-Type": "application/json" },
+    });
+  }
+
+  const presented = auth.slice(7).trim();
+  if (!presented || !expected || !timingSafeEqual(presented, expected)) {
+    return new Response(JSON.stringify({ error: "Unauthorized" }), {
+      status: 401,
+      headers: { "Content-Type": "application/json" },
+    });
+  }
+  return null;
+}
+
+/**
+ * Check the `Authorization: Bearer <INGEST_TOKEN>` header of an ingest request.
+ */
+export function checkIngestToken(request: Request): Response | null {
+  return checkBearerToken(request, process.env.INGEST_TOKEN || "");
+}
+
+/**
+ * Check the `Authorization: Bearer <EXPORT_TOKEN>` header of an export request.
+ * Exports read the whole catalog, so they get their own secret: a client that
+ * may write galaxies cannot read classifications, and the reverse.
+ */
+export function checkExportToken(request: Request): Response | null {
+  return checkBearerToken(request, process.env.EXPORT_TOKEN || "");
+}
+
+/**
+ * Request body encodings accepted from the ingest scripts (Content-Encoding).
+ * "deflate" is the zlib-wrapped format, as in HTTP.
+ */
+const SUPPORTED_CONTENT_ENCODINGS = ["identity", "gzip", "deflate"];
+
+function getContentEncoding(request: Request): string {
+  return (request.headers.get("content-encoding") || "identity").trim().toLowerCase();
+}
+
+/**
+ * Read the request body as JSON, decompressing gzip/deflate bodies first.
+ */
+async function readJsonBody(request: Request, encoding: string): Promise<unknown> {
+  if (encoding === "identity") {
+    return await request.json();
+  }
+  const compressed = new Uint8Array(await request.arrayBuffer());
+  const raw = encoding === "gzip" ? gunzipSync(compressed) : unzlibSync(compressed);
+  return JSON.parse(strFromU8(raw));
+}
+
 /**
  * Schemas
  */
@@ -317,8 +379,9 @@ export const upsertGalaxiesBatchInternal = internalMutation({
 });
 
 /**
- * Public HTTP action — verifies token, parses JSON,
- * and then calls the INTERNAL mutation by reference.
+ * Public HTTP action — verifies token, parses JSON (gzip/deflate bodies
+ * are decompressed based on Content-Encoding), and then calls the INTERNAL
+ * mutation by reference.
  * 
  * Supports three modes via the "mode" field in the request body:
  * - "insert" (default): Insert new galaxies, skip existing ones
@@ -330,27 +393,21 @@ export const upsertGalaxiesBatchInternal = internalMutation({
  */
 export const ingestGalaxiesHttp = httpAction(async (ctx, request) => {
   // 1) Auth
-  const auth = request.headers.get("authorization") || "";
-  if (!auth.startsWith("Bearer ")) {
-    return new Response(JSON.stringify({ error: "Missing Bearer token" }), {
-      status: 401,
-      headers: { "Content-Type": "application/json" },
-    });
-  }
+  const unauthorized = checkIngestToken(request);
+  if (unauthorized) return unauthorized;
 
-  const presented = auth.slice(7).trim();
-  const expected = process.env.INGEST_TOKEN || "";
-  if (!presented || !expected || !timingSafeEqual(presented, expected)) {
-    return new Response(JSON.stringify({ error: "Unauthorized" }), {
-      status: 401,
-      headers: { "Content-Type": "application/json" },
-    });
+  // 2) Parse JSON body (optionally gzip/deflate-compressed)
+  const contentEncoding = getContentEncoding(request);
+  if (!SUPPORTED_CONTENT_ENCODINGS.includes(contentEncoding)) {
+    return new Response(
+      JSON.stringify({ error: "Unsupported Content-Encoding", detail: `Expected one of: ${SUPPORTED_CONTENT_ENCODINGS.join(", ")}` }),
+      { status: 415, headers: { "Content-Type": "application/json" } }
+    );
   }
 
-  // 2) Parse JSON body
   let body: unknown;
   try {
-    body = await request.json();
+    body = await readJsonBody(request, contentEncoding);
   } catch {
     return new Response(JSON.stringify({ error: "Invalid JSON body" }), {
       status: 400,
@@ -1,7 +1,94 @@
 import { v } from "convex/values";
-import { query } from "../_generated/server";
+import { httpAction, internalQuery, query } from "../_generated/server";
+import { internal } from "../_generated/api";
 import { getOptionalUserId } from "../lib/auth";
 import { DEFAULT_SYSTEM_SETTINGS } from "../lib/defaults";
+import { galaxyIdsAggregate } from "./aggregates";
+import { checkExportToken } from "./batch_ingest";
+
+type Sortable =
+  | "numericId"
+  | "id"
+  | "ra"
+  | "dec"
+  | "reff"
+  | "q"
+  | "pa"
+  | "mag"
+  | "mean_mue"
+  | "nucleus"
+  | "totalClassifications"
+  | "numVisibleNucleus"
+  | "numAwesomeFlag"
+  | "numFailedFitting"
+  | "totalAssigned";
+
+// Index per sort key, the field it ranges over and that field's type (int64 fields need bigint bounds)
+const SORT_FIELDS: Record<Sortable, { index: string; field: string; kind: "int64" | "number" | "string" | "boolean" }> = {
+  numericId: { index: "by_numeric_id", field: "numericId", kind: "int64" },
+  id: { index: "by_external_id", field: "id", kind: "string" },
+  ra: { index: "by_ra", field: "ra", kind: "number" },
+  dec: { index: "by_dec", field: "dec", kind: "number" },
+  reff: { index: "by_reff", field: "reff", kind: "number" },
+  q: { index: "by_q", field: "q", kind: "number" },
+  pa: { index: "by_pa", field: "pa", kind: "number" },
+  mag: { index: "by_mag", field: "mag", kind: "number" },
+  mean_mue: { index: "by_mean_mue", field: "mean_mue", kind: "number" },
+  nucleus: { index: "by_nucleus", field: "nucleus", kind: "boolean" },
+  totalClassifications: { index: "by_totalClassifications", field: "totalClassifications", kind: "int64" },
+  numVisibleNucleus: { index: "by_numVisibleNucleus", field: "numVisibleNucleus", kind: "int64" },
+  numAwesomeFlag: { index: "by_numAwesomeFlag", field: "numAwesomeFlag", kind: "int64" },
+  numFailedFitting: { index: "by_numFailedFitting", field: "numFailedFitting", kind: "int64" },
+  totalAssigned: { index: "by_totalAssigned_numericId", field: "totalAssigned", kind: "int64" },
+};
+
+const sortByValidator = v.union(
+  v.literal("id"),
+  v.literal("ra"),
+  v.literal("dec"),
+  v.literal("reff"),
+  v.literal("q"),
+  v.literal("pa"),
+  v.literal("mag"),
+  v.literal("mean_mue"),
+  v.literal("nucleus"),
+  v.literal("numericId"),
+  v.literal("totalClassifications"),
+  v.literal("numVisibleNucleus"),
+  v.literal("numAwesomeFlag"),
+  v.literal("numFailedFitting"),
+  v.literal("totalAssigned")
+);
+
+// Search filters understood by applySearchFilters (min/max values are strings, as typed in the browser)
+const searchFilterArgs = {
+  searchId: v.optional(v.string()),
+  searchRaMin: v.optional(v.string()),
+  searchRaMax: v.optional(v.string()),
+  searchDecMin: v.optional(v.string()),
+  searchDecMax: v.optional(v.string()),
+  searchReffMin: v.optional(v.string()),
+  searchReffMax: v.optional(v.string()),
+  searchQMin: v.optional(v.string()),
+  searchQMax: v.optional(v.string()),
+  searchPaMin: v.optional(v.string()),
+  searchPaMax: v.optional(v.string()),
+  searchMagMin: v.optional(v.string()),
+  searchMagMax: v.optional(v.string()),
+  searchMeanMueMin: v.optional(v.string()),
+  searchMeanMueMax: v.optional(v.string()),
+  searchNucleus: v.optional(v.boolean()),
+  searchTotalClassificationsMin: v.optional(v.string()),
+  searchTotalClassificationsMax: v.optional(v.string()),
+  searchNumVisibleNucleusMin: v.optional(v.string()),
+  searchNumVisibleNucleusMax: v.optional(v.string()),
+  searchNumAwesomeFlagMin: v.optional(v.string()),
+  searchNumAwesomeFlagMax: v.optional(v.string()),
+  searchNumFailedFittingMin: v.optional(v.string()),
+  searchNumFailedFittingMax: v.optional(v.string()),
+  searchTotalAssignedMin: v.optional(v.string()),
+  searchTotalAssignedMax: v.optional(v.string()),
+};
 
 /**
  * Export galaxies with pagination for batch export.
@@ -12,23 +99,7 @@ export const exportGalaxiesBatch = query({
   args: {
     cursor: v.optional(v.string()),
     batchSize: v.optional(v.number()),
-    sortBy: v.optional(v.union(
-      v.literal("id"),
-      v.literal("ra"),
-      v.literal("dec"),
-      v.literal("reff"),
-      v.literal("q"),
-      v.literal("pa"),
-      v.literal("mag"),
-      v.literal("mean_mue"),
-      v.literal("nucleus"),
-      v.literal("numericId"),
-      v.literal("totalClassifications"),
-      v.literal("numVisibleNucleus"),
-      v.literal("numAwesomeFlag"),
-      v.literal("numFailedFitting"),
-      v.literal("totalAssigned")
-    )),
+    sortBy: v.optional(sortByValidator),
     sortOrder: v.optional(v.union(v.literal("asc"), v.literal("desc"))),
     filter: v.optional(v.union(
       v.literal("all"),
@@ -37,32 +108,7 @@ export const exportGalaxiesBatch = query({
       v.literal("unclassified"),
       v.literal("skipped")
     )),
-    searchId: v.optional(v.string()),
-    searchRaMin: v.optional(v.string()),
-    searchRaMax: v.optional(v.string()),
-    searchDecMin: v.optional(v.string()),
-    searchDecMax: v.optional(v.string()),
-    searchReffMin: v.optional(v.string()),
-    searchReffMax: v.optional(v.string()),
-    searchQMin: v.optional(v.string()),
-    searchQMax: v.optional(v.string()),
-    searchPaMin: v.optional(v.string()),
-    searchPaMax: v.optional(v.string()),
-    searchMagMin: v.optional(v.string()),
-    searchMagMax: v.optional(v.string()),
-    searchMeanMueMin: v.optional(v.string()),
-    searchMeanMueMax: v.optional(v.string()),
-    searchNucleus: v.optional(v.boolean()),
-    searchTotalClassificationsMin: v.optional(v.string()),
-    searchTotalClassificationsMax: v.optional(v.string()),
-    searchNumVisibleNucleusMin: v.optional(v.string()),
-    searchNumVisibleNucleusMax: v.optional(v.string()),
-    searchNumAwesomeFlagMin: v.optional(v.string()),
-    searchNumAwesomeFlagMax: v.optional(v.string()),
-    searchNumFailedFittingMin: v.optional(v.string()),
-    searchNumFailedFittingMax: v.optional(v.string()),
-    searchTotalAssignedMin: v.optional(v.string()),
-    searchTotalAssignedMax: v.optional(v.string()),
+    ...searchFilterArgs,
     searchAwesome: v.optional(v.boolean()),
     searchValidRedshift: v.optional(v.boolean()),
     searchVisibleNucleus: v.optional(v.boolean()),
@@ -168,41 +214,7 @@ export const exportGalaxiesBatch = query({
 
     const normalizedSortOrder: "asc" | "desc" = sortOrder === "desc" ? "desc" : "asc";
 
-    type Sortable =
-      | "numericId"
-      | "id"
-      | "ra"
-      | "dec"
-      | "reff"
-      | "q"
-      | "pa"
-      | "mag"
-      | "mean_mue"
-      | "nucleus"
-      | "totalClassifications"
-      | "numVisibleNucleus"
-      | "numAwesomeFlag"
-      | "numFailedFitting"
-      | "totalAssigned";
-
-    const allowedSort: Record<Sortable, { index: string }> = {
-      numericId: { index: "by_numeric_id" },
-      id: { index: "by_external_id" },
-      ra: { index: "by_ra" },
-      dec: { index: "by_dec" },
-      reff: { index: "by_reff" },
-      q: { index: "by_q" },
-      pa: { index: "by_pa" },
-      mag: { index: "by_mag" },
-      mean_mue: { index: "by_mean_mue" },
-      nucleus: { index: "by_nucleus" },
-      totalClassifications: { index: "by_totalClassifications" },
-      numVisibleNucleus: { index: "by_numVisibleNucleus" },
-      numAwesomeFlag: { index: "by_numAwesomeFlag" },
-      numFailedFitting: { index: "by_numFailedFitting" },
-      totalAssigned: { index: "by_totalAssigned_numericId" },
-    };
-    const requestedSort = (Object.keys(allowedSort) as Sortable[]).includes(sortBy as Sortable)
+    const requestedSort = (Object.keys(SORT_FIELDS) as Sortable[]).includes(sortBy as Sortable)
       ? (sortBy as Sortable)
       : "numericId";
 
@@ -321,7 +333,7 @@ export const exportGalaxiesBatch = query({
     }
 
     // Default: all galaxies with standard pagination
-    const indexName = allowedSort[requestedSort].index;
+    const indexName = SORT_FIELDS[requestedSort].index;
     let queryBuilder: any = ctx.db.query("galaxies").withIndex(indexName as any);
     queryBuilder = queryBuilder.order(normalizedSortOrder as any);
 
@@ -365,6 +377,253 @@ export const exportGalaxiesBatch = query({
   },
 });
 
+// -----------
+// Script export (scripts/export_galaxies_to_parquet.py)
+//
+// The exporter splits the sort index into key ranges and pages them concurrently,
+// each range with its own cursor. Ranges are [lower, upper) (or [lower, upper] with
+// includeUpper), so every galaxy falls into exactly one of them; galaxies without a
+// value for an optional sort field are paged separately with `missing: true`.
+
+// Upper bound on galaxies read per page (Convex limits the documents and bytes a query reads)
+const MAX_EXPORT_PAGE_SIZE = 2000;
+// Upper bound on the numericId split points computed from the galaxyIds aggregate
+const MAX_EXPORT_PARTITIONS = 1024;
+
+const rangeBoundValidator = v.union(v.number(), v.string(), v.boolean());
+
+type IndexKey = bigint | number | string | boolean;
+
+// Min/max search filter on each sort field (applySearchFilters keeps min <= value <= max)
+const SORT_FIELD_SEARCH_RANGES: Partial<Record<Sortable, [keyof SearchFilters, keyof SearchFilters]>> = {
+  ra: ["searchRaMin", "searchRaMax"],
+  dec: ["searchDecMin", "searchDecMax"],
+  reff: ["searchReffMin", "searchReffMax"],
+  q: ["searchQMin", "searchQMax"],
+  pa: ["searchPaMin", "searchPaMax"],
+  mag: ["searchMagMin", "searchMagMax"],
+  mean_mue: ["searchMeanMueMin", "searchMeanMueMax"],
+  totalClassifications: ["searchTotalClassificationsMin", "searchTotalClassificationsMax"],
+  numVisibleNucleus: ["searchNumVisibleNucleusMin", "searchNumVisibleNucleusMax"],
+  numAwesomeFlag: ["searchNumAwesomeFlagMin", "searchNumAwesomeFlagMax"],
+  numFailedFitting: ["searchNumFailedFittingMin", "searchNumFailedFittingMax"],
+  totalAssigned: ["searchTotalAssignedMin", "searchTotalAssignedMax"],
+};
+
+function toIndexKey(kind: string, value: number | string | boolean): IndexKey {
+  // int64 fields only match bigint bounds; a float bound would compare as a different type
+  return kind === "int64" ? BigInt(Math.trunc(Number(value))) : value;
+}
+
+function fromIndexKey(value: unknown): number | string | boolean | null {
+  if (value === undefined || value === null) return null;
+  return typeof value === "bigint" ? Number(value) : (value as number | string | boolean);
+}
+
+// A min/max search filter as an index key, parsed as applySearchFilters parses it (unset if it ignores it)
+function searchFilterKey(kind: string, text: unknown): IndexKey | undefined {
+  if (typeof text !== "string" || !text) return undefined;
+  const value = kind === "int64" ? parseInt(text) : parseFloat(text);
+  if (Number.isNaN(value)) return undefined;
+  return kind === "int64" ? BigInt(value) : value;
+}
+
+/**
+ * The key range of a page, narrowed to the search filter on the sort field (if any), so the index
+ * reads only galaxies that filter can keep. null if the two do not overlap.
+ */
+function searchIndexRange(
+  sortBy: Sortable,
+  range: { lower?: number | string | boolean; upper?: number | string | boolean; includeUpper?: boolean },
+  filters: SearchFilters
+): { lower?: IndexKey; upper?: IndexKey; includeUpper: boolean } | null {
+  const sort = SORT_FIELDS[sortBy];
+  let lower = range.lower === undefined ? undefined : toIndexKey(sort.kind, range.lower);
+  let upper = range.upper === undefined ? undefined : toIndexKey(sort.kind, range.upper);
+  let includeUpper = range.includeUpper ?? false;
+
+  let min: IndexKey | undefined;
+  let max: IndexKey | undefined;
+  if (sortBy === "nucleus") {
+    min = max = filters.searchNucleus;
+  } else if (SORT_FIELD_SEARCH_RANGES[sortBy]) {
+    const [minName, maxName] = SORT_FIELD_SEARCH_RANGES[sortBy]!;
+    min = searchFilterKey(sort.kind, filters[minName]);
+    max = searchFilterKey(sort.kind, filters[maxName]);
+  }
+  if (min !== undefined && (lower === undefined || min > lower)) lower = min;
+  if (max !== undefined && (upper === undefined || max < upper)) {
+    upper = max;
+    includeUpper = true;
+  }
+
+  if (lower !== undefined && upper !== undefined && (lower > upper || (lower === upper && !includeUpper))) return null;
+  return { lower, upper, includeUpper };
+}
+
+/**
+ * Smallest and largest value of the sort field, whether some galaxies lack it, the
+ * galaxy count and, for numericId, `partitions - 1` split points of about equal counts
+ * (from the galaxyIds aggregate; empty if it is not populated).
+ */
+export const exportGalaxiesBoundsInternal = internalQuery({
+  args: {
+    sortBy: sortByValidator,
+    partitions: v.optional(v.number()),
+  },
+  handler: async (ctx, args) => {
+    const sort = SORT_FIELDS[args.sortBy];
+    const index = () => ctx.db.query("galaxies").withIndex(sort.index as any, (q: any) => q.gt(sort.field, undefined));
+    const first: any = await index().order("asc").first();
+    const last: any = await index().order("desc").first();
+    const missing = await ctx.db
+      .query("galaxies")
+      .withIndex(sort.index as any, (q: any) => q.eq(sort.field, undefined))
+      .first();
+
+    let total: number | null = null;
+    const splits: number[] = [];
+    try {
+      total = await galaxyIdsAggregate.count(ctx);
+      const partitions = Math.min(Math.max(1, Math.floor(args.partitions ?? 1)), MAX_EXPORT_PARTITIONS);
+      if (args.sortBy === "numericId" && total > 0) {
+        for (let i = 1; i < partitions; i++) {
+          const item = await galaxyIdsAggregate.at(ctx, Math.floor((total * i) / partitions));
+          const key = Number(item.key);
+          if (splits.length === 0 || key > splits[splits.length - 1]) splits.push(key);
+        }
+      }
+    } catch (err) {
+      console.warn("Galaxy export: galaxyIds aggregate unavailable, using even key ranges:", String(err));
+    }
+
+    return {
+      sortBy: args.sortBy,
+      kind: sort.kind,
+      min: first ? fromIndexKey(first[sort.field]) : null,
+      max: last ? fromIndexKey(last[sort.field]) : null,
+      hasMissing: missing !== null,
+      total,
+      splits,
+    };
+  },
+});
+
+/**
+ * One page of a key range of the sort index, with the search filters applied.
+ * A min/max filter on the sort field itself also narrows the index range, so
+ * galaxies outside it are never read; a range outside it returns an empty page.
+ * `scanned` counts the galaxies read, including those the filters dropped.
+ */
+export const exportGalaxiesRangeInternal = internalQuery({
+  args: {
+    sortBy: sortByValidator,
+    sortOrder: v.optional(v.union(v.literal("asc"), v.literal("desc"))),
+    lower: v.optional(rangeBoundValidator),
+    upper: v.optional(rangeBoundValidator),
+    includeUpper: v.optional(v.boolean()),
+    missing: v.optional(v.boolean()),
+    cursor: v.optional(v.union(v.string(), v.null())),
+    batchSize: v.optional(v.number()),
+    filters: v.optional(v.object(searchFilterArgs)),
+  },
+  handler: async (ctx, args) => {
+    const sort = SORT_FIELDS[args.sortBy];
+    const numItems = Math.min(Math.max(1, Math.floor(args.batchSize ?? 500)), MAX_EXPORT_PAGE_SIZE);
+    const filters = args.filters ?? {};
+    const keys = args.missing ? null : searchIndexRange(args.sortBy, args, filters);
+    if (!args.missing && keys === null) {
+      return { galaxies: [], scanned: 0, cursor: null, isDone: true };
+    }
+
+    const page = await ctx.db
+      .query("galaxies")
+      .withIndex(sort.index as any, (q: any) => {
+        if (keys === null) return q.eq(sort.field, undefined);
+        let range = q;
+        if (keys.lower !== undefined) range = range.gte(sort.field, keys.lower);
+        if (keys.upper !== undefined) {
+          range = keys.includeUpper ? range.lte(sort.field, keys.upper) : range.lt(sort.field, keys.upper);
+        }
+        return range;
+      })
+      .order(args.sortOrder === "desc" ? "desc" : "asc")
+      .paginate({ cursor: args.cursor ?? null, numItems });
+
+    const galaxies = page.page.filter((g: any) => applySearchFilters(g, filters));
+    return {
+      galaxies: galaxies.map(formatGalaxyForExport),
+      scanned: page.page.length,
+      cursor: page.isDone ? null : page.continueCursor,
+      isDone: page.isDone,
+    };
+  },
+});
+
+function jsonResponse(payload: unknown, status = 200): Response {
+  return new Response(JSON.stringify(payload), {
+    status,
+    headers: { "Content-Type": "application/json" },
+  });
+}
+
+/**
+ * HTTP export for scripts, authorized with the export token (`Authorization: Bearer <EXPORT_TOKEN>`).
+ *
+ * POST /export/galaxies/bounds  { sortBy?, partitions? }  -> exportGalaxiesBoundsInternal
+ * POST /export/galaxies         { sortBy?, sortOrder?, lower?, upper?, includeUpper?, missing?,
+ *                                 cursor?, batchSize?, filters? }  -> exportGalaxiesRangeInternal
+ *
+ * Only the "all" filter is available: the per-user filters need a signed-in user.
+ */
+export const exportGalaxiesHttp = httpAction(async (ctx, request) => {
+  const unauthorized = checkExportToken(request);
+  if (unauthorized) return unauthorized;
+
+  let body: any;
+  try {
+    body = await request.json();
+  } catch {
+    return jsonResponse({ error: "Invalid JSON body" }, 400);
+  }
+  if (!body || typeof body !== "object" || Array.isArray(body)) {
+    return jsonResponse({ error: "Invalid body structure", detail: "Expected a JSON object" }, 400);
+  }
+
+  const sortBy = (body.sortBy ?? "numericId") as Sortable;
+  if (!(Object.keys(SORT_FIELDS) as Sortable[]).includes(sortBy)) {
+    return jsonResponse({ error: "Invalid sortBy", detail: `Expected one of: ${Object.keys(SORT_FIELDS).join(", ")}` }, 400);
+  }
+
+  try {
+    if (new URL(request.url).pathname.endsWith("/bounds")) {
+      const bounds = await ctx.runQuery(internal.galaxies.export.exportGalaxiesBoundsInternal, {
+        sortBy,
+        partitions: body.partitions,
+      });
+      return jsonResponse(bounds);
+    }
+    const page = await ctx.runQuery(internal.galaxies.export.exportGalaxiesRangeInternal, {
+      sortBy,
+      sortOrder: body.sortOrder === "desc" ? "desc" : "asc",
+      lower: body.lower ?? undefined,
+      upper: body.upper ?? undefined,
+      includeUpper: body.includeUpper ?? undefined,
+      missing: body.missing ?? undefined,
+      cursor: body.cursor ?? null,
+      batchSize: body.batchSize ?? undefined,
+      filters: body.filters ?? undefined,
+    });
+    return jsonResponse(page);
+  } catch (err) {
+    const errorMessage = String(err);
+    console.error("Galaxy export failed:", errorMessage);
+    // Argument validation errors are the caller's; anything else is worth a retry
+    const status = errorMessage.includes("ArgumentValidationError") ? 400 : 500;
+    return jsonResponse({ error: "Export failed", detail: errorMessage }, status);
+  }
+});
+
 /**
  * Format galaxy for export (subset of fields)
  */
@@ -388,10 +647,7 @@ function formatGalaxyForExport(g: any) {
   };
 }
 
-/**
- * Check if a galaxy passes search filters
- */
-function applySearchFilters(g: any, filters: {
+type SearchFilters = {
   searchId?: string;
   searchRaMin?: string;
   searchRaMax?: string;
@@ -418,7 +674,12 @@ function applySearchFilters(g: any, filters: {
   searchNumFailedFittingMax?: string;
   searchTotalAssignedMin?: string;
   searchTotalAssignedMax?: string;
-}): boolean {
+};
+
+/**
+ * Check if a galaxy passes search filters
+ */
+function applySearchFilters(g: any, filters: SearchFilters): boolean {
   // ID filter (exact match or partial)
   if (filters.searchId) {
     const searchIdLower = filters.searchId.toLowerCase().trim();
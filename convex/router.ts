@@ -1,5 +1,7 @@
 import { httpRouter } from "convex/server";
 import { ingestGalaxiesHttp, ping } from "./galaxies/batch_ingest";
+import { exportGalaxiesHttp } from "./galaxies/export";
+import { exportClassificationsHttp } from "./classifications/export";
 
 const http = httpRouter();
 
@@ -12,6 +14,25 @@ http.route({
    handler: ingestGalaxiesHttp,
 })
 
+// Export for scripts (EXPORT_TOKEN)
+http.route({
+    path: "/export/galaxies",
+    method: "POST",
+    handler: exportGalaxiesHttp,
+})
+
+http.route({
+    path: "/export/galaxies/bounds",
+    method: "POST",
+    handler: exportGalaxiesHttp,
+})
+
+http.route({
+    path: "/export/classifications",
+    method: "POST",
+    handler: exportClassificationsHttp,
+})
+
 http.route({
     path: "/ping",
     method: "GET",
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Incremental export of classifications to a partitioned Parquet dataset.
+
+The data page exports classifications by paging `getAdminExportBatch` over the
+whole table, so a nightly export takes longer every night although only a day's
+classifications are new. This script reads only what was created since its last
+run, through the /export/classifications HTTP action (export token):
+- DATASET/_watermark.json keeps the watermark, the _creationTime up to which
+  classifications have been exported; a run asks for (watermark, upTo], oldest
+  first, from the built-in by_creation_time index, and upTo becomes the next
+  watermark. upTo is fixed by the server on the first page, `--settle` seconds
+  behind its clock, so a mutation still committing with an earlier
+  _creationTime cannot be skipped
+- the new classifications are appended as one part file per partition they fall
+  in (`--partition-by` month or day of _creationTime, UTC):
+  DATASET/month=2026-10/part-20261017T030000Z.parquet, ... The directory reads
+  as one dataset (pandas.read_parquet(DATASET)), with the partition as a column
+- part files are written hidden (.part-...tmp) and only renamed into place once
+  the new watermark is saved together with the list of renames (a small
+  journal in _watermark.json, finished by the next run if this one is
+  interrupted), so a classification is never exported twice or not at all
+- partitions with more than `--max-files-per-partition` part files are compacted
+  into one file after the export (`--compact` compacts every partition with more
+  than one file and exports nothing)
+- `--full` re-exports the whole table into a new dataset that replaces DATASET
+  when it is complete. The watermark only sees new classifications: edits keep
+  their _creationTime and deleted classifications (of deleted users) stay in the
+  dataset, so a periodic --full run (e.g. weekly) picks those up
+
+Rows have the fields of the data page export (_id, _creationTime, userId,
+galaxyExternalId, lsb_class, morphology, ...). Configuration (URL, token) is
+resolved like for the ingest scripts: command line, dotenv file, environment
+(VITE_CONVEX_HTTP_ACTIONS_URL, EXPORT_TOKEN).
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from export_galaxies_to_parquet import DEFAULT_EXPORT_RETRIES, ExportError, post_export, replace_output
+from ingest_galaxies_from_file_multiband_fit import load_configuration
+from ingest_http import get_session
+from ingest_retry import DEFAULT_BACKOFF_BASE_SEC, DEFAULT_BACKOFF_MAX_SEC, RetryPolicy
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+WATERMARK_NAME = "_watermark.json"
+DEFAULT_PAGE_SIZE = 2000
+DEFAULT_SETTLE_SEC = 60.0
+DEFAULT_MAX_FILES_PER_PARTITION = 8
+DEFAULT_ROW_GROUP_ROWS = 100_000
+PARTITION_FORMATS = {"month": "%Y-%m", "day": "%Y-%m-%d"}
+
+# formatClassificationForExport (convex/classifications/export.ts)
+CLASSIFICATION_SCHEMA = pa.schema([
+    ("_id", pa.string()),
+    ("_creationTime", pa.float64()),
+    ("userId", pa.string()),
+    ("galaxyExternalId", pa.string()),
+    ("lsb_class", pa.int64()),
+    ("morphology", pa.int64()),
+    ("awesome_flag", pa.bool_()),
+    ("valid_redshift", pa.bool_()),
+    ("visible_nucleus", pa.bool_()),
+    ("failed_fitting", pa.bool_()),
+    ("comments", pa.string()),
+    ("sky_bkg", pa.float64()),
+    ("timeSpent", pa.float64()),
+])
+
+
+def format_ms(ms: Optional[float]) -> str:
+    if not ms:
+        return "the beginning"
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec="seconds")
+
+
+# --------------------------------------------------------------------------------------
+# Dataset state
+# --------------------------------------------------------------------------------------
+class Dataset:
+    """A partitioned classification dataset and its watermark file; `open()` finishes an interrupted run."""
+
+    def __init__(self, path: Path, partition_by: Optional[str] = None):
+        self.path = Path(path)
+        self.partition_by = partition_by
+        self.state: Dict[str, Any] = {}
+
+    @property
+    def state_path(self) -> Path:
+        return self.path / WATERMARK_NAME
+
+    @property
+    def watermark(self) -> float:
+        return float(self.state.get("watermark") or 0)
+
+    @contextmanager
+    def locked(self) -> Iterator["Dataset"]:
+        """Hold an exclusive lock on the dataset (two runs at once would export the same range twice)."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path / f"{WATERMARK_NAME}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise ExportError(f"Another export is running on {self.path}")
+            self.open()
+            yield self
+        finally:
+            os.close(fd)
+
+    def open(self) -> None:
+        if self.state_path.exists():
+            self.state = json.loads(self.state_path.read_text(encoding="utf-8"))
+        else:
+            self.state = {"watermark": 0, "partitionBy": self.partition_by or "month", "rows": 0, "pending": None}
+        existing = self.state["partitionBy"]
+        if self.partition_by is None:
+            self.partition_by = existing
+        elif existing != self.partition_by:
+            raise ExportError(
+                f"{self.path} is partitioned by {existing}, not {self.partition_by} (use --full to rebuild it)"
+            )
+        if self.state.get("pending"):
+            logger.info("↻ Finishing the file moves of an interrupted run")
+            self.apply_pending()
+        for leftover in self.path.glob(f"{self.partition_by}=*/.part-*.parquet.tmp"):
+            # Written by a run that failed before saving its watermark
+            leftover.unlink()
+
+    def save(self) -> None:
+        staged = self.state_path.with_name(f".{WATERMARK_NAME}.tmp")
+        staged.write_text(json.dumps(self.state, indent=2) + "\n", encoding="utf-8")
+        os.replace(staged, self.state_path)
+
+    def commit(self, renames: List[List[str]], deletes: List[str], **updates: Any) -> None:
+        """Save `updates` (a new watermark, counts) together with the file moves that go with them, then move."""
+        self.state.update(updates)
+        self.state["pending"] = {"rename": renames, "delete": deletes}
+        self.save()
+        self.apply_pending()
+
+    def apply_pending(self) -> None:
+        # Idempotent: an interrupted run is finished by repeating it
+        pending = self.state.get("pending") or {}
+        for src, dst in pending.get("rename", []):
+            if (self.path / src).exists():
+                os.replace(self.path / src, self.path / dst)
+        for name in pending.get("delete", []):
+            (self.path / name).unlink(missing_ok=True)
+        self.state["pending"] = None
+        self.save()
+
+    def partition_of(self, creation_ms: float) -> str:
+        day = datetime.fromtimestamp(creation_ms / 1000, timezone.utc)
+        return f"{self.partition_by}={day.strftime(PARTITION_FORMATS[self.partition_by])}"
+
+    def partitions(self) -> Dict[str, List[Path]]:
+        """Part files per partition directory, oldest first."""
+        found: Dict[str, List[Path]] = {}
+        for directory in sorted(self.path.glob(f"{self.partition_by}=*")):
+            parts = sorted(directory.glob("part-*.parquet"))
+            if parts:
+                found[directory.name] = parts
+        return found
+
+
+# --------------------------------------------------------------------------------------
+# Export
+# --------------------------------------------------------------------------------------
+class PartitionWriters:
+    """Hidden part files of one run, one per partition, written a row group at a time."""
+
+    def __init__(self, dataset: Dataset, run_id: str, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS):
+        self.dataset = dataset
+        self.run_id = run_id
+        self.row_group_rows = row_group_rows
+        self.rows: Dict[str, int] = defaultdict(int)
+        self._pending: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._writers: Dict[str, pq.ParquetWriter] = {}
+
+    def staged_name(self, partition: str) -> str:
+        return f"{partition}/.part-{self.run_id}.parquet.tmp"
+
+    def final_name(self, partition: str) -> str:
+        return f"{partition}/part-{self.run_id}.parquet"
+
+    def add(self, classifications: List[Dict[str, Any]]) -> None:
+        for row in classifications:
+            partition = self.dataset.partition_of(row["_creationTime"])
+            self._pending[partition].append(row)
+            self.rows[partition] += 1
+            if len(self._pending[partition]) >= self.row_group_rows:
+                self._flush(partition)
+
+    def _flush(self, partition: str) -> None:
+        rows = self._pending.pop(partition, None)
+        if not rows:
+            return
+        writer = self._writers.get(partition)
+        if writer is None:
+            path = self.dataset.path / self.staged_name(partition)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writer = self._writers[partition] = pq.ParquetWriter(path, CLASSIFICATION_SCHEMA)
+        writer.write_table(pa.Table.from_pylist(rows, schema=CLASSIFICATION_SCHEMA))
+
+    def close(self) -> List[List[str]]:
+        """Finish the part files; returns their (staged, final) names."""
+        for partition in list(self._pending):
+            self._flush(partition)
+        for writer in self._writers.values():
+            writer.close()
+        return [[self.staged_name(p), self.final_name(p)] for p in sorted(self._writers)]
+
+    def discard(self) -> None:
+        for partition, writer in self._writers.items():
+            writer.close()
+            (self.dataset.path / self.staged_name(partition)).unlink(missing_ok=True)
+
+
+class ClassificationExporter:
+    """Page the classifications created after a watermark through /export/classifications."""
+
+    def __init__(self, convex_url: str, token: str, page_size: int = DEFAULT_PAGE_SIZE,
+                 settle_sec: float = DEFAULT_SETTLE_SEC, timeout_sec: float = 60.0,
+                 retry_policy: Optional[RetryPolicy] = None):
+        self.url = f"{convex_url.rstrip('/')}/export/classifications"
+        self.token = token
+        self.page_size = page_size
+        self.settle_sec = settle_sec
+        self.timeout_sec = timeout_sec
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=DEFAULT_EXPORT_RETRIES)
+        self.session = get_session(1)
+        self.rows = 0
+        self.pages = 0
+
+    def export(self, after: float, writers: PartitionWriters) -> float:
+        """Write the classifications in (after, upTo] to `writers`; returns upTo, the next watermark."""
+        body: Dict[str, Any] = {"after": after, "settleMs": self.settle_sec * 1000, "batchSize": self.page_size}
+        last_log = time.monotonic()
+        while True:
+            page = post_export(self.session, self.url, self.token, body, self.retry_policy, self.timeout_sec)
+            classifications = page.get("classifications") or []
+            writers.add(classifications)
+            self.rows += len(classifications)
+            self.pages += 1
+            if page.get("isDone") or not page.get("cursor"):
+                return float(page["upTo"])
+            # The same range on every page: the cursor is only valid for it
+            body.update(upTo=page["upTo"], cursor=page["cursor"])
+            if time.monotonic() - last_log >= 10.0:
+                logger.info(f"  {self.rows} classifications so far ({self.pages} pages)")
+                last_log = time.monotonic()
+
+
+def export_since_watermark(dataset: Dataset, exporter: ClassificationExporter, row_group_rows: int) -> Dict[str, Any]:
+    after = dataset.watermark
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    writers = PartitionWriters(dataset, run_id, row_group_rows)
+    logger.info(f"📥 Exporting classifications created after {format_ms(after)}")
+    try:
+        up_to = exporter.export(after, writers)
+        renames = writers.close()
+    except BaseException:
+        writers.discard()
+        raise
+    rows = int(dataset.state.get("rows") or 0) + exporter.rows
+    run = {
+        "runId": run_id,
+        "after": after,
+        "upTo": up_to,
+        "rows": exporter.rows,
+        "pages": exporter.pages,
+        "partitions": dict(writers.rows),
+    }
+    dataset.commit(renames, [], watermark=up_to, watermarkIso=format_ms(up_to), rows=rows, lastRun=run)
+    return run
+
+
+# --------------------------------------------------------------------------------------
+# Compaction
+# --------------------------------------------------------------------------------------
+def compact(dataset: Dataset, max_files: int, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS) -> int:
+    """Merge the part files of every partition with more than `max_files` into one; returns the partitions compacted."""
+    compacted = 0
+    for partition, parts in dataset.partitions().items():
+        if len(parts) <= max_files:
+            continue
+        run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        staged = f"{partition}/.part-{run_id}.parquet.tmp"
+        # Ordered by _creationTime already: part files are named by run and every run exports later rows
+        writer = pq.ParquetWriter(dataset.path / staged, CLASSIFICATION_SCHEMA)
+        rows = 0
+        try:
+            pending: List[pa.Table] = []
+            pending_rows = 0
+            for part in parts:
+                table = pq.read_table(part, schema=CLASSIFICATION_SCHEMA)
+                pending.append(table)
+                pending_rows += table.num_rows
+                if pending_rows >= row_group_rows:
+                    writer.write_table(pa.concat_tables(pending), row_group_size=row_group_rows)
+                    rows += pending_rows
+                    pending, pending_rows = [], 0
+            if pending:
+                writer.write_table(pa.concat_tables(pending), row_group_size=row_group_rows)
+                rows += pending_rows
+        except BaseException:
+            writer.close()
+            (dataset.path / staged).unlink(missing_ok=True)
+            raise
+        writer.close()
+        final = f"{partition}/part-{run_id}.parquet"
+        dataset.commit([[staged, final]], [f"{partition}/{p.name}" for p in parts])
+        logger.info(f"✓ Compacted {partition}: {len(parts)} files -> 1 ({rows} rows)")
+        compacted += 1
+    return compacted
+
+
+# --------------------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------------------
+def run(args: argparse.Namespace, config: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    output = Path(args.dataset)
+    if args.compact:
+        dataset = Dataset(output, args.partition_by)
+        with dataset.locked():
+            compacted = compact(dataset, 1, args.row_group_size)
+        logger.info(f"✓ Compacted {compacted} partition(s) of {output}")
+        return {"compacted": compacted}
+
+    exporter = ClassificationExporter(
+        config["convex_url"],
+        config["export_token"],
+        page_size=args.page_size,
+        settle_sec=args.settle,
+        timeout_sec=args.timeout,
+        retry_policy=RetryPolicy(max_retries=args.max_retries, base_sec=args.backoff_base, max_sec=args.backoff_max),
+    )
+    started = time.perf_counter()
+
+    if args.full:
+        # A new dataset next to the old one, swapped in when it is complete
+        if output.parent != Path("."):
+            output.parent.mkdir(parents=True, exist_ok=True)
+        staging = output.with_name(f".{output.name}.tmp-{os.getpid()}")
+        partition_by = args.partition_by
+        if partition_by is None and (output / WATERMARK_NAME).exists():
+            partition_by = json.loads((output / WATERMARK_NAME).read_text(encoding="utf-8")).get("partitionBy")
+        try:
+            dataset = Dataset(staging, partition_by)
+            with dataset.locked():
+                result = export_since_watermark(dataset, exporter, args.row_group_size)
+            (staging / f"{WATERMARK_NAME}.lock").unlink(missing_ok=True)
+            replace_output(staging, output)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        logger.info(f"✓ Rebuilt {output}: {result['rows']} classifications up to {format_ms(result['upTo'])} "
+                    f"in {time.perf_counter() - started:.1f}s")
+        return result
+
+    dataset = Dataset(output, args.partition_by)
+    with dataset.locked():
+        result = export_since_watermark(dataset, exporter, args.row_group_size)
+        result["compacted"] = compact(dataset, args.max_files_per_partition, args.row_group_size)
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"✓ Exported {result['rows']} new classifications ({result['pages']} pages, "
+        f"{len(result['partitions'])} partition(s)) to {output} in {elapsed:.1f}s; "
+        f"watermark {format_ms(result['upTo'])}, {dataset.state['rows']} in the dataset"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export new classifications to a partitioned Parquet dataset through /export/classifications",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # First run exports everything; later runs only what is new
+  python export_classifications_incremental.py --dataset exports/classifications
+
+  # Nightly from cron, with a full rebuild on Sundays (picks up edits and deletions)
+  0 3 * * 1-6 cd /srv/app/scripts && python export_classifications_incremental.py --dot-env-file ../.env --dataset /data/classifications
+  0 3 * * 0   cd /srv/app/scripts && python export_classifications_incremental.py --dot-env-file ../.env --dataset /data/classifications --full
+
+  # Read it back
+  python -c "import pandas as pd; print(pd.read_parquet('exports/classifications'))"
+        """,
+    )
+    parser.add_argument("--dataset", required=True, help="Dataset directory (created on the first run)")
+    parser.add_argument("--partition-by", choices=sorted(PARTITION_FORMATS),
+                        help="Partition by month or day of _creationTime, UTC (default: as the dataset is, "
+                             "month for a new one; changing it needs --full)")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-export the whole table into a new dataset that replaces DATASET")
+    parser.add_argument("--compact", action="store_true",
+                        help="Only merge the part files of every partition into one file")
+    parser.add_argument("--max-files-per-partition", type=int, default=DEFAULT_MAX_FILES_PER_PARTITION,
+                        help=f"Compact partitions with more part files than this after an export "
+                             f"(default: {DEFAULT_MAX_FILES_PER_PARTITION})")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SEC,
+                        help=f"Export only classifications created at least this many seconds ago "
+                             f"(default: {DEFAULT_SETTLE_SEC:g})")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"Classifications read per request (default: {DEFAULT_PAGE_SIZE}; the server caps it at 2000)")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_ROWS,
+                        help=f"Rows per Parquet row group (default: {DEFAULT_ROW_GROUP_ROWS})")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds per request (default: 60)")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_EXPORT_RETRIES,
+                        help=f"Retries of a failed page (default: {DEFAULT_EXPORT_RETRIES})")
+    parser.add_argument("--backoff-base", type=float, default=DEFAULT_BACKOFF_BASE_SEC,
+                        help=f"First backoff ceiling in seconds (default: {DEFAULT_BACKOFF_BASE_SEC:g})")
+    parser.add_argument("--backoff-max", type=float, default=DEFAULT_BACKOFF_MAX_SEC,
+                        help=f"Longest backoff pause in seconds (default: {DEFAULT_BACKOFF_MAX_SEC:g})")
+    parser.add_argument("--convex-http-actions-url", help="Override Convex HTTP actions URL")
+    parser.add_argument("--export-token", help="Override export token (EXPORT_TOKEN)")
+    parser.add_argument("--dot-env-file", help="Path to .env file")
+    parser.add_argument("--verbose", action="store_true", help="Debug logging")
+    args = parser.parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    if args.full and args.compact:
+        parser.error("--full and --compact cannot be combined")
+    if args.page_size < 1 or args.row_group_size < 1 or args.max_files_per_partition < 1 or args.settle < 0:
+        parser.error("--page-size, --row-group-size and --max-files-per-partition must be positive, --settle not negative")
+
+    try:
+        # Compaction is local: no deployment needed
+        config = None if args.compact else load_configuration(
+            args.convex_http_actions_url, args.export_token, args.dot_env_file, token_variable="EXPORT_TOKEN"
+        )
+        run(args, config)
+    except KeyboardInterrupt:
+        logger.warning("⚠ Interrupted; the watermark was not moved")
+        sys.exit(130)
+    except Exception as e:
+        logger.error(f"❌ Export failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+"""
+Export galaxies to Parquet through the /export/galaxies HTTP action.
+
+The browser export pages `exportGalaxiesBatch` with a single cursor into CSV,
+which takes a long time for hundreds of thousands of galaxies and cannot run
+unattended. This script reads the same fields (formatGalaxyForExport in
+convex/galaxies/export.ts) with the export token:
+- the sort index is split into key ranges (`--partitions`): for numericId at
+  split points of about equal counts from the galaxyIds aggregate, otherwise in
+  even steps between the smallest and largest value; galaxies without a value
+  for an optional sort field form one more range
+- the ranges are paged concurrently (`--concurrency`), each with its own cursor,
+  and a failed page is retried with jittered backoff (ingest_retry.RetryPolicy)
+- every range streams into its own part file, a row group (`--row-group-size`)
+  at a time, so memory stays at about concurrency × one row group
+- part files are numbered in sort order: OUTPUT/part-00000.parquet, ... read
+  as one dataset (pandas.read_parquet(OUTPUT), or --parquet-file OUTPUT of the
+  ingest scripts) is the sorted export; OUTPUT/_export.json records the sort,
+  filters and counts. An OUTPUT ending in .parquet gets the parts concatenated
+  into a single file instead, with the same record in its metadata
+- the search filters of the browser export (`--search-id`, `--ra-min`, ...,
+  `--nucleus`); the per-user filters (my sequence, classified, skipped) need a
+  signed-in user and are not available
+
+The export is written next to OUTPUT and moved over it only when it is complete,
+so a cron job never leaves a partial export behind; the exit status is non-zero
+when it fails. Galaxies are read in one transaction per page, not from one
+snapshot: a galaxy whose sort value changes during the export may be missed or
+exported twice (numericId never changes).
+
+Configuration (URL, token) is resolved like for the ingest scripts: command line,
+dotenv file, environment (VITE_CONVEX_HTTP_ACTIONS_URL, EXPORT_TOKEN).
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+
+from ingest_galaxies_from_file_multiband_fit import load_configuration, summarize_error_detail
+from ingest_http import decode_json, encode_json, get_session
+from ingest_retry import (
+    DEFAULT_BACKOFF_BASE_SEC,
+    DEFAULT_BACKOFF_MAX_SEC,
+    RETRY_STATUSES,
+    RetryPolicy,
+    classify_exception,
+    parse_retry_after,
+)
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+SORT_KEYS = (
+    "numericId", "id", "ra", "dec", "reff", "q", "pa", "mag", "mean_mue", "nucleus",
+    "totalClassifications", "numVisibleNucleus", "numAwesomeFlag", "numFailedFitting", "totalAssigned",
+)
+DEFAULT_PARTITIONS = 32
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_ROW_GROUP_ROWS = 100_000
+DEFAULT_EXPORT_RETRIES = 4
+PROGRESS_INTERVAL_SEC = 10.0
+EXPORT_RECORD_NAME = "_export.json"
+EXPORT_METADATA_KEY = b"galaxy_export"
+
+# formatGalaxyForExport (numericId arrives as a string)
+EXPORT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("numericId", pa.int64()),
+    ("ra", pa.float64()),
+    ("dec", pa.float64()),
+    ("reff", pa.float64()),
+    ("q", pa.float64()),
+    ("pa", pa.float64()),
+    ("mag", pa.float64()),
+    ("mean_mue", pa.float64()),
+    ("nucleus", pa.bool_()),
+    ("totalClassifications", pa.int64()),
+    ("numVisibleNucleus", pa.int64()),
+    ("numAwesomeFlag", pa.int64()),
+    ("numFailedFitting", pa.int64()),
+    ("totalAssigned", pa.int64()),
+])
+
+# Range filters of applySearchFilters: CLI stem -> argument stem (--ra-min -> searchRaMin)
+SEARCH_RANGES = {
+    "ra": "Ra",
+    "dec": "Dec",
+    "reff": "Reff",
+    "q": "Q",
+    "pa": "Pa",
+    "mag": "Mag",
+    "mean-mue": "MeanMue",
+    "total-classifications": "TotalClassifications",
+    "num-visible-nucleus": "NumVisibleNucleus",
+    "num-awesome-flag": "NumAwesomeFlag",
+    "num-failed-fitting": "NumFailedFitting",
+    "total-assigned": "TotalAssigned",
+}
+# Sort key -> argument stem of the range filter on it, which also narrows the key ranges (searchIndexRange)
+SORT_SEARCH_RANGES = {
+    "ra": "Ra", "dec": "Dec", "reff": "Reff", "q": "Q", "pa": "Pa", "mag": "Mag", "mean_mue": "MeanMue",
+    "totalClassifications": "TotalClassifications", "numVisibleNucleus": "NumVisibleNucleus",
+    "numAwesomeFlag": "NumAwesomeFlag", "numFailedFitting": "NumFailedFitting", "totalAssigned": "TotalAssigned",
+}
+
+
+class ExportError(RuntimeError):
+    """A page could not be fetched (after retries) or the server rejected the request."""
+
+
+class ExportCancelled(ExportError):
+    """Another key range failed; this one stopped."""
+
+
+# --------------------------------------------------------------------------------------
+# Key ranges
+# --------------------------------------------------------------------------------------
+@dataclass
+class Partition:
+    """A key range of the sort index: [lower, upper), [lower, upper] with include_upper, or the unset values."""
+
+    index: int
+    lower: Any = None
+    upper: Any = None
+    include_upper: bool = False
+    missing: bool = False
+
+    def body(self) -> Dict[str, Any]:
+        if self.missing:
+            return {"missing": True}
+        body: Dict[str, Any] = {}
+        if self.lower is not None:
+            body["lower"] = self.lower
+        if self.upper is not None:
+            body["upper"] = self.upper
+            body["includeUpper"] = self.include_upper
+        return body
+
+    def describe(self) -> str:
+        if self.missing:
+            return "unset"
+        if self.lower is None and self.upper is None:
+            return "all"
+        return f"[{self.lower}, {self.upper}{']' if self.include_upper else ')'}"
+
+
+def narrow_bounds(bounds: Dict[str, Any], sort_by: str, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    `bounds` with min/max clamped to the search filter on the sort key, so the key ranges split only
+    values the filter keeps (the server narrows every range the same way); both None if none are left.
+    """
+    kind, low, high = bounds["kind"], bounds.get("min"), bounds.get("max")
+    if low is None:
+        return bounds
+    if sort_by == "nucleus":
+        keep_low = keep_high = filters.get("searchNucleus")
+    elif sort_by in SORT_SEARCH_RANGES:
+        stem = SORT_SEARCH_RANGES[sort_by]
+        # Parsed like the server does: parseInt for the integer fields, parseFloat for the others
+        parse = (lambda text: int(float(text))) if kind == "int64" else float
+        keep_low, keep_high = (
+            parse(filters[name]) if filters.get(name) else None
+            for name in (f"search{stem}Min", f"search{stem}Max")
+        )
+    else:
+        return bounds
+    if keep_low is not None and keep_low > low:
+        low = keep_low
+    if keep_high is not None and keep_high < high:
+        high = keep_high
+    if low > high:
+        low = high = None
+    return {**bounds, "min": low, "max": high}
+
+
+def plan_partitions(bounds: Dict[str, Any], count: int, descending: bool = False) -> List[Partition]:
+    """Key ranges covering the sort index, in export order (unset values first when ascending, as Convex orders them)."""
+    kind, low, high = bounds["kind"], bounds.get("min"), bounds.get("max")
+    count = max(1, count)
+    ranges: List[Partition] = []
+    if kind == "string":
+        # No useful way to split string keys; one range, which also holds any unset values
+        return [Partition(0)]
+    if low is not None:
+        if kind == "boolean":
+            ranges = [Partition(0, value, value, include_upper=True) for value in sorted({low, high})]
+        elif kind == "int64":
+            low, high = int(low), int(high)
+            splits = [int(s) for s in bounds.get("splits") or []]
+            if not splits:
+                splits = [low + (high - low + 1) * i // count for i in range(1, count)]
+            edges = [low] + sorted({s for s in splits if low < s <= high}) + [high + 1]
+            ranges = [Partition(0, a, b) for a, b in zip(edges, edges[1:])]
+        else:
+            low, high = float(low), float(high)
+            edges = sorted({low + (high - low) * i / count for i in range(count)} | {high})
+            if len(edges) == 1:
+                ranges = [Partition(0, low, high, include_upper=True)]
+            else:
+                ranges = [Partition(0, a, b) for a, b in zip(edges, edges[1:])]
+                ranges[-1].include_upper = True
+    if bounds.get("hasMissing"):
+        ranges.insert(0, Partition(0, missing=True))
+    if descending:
+        ranges.reverse()
+    for index, partition in enumerate(ranges):
+        partition.index = index
+    return ranges
+
+
+# --------------------------------------------------------------------------------------
+# Requests
+# --------------------------------------------------------------------------------------
+def post_export(session: requests.Session, url: str, token: str, body: Dict[str, Any], policy: RetryPolicy,
+                timeout_sec: float, cancelled: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """POST an export request, retrying throttling, gateway and server errors; raises ExportError."""
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    data = encode_json(body)
+    attempt = 0
+    while True:
+        attempt += 1
+        retry_after = None
+        try:
+            resp = session.post(url, data=data, headers=headers, timeout=timeout_sec)
+        except requests.RequestException as exc:
+            if not classify_exception(exc) or attempt >= policy.max_attempts:
+                raise ExportError(f"{url}: {exc}") from exc
+            reason = type(exc).__name__
+        else:
+            if resp.status_code == 200:
+                try:
+                    return decode_json(resp.content)
+                except ValueError:
+                    # An HTML page from a proxy; the next attempt may reach the deployment
+                    reason = "HTTP 200 without a JSON body"
+                    if attempt >= policy.max_attempts:
+                        raise ExportError(f"{url}: {reason}")
+            else:
+                try:
+                    result_json = decode_json(resp.content)
+                except ValueError:
+                    result_json = {}
+                detail = summarize_error_detail(resp, result_json if isinstance(result_json, dict) else {})
+                if (resp.status_code not in RETRY_STATUSES and resp.status_code != 500) or attempt >= policy.max_attempts:
+                    raise ExportError(f"{url}: HTTP {resp.status_code}: {detail}")
+                reason = f"HTTP {resp.status_code}"
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        pause = policy.backoff(attempt, retry_after)
+        logger.warning(f"↻ {reason}; retrying in {pause:.1f}s (attempt {attempt + 1}/{policy.max_attempts})")
+        if cancelled is None:
+            time.sleep(pause)
+        elif cancelled.wait(pause):
+            raise ExportCancelled("Export cancelled")
+
+
+# --------------------------------------------------------------------------------------
+# Export
+# --------------------------------------------------------------------------------------
+def page_table(galaxies: List[Dict[str, Any]]) -> pa.Table:
+    for galaxy in galaxies:
+        numeric_id = galaxy.get("numericId")
+        galaxy["numericId"] = int(numeric_id) if numeric_id not in (None, "") else None
+    return pa.Table.from_pylist(galaxies, schema=EXPORT_SCHEMA)
+
+
+class GalaxyExporter:
+    """Page the key ranges of one export concurrently into part files of a directory."""
+
+    def __init__(self, convex_url: str, token: str, sort_by: str = "numericId", sort_order: str = "asc",
+                 filters: Optional[Dict[str, Any]] = None, partitions: int = DEFAULT_PARTITIONS,
+                 concurrency: int = DEFAULT_CONCURRENCY, page_size: int = DEFAULT_PAGE_SIZE,
+                 row_group_rows: int = DEFAULT_ROW_GROUP_ROWS, timeout_sec: float = 60.0,
+                 retry_policy: Optional[RetryPolicy] = None):
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{sort_by}' (expected one of: {', '.join(SORT_KEYS)})")
+        self.url = f"{convex_url.rstrip('/')}/export/galaxies"
+        self.token = token
+        self.sort_by = sort_by
+        self.sort_order = sort_order
+        self.filters = filters or {}
+        self.partitions = partitions
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+        self.row_group_rows = max(1, row_group_rows)
+        self.timeout_sec = timeout_sec
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=DEFAULT_EXPORT_RETRIES)
+        self.session = get_session(self.concurrency)
+        self.cancelled = threading.Event()
+        self.rows = 0
+        self.scanned = 0
+        self.pages = 0
+        self.done_partitions = 0
+        self._lock = threading.Lock()
+
+    def _post(self, url: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        return post_export(self.session, url, self.token, body, self.retry_policy, self.timeout_sec, self.cancelled)
+
+    def bounds(self) -> Dict[str, Any]:
+        return self._post(f"{self.url}/bounds", {"sortBy": self.sort_by, "partitions": self.partitions})
+
+    def export_partition(self, partition: Partition, directory: Path) -> int:
+        """Page one key range into DIRECTORY/part-NNNNN.parquet (no file if it is empty); returns its rows."""
+        path = directory / f"part-{partition.index:05d}.parquet"
+        body = {
+            "sortBy": self.sort_by,
+            "sortOrder": self.sort_order,
+            "batchSize": self.page_size,
+            "filters": self.filters,
+            **partition.body(),
+        }
+        writer: Optional[pq.ParquetWriter] = None
+        pending: List[pa.Table] = []
+        pending_rows = 0
+        rows = 0
+        cursor = None
+        try:
+            while True:
+                if self.cancelled.is_set():
+                    raise ExportCancelled("Export cancelled")
+                page = self._post(self.url, {**body, "cursor": cursor})
+                last = bool(page.get("isDone")) or not page.get("cursor")
+                table = page_table(page.get("galaxies") or [])
+                if table.num_rows:
+                    pending.append(table)
+                    pending_rows += table.num_rows
+                while pending_rows >= self.row_group_rows or (last and pending_rows):
+                    merged = pa.concat_tables(pending)
+                    group, rest = merged.slice(0, self.row_group_rows), merged.slice(self.row_group_rows)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, EXPORT_SCHEMA)
+                    writer.write_table(group, row_group_size=self.row_group_rows)
+                    pending, pending_rows = ([rest] if rest.num_rows else []), rest.num_rows
+                rows += table.num_rows
+                with self._lock:
+                    self.rows += table.num_rows
+                    self.scanned += int(page.get("scanned") or 0)
+                    self.pages += 1
+                if last:
+                    break
+                cursor = page["cursor"]
+        finally:
+            if writer is not None:
+                writer.close()
+        with self._lock:
+            self.done_partitions += 1
+        logger.debug(f"Range {partition.describe()}: {rows} galaxies -> {path.name if rows else '(empty)'}")
+        return rows
+
+    def run(self, directory: Path, partitions: List[Partition], total: Optional[int] = None) -> None:
+        """Export all ranges into `directory`; raises the first failure after the other ranges stopped."""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="export") as pool:
+            futures = [pool.submit(self.export_partition, p, directory) for p in partitions]
+            pending = set(futures)
+            try:
+                while pending:
+                    finished, pending = wait(pending, timeout=PROGRESS_INTERVAL_SEC, return_when=FIRST_EXCEPTION)
+                    if any(f.exception() is not None for f in finished):
+                        break
+                    if pending:
+                        self.log_progress(len(partitions), total, time.perf_counter() - started)
+            finally:
+                if pending:
+                    # A range failed (or Ctrl-C): stop the others and drop the ranges not started yet
+                    self.cancelled.set()
+                    for future in pending:
+                        future.cancel()
+        failures = [f.exception() for f in futures if not f.cancelled() and f.exception() is not None]
+        failures = [e for e in failures if not isinstance(e, ExportCancelled)] or failures
+        if failures:
+            raise failures[0]
+
+    def log_progress(self, partitions: int, total: Optional[int], elapsed: float) -> None:
+        rate = self.scanned / elapsed if elapsed > 0 else 0.0
+        eta = ""
+        if total and rate > 0 and total > self.scanned:
+            eta = f", ETA {(total - self.scanned) / rate:.0f}s"
+        logger.info(
+            f"📥 {self.rows} galaxies ({self.scanned}{f'/{total}' if total else ''} read, {rate:.0f}/s{eta}); "
+            f"ranges {self.done_partitions}/{partitions}"
+        )
+
+
+# --------------------------------------------------------------------------------------
+# Output
+# --------------------------------------------------------------------------------------
+def concatenate_parts(directory: Path, target: Path, record: Dict[str, Any], row_group_rows: int = DEFAULT_ROW_GROUP_ROWS) -> int:
+    """Copy the part files of `directory` in order into one parquet file, regrouped into full row groups."""
+    metadata = {EXPORT_METADATA_KEY: json.dumps(record).encode("utf-8")}
+    schema = EXPORT_SCHEMA.with_metadata(metadata)
+    pending: List[pa.Table] = []
+    pending_rows = 0
+    row_groups = 0
+    with pq.ParquetWriter(target, schema) as writer:
+        def write(table: pa.Table) -> None:
+            nonlocal row_groups
+            writer.write_table(table.replace_schema_metadata(metadata), row_group_size=row_group_rows)
+            row_groups += 1
+
+        for part in sorted(directory.glob("part-*.parquet")):
+            source = pq.ParquetFile(part)
+            for i in range(source.num_row_groups):
+                pending.append(source.read_row_group(i))
+                pending_rows += pending[-1].num_rows
+                if pending_rows >= row_group_rows:
+                    merged = pa.concat_tables(pending)
+                    write(merged.slice(0, row_group_rows))
+                    rest = merged.slice(row_group_rows)
+                    pending, pending_rows = ([rest] if rest.num_rows else []), rest.num_rows
+            part.unlink()
+        if pending_rows:
+            write(pa.concat_tables(pending))
+    return row_groups
+
+
+def replace_output(staged: Path, output: Path) -> None:
+    """Move the finished export over OUTPUT (a file or a directory), removing what was there."""
+    if output.is_dir() and not output.is_symlink():
+        previous = output.with_name(f".{output.name}.old-{os.getpid()}")
+        output.rename(previous)
+        staged.rename(output)
+        shutil.rmtree(previous, ignore_errors=True)
+    else:
+        os.replace(staged, output)
+
+
+def search_filters_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    filters: Dict[str, Any] = {}
+    if args.search_id:
+        filters["searchId"] = args.search_id
+    for stem, name in SEARCH_RANGES.items():
+        for bound in ("min", "max"):
+            value = getattr(args, f"{stem.replace('-', '_')}_{bound}")
+            if value is not None:
+                # The server parses them like the browser's text fields
+                filters[f"search{name}{bound.capitalize()}"] = str(value)
+    if args.nucleus is not None:
+        filters["searchNucleus"] = args.nucleus
+    return filters
+
+
+def export(args: argparse.Namespace, config: Dict[str, str]) -> Dict[str, Any]:
+    output = Path(args.output)
+    single_file = output.suffix == ".parquet"
+    exporter = GalaxyExporter(
+        config["convex_url"],
+        config["export_token"],
+        sort_by=args.sort_by,
+        sort_order=args.sort_order,
+        filters=search_filters_from_args(args),
+        partitions=args.partitions,
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        row_group_rows=args.row_group_size,
+        timeout_sec=args.timeout,
+        retry_policy=RetryPolicy(max_retries=args.max_retries, base_sec=args.backoff_base, max_sec=args.backoff_max),
+    )
+    started_at = datetime.now(timezone.utc)
+    started = time.perf_counter()
+
+    bounds = narrow_bounds(exporter.bounds(), args.sort_by, exporter.filters)
+    partitions = plan_partitions(bounds, args.partitions, descending=args.sort_order == "desc")
+    total = bounds.get("total")
+    logger.info(
+        f"✓ Sort {args.sort_by} {args.sort_order}: {bounds.get('min')} .. {bounds.get('max')}"
+        f"{' (some unset)' if bounds.get('hasMissing') else ''}; {len(partitions)} key range(s), "
+        f"{exporter.concurrency} concurrent; {total if total is not None else 'unknown number of'} galaxies in the table"
+    )
+    if exporter.filters:
+        logger.info(f"  Filters: {json.dumps(exporter.filters)}")
+
+    if output.parent != Path("."):
+        output.parent.mkdir(parents=True, exist_ok=True)
+    staging = output.with_name(f".{output.name}.tmp-{os.getpid()}")
+    staging.mkdir()
+    try:
+        exporter.run(staging, partitions, total)
+        elapsed = time.perf_counter() - started
+        record = {
+            "sortBy": args.sort_by,
+            "sortOrder": args.sort_order,
+            "filters": exporter.filters,
+            "rows": exporter.rows,
+            "scanned": exporter.scanned,
+            "partitions": len(partitions),
+            "pages": exporter.pages,
+            "exportedAt": started_at.isoformat(timespec="seconds"),
+            "seconds": round(elapsed, 3),
+            "source": config["convex_url"],
+        }
+        if single_file:
+            merged = staging / "export.parquet"
+            concatenate_parts(staging, merged, record, args.row_group_size)
+            replace_output(merged, output)
+            shutil.rmtree(staging, ignore_errors=True)
+        else:
+            (staging / EXPORT_RECORD_NAME).write_text(json.dumps(record, indent=2) + "\n", encoding="utf-8")
+            replace_output(staging, output)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    rate = exporter.scanned / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"✓ Exported {exporter.rows} galaxies ({exporter.scanned} read, {exporter.pages} pages) to {output} "
+        f"in {elapsed:.1f}s ({rate:.0f} galaxies/s)"
+    )
+    return record
+
+
+# --------------------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export galaxies to Parquet through the /export/galaxies HTTP action",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Whole catalog, by numericId, as a directory of part files
+  python export_galaxies_to_parquet.py --output exports/galaxies
+
+  # Bright galaxies by magnitude into one file
+  python export_galaxies_to_parquet.py --output bright.parquet --sort-by mag --mag-max 18
+
+  # Nightly from cron
+  0 3 * * * cd /srv/app/scripts && python export_galaxies_to_parquet.py --dot-env-file ../.env --output /data/galaxies
+        """,
+    )
+    parser.add_argument("--output", required=True,
+                        help="Export directory (part files), or a .parquet file; replaced when the export completes")
+    parser.add_argument("--sort-by", choices=SORT_KEYS, default="numericId", help="Sort key (default: numericId)")
+    parser.add_argument("--sort-order", choices=["asc", "desc"], default="asc", help="Sort order (default: asc)")
+    parser.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS,
+                        help=f"Key ranges the sort index is split into (default: {DEFAULT_PARTITIONS})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Key ranges paged at the same time (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"Galaxies read per request (default: {DEFAULT_PAGE_SIZE}; the server caps it at 2000)")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_ROWS,
+                        help=f"Rows per Parquet row group; also what each range buffers (default: {DEFAULT_ROW_GROUP_ROWS})")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds per request (default: 60)")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_EXPORT_RETRIES,
+                        help=f"Retries of a failed page (default: {DEFAULT_EXPORT_RETRIES})")
+    parser.add_argument("--backoff-base", type=float, default=DEFAULT_BACKOFF_BASE_SEC,
+                        help=f"First backoff ceiling in seconds (default: {DEFAULT_BACKOFF_BASE_SEC:g})")
+    parser.add_argument("--backoff-max", type=float, default=DEFAULT_BACKOFF_MAX_SEC,
+                        help=f"Longest backoff pause in seconds (default: {DEFAULT_BACKOFF_MAX_SEC:g})")
+
+    filters = parser.add_argument_group("search filters (as in the browser export)")
+    filters.add_argument("--search-id", help="Galaxies whose id contains this text (case-insensitive)")
+    for stem in SEARCH_RANGES:
+        filters.add_argument(f"--{stem}-min", type=float, metavar="VALUE", help=f"Minimum {stem.replace('-', ' ')}")
+        filters.add_argument(f"--{stem}-max", type=float, metavar="VALUE", help=f"Maximum {stem.replace('-', ' ')}")
+    filters.add_argument("--nucleus", dest="nucleus", action="store_const", const=True, default=None,
+                         help="Only galaxies with a nucleus")
+    filters.add_argument("--no-nucleus", dest="nucleus", action="store_const", const=False,
+                         help="Only galaxies without a nucleus")
+
+    parser.add_argument("--convex-http-actions-url", help="Override Convex HTTP actions URL")
+    parser.add_argument("--export-token", help="Override export token (EXPORT_TOKEN)")
+    parser.add_argument("--dot-env-file", help="Path to .env file")
+    parser.add_argument("--verbose", action="store_true", help="Log every key range")
+    args = parser.parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    if args.partitions < 1 or args.concurrency < 1 or args.page_size < 1 or args.row_group_size < 1:
+        parser.error("--partitions, --concurrency, --page-size and --row-group-size must be positive")
+
+    try:
+        config = load_configuration(args.convex_http_actions_url, args.export_token, args.dot_env_file,
+                                    token_variable="EXPORT_TOKEN")
+        export(args, config)
+    except KeyboardInterrupt:
+        logger.warning("⚠ Interrupted; nothing was written")
+        sys.exit(130)
+    except Exception as e:
+        logger.error(f"❌ Export failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Batch sizing for the galaxy ingest scripts.
+
+The number of galaxies that fits into one `/ingest/galaxies` mutation depends on
+how many aggregates each galaxy touches and on how full the B-trees are, so a
+fixed batch size is either too cautious or fails with "Too many bytes read".
+`AdaptiveBatchSize` is an AIMD controller: it grows the batch additively while
+requests succeed within the target latency and halves it as soon as the server
+reports a read-limit/timeout failure. The size that overloaded the server is
+remembered as a ceiling which is only relaxed slowly, so long runs do not keep
+probing a size that is known to fail.
+
+A row count also says nothing about how large a request is: a galaxy without
+Thuruthipilly/band data encodes to a fraction of a fully populated one.
+`EncodedBatch` keeps each galaxy's JSON fragment (encoded once, when the row is
+added) so the batch can also be closed at a byte budget and the request body is
+assembled from the fragments without serializing again.
+
+The server rolls back the whole batch when one galaxy fails, so a single bad
+row would cost every good row of its batch. `split_failed_batch` plans the
+re-sends that isolate it: halves (or, when the error names the failing
+`batch index`, the rows before it, the row itself and the rows after it),
+recursively, until the rows that fail on their own are left. A rolled-back
+batch of n rows with one bad row thus costs at most ~2*log2(n) extra requests.
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+# Upper bound for the galaxies array of one request; well below Convex's argument size limit
+DEFAULT_MAX_BATCH_BYTES = 4 * 1024 * 1024
+
+
+# Error texts (lower-cased) that mean "this batch was too expensive", not "this data is bad".
+OVERLOAD_ERROR_PATTERNS = (
+    "too many bytes read",
+    "too many documents read",
+    "too many reads",
+    "timed out",
+    "timeout",
+    "ran for too long",
+)
+
+
+def is_overload_error(text: Optional[str]) -> bool:
+    """True if an error message/detail indicates the batch exceeded a size or time limit."""
+    if not text:
+        return False
+    lowered = text.lower()
+    return any(pattern in lowered for pattern in OVERLOAD_ERROR_PATTERNS)
+
+
+# Rows a run may quarantine by bisecting rolled-back batches; past this, failures are systematic, not poison rows
+DEFAULT_MAX_POISON_ROWS = 10
+
+# convex/galaxies/batch_ingest.ts: 'Failed at batch index 12, galaxy external ID "..."'
+_FAILED_INDEX_RE = re.compile(r"failed at batch index (\d+)", re.IGNORECASE)
+
+
+class PoisonRowError(RuntimeError):
+    """A single galaxy that makes its batch roll back even when sent alone."""
+
+
+def failed_batch_index(text: Optional[str]) -> Optional[int]:
+    """Index of the failing galaxy within the sent batch, when the server's error names it."""
+    match = _FAILED_INDEX_RE.search(text or "")
+    return int(match.group(1)) if match else None
+
+
+def split_failed_batch(length: int, failed_index: Optional[int] = None) -> List[Tuple[int, int]]:
+    """(start, stop) parts to re-send a rolled-back batch of `length` rows in, in order."""
+    if failed_index is not None and 0 <= failed_index < length:
+        bounds = [(0, failed_index), (failed_index, failed_index + 1), (failed_index + 1, length)]
+    else:
+        middle = (length + 1) // 2
+        bounds = [(0, middle), (middle, length)]
+    return [(start, stop) for start, stop in bounds if stop > start]
+
+
+class AdaptiveBatchSize:
+    """Additive-increase / multiplicative-decrease controller for the ingest batch size."""
+
+    def __init__(
+        self,
+        initial: int,
+        min_size: int = 1,
+        max_size: int = 100,
+        target_latency_sec: float = 5.0,
+        increase_step: int = 2,
+        decrease_factor: float = 0.5,
+        ceiling_relax_every: int = 50,
+    ):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial, self.min_size), self.max_size)
+        self.target_latency_sec = target_latency_sec
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.ceiling_relax_every = ceiling_relax_every
+        self.ceiling = self.max_size
+        self._successes_since_overload = 0
+
+    def on_success(self, batch_len: int, latency_sec: float) -> None:
+        """Grow after a healthy full-size batch; back off additively when latency is above target."""
+        self._successes_since_overload += 1
+        if self.ceiling < self.max_size and self._successes_since_overload % self.ceiling_relax_every == 0:
+            self.ceiling += 1
+        if latency_sec > self.target_latency_sec:
+            new_size = max(self.min_size, self.size - self.increase_step)
+        elif batch_len >= self.size:
+            new_size = min(self.ceiling, self.size + self.increase_step)
+        else:
+            return
+        self._set(new_size, f"latency={latency_sec:.2f}s")
+
+    def on_overload(self, batch_len: int) -> None:
+        """Shrink immediately after a read-limit/timeout failure of a batch of `batch_len` rows."""
+        # Several in-flight batches may fail for the same reason; size from the failed batch,
+        # not from the current size, so they do not compound.
+        new_size = max(self.min_size, min(self.size, int(batch_len * self.decrease_factor)))
+        self.ceiling = max(self.min_size, min(self.ceiling, batch_len - 1))
+        self._successes_since_overload = 0
+        self._set(new_size, f"overload at {batch_len} rows")
+
+    def _set(self, new_size: int, reason: str) -> None:
+        if new_size != self.size:
+            logger.info(f"↕ Batch size {self.size} → {new_size} ({reason})")
+            self.size = new_size
+
+
+class EncodedBatch:
+    """
+    Galaxy payloads of one batch with their encoded JSON fragments; iterates/slices like a list of galaxies.
+
+    A galaxy is None when only its fragment was produced (ingest_parallel.ParallelTransform).
+    """
+
+    def __init__(self, galaxies: Optional[List[Dict[str, Any]]] = None, fragments: Optional[List[bytes]] = None):
+        self.galaxies: List[Dict[str, Any]] = galaxies if galaxies is not None else []
+        self.fragments: List[bytes] = fragments if fragments is not None else []
+        self._fragment_bytes = sum(len(f) for f in self.fragments)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the encoded galaxies array (fragments plus separators)."""
+        return self._fragment_bytes + max(len(self.fragments) - 1, 0) + 2
+
+    def size_with(self, fragment: bytes) -> int:
+        """`nbytes` after appending `fragment`."""
+        return self.nbytes + len(fragment) + (1 if self.fragments else 0)
+
+    def append(self, galaxy: Optional[Dict[str, Any]], fragment: bytes) -> None:
+        self.galaxies.append(galaxy)
+        self.fragments.append(fragment)
+        self._fragment_bytes += len(fragment)
+
+    def __len__(self) -> int:
+        return len(self.galaxies)
+
+    def __iter__(self):
+        return iter(self.galaxies)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EncodedBatch(self.galaxies[index], self.fragments[index])
+        return self.galaxies[index]
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the ingest hot path.
+
+Generates multiband catalogs (10k, 100k and 1M rows by default) with every
+column of the mapping profile, filled with plausible values (valid ra/dec/q/pa,
+some nulls in the optional columns), and times each step of the ingest
+pipeline separately, without any HTTP:
+- read: ParquetStream frames of the mapped columns (the --stream path)
+- row_to_galaxy: the per-row extract_nested/split_nested path, on the first
+  --row-sample rows (it is too slow for 1M rows)
+- transform: the columnar plan (iter_frame_galaxies), as used by the ingesters
+- serialize: encode_json of each galaxy
+- batch: byte-budgeted EncodedBatch assembly and build_ingest_body
+
+Each benchmark runs --repeat times and the fastest pass counts. Catalogs are
+cached in --catalog-dir and reused while the profile and seed stay the same.
+
+Every run is appended to a JSON-lines history file together with the git
+commit, host and library versions. With --check, the rows/s of each benchmark
+are compared with the most recent run of a different commit on the same host
+(or --baseline REV), and the exit status is 1 if any of them dropped by more
+than --threshold.
+
+    python scripts/ingest_benchmark.py --sizes 10k,100k --check
+"""
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingest_batching import DEFAULT_MAX_BATCH_BYTES, EncodedBatch
+# Also sets up the shared logger (stdout)
+from ingest_galaxies_from_file_multiband_fit import extract_nested, iter_frame_galaxies
+from ingest_http import build_ingest_body, encode_json, orjson
+from ingest_mapping import split_nested, str_or_int_to_str
+from ingest_profiles import MappingProfile, load_profile
+from ingest_reader import DEFAULT_STREAM_BATCH_ROWS, ParquetStream
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+BENCHMARKS = ("read", "row_to_galaxy", "transform", "serialize", "batch")
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_PROFILE = "galaxy_multiband_fit.v1"
+DEFAULT_HISTORY_PATH = ".ingest_bench_history.jsonl"
+DEFAULT_CATALOG_DIR = ".ingest_bench"
+DEFAULT_REPEAT = 3
+DEFAULT_ROW_SAMPLE = 20_000
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_BATCH_SIZE = 20
+
+# Rows generated (and written as one row group) at a time, so 1M-row catalogs fit in memory
+GENERATE_CHUNK_ROWS = 100_000
+
+
+# --------------------------------------------------------------------------------------
+# Catalogs
+# --------------------------------------------------------------------------------------
+def _leaves(mapping: Dict[str, Any], path: Tuple[str, ...] = ()) -> Iterator[Tuple[Tuple[str, ...], str, Any]]:
+    for key, colmap in mapping.items():
+        if isinstance(colmap, dict):
+            yield from _leaves(colmap, path + (key,))
+        elif isinstance(colmap, tuple) and colmap[0] is not None:
+            yield path + (key,), colmap[0], colmap[1]
+
+
+def _float_values(path: Tuple[str, ...], rng: np.random.Generator, n: int) -> np.ndarray:
+    key = path[-1]
+    if path == ("ra",):
+        return rng.uniform(0, 360, n)
+    if path == ("dec",):
+        return np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    if path == ("q",):
+        return rng.uniform(0.05, 1.0, n)
+    if path == ("pa",):
+        return rng.uniform(-90, 90, n)
+    if key in ("reff", "reff_pixels"):
+        return rng.lognormal(0.5, 0.6, n)
+    if key in ("x", "y"):
+        return rng.uniform(0, 4096, n)
+    if "error" in key:
+        values = np.abs(rng.normal(0, 0.05, n))
+    elif key.startswith("mag") or key.startswith("mu"):
+        values = rng.normal(21, 1.5, n)
+    else:
+        values = rng.normal(0, 1, n)
+    # Optional columns: some nulls, as in real fits
+    values[rng.random(n) < 0.05] = np.nan
+    return values
+
+
+def generate_catalog(rows: int, profile: MappingProfile, seed: int = 0, start: int = 0) -> pd.DataFrame:
+    """`rows` galaxies with every column of `profile`; row `start + k` gets object ID 10**15 + start + k."""
+    rng = np.random.default_rng([seed, start])
+    columns: Dict[str, Any] = {}
+    for path, column, cast in _leaves(profile.mapping):
+        if column in columns:
+            continue
+        if path == ("id",) or cast is str_or_int_to_str:
+            columns[column] = np.arange(10**15 + start, 10**15 + start + rows, dtype="int64")
+        elif cast is bool:
+            columns[column] = rng.random(rows) < 0.3
+        elif cast is str:
+            columns[column] = pd.Series(rng.choice(["", "flagged", "ok"], rows), dtype=object)
+        else:
+            columns[column] = _float_values(path, rng, rows)
+    return pd.DataFrame(columns)
+
+
+def ensure_catalog(rows: int, profile: MappingProfile, directory: Path, seed: int = 0) -> Path:
+    """Path of the cached catalog for (profile, rows, seed), generated on first use."""
+    path = Path(directory) / f"{profile.label}_{rows}_s{seed}.parquet"
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    writer = None
+    try:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            table = pa.Table.from_pandas(
+                generate_catalog(min(GENERATE_CHUNK_ROWS, rows - start), profile, seed, start),
+                preserve_index=False,
+            )
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    tmp_path.replace(path)
+    logger.info(f"✓ Generated {path} ({rows} rows, {path.stat().st_size / 1024 / 1024:.1f} MB)")
+    return path
+
+
+# --------------------------------------------------------------------------------------
+# Benchmarks
+# --------------------------------------------------------------------------------------
+def _assemble_batches(galaxies: Sequence[Dict[str, Any]], fragments: Sequence[bytes], batch_size: int, max_batch_bytes: int) -> int:
+    """Same batching as process_parquet (row cap and byte budget); returns the number of request bodies."""
+    bodies = 0
+    batch = EncodedBatch()
+    for galaxy, fragment in zip(galaxies, fragments):
+        if len(batch) and max_batch_bytes and batch.size_with(fragment) > max_batch_bytes:
+            build_ingest_body(batch.fragments, mode="insert")
+            bodies += 1
+            batch = EncodedBatch()
+        batch.append(galaxy, fragment)
+        if len(batch) >= batch_size:
+            build_ingest_body(batch.fragments, mode="insert")
+            bodies += 1
+            batch = EncodedBatch()
+    if len(batch):
+        build_ingest_body(batch.fragments, mode="insert")
+        bodies += 1
+    return bodies
+
+
+def _pass(path: Path, profile: MappingProfile, batch_size: int, max_batch_bytes: int) -> Dict[str, float]:
+    """One pass over the catalog, frame by frame; seconds per benchmark (row_to_galaxy excluded)."""
+    seconds = dict.fromkeys(("read", "transform", "serialize", "batch"), 0.0)
+    frames = iter(ParquetStream(path, columns=profile.plan.source_columns, batch_rows=DEFAULT_STREAM_BATCH_ROWS))
+    while True:
+        started = time.perf_counter()
+        frame = next(frames, None)
+        seconds["read"] += time.perf_counter() - started
+        if frame is None:
+            return seconds
+
+        started = time.perf_counter()
+        galaxies = [galaxy for _, galaxy in iter_frame_galaxies(frame, profile.plan)]
+        seconds["transform"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        fragments = [encode_json(galaxy) for galaxy in galaxies]
+        seconds["serialize"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        _assemble_batches(galaxies, fragments, batch_size, max_batch_bytes)
+        seconds["batch"] += time.perf_counter() - started
+
+
+def _row_to_galaxy_pass(path: Path, profile: MappingProfile, row_sample: int) -> Tuple[float, int]:
+    """Seconds for the per-row path over the first `row_sample` rows (read excluded) and the row count."""
+    frame = next(iter(ParquetStream(path, columns=profile.plan.source_columns, batch_rows=row_sample)), None)
+    if frame is None:
+        return 0.0, 0
+    started = time.perf_counter()
+    for _, row in frame.iterrows():
+        split_nested(extract_nested(row, profile.mapping))
+    return time.perf_counter() - started, len(frame)
+
+
+def run_benchmarks(
+    path: Path,
+    rows: int,
+    profile: MappingProfile,
+    repeat: int = DEFAULT_REPEAT,
+    row_sample: int = DEFAULT_ROW_SAMPLE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+) -> Dict[str, Dict[str, float]]:
+    """{benchmark: {"rows", "seconds", "rows_per_sec"}} for one catalog, best of `repeat` passes."""
+    best: Dict[str, Tuple[float, int]] = {}
+
+    def keep(name: str, seconds: float, count: int):
+        if count and (name not in best or seconds < best[name][0]):
+            best[name] = (seconds, count)
+
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        for name, seconds in _pass(path, profile, batch_size, max_batch_bytes).items():
+            keep(name, seconds, rows)
+        if row_sample > 0:
+            gc.collect()
+            keep("row_to_galaxy", *_row_to_galaxy_pass(path, profile, min(row_sample, rows)))
+    return {
+        name: {"rows": count, "seconds": round(seconds, 6), "rows_per_sec": round(count / max(seconds, 1e-9), 1)}
+        for name, (seconds, count) in sorted(best.items(), key=lambda item: BENCHMARKS.index(item[0]))
+    }
+
+
+# --------------------------------------------------------------------------------------
+# History and regression check
+# --------------------------------------------------------------------------------------
+def git_revision() -> Tuple[Optional[str], bool]:
+    """(HEAD commit, working tree has changes) of the repository holding this script."""
+    cwd = Path(__file__).resolve().parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(status)
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "numpy": np.__version__,
+        "orjson": orjson is not None,
+    }
+
+
+def load_history(path: Path) -> List[Dict[str, Any]]:
+    path = Path(path)
+    if not path.exists():
+        return []
+    entries = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            entries.append(json.loads(line))
+    return entries
+
+
+def append_history(path: Path, entry: Dict[str, Any]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+def find_baseline(history: Sequence[Dict[str, Any]], entry: Dict[str, Any], ref: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Most recent comparable run: same host and profile, and either the commit `ref`
+    (prefix) or a different state of the tree than `entry` (another commit, or the
+    clean commit a dirty tree is based on).
+    """
+    for old in reversed(history):
+        if old["env"]["host"] != entry["env"]["host"] or old["profile"] != entry["profile"]:
+            continue
+        if ref is not None:
+            if (old.get("commit") or "").startswith(ref):
+                return old
+            continue
+        if (old.get("commit"), old.get("dirty")) != (entry.get("commit"), entry.get("dirty")):
+            return old
+    return None
+
+
+def compare(entry: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Tuple[str, str, float, float, float, bool]]:
+    """(size, benchmark, baseline rows/s, current rows/s, relative change, regressed) for benchmarks in both runs."""
+    rows = []
+    for size, results in entry["results"].items():
+        for name, result in results.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if old is None or not old["rows_per_sec"]:
+                continue
+            change = result["rows_per_sec"] / old["rows_per_sec"] - 1
+            rows.append((size, name, old["rows_per_sec"], result["rows_per_sec"], change, change < -threshold))
+    return rows
+
+
+# --------------------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------------------
+def parse_sizes(text: str) -> List[int]:
+    """'10k,100k,1M' -> [10000, 100000, 1000000]"""
+    sizes = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        factor = {"k": 1_000, "m": 1_000_000}.get(part[-1], 1)
+        sizes.append(int(float(part.rstrip("km")) * factor))
+    return sizes
+
+
+def _short(commit: Optional[str], dirty: bool = False) -> str:
+    return (commit or "unknown")[:10] + ("+dirty" if dirty else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the galaxy ingest hot path")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="Comma-separated catalog sizes, e.g. 10k,100k,1M (default: 10k, 100k and 1M rows)")
+    parser.add_argument("--mapping-profile", default=DEFAULT_PROFILE,
+                        help=f"Mapping profile whose columns the catalogs get (default: {DEFAULT_PROFILE})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Passes per catalog; the fastest counts (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--row-sample", type=int, default=DEFAULT_ROW_SAMPLE,
+                        help=f"Rows timed for the per-row row_to_galaxy path, 0 to skip it (default: {DEFAULT_ROW_SAMPLE})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Row cap of the batch assembly benchmark (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--max-batch-bytes", type=int, default=DEFAULT_MAX_BATCH_BYTES,
+                        help=f"Byte budget of the batch assembly benchmark (default: {DEFAULT_MAX_BATCH_BYTES})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated catalogs (default: 0)")
+    parser.add_argument("--catalog-dir", default=DEFAULT_CATALOG_DIR,
+                        help=f"Where generated catalogs are cached (default: {DEFAULT_CATALOG_DIR})")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH,
+                        help=f"JSON-lines file the results are appended to (default: {DEFAULT_HISTORY_PATH})")
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the history")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with status 1 if a benchmark's rows/s dropped by more than --threshold")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Relative throughput drop that counts as a regression (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--baseline", metavar="REV",
+                        help="Compare with the latest run of this commit (prefix) instead of the latest other commit")
+    args = parser.parse_args()
+
+    try:
+        sizes = parse_sizes(args.sizes)
+        if not sizes:
+            raise ValueError("--sizes is empty")
+        profile = load_profile(args.mapping_profile)
+        commit, dirty = git_revision()
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": commit,
+            "dirty": dirty,
+            "profile": profile.label,
+            "env": environment(),
+            "params": {
+                "repeat": args.repeat,
+                "row_sample": args.row_sample,
+                "batch_size": args.batch_size,
+                "max_batch_bytes": args.max_batch_bytes,
+                "seed": args.seed,
+            },
+            "results": {},
+        }
+        logger.info(f"🔍 Benchmarking {profile.label} at {_short(commit, dirty)} on {entry['env']['host']} "
+                    f"(sizes={sizes}, repeat={args.repeat}, orjson={'yes' if orjson is not None else 'no'})")
+        for rows in sizes:
+            path = ensure_catalog(rows, profile, Path(args.catalog_dir), args.seed)
+            results = run_benchmarks(
+                path, rows, profile,
+                repeat=args.repeat,
+                row_sample=args.row_sample,
+                batch_size=args.batch_size,
+                max_batch_bytes=args.max_batch_bytes,
+            )
+            entry["results"][str(rows)] = results
+            for name, result in results.items():
+                logger.info(f"  {rows:>9} rows  {name:<14} {result['rows_per_sec']:>12,.0f} rows/s  ({result['seconds']:.3f}s)")
+
+        history_path = Path(args.history)
+        baseline = find_baseline(load_history(history_path), entry, args.baseline)
+        regressions = []
+        if baseline is None:
+            logger.info("No earlier run to compare with" + (f" for {args.baseline}" if args.baseline else ""))
+        else:
+            logger.info(f"Compared with {_short(baseline.get('commit'), baseline.get('dirty', False))} "
+                        f"({baseline['timestamp']}), threshold {args.threshold:.0%}:")
+            for size, name, old, new, change, regressed in compare(entry, baseline, args.threshold):
+                marker = "❌" if regressed else "✓"
+                logger.info(f"  {marker} {int(size):>9} rows  {name:<14} {old:>12,.0f} → {new:>12,.0f} rows/s  ({change:+.1%})")
+                if regressed:
+                    regressions.append((size, name, change))
+
+        if not args.no_save:
+            append_history(history_path, entry)
+            logger.info(f"✓ Results appended to {history_path}")
+
+        if regressions:
+            logger.warning(f"⚠ {len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            if args.check:
+                sys.exit(1)
+    except Exception as e:
+        logger.error(f"❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
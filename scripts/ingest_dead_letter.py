@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Dead-letter file for the galaxy ingest scripts (`--dead-letter-file`, `--replay`).
+
+Rows the pipeline gives up on used to survive only as log lines and the
+`failed_at` dict; getting them in meant rerunning on offsets and re-reading the
+whole catalog. `DeadLetterStore` writes them to a parquet file instead:
+- galaxies quarantined by batch bisection (they fail on their own), and the rows
+  of batches that failed under --continue-on-error
+- per row: the original source columns (read back from the catalog by row
+  number, ingest_reader.read_rows), `_row` / `_source` (where it came from),
+  `_mode`, `_status` / `_error` / `_detail` (summarize_error_detail),
+  `_payload` (the galaxy JSON that was sent), `_attempts` and `_failed_at`
+
+A dead-letter file is an ordinary catalog for the mapping profile, so `--replay
+FILE` ingests just those rows again through the usual pipeline (after a fix in
+the data, the mapping or the deployment). Rows that fail again are kept with
+`_attempts` incremented and their original `_row`/`_source`; the file is
+replaced only when the replay finishes, and removed once nothing is left.
+
+A run adds to an existing dead-letter file (earlier rows are kept). In fail-fast
+mode the failed batch is not dead-lettered: --resume / --offset send it again.
+Rows rejected by --validate go to the reject file, not here.
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingest_reader import read_rows
+from ingest_validation import ROW_COLUMN, RejectFile
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+DEFAULT_DEAD_LETTER_PATH = "ingest_dead_letters.parquet"
+
+SOURCE_COLUMN = "_source"
+MODE_COLUMN = "_mode"
+STATUS_COLUMN = "_status"
+ERROR_COLUMN = "_error"
+DETAIL_COLUMN = "_detail"
+PAYLOAD_COLUMN = "_payload"
+ATTEMPTS_COLUMN = "_attempts"
+FAILED_AT_COLUMN = "_failed_at"
+META_COLUMNS = (
+    ROW_COLUMN, SOURCE_COLUMN, MODE_COLUMN, STATUS_COLUMN, ERROR_COLUMN,
+    DETAIL_COLUMN, ATTEMPTS_COLUMN, FAILED_AT_COLUMN, PAYLOAD_COLUMN,
+)
+
+# Failed rows are collected and read back from the source in groups of this many
+_DEAD_LETTER_FLUSH_ROWS = 10000
+
+
+def is_dead_letter_file(path: Path) -> bool:
+    return ATTEMPTS_COLUMN in pq.read_schema(path).names
+
+
+class DeadLetterStore:
+    """
+    Dead letters of one source (a file, directory or glob as given to the ingest script).
+
+    Rows are written to PATH.tmp and moved over PATH by `close()`; `discard()` leaves PATH as it was.
+    With `replay=True` the source is the dead-letter file itself and its rows are not carried over:
+    whatever is not added again has been ingested.
+    """
+
+    def __init__(self, path: Path, source: str, mode: str, schema: Optional[pa.Schema] = None, replay: bool = False):
+        self.path = Path(path)
+        self.source = str(source)
+        self.mode = mode
+        self.replay = replay
+        self.added = 0
+        self.carried = 0
+        self._pending: List[Dict[str, Any]] = []
+        if self.path.parent != Path("."):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = RejectFile(
+            self.path.with_name(self.path.name + ".tmp"), schema, trailing_columns=META_COLUMNS
+        )
+        if self.path.exists() and not replay:
+            # Dead letters of earlier runs stay until they are replayed
+            earlier = pd.read_parquet(self.path)
+            self.carried = len(earlier)
+            self._file.write(earlier)
+
+    def add(self, rows: Sequence[int], fragments: Sequence[bytes], error: str, detail: str, status: Any) -> None:
+        """Record the rows of a failed request (file/dataset row numbers and their encoded galaxies)."""
+        failed_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        for row, fragment in zip(rows, fragments):
+            self._pending.append({
+                ROW_COLUMN: int(row),
+                STATUS_COLUMN: str(status),
+                ERROR_COLUMN: error,
+                DETAIL_COLUMN: detail,
+                PAYLOAD_COLUMN: bytes(fragment).decode("utf-8"),
+                FAILED_AT_COLUMN: failed_at,
+            })
+        self.added += len(rows)
+        if len(self._pending) >= _DEAD_LETTER_FLUSH_ROWS:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        meta = pd.DataFrame(self._pending)
+        self._pending = []
+        rows = meta[ROW_COLUMN].to_numpy()
+        source = read_rows(self.source, rows).reindex(rows)
+        if ATTEMPTS_COLUMN in source.columns:
+            # Replayed dead letters keep pointing at the catalog row they came from
+            meta[ROW_COLUMN] = source[ROW_COLUMN].to_numpy()
+            meta[SOURCE_COLUMN] = source[SOURCE_COLUMN].to_numpy()
+            meta[ATTEMPTS_COLUMN] = source[ATTEMPTS_COLUMN].fillna(0).astype("int64").to_numpy() + 1
+        else:
+            meta[SOURCE_COLUMN] = self.source
+            meta[ATTEMPTS_COLUMN] = 1
+        meta[MODE_COLUMN] = self.mode
+        source = source.drop(columns=[c for c in META_COLUMNS if c in source.columns]).reset_index(drop=True)
+        self._file.write(pd.concat([source, meta[list(META_COLUMNS)]], axis=1))
+
+    @property
+    def rows(self) -> int:
+        """Rows the file holds after close()."""
+        return self.carried + self.added
+
+    def close(self) -> None:
+        """Write the remaining rows and replace the dead-letter file (removed when empty)."""
+        self.flush()
+        self._file.close()
+        if self._file.path.exists():
+            os.replace(self._file.path, self.path)
+        elif self.path.exists():
+            self.path.unlink()
+
+    def discard(self) -> None:
+        """Drop this run's rows and keep the dead-letter file unchanged (a replay that did not finish)."""
+        self._pending = []
+        self._file.close()
+        self._file.path.unlink(missing_ok=True)
+
+    def log_summary(self) -> None:
+        if self.added:
+            logger.warning(f"⚠ {self.added} row(s) written to the dead-letter file {self.path} "
+                           f"(replay with --replay {self.path})")
+        if self.replay:
+            if self.rows:
+                logger.warning(f"⚠ {self.rows} dead letter(s) failed again and stay in {self.path}")
+            else:
+                logger.info(f"✓ Every dead letter was ingested; removed {self.path}")
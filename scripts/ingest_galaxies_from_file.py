@@ -17,6 +17,12 @@ Priority for configuration:
 Expected variables:
 - VITE_CONVEX_HTTP_ACTIONS_URL
 - INGEST_TOKEN
+
+With --concurrency N, up to N batches are in flight while the next ones are
+built; results are counted in source order. Committed batches are recorded in
+the checkpoint journal (--journal, ingest_journal), and --resume skips them.
+--report-json / --prometheus-textfile write the run report (ingest_metrics)
+and --profile a stage-tagged profile of the run (ingest_profiler).
 """
 
 import argparse
@@ -25,8 +31,9 @@ import sys
 import time
 import json
 import logging
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Any, Union
+from typing import Dict, Iterator, List, Any, Union
 
 try:
     import pandas as pd
@@ -37,6 +44,17 @@ except ImportError as e:
     print("Install with: pip install pandas pyarrow requests python-dotenv")
     sys.exit(1)
 
+from ingest_id_index import catalog_fingerprint
+from ingest_journal import DEFAULT_JOURNAL_PATH, IngestJournal, drop_committed_rows, first_uncommitted_row, selection_key
+from ingest_mapping import split_nested
+from ingest_memory import format_size, peak_rss
+from ingest_metrics import DEFAULT_METRICS_INTERVAL, IngestMetrics
+from ingest_profiler import add_profile_arguments, finish_profiler, start_profiler
+from ingest_profiles import check_parquet, load_profile
+from ingest_http import COMPRESSION_CHOICES, describe_body, encode_json_body, get_session
+from ingest_reader import DEFAULT_STREAM_BATCH_ROWS, ParquetDataset, ParquetStream, is_dataset_source, open_parquet_dataset
+from ingest_sender import OrderedBatchSender, SentBatch
+
 
 # --------------------------------------------------------------------------------------
 # Logger setup
@@ -54,139 +72,12 @@ logger.setLevel(logging.INFO)
 
 # --------------------------------------------------------------------------------------
 # Nested Mapping: Database schema -> (Parquet column, target type)
+# Defined by a versioned profile in mapping_profiles/ (see ingest_profiles.py)
 # --------------------------------------------------------------------------------------
 
-def str_or_int_to_str(val):
-    """Special casting: first to int, then to string."""
-    try:
-        return str(int(val))
-    except Exception:
-        return str(val)
-
-
-NESTED_COLUMN_MAPPING: Dict[str, Union[tuple, Dict[str, Any], None]] = {
-    # core
-    "id": ("coadd_object_id", str_or_int_to_str),
-    "ra": ("ra", float),
-    "dec": ("dec", float),
-    "reff": ("sersic_reff_arcsec__best_available_fit", float),
-    "reff_pixels": ("sersic_reff_pixels__best_available_fit", float),
-    "q": ("sersic_q__best_available_fit", float),
-    "pa": ("sersic_PA__best_available_fit", float),
-    "nucleus": ("is_nucleated", bool),
-
-    "isActive": (None, bool),        # optional, may be None
-    "redshift_x": (None, float),
-    "redshift_y": (None, float),
-    "x": ("sersic_x__best_available_fit", float),
-    "y": ("sersic_y__best_available_fit", float),
-
-    "photometry": {
-        "g": {
-            "sersic": {
-                "mag": ("sersic_mag__best_available_fit", float),
-                "mag_error": ("sersic_mag_error__best_available_fit", float),
-                "mag_rel_error": ("sersic_mag_rel_error__best_available_fit", float),
-                "mean_mue": ("sersic_mean_mue__best_available_fit", float),
-                "mue": ("sersic_mue__best_available_fit", float),
-                "x_error": ("sersic_x_error__best_available_fit", float),
-                "x_rel_error": ("sersic_x_rel_error__best_available_fit", float),
-                "psf": {
-                    "mag": ("sersic_psf_mag__best_available_fit", float),
-                    "mag_error": ("sersic_psf_mag_error__best_available_fit", float),
-                    "mag_rel_error": ("sersic_psf_mag_rel_error__best_available_fit", float),
-                    "x": ("sersic_psf_x__best_available_fit", float),
-                    "x_error": ("sersic_psf_x_error__best_available_fit", float),
-                    "x_rel_error": ("sersic_psf_x_rel_error__best_available_fit", float),
-                },
-            },
-            "source_extractor": {
-                "mag_auto": ("mag_auto_g", float),
-                "mu_mean_model": ("mu_mean_model_g", float),
-                "flux_radius": ("flux_radius_g_arcsec", float),
-            },
-        },
-        "r": {
-            "sersic": {
-                "mean_mue": ("sersic_mean_mue_r", float),
-                "mue": ("sersic_mue_r", float),
-                "mag": ("sersic_mag_r", float),
-                "mag_error": ("sersic_mag_error_r", float),
-                "mag_rel_error": ("sersic_mag_rel_error_r", float),
-                "x_error": ("sersic_x_error_r", float),
-                "x_rel_error": ("sersic_x_rel_error_r", float),
-                "psf": {
-                    "mag": ("sersic_psf_mag_r", float),
-                    "mag_error": ("sersic_psf_mag_error_r", float),
-                },
-            },
-            "source_extractor": {
-                "mag_auto": ("mag_auto_r", float),
-                "mu_mean_model": ("mu_mean_model_r", float),
-                "flux_radius": ("flux_radius_r_arcsec", float),
-            },
-        },
-        "i": {
-            "sersic": {
-                "mean_mue": ("sersic_mean_mue_i", float),
-                "mue": ("sersic_mue_i", float),
-                "mag": ("sersic_mag_i", float),
-                "mag_error": ("sersic_mag_error_i", float),
-                "mag_rel_error": ("sersic_mag_rel_error_i", float),
-                "x_error": ("sersic_x_error_i", float),
-                "x_rel_error": ("sersic_x_rel_error_i", float),
-                "psf": {
-                    "mag": ("sersic_psf_mag_i", float),
-                    "mag_error": ("sersic_psf_mag_error_i", float),
-                },
-            },
-            "source_extractor": {
-                "mag_auto": ("mag_auto_i", float),
-                "mu_mean_model": ("mu_mean_model_i", float),
-                "flux_radius": ("flux_radius_i_arcsec", float),
-            },
-        },
-        "y": {
-            "source_extractor": {
-                "mag_auto": ("mag_auto_y", float),
-                "mu_mean_model": ("mu_mean_model_y", float),
-                "flux_radius": ("flux_radius_y_arcsec", float),
-            },
-        },
-        "z": {
-            "source_extractor": {
-                "mag_auto": ("mag_auto_z", float),
-                "mu_mean_model": ("mu_mean_model_z", float),
-                "flux_radius": ("flux_radius_z_arcsec", float),
-            },
-        },
-    },
-
-    "misc": {
-        "is_detr": ("is_detr", bool),
-        "is_vit": ("is_vit", bool),
-        "paper": ("paper", str),
-        "dataset": ("dataset", str),
-        "tilename": ("tilename", str),
-        "thur_cls": ("thur_cls", str),
-        "thur_cls_n": ("thur_cls_n", float),
-    },
-
-    "thuruthipilly": {
-        "n": ("n_thur", float),
-        "q": ("q_thur", float),
-        "reff_g": ("reff_g_thur", float),
-        "reff_i": ("reff_i_thur", float),
-        "mag_g_cor": ("mag_g_cor_thur", float),
-        "mag_g_gf": ("mag_g_gf_thur", float),
-        "mag_i_cor": ("mag_i_cor_thur", float),
-        "mag_i_gf": ("mag_i_gf_thur", float),
-        "mue_mean_g_gf": ("mue_mean_g_gf_thur", float),
-        "mu_mean_g_cor": ("mu_mean_g_cor_thur", float),
-        "mue_mean_i_gf": ("mue_mean_i_gf_thur", float),
-        "mu_mean_i_cor": ("mu_mean_i_cor_thur", float),
-    },
-}
+DEFAULT_MAPPING_PROFILE = "galaxy.v1"
+MAPPING_PROFILE = load_profile(DEFAULT_MAPPING_PROFILE)
+NESTED_COLUMN_MAPPING: Dict[str, Union[tuple, Dict[str, Any], None]] = MAPPING_PROFILE.mapping
 
 
 # --------------------------------------------------------------------------------------
@@ -289,123 +180,226 @@ def extract_nested(row: pd.Series, mapping: Dict[str, Any]) -> Dict[str, Any]:
 
 def row_to_galaxy(row: pd.Series) -> Dict[str, Any]:
     """Build split-object representation expected by new ingestion API."""
-    nested = extract_nested(row, NESTED_COLUMN_MAPPING)
-    # Core galaxy fields
-    galaxy_core_keys = [
-        'id','ra','dec','reff','reff_pixels','q','pa','nucleus','isActive','redshift_x','redshift_y','x','y','misc'
-    ]
-    galaxy_core = {k: nested.get(k) for k in galaxy_core_keys if k in nested}
-    # Photometry bands
-    phot = nested.get('photometry', {})
-    g_ser = phot.get('g', {}).get('sersic')
-    r_ser = phot.get('r', {}).get('sersic')
-    i_ser = phot.get('i', {}).get('sersic')
-    photometryBand = {'sersic': g_ser} if g_ser else None
-    photometryBandR = {'sersic': r_ser} if r_ser else None
-    photometryBandI = {'sersic': i_ser} if i_ser else None
-    # Source extractor unified
-    def se_band(b):
-        return phot.get(b, {}).get('source_extractor', {}) if phot.get(b) else {}
-    source_extractor = {
-        'g': se_band('g'),
-        'r': se_band('r'),
-        'i': se_band('i'),
-    }
-    y_se = se_band('y') if phot.get('y') else None
-    z_se = se_band('z') if phot.get('z') else None
-    if y_se: source_extractor['y'] = y_se
-    if z_se: source_extractor['z'] = z_se
-    # Remove empty dict bands
-    if not any(v for k,v in source_extractor.items() if isinstance(v, dict) and v):
-        source_extractor_out = None
-    else:
-        source_extractor_out = source_extractor
-    # Thuruthipilly
-    thuru = nested.get('thuruthipilly') or None
-    obj = {
-        'galaxy': galaxy_core,
-        'photometryBand': photometryBand,
-        'photometryBandR': photometryBandR,
-        'photometryBandI': photometryBandI,
-        'sourceExtractor': source_extractor_out,
-        'thuruthipilly': thuru,
-    }
-    return {k: v for k, v in obj.items() if v is not None}
+    return split_nested(extract_nested(row, NESTED_COLUMN_MAPPING))
+
+
+# Compiled once with the profile; transforms whole frames column by column (same output as row_to_galaxy).
+COLUMNAR_PLAN = MAPPING_PROFILE.plan
 
 
 # --------------------------------------------------------------------------------------
 # Ingest HTTP
 # --------------------------------------------------------------------------------------
-def send_ingest(convex_url, ingest_token, galaxies, timeout_sec=60):
+def send_ingest(convex_url, ingest_token, galaxies, timeout_sec=60, compression="none", metrics=None):
     url = f"{convex_url}/ingest/galaxies"
+    payload = {"galaxies": galaxies}
+    body, encoding_headers = encode_json_body(payload, compression)
     headers = {
         "Authorization": f"Bearer {ingest_token}",
         "Content-Type": "application/json",
+        **encoding_headers,
     }
-    payload = {"galaxies": galaxies}
-    logger.info(f"POST {url} with {len(galaxies)} galaxies")
-    return requests.post(url, headers=headers, data=json.dumps(payload), timeout=timeout_sec)
+    logger.info(f"POST {url} with {len(galaxies)} galaxies ({describe_body(body, compression)})")
+    started = time.perf_counter()
+    try:
+        resp = get_session().post(url, headers=headers, data=body, timeout=timeout_sec)
+    except Exception:
+        if metrics is not None:
+            metrics.observe_request(time.perf_counter() - started, "error", 0, len(body))
+        raise
+    if metrics is not None:
+        metrics.observe_request(time.perf_counter() - started, resp.status_code, 0, len(body))
+    return resp
 
 
 # --------------------------------------------------------------------------------------
 # Batch process
 # --------------------------------------------------------------------------------------
-def process_parquet(df, convex_url, ingest_token, batch_size=100, dry_run=False, continue_on_error=False):
+def iter_row_batches(frames, batch_size: int) -> Iterator[pd.DataFrame]:
+    """Slices of `batch_size` rows (the last one shorter) from a DataFrame or an iterable of DataFrames."""
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    pending: List[pd.DataFrame] = []
+    pending_rows = 0
+    for frame in frames:
+        start = 0
+        while start < len(frame):
+            piece = frame.iloc[start:start + batch_size - pending_rows]
+            start += len(piece)
+            pending.append(piece)
+            pending_rows += len(piece)
+            if pending_rows >= batch_size:
+                yield pending[0] if len(pending) == 1 else pd.concat(pending)
+                pending, pending_rows = [], 0
+    if pending:
+        yield pending[0] if len(pending) == 1 else pd.concat(pending)
+
+
+class BatchFailed(RuntimeError):
+    """A batch failed and its rows are already counted in stats["errors"]."""
+
+
+def process_parquet(df, convex_url, ingest_token, batch_size=100, dry_run=False, continue_on_error=False, compression="none", plan=None, concurrency=1, journal=None, metrics=None):
+    """
+    Transform and send `df` (a DataFrame or a stream of them) in batches of `batch_size` rows.
+
+    With concurrency > 1, up to `concurrency` requests are in flight while the next
+    batches are built (OrderedBatchSender); results are still counted in source
+    order. Without --continue-on-error the first failed batch stops the run once the
+    batches already in flight are counted, and its error is raised.
+
+    With a journal (IngestJournal), every committed batch is recorded under the file
+    row numbers of its rows (the frame index), so --resume can skip them.
+
+    `metrics` (IngestMetrics, default: fresh) times the read, transform, send_wait
+    and account stages and observes every request, for --report-json and
+    --prometheus-textfile.
+    """
     stats = {"total": len(df), "inserted": 0, "errors": 0}
-    batch = []
-    import traceback
-    for i, (_, row) in enumerate(df.iterrows()):
-        try:
-            galaxy = row_to_galaxy(row)
-            batch.append(galaxy)
-
-            if len(batch) >= batch_size or i == len(df) - 1:
-                if not dry_run:
-                    resp = send_ingest(convex_url, ingest_token, batch)
-                    if resp.status_code == 200:
-                        stats["inserted"] += len(batch)
-                        logger.info(f"\u2713 Batch inserted: {len(batch)}")
-                    else:
-                        stats["errors"] += len(batch)
-                        logger.error(f"\u274C Ingest failed {resp.status_code}")
-                        # Try to pretty print error detail if JSON
-                        try:
-                            err_json = resp.json()
-                            print("\n\u274C Ingest failed {code} (batch {batch_num}):".format(code=resp.status_code, batch_num=i//batch_size+1))
-                            if "error" in err_json:
-                                print(f"Error: {err_json['error']}")
-                            if "detail" in err_json:
-                                print("Detail:")
-                                print(err_json["detail"])
-                            else:
-                                print(json.dumps(err_json, indent=2))
-                        except Exception:
-                            print(f"\n\u274C Ingest failed {resp.status_code} (batch {i//batch_size+1}):\n{resp.text}\n")
-                        if not continue_on_error:
-                            raise RuntimeError(f"Ingest failed {resp.status_code}")
+    plan = plan or COLUMNAR_PLAN
+    metrics = metrics or IngestMetrics()
+    metrics.begin(stats["total"])
+    # First failure that stops the run (fail-fast), raised after the batches in flight
+    failure = {"error": None}
+
+    def send_fn(batch):
+        return send_ingest(convex_url, ingest_token, batch, compression=compression, metrics=metrics)
+
+    def fail(error):
+        if not continue_on_error and failure["error"] is None:
+            failure["error"] = error
+
+    def log_progress(i):
+        metrics.progress(i + 1)
+        progress = (i + 1) / max(stats["total"], 1) * 100
+        logger.info(f"Progress {i+1}/{stats['total']} ({progress:.1f}%, {metrics.describe_progress()})")
+        metrics.maybe_write()
+
+    def account(sent: SentBatch):
+        with metrics.stage("account"):
+            account_batch(sent)
+
+    def account_batch(sent: SentBatch):
+        (i, file_rows), batch = sent.meta, sent.batch
+        batch_num = i // batch_size + 1
+        if sent.error is not None:
+            # The request itself failed (network error, ...): none of the batch was stored
+            stats["errors"] += len(batch)
+            metrics.record_batch(batch_num, len(batch), "error", {"errors": len(batch)})
+            logger.error(f"\u274C Error at row {i}: {sent.error}")
+            fail(sent.error)
+            return
+        resp = sent.result
+        if resp.status_code == 200:
+            stats["inserted"] += len(batch)
+            logger.info(f"\u2713 Batch inserted: {len(batch)}")
+            try:
+                body = resp.json()
+                counts = {key: body[key] for key in ("inserted", "skipped") if isinstance(body.get(key), int)}
+            except (ValueError, AttributeError):
+                counts = {"inserted": len(batch)}
+            metrics.record_batch(batch_num, len(batch), 200, counts)
+            if journal is not None:
+                journal.record_batch(batch_num, file_rows, counts)
+        else:
+            metrics.record_batch(batch_num, len(batch), resp.status_code, {"errors": len(batch)})
+            stats["errors"] += len(batch)
+            logger.error(f"\u274C Ingest failed {resp.status_code}")
+            # Try to pretty print error detail if JSON
+            try:
+                err_json = resp.json()
+                print("\n\u274C Ingest failed {code} (batch {batch_num}):".format(code=resp.status_code, batch_num=i//batch_size+1))
+                if "error" in err_json:
+                    print(f"Error: {err_json['error']}")
+                if "detail" in err_json:
+                    print("Detail:")
+                    print(err_json["detail"])
                 else:
+                    print(json.dumps(err_json, indent=2))
+            except Exception:
+                print(f"\n\u274C Ingest failed {resp.status_code} (batch {i//batch_size+1}):\n{resp.text}\n")
+            fail(BatchFailed(f"Ingest failed {resp.status_code}"))
+        log_progress(i)
+        if concurrency == 1:
+            time.sleep(0.1)
+
+    sender = None
+    if not dry_run:
+        # One keep-alive connection per in-flight request
+        get_session(pool_size=concurrency)
+        sender = OrderedBatchSender(send_fn, concurrency=concurrency)
+
+    # A DataFrame was read (and timed) by the caller; streams read as they are iterated
+    frames = df if isinstance(df, pd.DataFrame) else metrics.timed_iter("read", df)
+    i = -1
+    try:
+        for rows in iter_row_batches(frames, batch_size):
+            i += len(rows)
+            metrics.add("rows_read", len(rows))
+            # Transformed here so that a row that cannot be mapped fails only its batch (--continue-on-error)
+            try:
+                with metrics.stage("transform"):
+                    batch = plan.transform(rows)
+            except Exception as e:
+                stats["errors"] += len(rows)
+                logger.error(f"\u274C Transform failed for rows {i + 1 - len(rows)}-{i}: {e}")
+                error = BatchFailed(f"Transform failed: {e}")
+                error.__cause__ = e
+                fail(error)
+            else:
+                if sender is None:
                     logger.info(f"\U0001F50D DRY RUN would insert {len(batch)} galaxies")
                     stats["inserted"] += len(batch)
-                batch = []
-                progress = (i + 1) / stats["total"] * 100
-                logger.info(f"Progress {i+1}/{stats['total']} ({progress:.1f}%)")
-                if not dry_run:
-                    time.sleep(0.1)
-        except Exception as e:
-            stats["errors"] += 1
-            logger.error(f"\u274C Error at row {i}: {e}")
-            # print(f"\n\u274C Exception detail (row {i}):\n{traceback.format_exc()}\n")
-            if not continue_on_error:
-                raise
+                    metrics.record_batch(i // batch_size + 1, len(batch), "dry-run", {})
+                    log_progress(i)
+                else:
+                    metrics.add("rows_batched", len(batch))
+                    # Blocks while `concurrency` requests are in flight
+                    with metrics.stage("send_wait"):
+                        finished = sender.submit((i, rows.index.tolist()), batch)
+                    for sent in finished:
+                        account(sent)
+            if failure["error"] is not None:
+                break
+        if sender is not None:
+            with metrics.stage("send_wait"):
+                finished = sender.drain()
+            for sent in finished:
+                account(sent)
+    finally:
+        if sender is not None:
+            sender.close()
+    if failure["error"] is not None:
+        raise failure["error"]
+    # Filters applied while streaming can make the selected row count an upper bound
+    stats["total"] = i + 1
+    metrics.end(stats["total"])
     return stats
 
 
 # --------------------------------------------------------------------------------------
 # Main
 # --------------------------------------------------------------------------------------
+def log_metrics_summary(metrics: IngestMetrics):
+    rate, _ = metrics.throughput()
+    logger.info(f"Throughput: {rate:.0f} rows/s; time per stage:")
+    for line in metrics.summary_lines():
+        logger.info(line)
+    logger.info(f"Peak RSS: {format_size(peak_rss())}")
+    requests_sent = metrics.counters["requests"]
+    if requests_sent:
+        logger.info(f"Requests: {requests_sent} ({metrics.counters['bytes_sent']} bytes sent)")
+    for path in (metrics.json_path, metrics.prometheus_path):
+        if path is not None:
+            logger.info(f"Metrics written to {path}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Ingest galaxies (split schema objects) from parquet")
-    parser.add_argument("--parquet-file", required=True, help="Parquet file path")
+    parser.add_argument("--parquet-file", required=True,
+                        help="Parquet file, directory of (hive-partitioned) parquet files, or quoted glob")
+    parser.add_argument("--where",
+                        help="Row filter pushed down to partitions/row-group statistics, e.g. \"paper == 'X'\"")
     parser.add_argument("--convex-http-actions-url", help="Convex ingestion URL")
     parser.add_argument("--ingest-token", help="Ingest API token")
     parser.add_argument("--dot-env-file", help="Dotenv file (default .env)")
@@ -414,22 +408,125 @@ def main():
     parser.add_argument("--offset", type=int, default=0, help="Row offset to start processing (default: 0)")
     parser.add_argument("--limit", type=int, default=None, help="Maximum number of rows to process (default: all)")
     parser.add_argument("--continue-on-error", action="store_true", help="Continue with next batch on error (default: stop immediately)")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH,
+                        help=f"SQLite checkpoint journal of committed batches (default: {DEFAULT_JOURNAL_PATH})")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record committed batches")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip rows the journal records as committed for this file and --where selection")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Maximum ingest requests in flight; the next batches are built while they run (default: 1)")
+    parser.add_argument("--compression", choices=COMPRESSION_CHOICES, default="none",
+                        help="Compress request bodies (requires a deployment that accepts Content-Encoding; default: none)")
+    parser.add_argument("--mapping-profile", default=DEFAULT_MAPPING_PROFILE,
+                        help=f"Mapping profile name in mapping_profiles/ or path to a profile file (default: {DEFAULT_MAPPING_PROFILE})")
+    parser.add_argument("--allow-missing-columns", action="store_true",
+                        help="Skip mapped columns missing from the file instead of failing the schema check")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the parquet file in record batches (mapped columns only, seeks to --offset via row groups)")
+    parser.add_argument("--stream-batch-rows", type=int, default=DEFAULT_STREAM_BATCH_ROWS,
+                        help=f"Rows per record batch in --stream mode (default: {DEFAULT_STREAM_BATCH_ROWS})")
+    parser.add_argument("--report-json",
+                        help="Write a JSON run report (stage timings, counters, request latency histograms, "
+                             "server counts, rows/s, ETA); refreshed during the run")
+    parser.add_argument("--prometheus-textfile",
+                        help="Write the same metrics in node_exporter textfile collector format (*.prom)")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_METRICS_INTERVAL,
+                        help=f"Seconds between report refreshes during the run (default: {DEFAULT_METRICS_INTERVAL:g})")
+    add_profile_arguments(parser)
     args = parser.parse_args()
 
+    metrics = IngestMetrics(
+        labels={"mode": "insert", "source": Path(args.parquet_file).name or args.parquet_file},
+        interval=args.metrics_interval,
+    )
+    metrics.json_path = Path(args.report_json) if args.report_json else None
+    metrics.prometheus_path = Path(args.prometheus_textfile) if args.prometheus_textfile else None
+    # Opened below; closed on every way out
+    journal = None
     try:
         config = load_configuration(args.convex_http_actions_url, args.ingest_token, args.dot_env_file)
         parquet_file = Path(args.parquet_file)
-        if not parquet_file.exists():
+        dataset = None
+        if args.where or is_dataset_source(args.parquet_file):
+            dataset = open_parquet_dataset(args.parquet_file)
+        elif not parquet_file.exists():
             raise FileNotFoundError(f"File not found: {parquet_file}")
-        df = pd.read_parquet(parquet_file)
-        total_rows = len(df)
+        profile = load_profile(args.mapping_profile)
+        check_parquet(
+            profile,
+            parquet_file,
+            allow_missing=args.allow_missing_columns,
+            schema=dataset.schema if dataset is not None else None,
+        )
         offset = args.offset if args.offset >= 0 else 0
         limit = args.limit if args.limit is not None and args.limit > 0 else None
-        if limit is not None:
-            df = df.iloc[offset:offset+limit]
+
+        if args.resume and args.no_journal:
+            raise ValueError("--resume needs the journal; drop --no-journal")
+        if not args.no_journal:
+            journal = IngestJournal(
+                Path(args.journal),
+                catalog_fingerprint(args.parquet_file, dataset),
+                "insert",
+                selection_key(where=args.where),
+                source=str(parquet_file),
+            )
+            logger.info(f"✓ Journal: {journal.path} (fingerprint={journal.fingerprint}, selection={journal.selection})")
+
+        committed = []
+        if args.resume:
+            end = offset + limit if limit is not None else None
+            committed = journal.committed_ranges()
+            resume_offset = first_uncommitted_row(committed, offset)
+            # Committed ranges past the resume point (e.g. batches in flight when the run stopped)
+            committed = [r for r in committed if r[1] >= resume_offset and (end is None or r[0] < end)]
+            logger.info(
+                f"↻ Resuming from row {resume_offset}: skipped {resume_offset - offset} committed rows, "
+                f"{len(committed)} later committed range(s) will be dropped while reading"
+            )
+            offset = resume_offset
+            if end is not None:
+                limit = end - offset
+                if limit <= 0:
+                    logger.info("✓ Nothing left to ingest: every selected row is already committed")
+                    return
+        row_filter = partial(drop_committed_rows, ranges=committed) if committed else None
+
+        if dataset is not None:
+            df = ParquetDataset(
+                dataset,
+                columns=profile.plan.source_columns,
+                where=args.where,
+                offset=offset,
+                limit=limit,
+                batch_rows=args.stream_batch_rows,
+                row_filter=row_filter,
+            )
+            logger.info(
+                f"✓ Streaming up to {len(df)} rows from {len(dataset.files)} file(s) "
+                f"(offset={offset}, limit={limit}, where={args.where!r}; {df.pruned_rows} rows pruned)"
+            )
+        elif args.stream:
+            df = ParquetStream(
+                parquet_file,
+                columns=profile.plan.source_columns,
+                offset=offset,
+                limit=limit,
+                batch_rows=args.stream_batch_rows,
+                row_filter=row_filter,
+            )
+            logger.info(f"✓ Streaming {len(df)} rows from {parquet_file} (offset={offset}, limit={limit})")
         else:
-            df = df.iloc[offset:]
-        logger.info(f"✓ Loaded {len(df)} rows from {parquet_file} (offset={offset}, limit={limit})")
+            with metrics.stage("read"):
+                df = pd.read_parquet(parquet_file)
+            # Indexed by row position in the file, as the journal records rows
+            df.index = pd.RangeIndex(len(df))
+            if limit is not None:
+                df = df.iloc[offset:offset+limit]
+            else:
+                df = df.iloc[offset:]
+            df = drop_committed_rows(df, committed)
+            logger.info(f"✓ Loaded {len(df)} rows from {parquet_file} (offset={offset}, limit={limit})")
         # logger.info("📋 Sample:\n" + df.head().to_string())
 
         if not args.dry_run:
@@ -437,14 +534,30 @@ def main():
             if resp.lower() != "y":
                 logger.info("❌ Cancelled")
                 return
-        stats = process_parquet(df, config["convex_url"], config["ingest_token"], args.batch_size, args.dry_run, args.continue_on_error)
+        profiler = start_profiler(args, metrics)
+        try:
+            stats = process_parquet(df, config["convex_url"], config["ingest_token"], args.batch_size, args.dry_run, args.continue_on_error, args.compression, plan=profile.plan, concurrency=args.concurrency,
+                                    journal=None if args.dry_run else journal, metrics=metrics)
+        finally:
+            finish_profiler(profiler, args, metrics)
+        metrics.write()
         logger.info("SUMMARY: " + str(stats))
+        if journal is not None and not args.dry_run:
+            logger.info(f"Journal: {journal.recorded} committed batch(es) recorded in {journal.path}")
+        log_metrics_summary(metrics)
 
     except Exception as e:
+        # The report shows how far the run got
+        metrics.write()
         logger.error(f"❌ Error: {e}")
         import traceback
         print(f"\n❌ Exception detail:\n{traceback.format_exc()}\n")
+        if journal is not None:
+            logger.error(f"(Committed batches are in the journal {journal.path}; rerun with --resume to continue.)")
         sys.exit(1)
+    finally:
+        if journal is not None:
+            journal.close()
 
 
 if __name__ == "__main__":
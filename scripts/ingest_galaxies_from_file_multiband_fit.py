@@ -22,20 +22,26 @@ OBJECT ID FILTERING (for testing):
 To test ingestion of specific objects, use one of:
 - --object-ids ID1,ID2,ID3 (comma-separated list)
 - --object-ids-file path/to/ids.txt (one ID per line)
+
+WATCH MODE:
+--watch DIR runs as a daemon that ingests new or modified parquet shards
+dropped into DIR (see ingest_watch.py), without confirmation prompts.
 """
 
 import argparse
 import os
 import sys
 import time
-import json
 import re
 import logging
+from dataclasses import dataclass, field, replace
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Any, Union
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple, Union
 
 try:
     import pandas as pd
+    import pyarrow.parquet as pq
     import requests
     from dotenv import load_dotenv
 except ImportError as e:
@@ -43,6 +49,72 @@ except ImportError as e:
     print("Install with: pip install pandas pyarrow requests python-dotenv")
     sys.exit(1)
 
+from ingest_mapping import split_nested
+from ingest_profiles import check_parquet, load_profile
+from ingest_batching import (
+    DEFAULT_MAX_BATCH_BYTES,
+    DEFAULT_MAX_POISON_ROWS,
+    AdaptiveBatchSize,
+    EncodedBatch,
+    PoisonRowError,
+    failed_batch_index,
+    is_overload_error,
+    split_failed_batch,
+)
+from ingest_dead_letter import DEFAULT_DEAD_LETTER_PATH, MODE_COLUMN, DeadLetterStore, is_dead_letter_file
+from ingest_journal import (
+    DEFAULT_JOURNAL_PATH,
+    IngestJournal,
+    drop_committed_rows,
+    first_uncommitted_row,
+    selection_key,
+)
+from ingest_id_index import ObjectIdIndex, catalog_fingerprint, default_index_path
+from ingest_manifest import DEFAULT_MANIFEST_PATH, ContentManifest
+from ingest_memory import BATCH_MEMORY_FACTOR, MemoryBudget, format_size, parse_size, peak_rss, read_ahead
+from ingest_metrics import DEFAULT_METRICS_INTERVAL, IngestMetrics
+from ingest_http import COMPRESSION_CHOICES, build_ingest_body, compress_body, decode_json, describe_body, encode_json, get_session
+from ingest_parallel import ParallelTransform
+from ingest_ratelimit import RateLimiter, default_state_path
+from ingest_profiler import add_profile_arguments, finish_profiler, start_profiler
+from ingest_retry import (
+    DEFAULT_BACKOFF_BASE_SEC,
+    DEFAULT_BACKOFF_MAX_SEC,
+    DEFAULT_BREAKER_MAX_OPEN_SEC,
+    DEFAULT_BREAKER_THRESHOLD,
+    DEFAULT_MAX_RETRIES,
+    OUTAGE_STATUSES,
+    RETRY_STATUSES,
+    CircuitBreaker,
+    RetryPolicy,
+    classify_exception,
+    parse_retry_after,
+    ping_probe,
+)
+from ingest_reader import (
+    DEFAULT_STREAM_BATCH_ROWS,
+    ParquetDataset,
+    ParquetStream,
+    RowGroupSlices,
+    is_dataset_source,
+    open_parquet_dataset,
+    parse_where,
+)
+from ingest_sender import OrderedBatchSender, SentBatch
+from ingest_validation import DEFAULT_REJECT_PATH, PreflightValidator
+from ingest_watch import (
+    DEFAULT_SETTLE_SEC,
+    DEFAULT_SLICE_ROWS,
+    DEFAULT_WATCH_INTERVAL,
+    DEFAULT_WATCH_PATTERN,
+    DEFAULT_WATCH_STATE_PATH,
+    FolderWatcher,
+    ShardJob,
+    ShardQueue,
+    ShardTracker,
+    shard_output_name,
+)
+
 
 # --------------------------------------------------------------------------------------
 # Logger setup
@@ -60,145 +132,23 @@ logger.setLevel(logging.INFO)
 
 # --------------------------------------------------------------------------------------
 # Nested Mapping: Database schema -> (Parquet column, target type)
+# Defined by a versioned profile in mapping_profiles/ (see ingest_profiles.py)
 # --------------------------------------------------------------------------------------
 
-def str_or_int_to_str(val):
-    """Special casting: first to int, then to string."""
-    try:
-        return str(int(val))
-    except Exception:
-        return str(val)
-
-
-NESTED_COLUMN_MAPPING: Dict[str, Union[tuple, Dict[str, Any], None]] = {
-    # core
-    "id": ("coadd_object_id", str_or_int_to_str),
-    "ra": ("ra", float),  # should be sersic_ra__best_available_fit
-    "dec": ("dec", float),  # should be sersic_dec__best_available_fit
-    "reff": ("sersic_reff_arcsec__best_available_fit", float),
-    "reff_pixels": ("sersic_reff_pixels__best_available_fit", float),
-    "q": ("sersic_q__best_available_fit", float),
-    "pa": ("sersic_PA__best_available_fit", float),
-    "nucleus": ("is_nucleated", bool),
-
-    "isActive": (None, bool),        # optional, may be None
-    "redshift_x": (None, float),
-    "redshift_y": (None, float),
-    "x": ("sersic_x__best_available_fit", float),
-    "y": ("sersic_y__best_available_fit", float),
-
-    "photometry": {
-        "g": {
-            "sersic": {
-                "mag": ("sersic_mag__best_available_fit", float),
-                "mag_error": ("sersic_mag_error__best_available_fit", float),
-                "mag_rel_error": ("sersic_mag_rel_error__best_available_fit", float),
-                "mean_mue": ("sersic_mean_mue__best_available_fit", float),
-                "mue": ("sersic_mue__best_available_fit", float),
-                "x_error": ("sersic_x_error__best_available_fit", float),
-                "x_rel_error": ("sersic_x_rel_error__best_available_fit", float),
-                "psf": {
-                    "mag": ("sersic_psf_mag__best_available_fit", float),
-                    "mag_error": ("sersic_psf_mag_error__best_available_fit", float),
-                    "mag_rel_error": ("sersic_psf_mag_rel_error__best_available_fit", float),
-                    "x": ("sersic_psf_x__best_available_fit", float),
-                    "x_error": ("sersic_psf_x_error__best_available_fit", float),
-                    "x_rel_error": ("sersic_psf_x_rel_error__best_available_fit", float),
-                },
-            },
-            "source_extractor": {
-                "mag_auto": ("mag_auto_g", float),
-                "mu_mean_model": ("mu_mean_model_g", float),
-                "flux_radius": ("flux_radius_g_arcsec", float),
-            },
-        },
-        "r": {
-            "sersic": {
-                "mean_mue": ("sersic_mean_mue_r", float),
-                "mue": ("sersic_mue_r__best_available_fit", float),
-                "mag": ("sersic_mag_r__best_available_fit", float),
-                "mag_error": ("sersic_mag_error_r__best_available_fit", float),
-                "mag_rel_error": ("sersic_mag_rel_error_r__best_available_fit", float),
-                "x_error": ("sersic_x_error_r__best_available_fit", float),
-                "x_rel_error": ("sersic_x_rel_error_r__best_available_fit", float),
-                "psf": {
-                    "mag": ("sersic_psf_mag_r__best_available_fit", float),
-                    "mag_error": ("sersic_psf_mag_error_r__best_available_fit", float),
-                },
-            },
-            "source_extractor": {
-                "mag_auto": ("mag_auto_r", float),
-                "mu_mean_model": ("mu_mean_model_r", float),
-                "flux_radius": ("flux_radius_r_arcsec", float),
-            },
-        },
-        "i": {
-            "sersic": {
-                "mean_mue": ("sersic_mean_mue_i__best_available_fit", float),
-                "mue": ("sersic_mue_i__best_available_fit", float),
-                "mag": ("sersic_mag_i__best_available_fit", float),
-                "mag_error": ("sersic_mag_error_i__best_available_fit", float),
-                "mag_rel_error": ("sersic_mag_rel_error_i__best_available_fit", float),
-                "x_error": ("sersic_x_error_i__best_available_fit", float),
-                "x_rel_error": ("sersic_x_rel_error_i__best_available_fit", float),
-                "psf": {
-                    "mag": ("sersic_psf_mag_i__best_available_fit", float),
-                    "mag_error": ("sersic_psf_mag_error_i__best_available_fit", float),
-                },
-            },
-            "source_extractor": {
-                "mag_auto": ("mag_auto_i", float),
-                "mu_mean_model": ("mu_mean_model_i", float),
-                "flux_radius": ("flux_radius_i_arcsec", float),
-            },
-        },
-        "y": {
-            "source_extractor": {
-                "mag_auto": ("mag_auto_y", float),
-                "mu_mean_model": ("mu_mean_model_y", float),
-                "flux_radius": ("flux_radius_y_arcsec", float),
-            },
-        },
-        "z": {
-            "source_extractor": {
-                "mag_auto": ("mag_auto_z", float),
-                "mu_mean_model": ("mu_mean_model_z", float),
-                "flux_radius": ("flux_radius_z_arcsec", float),
-            },
-        },
-    },
-
-    "misc": {
-        "is_detr": ("is_detr", bool),
-        "is_vit": ("is_vit", bool),
-        "paper": ("paper", str),
-        "dataset": ("dataset", str),
-        "tilename": ("tilename", str),
-        "thur_cls": ("thur_cls", str),
-        "thur_cls_n": ("thur_cls_n", float),
-    },
-
-    "thuruthipilly": {
-        "n": ("n_thur", float),
-        "q": ("q_thur", float),
-        "reff_g": ("reff_g_thur", float),
-        "reff_i": ("reff_i_thur", float),
-        "mag_g_cor": ("mag_g_cor_thur", float),
-        "mag_g_gf": ("mag_g_gf_thur", float),
-        "mag_i_cor": ("mag_i_cor_thur", float),
-        "mag_i_gf": ("mag_i_gf_thur", float),
-        "mue_mean_g_gf": ("mue_mean_g_gf_thur", float),
-        "mu_mean_g_cor": ("mu_mean_g_cor_thur", float),
-        "mue_mean_i_gf": ("mue_mean_i_gf_thur", float),
-        "mu_mean_i_cor": ("mu_mean_i_cor_thur", float),
-    },
-}
+DEFAULT_MAPPING_PROFILE = "galaxy_multiband_fit.v1"
+MAPPING_PROFILE = load_profile(DEFAULT_MAPPING_PROFILE)
+NESTED_COLUMN_MAPPING: Dict[str, Union[tuple, Dict[str, Any], None]] = MAPPING_PROFILE.mapping
 
 
 # --------------------------------------------------------------------------------------
 # Config loading
 # --------------------------------------------------------------------------------------
-def load_configuration(convex_http_url_arg=None, ingest_token_arg=None, dot_env_file=None):
+def load_configuration(convex_http_url_arg=None, ingest_token_arg=None, dot_env_file=None, token_variable="INGEST_TOKEN"):
+    """Resolve the URL and the token named `token_variable` (command line, dotenv file, environment).
+
+    The token comes back under `token_variable.lower()`: "ingest_token", or
+    "export_token" for the exporters, which the deployment authorizes separately.
+    """
     source_info = {}
     env_path = None
 
@@ -227,21 +177,21 @@ def load_configuration(convex_http_url_arg=None, ingest_token_arg=None, dot_env_
 
     if ingest_token_arg:
         ingest_token = ingest_token_arg
-        source_info["INGEST_TOKEN"] = "CLI arg"
-    elif os.getenv("INGEST_TOKEN"):
-        ingest_token = os.getenv("INGEST_TOKEN")
-        source_info["INGEST_TOKEN"] = f"dotenv {env_path}" if env_path else "env"
+        source_info[token_variable] = "CLI arg"
+    elif os.getenv(token_variable):
+        ingest_token = os.getenv(token_variable)
+        source_info[token_variable] = f"dotenv {env_path}" if env_path else "env"
     else:
         ingest_token = None
 
     if not convex_url or not ingest_token:
-        raise ValueError("Convex URL or Ingest Token not provided")
+        raise ValueError(f"Convex URL or {token_variable} not provided")
 
     convex_url = convex_url.rstrip("/")
     logger.info("Resolved configuration:")
     logger.info(f"  VITE_CONVEX_HTTP_ACTIONS_URL={convex_url} (source={source_info.get('VITE_CONVEX_HTTP_ACTIONS_URL')})")
-    logger.info(f"  INGEST_TOKEN=*** (source={source_info.get('INGEST_TOKEN')})")
-    return {"convex_url": convex_url, "ingest_token": ingest_token}
+    logger.info(f"  {token_variable}=*** (source={source_info.get(token_variable)})")
+    return {"convex_url": convex_url, token_variable.lower(): ingest_token}
 
 
 # --------------------------------------------------------------------------------------
@@ -295,86 +245,82 @@ def extract_nested(row: pd.Series, mapping: Dict[str, Any]) -> Dict[str, Any]:
 
 def row_to_galaxy(row: pd.Series) -> Dict[str, Any]:
     """Build split-object representation expected by new ingestion API."""
-    nested = extract_nested(row, NESTED_COLUMN_MAPPING)
-    # Core galaxy fields
-    galaxy_core_keys = [
-        'id','ra','dec','reff','reff_pixels','q','pa','nucleus','isActive','redshift_x','redshift_y','x','y','misc'
-    ]
-    galaxy_core = {k: nested.get(k) for k in galaxy_core_keys if k in nested}
-    # Photometry bands
-    phot = nested.get('photometry', {})
-    g_ser = phot.get('g', {}).get('sersic')
-    r_ser = phot.get('r', {}).get('sersic')
-    i_ser = phot.get('i', {}).get('sersic')
-    photometryBand = {'sersic': g_ser} if g_ser else None
-    photometryBandR = {'sersic': r_ser} if r_ser else None
-    photometryBandI = {'sersic': i_ser} if i_ser else None
-    # Source extractor unified
-    def se_band(b):
-        return phot.get(b, {}).get('source_extractor', {}) if phot.get(b) else {}
-    source_extractor = {
-        'g': se_band('g'),
-        'r': se_band('r'),
-        'i': se_band('i'),
-    }
-    y_se = se_band('y') if phot.get('y') else None
-    z_se = se_band('z') if phot.get('z') else None
-    if y_se: source_extractor['y'] = y_se
-    if z_se: source_extractor['z'] = z_se
-    # Remove empty dict bands
-    if not any(v for k,v in source_extractor.items() if isinstance(v, dict) and v):
-        source_extractor_out = None
-    else:
-        source_extractor_out = source_extractor
-    # Thuruthipilly
-    thuru = nested.get('thuruthipilly') or None
-    obj = {
-        'galaxy': galaxy_core,
-        'photometryBand': photometryBand,
-        'photometryBandR': photometryBandR,
-        'photometryBandI': photometryBandI,
-        'sourceExtractor': source_extractor_out,
-        'thuruthipilly': thuru,
-    }
-    return {k: v for k, v in obj.items() if v is not None}
+    return split_nested(extract_nested(row, NESTED_COLUMN_MAPPING))
+
+
+# Compiled once with the profile; transforms whole frames column by column (same output as row_to_galaxy).
+COLUMNAR_PLAN = MAPPING_PROFILE.plan
 
 
 # --------------------------------------------------------------------------------------
 # Ingest HTTP
 # --------------------------------------------------------------------------------------
-def send_ingest(convex_url, ingest_token, galaxies, mode="insert", timeout_sec=60):
+def send_ingest(convex_url, ingest_token, galaxies, mode="insert", timeout_sec=60, compression="none", metrics=None, retry_policy=None, rate_limiter=None):
     """
     Send galaxies to the Convex ingestion endpoint.
     
     Args:
         convex_url: Base URL for Convex HTTP actions
         ingest_token: Authentication token
-        galaxies: List of galaxy data objects
+        galaxies: List of galaxy data objects, or an EncodedBatch whose
+                  pre-encoded fragments are used as-is
         mode: Operation mode - 'insert' (default), 'update', or 'upsert'
         timeout_sec: Request timeout in seconds
+        compression: Request body encoding - 'none' (default), 'gzip' or 'deflate'
+        metrics: Optional IngestMetrics; the request (all attempts) is observed in
+                 its latency histogram by final status and retry count
+        retry_policy: RetryPolicy (default: 2 retries, jittered exponential backoff);
+                      429/502/503/504 and retryable request exceptions are retried,
+                      Retry-After is honored, and with a circuit breaker attempts made
+                      during an outage wait for the deployment instead of counting
+        rate_limiter: Optional RateLimiter; every attempt waits for its tokens and reports
+                      its status and latency back (429s and slow requests lower the rate)
     
     Returns:
-        Response object from requests.post
+        Response object from the shared keep-alive session
     """
     url = f"{convex_url}/ingest/galaxies"
+    if isinstance(galaxies, EncodedBatch):
+        fragments = galaxies.fragments
+    else:
+        fragments = [encode_json(g) for g in galaxies]
+    body, encoding_headers = compress_body(build_ingest_body(fragments, mode=mode), compression)
     headers = {
         "Authorization": f"Bearer {ingest_token}",
         "Content-Type": "application/json",
+        **encoding_headers,
     }
-    payload = {"galaxies": galaxies, "mode": mode}
-    logger.info(f"POST {url} with {len(galaxies)} galaxies (mode={mode})")
+    logger.info(f"POST {url} with {len(galaxies)} galaxies (mode={mode}, {describe_body(body, compression)})")
 
-    transient_statuses = {429, 502, 503, 504}
-    max_attempts = 3
-    backoff_base_sec = 1.0
+    policy = retry_policy or RetryPolicy()
+    breaker = policy.breaker
+    max_attempts = policy.max_attempts
 
-    for attempt in range(1, max_attempts + 1):
+    started = time.perf_counter()
+    attempt = 0
+    retries = 0
+    while True:
+        if breaker is not None:
+            breaker.wait()
+        if rate_limiter is not None:
+            rate_limiter.acquire(len(galaxies))
+        attempt += 1
+        sent_at = time.perf_counter()
         try:
-            resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=timeout_sec)
+            resp = get_session().post(url, headers=headers, data=body, timeout=timeout_sec)
         except requests.RequestException as exc:
-            if attempt >= max_attempts:
+            retryable = classify_exception(exc)
+            outage = retryable and breaker is not None and breaker.record_failure(type(exc).__name__)
+            if not retryable or (attempt >= max_attempts and not outage):
+                if metrics is not None:
+                    metrics.observe_request(time.perf_counter() - started, "error", retries, len(body))
                 raise
-            sleep_sec = backoff_base_sec * attempt
+            retries += 1
+            if outage:
+                # Wait for the deployment (breaker.wait) instead of spending this batch's attempts
+                attempt -= 1
+                continue
+            sleep_sec = policy.backoff(attempt)
             logger.warning(
                 f"⚠ Request error on attempt {attempt}/{max_attempts}: {exc}. "
                 f"Retrying in {sleep_sec:.1f}s..."
@@ -382,19 +328,34 @@ def send_ingest(convex_url, ingest_token, galaxies, mode="insert", timeout_sec=6
             time.sleep(sleep_sec)
             continue
 
-        if resp.status_code in transient_statuses and attempt < max_attempts:
-            sleep_sec = backoff_base_sec * attempt
-            logger.warning(
-                f"⚠ Transient HTTP {resp.status_code} on attempt {attempt}/{max_attempts}. "
-                f"Retrying in {sleep_sec:.1f}s..."
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        if rate_limiter is not None:
+            rate_limiter.on_response(resp.status_code, time.perf_counter() - sent_at, retry_after)
+        if resp.status_code in RETRY_STATUSES:
+            outage = (
+                breaker is not None
+                and resp.status_code in OUTAGE_STATUSES
+                and breaker.record_failure(f"HTTP {resp.status_code}")
             )
-            time.sleep(sleep_sec)
-            continue
+            if attempt < max_attempts or outage:
+                retries += 1
+                if outage:
+                    attempt -= 1
+                    continue
+                sleep_sec = policy.backoff(attempt, retry_after)
+                logger.warning(
+                    f"⚠ Transient HTTP {resp.status_code} on attempt {attempt}/{max_attempts}. "
+                    f"Retrying in {sleep_sec:.1f}s..."
+                )
+                time.sleep(sleep_sec)
+                continue
+        elif breaker is not None:
+            breaker.record_success()
 
+        if metrics is not None:
+            metrics.observe_request(time.perf_counter() - started, resp.status_code, retries, len(body))
         return resp
 
-    raise RuntimeError("Unreachable: send_ingest retry loop exited unexpectedly")
-
 
 def parse_response_json(resp: requests.Response) -> Dict[str, Any]:
     """Parse JSON response safely; returns {} when body is not valid JSON."""
@@ -463,29 +424,372 @@ def load_object_ids(object_ids_str: str = None, object_ids_file: str = None) ->
     return object_ids
 
 
+def filter_by_object_ids(df: pd.DataFrame, object_ids: set) -> pd.DataFrame:
+    """Keep only rows whose coadd_object_id (as string) is in object_ids."""
+    return df[df['coadd_object_id'].astype(str).isin(object_ids)]
+
+
+def select_rows(frame: pd.DataFrame, object_ids=None, committed=None) -> pd.DataFrame:
+    """Row filter for ParquetStream/ParquetDataset: object ID selection and already committed rows (picklable via partial)."""
+    if object_ids:
+        frame = filter_by_object_ids(frame, object_ids)
+    return drop_committed_rows(frame, committed or [])
+
+
 # --------------------------------------------------------------------------------------
 # Batch process
 # --------------------------------------------------------------------------------------
-def process_parquet(df, convex_url, ingest_token, batch_size=100, dry_run=False, continue_on_error=False, global_offset=0, mode="insert"):
+def with_file_row_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Index a freshly read DataFrame by row position in the file (named index levels become columns)."""
+    if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1:
+        return df
+    return df.reset_index(drop=all(name is None for name in df.index.names))
+
+
+def iter_frame_galaxies(frames, plan=None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (file row, split galaxy object) for a DataFrame or an iterable of DataFrames
+    (e.g. ParquetStream). Frames must be indexed by row number in the parquet file.
+    `plan` defaults to COLUMNAR_PLAN (the default mapping profile).
+    """
+    plan = plan or COLUMNAR_PLAN
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    for frame in frames:
+        yield from plan.iter_indexed(frame)
+
+
+@dataclass
+class IngestRun:
+    """
+    The collaborators of an ingest run, handed to process_parquet together. All are optional;
+    several calls (watch-mode slices) can share one, or copies made with dataclasses.replace.
+
+    journal: IngestJournal; every committed batch is recorded in it
+    manifest: ContentManifest (update/upsert); rows whose payload hash is unchanged since the
+              last committed run are not sent
+    validator: PreflightValidator; rows failing pre-flight validation go to its reject file
+               instead of a batch (a ParallelTransform validates in its workers)
+    metrics: IngestMetrics collecting stage timings, counters and request latencies
+    memory_budget: MemoryBudget (--max-memory); a stream is read ahead on a reader thread
+                   within its read-ahead share, and batches in flight are capped by its
+                   in-flight share
+    retry_policy: RetryPolicy for send_ingest (backoff, Retry-After, circuit breaker),
+                  shared by all sending threads
+    dead_letters: DeadLetterStore; quarantined rows and, with continue_on_error, the rows of
+                  failed batches are written to it with their payload and error
+    rate_limiter: RateLimiter for send_ingest (requests/s and galaxies/s, shared with other
+                  ingest processes); without one, requests are not paced
+    batch_controller: AdaptiveBatchSize; overrides batch_size when given
+    """
+
+    journal: Optional[IngestJournal] = None
+    manifest: Optional[ContentManifest] = None
+    validator: Optional[PreflightValidator] = None
+    metrics: IngestMetrics = field(default_factory=IngestMetrics)
+    memory_budget: Optional[MemoryBudget] = None
+    retry_policy: Optional[RetryPolicy] = None
+    dead_letters: Optional[DeadLetterStore] = None
+    rate_limiter: Optional[RateLimiter] = None
+    batch_controller: Optional[AdaptiveBatchSize] = None
+
+
+def dead_letter_batch(run: IngestRun, sent: SentBatch, error: str, detail: str, status: Any) -> None:
+    """Write the rows of a batch the run gives up on to run.dead_letters (if any), with their payload and error."""
+    if run.dead_letters is None:
+        return
+    file_rows = sent.meta[3]
+    run.dead_letters.add(file_rows, sent.batch.fragments, error, detail, status)
+    run.metrics.add("rows_dead_lettered", len(sent.batch))
+
+
+def quarantine_row(sent: SentBatch, stats: Dict[str, Any], run: IngestRun) -> Dict[str, Any]:
+    """Account a row isolated by bisection (PoisonRowError); the rest of its batch was committed."""
+    batch_num, _, _, file_rows = sent.meta
+    resp = sent.result
+    result_json = parse_response_json(resp)
+    galaxy = sent.batch.galaxies[0] if sent.batch.galaxies[0] is not None else decode_json(sent.batch.fragments[0])
+    row = {
+        "batch_num": batch_num,
+        "global_row": file_rows[0],
+        "id": (galaxy.get("galaxy") or {}).get("id"),
+        "error": result_json.get("error", f"HTTP {resp.status_code}"),
+        "detail": summarize_error_detail(resp, result_json),
+    }
+    stats["errors"] += 1
+    stats["quarantined"] += 1
+    stats["poison_rows"].append(row)
+    run.metrics.add("rows_quarantined")
+    dead_letter_batch(run, sent, row["error"], row["detail"], resp.status_code)
+    run.metrics.record_batch(batch_num, 1, "quarantined", {"errors": 1})
+    logger.error(f"❌ Quarantined galaxy {row['id']} (global row {row['global_row']}): {row['detail']}")
+    return row
+
+
+def account_batch(sent: SentBatch, stats: Dict[str, Any], fail_fast: Dict[str, Any], run: IngestRun,
+                  mode: str = "insert", continue_on_error: bool = False) -> None:
+    """
+    Update `stats` for one finished batch, in source order. The first failure is recorded in
+    stats["failed_at"] and, without continue_on_error, in fail_fast["error"] (the exception to
+    raise once the batches in flight are drained); with continue_on_error, failed batches go
+    to the dead letters.
+    """
+    batch_num, batch_start_idx, i, file_rows = sent.meta
+    batch = sent.batch
+    metrics = run.metrics
+    record_failure = continue_on_error or fail_fast["error"] is None
+
+    if isinstance(sent.error, PoisonRowError):
+        quarantine_row(sent, stats, run)
+        return
+
+    if sent.error is not None:
+        # Unexpected error while sending the batch
+        stats["errors"] += len(batch)
+        global_row = file_rows[0]
+        if record_failure:
+            stats["failed_at"] = {
+                "batch_num": batch_num,
+                "local_row": batch_start_idx,
+                "global_row": global_row,
+                "error": "Batch processing error",
+                "detail": str(sent.error),
+            }
+        logger.error(f"❌ Error processing batch {batch_num} at row {batch_start_idx} (global row {global_row}): {sent.error}")
+        metrics.record_batch(batch_num, len(batch), "error", {"errors": len(batch)})
+        if continue_on_error:
+            dead_letter_batch(run, sent, "Batch processing error", str(sent.error), "error")
+        if fail_fast["error"] is None and not continue_on_error:
+            fail_fast["error"] = sent.error
+        return
+
+    resp = sent.result
+    result_json = parse_response_json(resp)
+
+    # Success requires HTTP 200 and a parseable JSON object.
+    # This avoids false positives when an upstream returns HTML/text with HTTP 200.
+    if resp.status_code == 200 and result_json and result_json.get("success", True):
+        # Success - batch was committed
+        if fail_fast["error"] is not None:
+            fail_fast["committed_after"] += 1
+        # Handle response based on mode
+        counts = {}
+        if mode == "insert":
+            actual_inserted = result_json.get("inserted", len(batch))
+            actual_skipped = result_json.get("skipped", 0)
+            stats["inserted"] += actual_inserted
+            stats["skipped"] += actual_skipped
+            counts = {"inserted": actual_inserted, "skipped": actual_skipped}
+            logger.info(f"✓ Batch {batch_num}: inserted={actual_inserted}, skipped={actual_skipped}")
+        elif mode == "update":
+            actual_updated = result_json.get("updated", 0)
+            actual_not_found = result_json.get("notFound", 0)
+            stats["updated"] += actual_updated
+            stats["not_found"] += actual_not_found
+            counts = {"updated": actual_updated, "not_found": actual_not_found}
+            logger.info(f"✓ Batch {batch_num}: updated={actual_updated}, not_found={actual_not_found}")
+        elif mode == "upsert":
+            actual_inserted = result_json.get("inserted", 0)
+            actual_updated = result_json.get("updated", 0)
+            stats["inserted"] += actual_inserted
+            stats["updated"] += actual_updated
+            counts = {"inserted": actual_inserted, "updated": actual_updated}
+            logger.info(f"✓ Batch {batch_num}: inserted={actual_inserted}, updated={actual_updated}")
+        metrics.record_batch(batch_num, len(batch), resp.status_code, counts)
+        if run.journal is not None:
+            run.journal.record_batch(batch_num, file_rows, counts)
+        # In update mode the server only reports how many were not found, not which ones
+        if run.manifest is not None and not counts.get("not_found"):
+            run.manifest.record(batch)
+        return
+
+    # Failure - batch was rolled back
+    stats["errors"] += len(batch)
+    metrics.record_batch(batch_num, len(batch), resp.status_code, {"errors": len(batch)})
+    
+    # Extract detailed error info
+    error_msg = result_json.get("error", f"HTTP {resp.status_code}")
+    error_detail = summarize_error_detail(resp, result_json)
+    was_rolled_back = result_json.get("rollback", False)
+    if resp.status_code in {429, 502, 503, 504}:
+        error_detail = f"{error_detail} | transient upstream error after retries"
+    
+    # Calculate exact failure position
+    global_batch_start = file_rows[0]
+    global_batch_end = file_rows[-1]
+    
+    if record_failure:
+        stats["failed_at"] = {
+            "batch_num": batch_num,
+            "batch_size": len(batch),
+            "local_row_range": (batch_start_idx, i),
+            "global_row_range": (global_batch_start, global_batch_end),
+            "error": error_msg,
+            "detail": error_detail,
+            "rolled_back": was_rolled_back,
+        }
+    
+    logger.error(f"")
+    logger.error(f"{'='*60}")
+    logger.error(f"❌ BATCH {batch_num} FAILED")
+    logger.error(f"{'='*60}")
+    logger.error(f"Batch size: {len(batch)} galaxies")
+    logger.error(f"Local row range: {batch_start_idx} - {i}")
+    logger.error(f"Global row range (file rows): {global_batch_start} - {global_batch_end}")
+    logger.error(f"Error: {error_msg}")
+    logger.error(f"Detail: {error_detail}")
+    if was_rolled_back:
+        logger.error(f"Status: Batch was ROLLED BACK (no data committed)")
+    logger.error(f"{'='*60}")
+    logger.error(f"")
+    
+    if continue_on_error:
+        dead_letter_batch(run, sent, error_msg, error_detail, resp.status_code)
+    if fail_fast["error"] is None and not continue_on_error:
+        fail_fast["error"] = RuntimeError(
+            f"Batch {batch_num} failed at global rows {global_batch_start}-{global_batch_end}: {error_msg}"
+        )
+
+
+def is_overloaded(sent: SentBatch) -> bool:
+    """The batch timed out or hit a server read/time limit; smaller batches may get through."""
+    if sent.error is not None:
+        return isinstance(sent.error, requests.Timeout)
+    if sent.result.status_code == 504:
+        return True
+    result_json = parse_response_json(sent.result)
+    return is_overload_error(f"{result_json.get('error', '')} {summarize_error_detail(sent.result, result_json)}")
+
+
+def is_rolled_back(sent: SentBatch) -> bool:
+    """The mutation failed on the batch's data (not a transient, overload or request error)."""
+    if sent.error is not None or sent.result.status_code != 500:
+        return False
+    return bool(parse_response_json(sent.result).get("rollback")) and not is_overloaded(sent)
+
+
+def send_part(send_fn: Callable[[EncodedBatch], requests.Response], meta: Tuple, chunk: EncodedBatch) -> SentBatch:
+    """Send part of a batch now, on the calling thread; errors are returned in the SentBatch like the sender's."""
+    try:
+        return SentBatch(meta, chunk, result=send_fn(chunk))
+    except Exception as exc:
+        return SentBatch(meta, chunk, error=exc)
+
+
+def bisect_batch(sent: SentBatch, resend: Callable[[Tuple, EncodedBatch], List[SentBatch]],
+                 poison: Dict[str, int], metrics: IngestMetrics) -> List[SentBatch]:
+    """
+    Re-send a rolled-back batch in parts through `resend(meta, part)`, which settles each part
+    (so a rolled-back part is bisected in turn), until the rows that fail on their own are
+    isolated. A single row comes back with a PoisonRowError and counts in poison["found"].
+    """
+    batch_num, batch_start_idx, _, file_rows = sent.meta
+    result_json = parse_response_json(sent.result)
+    if len(sent.batch) == 1:
+        poison["found"] += 1
+        return [SentBatch(sent.meta, sent.batch, result=sent.result, error=PoisonRowError(result_json.get("error")))]
+    # The server names the failing galaxy of insert/update/upsert errors; split around it
+    hint = failed_batch_index(summarize_error_detail(sent.result, result_json))
+    parts = split_failed_batch(len(sent.batch), hint)
+    logger.warning(
+        f"↻ Batch {batch_num} rolled back; re-sending its {len(sent.batch)} rows "
+        f"as {'+'.join(str(stop - start) for start, stop in parts)} to isolate the failing row(s)"
+    )
+    settled = []
+    for start, stop in parts:
+        meta = (batch_num, batch_start_idx + start, batch_start_idx + stop - 1, file_rows[start:stop])
+        metrics.add("bisect_requests")
+        settled.extend(resend(meta, sent.batch[start:stop]))
+    return settled
+
+
+def settle_batch(sent: SentBatch, send_fn: Callable[[EncodedBatch], requests.Response], run: IngestRun,
+                 poison: Dict[str, int], max_poison_rows: int = DEFAULT_MAX_POISON_ROWS) -> List[SentBatch]:
+    """
+    Feed run.batch_controller; re-send overloaded batches in smaller pieces and bisect rolled-back
+    ones (until poison["found"] reaches max_poison_rows), in order. Returns the batches to account.
+    """
+    def resend(meta, chunk):
+        return settle_batch(send_part(send_fn, meta, chunk), send_fn, run, poison, max_poison_rows)
+
+    if max_poison_rows and poison["found"] < max_poison_rows and is_rolled_back(sent):
+        return bisect_batch(sent, resend, poison, run.metrics)
+    controller = run.batch_controller
+    if controller is None:
+        return [sent]
+    if not is_overloaded(sent):
+        if sent.error is None and sent.result.status_code == 200:
+            controller.on_success(len(sent.batch), sent.result.elapsed.total_seconds())
+        return [sent]
+    if len(sent.batch) <= controller.min_size:
+        return [sent]
+    controller.on_overload(len(sent.batch))
+    size = controller.size
+    batch_num, batch_start_idx, _, file_rows = sent.meta
+    logger.warning(f"⚠ Batch {batch_num} exceeded server limits; re-sending its {len(sent.batch)} rows in batches of {size}")
+    settled = []
+    for start in range(0, len(sent.batch), size):
+        chunk = sent.batch[start:start + size]
+        meta = (batch_num, batch_start_idx + start, batch_start_idx + start + len(chunk) - 1, file_rows[start:start + size])
+        settled.extend(resend(meta, chunk))
+    return settled
+
+
+def process_parquet(df, convex_url, ingest_token, batch_size=100, dry_run=False, continue_on_error=False, mode="insert", concurrency=1, compression="none", max_batch_bytes=DEFAULT_MAX_BATCH_BYTES, plan=None, max_poison_rows=DEFAULT_MAX_POISON_ROWS, run=None):
     """
     Process parquet dataframe and ingest galaxies in batches.
     
     FAIL-FAST: By default, stops immediately on any error.
     The server-side mutation is atomic - on failure, the entire batch is rolled back.
+
+    With concurrency > 1, up to `concurrency` batches are in flight while the next
+    ones are built. Results are accounted strictly in source order, so `failed_at`
+    always points at the first failed batch and every row before it is committed.
+    Batches already in flight when a failure is seen are drained and counted.
+
+    With a batch_controller (AdaptiveBatchSize), the size of each new batch follows
+    server feedback, and a batch that fails with a read-limit/timeout error is
+    re-sent right away in smaller pieces before later batches are accounted.
+
+    A batch the server rolled back because of its data (HTTP 500 with rollback) is
+    bisected: re-sent in halves, recursively, so its good rows commit and only the
+    rows that fail on their own are quarantined (stats["poison_rows"]) instead of
+    failing the run. After max_poison_rows quarantined rows, failures are handled
+    as before (fail-fast or --continue-on-error).
+
+    Each galaxy is JSON-encoded once, as it is added to a batch. A batch is closed
+    at the row cap or before the next galaxy would push its encoded size past
+    max_batch_bytes, whichever comes first; the request body is assembled from
+    the already encoded fragments.
     
     Args:
-        df: DataFrame with galaxy data
+        df: DataFrame with galaxy data, a ParquetStream/ParquetDataset yielding DataFrames,
+            or a ParallelTransform yielding already encoded galaxies
         convex_url: Convex HTTP actions URL
         ingest_token: Authentication token
         batch_size: Number of galaxies per batch
         dry_run: If True, don't actually send to server
         continue_on_error: If True, continue with next batch on error (not recommended)
-        global_offset: The offset in the original file (for error reporting)
         mode: Operation mode - 'insert' (default), 'update', or 'upsert'
               - insert: Insert new galaxies, skip existing ones
               - update: Update existing galaxies only, report not-found ones
               - upsert: Insert new galaxies or update existing ones
+        concurrency: Maximum number of ingest requests in flight (default: 1)
+        compression: Request body encoding - 'none' (default), 'gzip' or 'deflate'
+        max_batch_bytes: Byte budget for the encoded galaxies of one batch (0/None: row cap only).
+                         A single galaxy larger than the budget is sent on its own.
+        plan: ColumnarPlan of the mapping profile to use (default: COLUMNAR_PLAN)
+        max_poison_rows: Rows that may be quarantined by bisecting rolled-back batches
+                         (0: do not bisect)
+        run: IngestRun with the journal, manifest, validator, metrics, memory budget,
+             retry policy, dead letters, rate limiter and batch controller (default: none
+             of them, fresh metrics)
+
+    Global row numbers (error reporting, journal) are row positions in the parquet
+    file, taken from the frame index (see with_file_row_index / ParquetStream).
     """
+    run = run or IngestRun()
+    metrics, manifest, validator = run.metrics, run.manifest, run.validator
     # Initialize stats based on mode
     stats = {
         "total": len(df), 
@@ -497,126 +801,369 @@ def process_parquet(df, convex_url, ingest_token, batch_size=100, dry_run=False,
         "failed_at": None,  # Will contain info about failure point
         "mode": mode,
     }
-    batch = []
+    if manifest is not None:
+        stats["unchanged"] = 0
+    if validator is not None:
+        stats["rejected"] = 0
+    stats["quarantined"] = 0
+    stats["poison_rows"] = []
+    # Rows isolated by bisection so far, including those not accounted yet
+    poison = {"found": 0}
+    # First fail-fast failure: (exception to raise, number of batches committed after it)
+    fail_fast = {"error": None, "committed_after": 0}
+    metrics.begin(stats["total"])
+    # Validators and manifests count across calls (watch-mode slices of one shard)
+    rejected_before = validator.rejected if validator is not None else 0
+    unchanged_before = manifest.unchanged if manifest is not None else 0
+
+    def send_fn(galaxies):
+        return send_ingest(
+            convex_url, ingest_token, galaxies, mode=mode, compression=compression, metrics=metrics,
+            retry_policy=run.retry_policy, rate_limiter=run.rate_limiter,
+        )
+
+    def finish(finished: List[SentBatch]):
+        for sent in finished:
+            # Re-sends of overloaded and bisected batches wait on the server like the first attempt
+            with metrics.stage("send_wait"):
+                parts = settle_batch(sent, send_fn, run, poison, max_poison_rows)
+            for part in parts:
+                with metrics.stage("account"):
+                    account_batch(part, stats, fail_fast, run, mode, continue_on_error)
+                    i = part.meta[2]
+                    metrics.progress(i + 1)
+                    progress = (i + 1) / max(stats["total"], 1) * 100
+                    logger.info(f"Progress: {i+1}/{stats['total']} ({progress:.1f}%, {metrics.describe_progress()})")
+                    metrics.maybe_write()
+
+    def dry_run_batch(batch_num, batch):
+        mode_verb = {"insert": "insert", "update": "update", "upsert": "insert/update"}.get(mode, mode)
+        logger.info(f"🔍 DRY RUN batch {batch_num}: would {mode_verb} {len(batch)} galaxies")
+        if mode in ("insert", "upsert"):
+            stats["inserted"] += len(batch)
+        else:
+            stats["updated"] += len(batch)
+        metrics.record_batch(batch_num, len(batch), "dry-run", {})
+
+    sender = None
+    if not dry_run:
+        # One keep-alive connection per in-flight request
+        get_session(pool_size=concurrency)
+        sender = OrderedBatchSender(
+            send_fn,
+            concurrency=concurrency,
+            max_pending_bytes=run.memory_budget.in_flight_bytes if run.memory_budget is not None else None,
+        )
+
+    batch = EncodedBatch()
+    batch_rows = []  # File row number of each galaxy in the batch
     batch_start_idx = 0  # Track the starting index of current batch
-    
-    for i, (_, row) in enumerate(df.iterrows()):
-        try:
-            galaxy = row_to_galaxy(row)
+    batch_num = 0
+    i = -1
+
+    def close_batch(last_idx):
+        nonlocal batch, batch_rows, batch_num
+        batch_num += 1
+        metrics.add("rows_batched", len(batch))
+        metrics.add("bytes_encoded", batch.nbytes)
+        if sender is None:
+            dry_run_batch(batch_num, batch)
+        else:
+            # Blocks while `concurrency` batches are in flight
+            with metrics.stage("send_wait"):
+                finished = sender.submit(
+                    (batch_num, batch_start_idx, last_idx, batch_rows), batch, nbytes=batch.nbytes * BATCH_MEMORY_FACTOR
+                )
+            finish(finished)
+        batch = EncodedBatch()
+        batch_rows = []
+
+    def read_frames():
+        # A DataFrame was read (and timed) by the caller; streams read as they are iterated
+        if isinstance(df, pd.DataFrame):
+            frames = [df]
+        elif run.memory_budget is not None:
+            # Read on a separate thread, at most the read-ahead share ahead; "read" is waiting for it
+            frames = metrics.timed_iter("read", read_ahead(df, run.memory_budget))
+        else:
+            frames = metrics.timed_iter("read", df)
+        for frame in frames:
+            metrics.add("rows_read", len(frame))
+            yield frame
+
+    if isinstance(df, ParallelTransform):
+        # Workers read, validate and encode; their time shows up as "transform"
+        galaxies = metrics.timed_iter("transform", df)
+        if manifest is not None:
+            # Workers return encoded fragments; the manifest needs the payloads back
+            galaxies = ((row, decode_json(f), f) for row, _, f in galaxies)
+    else:
+        frames = read_frames()
+        if validator is not None:
+            frames = metrics.timed_iter("validate", validator.iter_clean(frames))
+        galaxies = metrics.timed_iter(
+            "transform", ((row, galaxy, None) for row, galaxy in iter_frame_galaxies(frames, plan))
+        )
+    if manifest is not None:
+        galaxies = metrics.timed_iter("manifest", manifest.filter_changed(galaxies))
+    try:
+        for i, (file_row, galaxy, fragment) in enumerate(galaxies):
+            if fragment is None:
+                with metrics.stage("serialize"):
+                    fragment = encode_json(galaxy)
+            if len(batch) and max_batch_bytes and batch.size_with(fragment) > max_batch_bytes:
+                # Byte budget reached before the row cap
+                close_batch(i - 1)
+                if fail_fast["error"] is not None:
+                    break
             if len(batch) == 0:
                 batch_start_idx = i  # Remember where this batch starts
-            batch.append(galaxy)
-
-            if len(batch) >= batch_size or i == len(df) - 1:
-                batch_num = i // batch_size + 1
-                
-                if not dry_run:
-                    resp = send_ingest(convex_url, ingest_token, batch, mode=mode)
-
-                    result_json = parse_response_json(resp)
-
-                    # Success requires HTTP 200 and a parseable JSON object.
-                    # This avoids false positives when an upstream returns HTML/text with HTTP 200.
-                    if resp.status_code == 200 and result_json and result_json.get("success", True):
-                        # Success - batch was committed
-                        # Handle response based on mode
-                        if mode == "insert":
-                            actual_inserted = result_json.get("inserted", len(batch))
-                            actual_skipped = result_json.get("skipped", 0)
-                            stats["inserted"] += actual_inserted
-                            stats["skipped"] += actual_skipped
-                            logger.info(f"✓ Batch {batch_num}: inserted={actual_inserted}, skipped={actual_skipped}")
-                        elif mode == "update":
-                            actual_updated = result_json.get("updated", 0)
-                            actual_not_found = result_json.get("notFound", 0)
-                            stats["updated"] += actual_updated
-                            stats["not_found"] += actual_not_found
-                            logger.info(f"✓ Batch {batch_num}: updated={actual_updated}, not_found={actual_not_found}")
-                        elif mode == "upsert":
-                            actual_inserted = result_json.get("inserted", 0)
-                            actual_updated = result_json.get("updated", 0)
-                            stats["inserted"] += actual_inserted
-                            stats["updated"] += actual_updated
-                            logger.info(f"✓ Batch {batch_num}: inserted={actual_inserted}, updated={actual_updated}")
-                    else:
-                        # Failure - batch was rolled back
-                        stats["errors"] += len(batch)
-                        
-                        # Extract detailed error info
-                        error_msg = result_json.get("error", f"HTTP {resp.status_code}")
-                        error_detail = summarize_error_detail(resp, result_json)
-                        was_rolled_back = result_json.get("rollback", False)
-                        if resp.status_code in {429, 502, 503, 504}:
-                            error_detail = f"{error_detail} | transient upstream error after retries"
-                        
-                        # Calculate exact failure position
-                        global_batch_start = global_offset + batch_start_idx
-                        global_batch_end = global_offset + i
-                        
-                        stats["failed_at"] = {
-                            "batch_num": batch_num,
-                            "batch_size": len(batch),
-                            "local_row_range": (batch_start_idx, i),
-                            "global_row_range": (global_batch_start, global_batch_end),
-                            "error": error_msg,
-                            "detail": error_detail,
-                            "rolled_back": was_rolled_back,
-                        }
-                        
-                        logger.error(f"")
-                        logger.error(f"{'='*60}")
-                        logger.error(f"❌ BATCH {batch_num} FAILED")
-                        logger.error(f"{'='*60}")
-                        logger.error(f"Batch size: {len(batch)} galaxies")
-                        logger.error(f"Local row range: {batch_start_idx} - {i}")
-                        logger.error(f"Global row range (with offset): {global_batch_start} - {global_batch_end}")
-                        logger.error(f"Error: {error_msg}")
-                        logger.error(f"Detail: {error_detail}")
-                        if was_rolled_back:
-                            logger.error(f"Status: Batch was ROLLED BACK (no data committed)")
-                        logger.error(f"{'='*60}")
-                        logger.error(f"")
-                        
-                        if not continue_on_error:
-                            raise RuntimeError(
-                                f"Batch {batch_num} failed at global rows {global_batch_start}-{global_batch_end}: {error_msg}"
-                            )
-                else:
-                    mode_verb = {"insert": "insert", "update": "update", "upsert": "insert/update"}.get(mode, mode)
-                    logger.info(f"🔍 DRY RUN batch {batch_num}: would {mode_verb} {len(batch)} galaxies")
-                    if mode in ("insert", "upsert"):
-                        stats["inserted"] += len(batch)
-                    else:
-                        stats["updated"] += len(batch)
-                
-                batch = []
-                progress = (i + 1) / stats["total"] * 100
-                logger.info(f"Progress: {i+1}/{stats['total']} ({progress:.1f}%)")
-                
-                if not dry_run:
-                    time.sleep(0.1)
-                    
-        except RuntimeError:
-            # Re-raise RuntimeError (our controlled failure)
-            raise
-        except Exception as e:
-            # Unexpected error during row processing
-            stats["errors"] += 1
-            global_row = global_offset + i
-            stats["failed_at"] = {
-                "batch_num": i // batch_size + 1,
-                "local_row": i,
-                "global_row": global_row,
-                "error": "Row processing error",
-                "detail": str(e),
-            }
-            logger.error(f"❌ Error processing row {i} (global row {global_row}): {e}")
-            if not continue_on_error:
-                raise
-    
+            batch.append(galaxy, fragment)
+            batch_rows.append(file_row)
+            if len(batch) < (run.batch_controller.size if run.batch_controller else batch_size):
+                continue
+            close_batch(i)
+            if fail_fast["error"] is not None:
+                break
+        else:
+            if len(batch):
+                close_batch(i)
+        if sender is not None:
+            with metrics.stage("send_wait"):
+                finished = sender.drain()
+            finish(finished)
+    finally:
+        if sender is not None:
+            sender.close()
+
+    if fail_fast["error"] is not None:
+        if fail_fast["committed_after"]:
+            resend_note = "--resume skips them" if run.journal is not None else "resuming from the failed batch will re-send them"
+            logger.warning(
+                f"⚠ {fail_fast['committed_after']} batch(es) after the failed one were already in flight and committed; "
+                f"{resend_note}"
+            )
+        raise fail_fast["error"]
+
+    # Filters applied while streaming can make the selected row count an upper bound
+    stats["total"] = i + 1
+    if manifest is not None:
+        stats["unchanged"] = manifest.unchanged - unchanged_before
+        stats["total"] += stats["unchanged"]
+        metrics.add("rows_unchanged", stats["unchanged"])
+    if validator is not None:
+        stats["rejected"] = validator.rejected - rejected_before
+        stats["total"] += stats["rejected"]
+        metrics.add("rows_rejected", stats["rejected"])
+    metrics.end(stats["total"])
     return stats
 
 
+# --------------------------------------------------------------------------------------
+# Watch mode
+# --------------------------------------------------------------------------------------
+def watch_folder(args, config, profile, run=None):
+    """
+    Daemon mode (--watch): ingest new or modified shards of a directory as they appear.
+
+    Shards are streamed in slices of --watch-slice-rows rows, round-robin over the
+    pending shards. Progress is kept per shard fingerprint in the watch state file
+    (and in the journal, which is authoritative when enabled), so a restarted daemon
+    skips finished shards and continues unfinished ones. A shard that fails is
+    retried when its file changes or the daemon restarts. The metrics, memory budget,
+    retry policy (whose circuit breaker pauses the daemon while the deployment is down)
+    and rate limiter of `run` (IngestRun) cover its whole lifetime, as do the manifest
+    and batch controller set up here; each shard adds its own journal, validator and
+    dead letters.
+    """
+    run = run or IngestRun()
+    metrics = run.metrics
+    directory = Path(args.watch)
+    if not directory.is_dir():
+        raise FileNotFoundError(f"Watch directory not found: {directory}")
+    reject_dir = Path(args.reject_file).with_suffix("")
+    dead_letter_dir = Path(args.dead_letter_file).with_suffix("")
+    tracker = ShardTracker(Path(args.watch_state))
+    watcher = FolderWatcher(
+        directory,
+        tracker,
+        pattern=args.watch_pattern,
+        settle_sec=args.watch_settle,
+        ignore=[reject_dir, dead_letter_dir],
+    )
+    queue = ShardQueue(args.watch_slice_rows)
+
+    if args.skip_unchanged:
+        if args.mode == "insert":
+            raise ValueError("--skip-unchanged applies to --mode update/upsert (insert already skips existing galaxies)")
+        run = replace(run, manifest=ContentManifest(Path(args.manifest), config["convex_url"]))
+    if args.adaptive_batch:
+        run = replace(run, batch_controller=AdaptiveBatchSize(
+            args.batch_size,
+            min_size=args.min_batch_size,
+            max_size=args.max_batch_size,
+            target_latency_sec=args.target_latency,
+        ))
+    if not args.dry_run:
+        # One warm keep-alive session for the daemon's lifetime
+        get_session(pool_size=args.concurrency)
+
+    totals = {"shards": 0, "failed": 0, "inserted": 0, "updated": 0, "skipped": 0, "not_found": 0, "errors": 0, "rejected": 0, "quarantined": 0}
+
+    def close_job(job: ShardJob):
+        validator = job.context.pop("validator", None)
+        if validator is not None:
+            validator.close()
+            validator.log_summary()
+        dead_letters = job.context.pop("dead_letters", None)
+        if dead_letters is not None:
+            dead_letters.close()
+            dead_letters.log_summary()
+        journal = job.context.pop("journal", None)
+        if journal is not None:
+            journal.close()
+
+    def open_job(path: Path, fingerprint: str):
+        try:
+            check_parquet(profile, path, allow_missing=args.allow_missing_columns)
+            rows = pq.ParquetFile(path).metadata.num_rows
+        except Exception as e:
+            logger.error(f"❌ Shard {path} skipped until it changes: {e}")
+            tracker.mark(path, fingerprint, "failed", error=str(e))
+            totals["failed"] += 1
+            return None
+        state = tracker.get(path)
+        resumed = state is not None and state["fingerprint"] == fingerprint and state["status"] != "done"
+        job = ShardJob(path, fingerprint, rows, state["next_row"] if resumed else 0)
+        if not args.no_journal and not args.dry_run:
+            journal = IngestJournal(Path(args.journal), fingerprint, args.mode, selection_key(), source=str(path))
+            committed = journal.committed_ranges()
+            job.next_row = first_uncommitted_row(committed, job.next_row)
+            job.context.update(journal=journal, committed=committed)
+        if args.validate:
+            reject_path = None if args.dry_run else reject_dir / shard_output_name(path, directory)
+            if reject_path is not None:
+                reject_dir.mkdir(parents=True, exist_ok=True)
+            job.context["validator"] = PreflightValidator(
+                profile.plan, reject_path, schema=pq.read_schema(path), memory_budget=run.memory_budget
+            )
+        if not args.dry_run:
+            job.context["dead_letters"] = DeadLetterStore(
+                dead_letter_dir / shard_output_name(path, directory), str(path), args.mode, schema=pq.read_schema(path)
+            )
+        tracker.mark(path, fingerprint, "pending", rows, job.next_row)
+        note = f", continuing at row {job.next_row}" if job.next_row else ""
+        logger.info(f"📥 Shard {path}: {rows} rows{note}")
+        return job
+
+    def ingest_slice(job: ShardJob, offset: int, limit: int):
+        committed = job.context.get("committed")
+        source = ParquetStream(
+            job.path,
+            columns=profile.plan.source_columns,
+            offset=offset,
+            limit=limit,
+            batch_rows=args.stream_batch_rows,
+            row_filter=partial(select_rows, committed=committed) if committed else None,
+            pre_buffer=run.memory_budget is None,
+        )
+        validator = job.context.get("validator")
+        if args.transform_workers > 1:
+            source = ParallelTransform(
+                source, profile.path, args.transform_workers, validator=validator,
+                max_pending=args.transform_workers if run.memory_budget is not None else None,
+            )
+        return process_parquet(
+            source,
+            config["convex_url"],
+            config["ingest_token"],
+            args.batch_size,
+            args.dry_run,
+            args.continue_on_error,
+            mode=args.mode,
+            concurrency=args.concurrency,
+            compression=args.compression,
+            max_batch_bytes=args.max_batch_bytes,
+            plan=profile.plan,
+            max_poison_rows=args.max_poison_rows,
+            run=replace(
+                run,
+                journal=job.context.get("journal"),
+                validator=validator,
+                dead_letters=job.context.get("dead_letters"),
+            ),
+        )
+
+    logger.info(
+        f"👀 Watching {directory} for {args.watch_pattern} shards "
+        f"(poll every {args.watch_interval}s, settle {args.watch_settle}s, slices of {queue.slice_rows} rows, mode={args.mode})"
+    )
+    last_poll = None
+    try:
+        while True:
+            if last_poll is None or not len(queue) or time.monotonic() - last_poll >= args.watch_interval:
+                last_poll = time.monotonic()
+                for path, fingerprint in watcher.poll():
+                    job = open_job(path, fingerprint)
+                    if job is None:
+                        continue
+                    replaced = queue.add(job)
+                    if replaced is not None:
+                        logger.info(f"↻ Shard {path} changed while queued; restarting it")
+                        close_job(replaced)
+            work = queue.next_slice()
+            if work is None:
+                if args.watch_once and not watcher.unsettled:
+                    break
+                metrics.maybe_write()
+                with metrics.stage("idle"):
+                    time.sleep(min(args.watch_interval, max(args.watch_settle, 0.1)) if watcher.unsettled else args.watch_interval)
+                continue
+
+            job, offset, limit = work
+            try:
+                stats = ingest_slice(job, offset, limit)
+            except Exception as e:
+                logger.error(f"❌ Shard {job.path} failed at rows {offset}-{offset + limit - 1}: {e}")
+                logger.error(f"   (retried when the file changes or the daemon restarts)")
+                tracker.mark(job.path, job.fingerprint, "failed", job.rows, job.next_row, error=str(e))
+                totals["failed"] += 1
+                close_job(job)
+                continue
+            for key in ("inserted", "updated", "skipped", "not_found", "errors", "rejected", "quarantined"):
+                totals[key] += stats.get(key, 0)
+            metrics.maybe_write()
+            job.next_row = offset + limit
+            if job.done:
+                tracker.mark(job.path, job.fingerprint, "done", job.rows, job.rows)
+                totals["shards"] += 1
+                close_job(job)
+                lag = time.time() - job.path.stat().st_mtime
+                logger.info(f"✓ Shard {job.path} done ({job.rows} rows), {lag:.1f}s after it was written")
+            else:
+                tracker.mark(job.path, job.fingerprint, "pending", job.rows, job.next_row)
+                queue.requeue(job)
+    except KeyboardInterrupt:
+        logger.info("Stopping watch; unfinished shards continue on the next start")
+    finally:
+        while len(queue):
+            job, _, _ = queue.next_slice()
+            close_job(job)
+        tracker.close()
+        if run.manifest is not None:
+            run.manifest.close()
+
+    logger.info("=" * 60)
+    logger.info(
+        f"WATCH SUMMARY (mode={args.mode}): {totals['shards']} shard(s) done, {totals['failed']} failed; "
+        f"inserted={totals['inserted']}, updated={totals['updated']}, skipped={totals['skipped']}, "
+        f"not_found={totals['not_found']}, errors={totals['errors']}, rejected={totals['rejected']}, "
+        f"quarantined={totals['quarantined']}"
+    )
+    log_metrics_summary(metrics)
+    logger.info("=" * 60)
+
+
 # --------------------------------------------------------------------------------------
 # Main
 # --------------------------------------------------------------------------------------
@@ -626,6 +1173,95 @@ def process_parquet(df, convex_url, ingest_token, batch_size=100, dry_run=False,
 # Smaller batches = fewer aggregate operations = less data read per mutation.
 RECOMMENDED_BATCH_SIZE = 20
 MAX_SAFE_BATCH_SIZE = 30  # Above this, you risk hitting the 16MB limit
+# Quarantined galaxies listed in the summary
+MAX_LISTED_POISON_ROWS = 20
+
+
+def open_metrics(args, source: str) -> IngestMetrics:
+    """IngestMetrics for this run, writing to --report-json / --prometheus-textfile if given."""
+    metrics = IngestMetrics(
+        labels={"mode": args.mode, "source": Path(source).name or source},
+        interval=args.metrics_interval,
+    )
+    metrics.json_path = Path(args.report_json) if args.report_json else None
+    metrics.prometheus_path = Path(args.prometheus_textfile) if args.prometheus_textfile else None
+    return metrics
+
+
+def open_retry_policy(args, convex_url: str) -> RetryPolicy:
+    """RetryPolicy from --max-retries/--backoff-*, with a /ping-probing circuit breaker unless --breaker-threshold 0."""
+    breaker = None
+    if args.breaker_threshold > 0:
+        breaker = CircuitBreaker(
+            ping_probe(convex_url, get_session),
+            threshold=args.breaker_threshold,
+            max_open_sec=args.breaker_max_open,
+            probe_base_sec=args.backoff_base,
+            probe_max_sec=args.backoff_max,
+        )
+    return RetryPolicy(max_retries=args.max_retries, base_sec=args.backoff_base, max_sec=args.backoff_max, breaker=breaker)
+
+
+def open_rate_limiter(args, convex_url: str) -> Optional[RateLimiter]:
+    """RateLimiter shared with the other ingest processes for this deployment (None with --no-rate-limit or --dry-run)."""
+    if args.no_rate_limit or args.dry_run:
+        return None
+    limiter = RateLimiter(
+        Path(args.rate_state_file) if args.rate_state_file else default_state_path(convex_url),
+        max_requests_per_sec=args.max_requests_per_sec,
+        max_galaxies_per_sec=args.max_galaxies_per_sec,
+        target_latency_sec=args.target_latency,
+    )
+    logger.info(f"✓ Rate limit: {limiter.describe()}")
+    return limiter
+
+
+def record_run_sections(metrics: IngestMetrics, *parts):
+    """Add the report sections of the run's MemoryBudget / CircuitBreaker / RateLimiter (None: not used)."""
+    for part in parts:
+        if part is not None:
+            metrics.info.update(part.summary())
+
+
+def open_memory_budget(args) -> Optional[MemoryBudget]:
+    """MemoryBudget for --max-memory (None without it); shrinks --stream-batch-rows to fit."""
+    if not args.max_memory:
+        return None
+    budget = MemoryBudget(parse_size(args.max_memory))
+    logger.info(f"✓ Memory budget: {budget.describe()}")
+    batch_rows = budget.batch_rows(args.stream_batch_rows)
+    if batch_rows < args.stream_batch_rows:
+        logger.info(f"  --stream-batch-rows {args.stream_batch_rows} -> {batch_rows} to fit the working memory")
+        args.stream_batch_rows = batch_rows
+    return budget
+
+
+def log_metrics_summary(metrics: IngestMetrics):
+    rate, _ = metrics.throughput()
+    logger.info(f"Throughput: {rate:.0f} rows/s; time per stage:")
+    for line in metrics.summary_lines():
+        logger.info(line)
+    breaker = metrics.info.get("circuit_breaker")
+    if breaker and breaker["opened"]:
+        logger.info(f"Circuit breaker: opened {breaker['opened']} time(s), requests paused for {breaker['open_seconds']:.1f}s")
+    limit = metrics.info.get("rate_limit")
+    if limit and (limit["cuts_on_429"] or limit["cuts_on_latency"] or limit["waited_seconds"] >= 1):
+        rate = "unlimited" if limit["requests_per_sec"] is None else f"{limit['requests_per_sec']:.1f} requests/s"
+        logger.info(
+            f"Rate limit: waited {limit['waited_seconds']:.1f}s; lowered {limit['cuts_on_429']} time(s) on 429, "
+            f"{limit['cuts_on_latency']} on latency; now {rate}"
+        )
+    rss = f"Peak RSS: {format_size(peak_rss())}"
+    if "memory" in metrics.info:
+        memory = metrics.info["memory"]
+        rss += f" (limit {format_size(memory['limit_bytes'])}; reader throttled {memory['reader_throttled']} time(s))"
+    logger.info(rss)
+    requests_sent = metrics.counters["requests"]
+    if requests_sent:
+        logger.info(f"Requests: {requests_sent} ({metrics.counters['retries']} retries, {metrics.counters['bytes_sent']} bytes sent)")
+    for path in (metrics.json_path, metrics.prometheus_path):
+        if path is not None:
+            logger.info(f"Metrics written to {path}")
 
 def main():
     parser = argparse.ArgumentParser(
@@ -639,6 +1275,18 @@ BATCH SIZE GUIDANCE:
   
   Example: --batch-size {RECOMMENDED_BATCH_SIZE}
 
+  With --adaptive-batch, --batch-size is only the starting size: it grows while
+  requests succeed within --target-latency and is halved (and the failed rows
+  re-sent) on "Too many bytes read"/timeout errors, up to --max-batch-size.
+
+  --max-batch-bytes closes a batch early when its encoded galaxies would exceed
+  the byte budget, so sparse rows can use a larger --batch-size while dense
+  rows never produce an oversized request.
+
+  A batch rolled back because of one bad galaxy is re-sent in halves until that
+  galaxy is isolated; the other rows commit and it is quarantined (listed in the
+  summary), for up to --max-poison-rows galaxies.
+
 OPERATION MODES:
   --mode insert  (default) Insert new galaxies, skip existing ones
   --mode update  Update existing galaxies only, report not-found ones
@@ -648,24 +1296,135 @@ OPERATION MODES:
   and classification statistics (totalClassifications, etc.).
 """
     )
-    parser.add_argument("--parquet-file", required=True, help="Parquet file path")
+    parser.add_argument("--parquet-file",
+                        help="Parquet file, directory of (hive-partitioned) parquet files, or quoted glob (required unless --watch)")
+    parser.add_argument("--where",
+                        help="Row filter pushed down to partitions/row-group statistics, e.g. \"paper == 'X' and tilename in ('A', 'B')\"")
     parser.add_argument("--convex-http-actions-url", help="Convex ingestion URL")
     parser.add_argument("--ingest-token", help="Ingest API token")
     parser.add_argument("--dot-env-file", help="Dotenv file (default .env)")
     parser.add_argument("--batch-size", type=int, default=RECOMMENDED_BATCH_SIZE, 
                         help=f"Batch size for ingestion (default: {RECOMMENDED_BATCH_SIZE}, max safe: {MAX_SAFE_BATCH_SIZE})")
+    parser.add_argument("--adaptive-batch", action="store_true",
+                        help="Adapt the batch size to server feedback (AIMD), starting at --batch-size")
+    parser.add_argument("--min-batch-size", type=int, default=1,
+                        help="Smallest batch size for --adaptive-batch (default: 1)")
+    parser.add_argument("--max-batch-size", type=int, default=100,
+                        help="Largest batch size for --adaptive-batch (default: 100)")
+    parser.add_argument("--target-latency", type=float, default=5.0,
+                        help="Per-request latency (seconds) above which --adaptive-batch stops growing and the "
+                             "rate limiter slows down (default: 5.0)")
+    parser.add_argument("--max-batch-bytes", type=int, default=DEFAULT_MAX_BATCH_BYTES,
+                        help=f"Also close a batch before its encoded galaxies exceed this many bytes; 0 disables (default: {DEFAULT_MAX_BATCH_BYTES})")
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--offset", type=int, default=0, help="Row offset to start processing (default: 0)")
     parser.add_argument("--limit", type=int, default=None, help="Maximum number of rows to process (default: all)")
     parser.add_argument("--continue-on-error", action="store_true", help="Continue with next batch on error (default: stop immediately)")
+    parser.add_argument("--max-poison-rows", type=int, default=DEFAULT_MAX_POISON_ROWS,
+                        help="Bisect batches the server rolled back and quarantine up to this many galaxies that fail "
+                             f"on their own, committing the rest; 0 disables (default: {DEFAULT_MAX_POISON_ROWS})")
     parser.add_argument("--mode", choices=["insert", "update", "upsert"], default="insert",
                         help="Operation mode: insert (default), update, or upsert")
     parser.add_argument("--object-ids", help="Comma-separated object IDs to process (for testing)")
     parser.add_argument("--object-ids-file", help="File path with one object ID per line (for testing)")
+    parser.add_argument("--id-index",
+                        help="Object ID index for --object-ids (default: <file>.ids.sqlite / <dir>/_object_ids.sqlite if present; "
+                             "build with scripts/ingest_id_index.py)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Maximum ingest requests in flight; the next batches are built while they run (default: 1)")
+    parser.add_argument("--compression", choices=COMPRESSION_CHOICES, default="none",
+                        help="Compress request bodies (requires a deployment that accepts Content-Encoding; default: none)")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH,
+                        help=f"SQLite checkpoint journal of committed batches (default: {DEFAULT_JOURNAL_PATH})")
+    parser.add_argument("--no-journal", action="store_true", help="Do not record committed batches")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip rows the journal records as committed for this file, mode and object-ID selection")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="update/upsert only: do not send rows whose payload hash matches the last committed one")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH,
+                        help=f"Content-hash manifest used by --skip-unchanged (default: {DEFAULT_MANIFEST_PATH})")
+    parser.add_argument("--mapping-profile", default=DEFAULT_MAPPING_PROFILE,
+                        help=f"Mapping profile name in mapping_profiles/ or path to a profile file (default: {DEFAULT_MAPPING_PROFILE})")
+    parser.add_argument("--allow-missing-columns", action="store_true",
+                        help="Skip mapped columns missing from the file instead of failing the schema check")
+    parser.add_argument("--validate", action="store_true",
+                        help="Check rows before batching (required fields, NaN/inf, ra/dec/q/pa ranges, casts, duplicate IDs); "
+                             "rejected rows are written to --reject-file instead of being sent")
+    parser.add_argument("--reject-file", default=DEFAULT_REJECT_PATH,
+                        help=f"Parquet file for rows rejected by --validate, with their reasons (default: {DEFAULT_REJECT_PATH})")
+    parser.add_argument("--dead-letter-file", default=DEFAULT_DEAD_LETTER_PATH,
+                        help="Parquet file collecting the rows the run gives up on (quarantined galaxies; failed batches "
+                             "with --continue-on-error): source columns, payload, error, attempts "
+                             f"(default: {DEFAULT_DEAD_LETTER_PATH}; with --watch, a directory of per-shard files)")
+    parser.add_argument("--replay", metavar="DEAD_LETTER_FILE",
+                        help="Ingest the rows of a dead-letter file again; those that fail again stay in it")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the parquet file in record batches (mapped columns only, seeks to --offset via row groups)")
+    parser.add_argument("--transform-workers", type=int, default=1,
+                        help="Transform rows in this many processes, one parquet row group per task (implies --stream; default: 1)")
+    parser.add_argument("--stream-batch-rows", type=int, default=DEFAULT_STREAM_BATCH_ROWS,
+                        help=f"Rows per record batch in --stream mode (default: {DEFAULT_STREAM_BATCH_ROWS})")
+    parser.add_argument("--watch", metavar="DIR",
+                        help="Daemon mode: ingest new or modified parquet shards dropped into DIR (no confirmation prompt)")
+    parser.add_argument("--watch-pattern", default=DEFAULT_WATCH_PATTERN,
+                        help=f"File name pattern of shards in --watch mode (default: {DEFAULT_WATCH_PATTERN})")
+    parser.add_argument("--watch-interval", type=float, default=DEFAULT_WATCH_INTERVAL,
+                        help=f"Seconds between directory polls in --watch mode (default: {DEFAULT_WATCH_INTERVAL})")
+    parser.add_argument("--watch-settle", type=float, default=DEFAULT_SETTLE_SEC,
+                        help=f"A shard must be unchanged this many seconds before it is read (default: {DEFAULT_SETTLE_SEC})")
+    parser.add_argument("--watch-slice-rows", type=int, default=DEFAULT_SLICE_ROWS,
+                        help=f"Rows ingested from one shard before moving to the next pending shard (default: {DEFAULT_SLICE_ROWS})")
+    parser.add_argument("--watch-state", default=DEFAULT_WATCH_STATE_PATH,
+                        help=f"SQLite file recording ingested shard fingerprints (default: {DEFAULT_WATCH_STATE_PATH})")
+    parser.add_argument("--watch-once", action="store_true",
+                        help="Ingest the shards currently in the --watch directory, then exit")
+    parser.add_argument("--report-json",
+                        help="Write a JSON run report (stage timings, counters, request latency histograms, "
+                             "server counts, rows/s, ETA); refreshed during the run")
+    parser.add_argument("--prometheus-textfile",
+                        help="Write the same metrics in node_exporter textfile collector format (*.prom)")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_METRICS_INTERVAL,
+                        help=f"Seconds between report refreshes during the run (default: {DEFAULT_METRICS_INTERVAL:g})")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES,
+                        help=f"Retries per batch after 429/502/503/504 or a network error (default: {DEFAULT_MAX_RETRIES})")
+    parser.add_argument("--backoff-base", type=float, default=DEFAULT_BACKOFF_BASE_SEC,
+                        help=f"Base of the jittered exponential backoff in seconds (default: {DEFAULT_BACKOFF_BASE_SEC:g})")
+    parser.add_argument("--backoff-max", type=float, default=DEFAULT_BACKOFF_MAX_SEC,
+                        help=f"Longest backoff pause in seconds; Retry-After may ask for more (default: {DEFAULT_BACKOFF_MAX_SEC:g})")
+    parser.add_argument("--breaker-threshold", type=int, default=DEFAULT_BREAKER_THRESHOLD,
+                        help=f"Consecutive 502/503/504 or network failures that pause all requests until /ping answers "
+                             f"(default: {DEFAULT_BREAKER_THRESHOLD}; 0 disables the circuit breaker)")
+    parser.add_argument("--breaker-max-open", type=float, default=DEFAULT_BREAKER_MAX_OPEN_SEC,
+                        help=f"Seconds to wait for the deployment before giving up (default: {DEFAULT_BREAKER_MAX_OPEN_SEC:g})")
+    parser.add_argument("--max-requests-per-sec", type=float, default=0,
+                        help="Cap on ingest requests per second, shared by all ingest processes for the deployment on "
+                             "this host; 429s and slow requests lower the rate below it (default: 0, no cap)")
+    parser.add_argument("--max-galaxies-per-sec", type=float, default=0,
+                        help="Cap on galaxies sent per second, shared like --max-requests-per-sec (default: 0, no cap)")
+    parser.add_argument("--rate-state-file",
+                        help="State file of the shared rate limiter; processes using the same file share the limits "
+                             "(default: one per deployment URL in the temp directory)")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="Send as fast as the server answers, without the shared rate limiter")
+    parser.add_argument("--max-memory", metavar="SIZE",
+                        help="Memory budget of the ingest process, e.g. 512M or 2G (implies --stream): bounded "
+                             "read-ahead and in-flight batches, smaller record batches; peak RSS is in the summary")
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    if args.replay:
+        if args.parquet_file or args.watch:
+            parser.error("--replay reads the dead-letter file; drop --parquet-file/--watch")
+        args.parquet_file = args.replay
+    if not args.parquet_file and not args.watch:
+        parser.error("--parquet-file is required (or use --watch DIR)")
+    if args.watch and (args.parquet_file or args.where or args.object_ids or args.object_ids_file or args.resume):
+        parser.error("--watch cannot be combined with --parquet-file, --where, --object-ids(-file) or --resume "
+                     "(watch mode always continues unfinished shards)")
 
-    # Warn if batch size is too large
-    if args.batch_size > MAX_SAFE_BATCH_SIZE:
+    # Warn if batch size is too large (adaptive sizing shrinks on its own)
+    if args.batch_size > MAX_SAFE_BATCH_SIZE and not args.adaptive_batch and args.watch:
+        logger.warning(f"⚠️  Batch size {args.batch_size} exceeds recommended maximum of {MAX_SAFE_BATCH_SIZE}")
+    elif args.batch_size > MAX_SAFE_BATCH_SIZE and not args.adaptive_batch:
         logger.warning(f"⚠️  Batch size {args.batch_size} exceeds recommended maximum of {MAX_SAFE_BATCH_SIZE}")
         logger.warning(f"    This may cause 'Too many bytes read' errors due to Convex limits.")
         logger.warning(f"    Consider using --batch-size {RECOMMENDED_BATCH_SIZE}")
@@ -674,36 +1433,216 @@ OPERATION MODES:
             logger.info("Cancelled. Rerun with a smaller --batch-size.")
             return
 
+    # Opened below for a single-file run; closed on every way out
+    journal = manifest = None
     try:
         config = load_configuration(args.convex_http_actions_url, args.ingest_token, args.dot_env_file)
+        metrics = open_metrics(args, args.watch or args.parquet_file)
+        memory_budget = open_memory_budget(args)
+        retry_policy = open_retry_policy(args, config["convex_url"])
+        rate_limiter = open_rate_limiter(args, config["convex_url"])
+        if args.watch:
+            profiler = start_profiler(args, metrics)
+            try:
+                watch_folder(
+                    args,
+                    config,
+                    load_profile(args.mapping_profile),
+                    IngestRun(
+                        metrics=metrics, memory_budget=memory_budget, retry_policy=retry_policy, rate_limiter=rate_limiter
+                    ),
+                )
+            finally:
+                finish_profiler(profiler, args, metrics)
+                record_run_sections(metrics, memory_budget, retry_policy.breaker, rate_limiter)
+                metrics.write()
+            return
         parquet_file = Path(args.parquet_file)
-        if not parquet_file.exists():
+        dataset = None
+        if args.where or is_dataset_source(args.parquet_file):
+            # Directory/glob input or --where: read through a pyarrow dataset
+            dataset = open_parquet_dataset(args.parquet_file)
+            logger.info(f"✓ Dataset: {len(dataset.files)} parquet file(s) from {args.parquet_file}")
+        elif not parquet_file.exists():
             raise FileNotFoundError(f"File not found: {parquet_file}")
-        df = pd.read_parquet(parquet_file)
-        total_rows = len(df)
+        if args.replay:
+            if dataset is not None or not is_dead_letter_file(parquet_file):
+                raise ValueError(f"{args.replay} is not a dead-letter file")
+            modes = set(pq.read_table(parquet_file, columns=[MODE_COLUMN]).column(0).to_pylist())
+            logger.info(f"↻ Replaying {pq.ParquetFile(parquet_file).metadata.num_rows} dead letter(s) from {parquet_file}")
+            if modes - {args.mode}:
+                logger.warning(f"⚠ The dead letters were sent with --mode {', '.join(sorted(modes))}; replaying with --mode {args.mode}")
+        # Fails here, from the footer schema alone, if the file does not fit the profile
+        profile = load_profile(args.mapping_profile)
+        check_parquet(
+            profile,
+            parquet_file,
+            allow_missing=args.allow_missing_columns,
+            schema=dataset.schema if dataset is not None else None,
+        )
         offset = args.offset if args.offset >= 0 else 0
         limit = args.limit if args.limit is not None and args.limit > 0 else None
-        if limit is not None:
-            df = df.iloc[offset:offset+limit]
-        else:
-            df = df.iloc[offset:]
-        logger.info(f"✓ Loaded {len(df)} rows from {parquet_file} (offset={offset}, limit={limit})")
-        
-        # Filter by object IDs if provided
+        object_ids = None
         if args.object_ids or args.object_ids_file:
             object_ids = load_object_ids(args.object_ids, args.object_ids_file)
-            rows_before_filter = len(df)
-            # Convert object IDs to strings to match dataframe values
-            df['coadd_object_id_str'] = df['coadd_object_id'].astype(str)
-            df = df[df['coadd_object_id_str'].isin(object_ids)]
-            df = df.drop(columns=['coadd_object_id_str'])
-            rows_after_filter = len(df)
-            logger.info(f"  Filtered by object IDs: {rows_before_filter} → {rows_after_filter} rows")
-            if rows_after_filter == 0:
-                logger.warning(f"⚠️  No matching object IDs found in the data!")
-                logger.warning(f"    Available columns: {list(df.columns) if total_rows > 0 else 'empty'}")
-                return
+
+        fingerprint = catalog_fingerprint(args.parquet_file, dataset)
+        id_index = None
+        if object_ids:
+            index_path = Path(args.id_index) if args.id_index else default_index_path(args.parquet_file)
+            if index_path is not None and index_path.exists():
+                id_index = ObjectIdIndex(index_path)
+                id_index.check_fingerprint(fingerprint)
+                logger.info(f"✓ Object ID index: {id_index.path}")
+            elif args.id_index:
+                raise FileNotFoundError(f"Object ID index not found: {index_path}")
+
+        journal = None
+        if args.resume and args.no_journal:
+            raise ValueError("--resume needs the journal; drop --no-journal")
+        if not args.no_journal:
+            journal = IngestJournal(
+                Path(args.journal),
+                fingerprint,
+                args.mode,
+                selection_key(object_ids, where=args.where),
+                source=str(parquet_file),
+            )
+            logger.info(f"✓ Journal: {journal.path} (fingerprint={journal.fingerprint}, selection={journal.selection})")
+
+        committed = []
+        if args.resume:
+            end = offset + limit if limit is not None else None
+            committed = journal.committed_ranges()
+            resume_offset = first_uncommitted_row(committed, offset)
+            # Committed ranges past the resume point (e.g. batches in flight when the run stopped)
+            committed = [r for r in committed if r[1] >= resume_offset and (end is None or r[0] < end)]
+            logger.info(
+                f"↻ Resuming from row {resume_offset}: skipped {resume_offset - offset} committed rows, "
+                f"{len(committed)} later committed range(s) will be dropped while reading"
+            )
+            offset = resume_offset
+            if end is not None:
+                limit = end - offset
+                if limit <= 0:
+                    logger.info("✓ Nothing left to ingest: every selected row is already committed")
+                    return
+
+        manifest = None
+        if args.skip_unchanged:
+            if args.mode == "insert":
+                raise ValueError("--skip-unchanged applies to --mode update/upsert (insert already skips existing galaxies)")
+            manifest = ContentManifest(Path(args.manifest), config["convex_url"])
+            logger.info(f"✓ Manifest: {manifest.path} (unchanged rows will not be sent)")
+
+        if args.transform_workers > 1 and not args.stream and dataset is None:
+            logger.info("  --transform-workers reads the file row group by row group; enabling --stream")
+            args.stream = True
+        if memory_budget is not None and not args.stream and dataset is None:
+            logger.info("  --max-memory reads the file record batch by record batch; enabling --stream")
+            args.stream = True
+
+        row_filter = partial(select_rows, object_ids=object_ids, committed=committed) if object_ids or committed else None
+        if id_index is not None:
+            # Only the row groups (and the span within them) that hold the requested IDs are read
+            matches, unknown_ids = id_index.lookup(object_ids)
+            parts = id_index.slices(matches, dataset, offset, offset + limit if limit is not None else None)
+            where, where_columns = parse_where(args.where) if args.where else (None, [])
+            df = RowGroupSlices(
+                parts,
+                columns=list(dict.fromkeys([*profile.plan.source_columns, *where_columns])),
+                schema=dataset.schema if dataset is not None else None,
+                where=where,
+                batch_rows=args.stream_batch_rows,
+                row_filter=row_filter,
+            )
+            logger.info(
+                f"✓ {len(matches)} of {len(object_ids)} object IDs found in the index; "
+                f"reading {len(df)} rows from {len(parts)} row group(s)"
+            )
+            if unknown_ids:
+                logger.warning(f"⚠ {len(unknown_ids)} object ID(s) not in the catalog, e.g. {unknown_ids[:5]}")
+        elif dataset is not None:
+            # Always streamed; partitions and row groups that cannot match --where are never decoded
+            df = ParquetDataset(
+                dataset,
+                columns=profile.plan.source_columns,
+                where=args.where,
+                offset=offset,
+                limit=limit,
+                batch_rows=args.stream_batch_rows,
+                row_filter=row_filter,
+            )
+            logger.info(
+                f"✓ Streaming up to {len(df)} rows from {len(df.units())} row group(s) "
+                f"(offset={offset}, limit={limit}, where={args.where!r}; "
+                f"{df.pruned_rows} rows pruned by partitions/statistics)"
+            )
+            if object_ids:
+                logger.info(f"  Filtering by {len(object_ids)} object IDs while streaming")
+        elif args.stream:
+            # Streaming: projected columns, row-group seek to offset, bounded memory
+            df = ParquetStream(
+                parquet_file,
+                columns=profile.plan.source_columns,
+                offset=offset,
+                limit=limit,
+                batch_rows=args.stream_batch_rows,
+                row_filter=row_filter,
+                pre_buffer=memory_budget is None,
+            )
+            logger.info(
+                f"✓ Streaming {len(df)} rows from {parquet_file} "
+                f"(offset={offset}, limit={limit}, batch_rows={args.stream_batch_rows}, "
+                f"columns={len(df.columns)}/{len(profile.plan.source_columns)} mapped)"
+            )
+            if object_ids:
+                logger.info(f"  Filtering by {len(object_ids)} object IDs while streaming (no object ID index)")
+        else:
+            with metrics.stage("read"):
+                df = with_file_row_index(pd.read_parquet(parquet_file))
+            total_rows = len(df)
+            if limit is not None:
+                df = df.iloc[offset:offset+limit]
+            else:
+                df = df.iloc[offset:]
+            logger.info(f"✓ Loaded {len(df)} rows from {parquet_file} (offset={offset}, limit={limit})")
+
+            # Filter by object IDs if provided
+            if object_ids:
+                rows_before_filter = len(df)
+                # Convert object IDs to strings to match dataframe values
+                df = filter_by_object_ids(df, object_ids)
+                rows_after_filter = len(df)
+                logger.info(f"  Filtered by object IDs: {rows_before_filter} → {rows_after_filter} rows")
+                if rows_after_filter == 0:
+                    logger.warning(f"⚠️  No matching object IDs found in the data!")
+                    logger.warning(f"    Available columns: {list(df.columns) if total_rows > 0 else 'empty'}")
+                    return
+            df = drop_committed_rows(df, committed)
         
+        validator = None
+        if args.validate:
+            validator = PreflightValidator(
+                profile.plan,
+                None if args.dry_run else Path(args.reject_file),
+                schema=dataset.schema if dataset is not None else pq.read_schema(parquet_file),
+                memory_budget=memory_budget,
+            )
+            logger.info(f"✓ Pre-flight validation on; rejected rows go to {args.reject_file}" if not args.dry_run
+                        else "✓ Pre-flight validation on (dry run: rejected rows are only counted)")
+
+        if args.transform_workers > 1 and not isinstance(df, pd.DataFrame):
+            df = ParallelTransform(
+                df, profile.path, args.transform_workers, validator=validator,
+                # Within a memory budget, one decoded row group in flight per worker
+                max_pending=args.transform_workers if memory_budget is not None else None,
+            )
+            logger.info(
+                f"  Transforming in {df.workers} processes, one row group per task "
+                f"({len(df.tasks())} row groups)"
+            )
+
         logger.info(f"  Mode: {args.mode}")
         # logger.info("📋 Sample:\n" + df.head().to_string())
 
@@ -714,17 +1653,75 @@ OPERATION MODES:
                 logger.info("❌ Cancelled")
                 return
         
-        # Pass the global offset so error messages show correct row numbers in original file
-        stats = process_parquet(
-            df, 
-            config["convex_url"], 
-            config["ingest_token"], 
-            args.batch_size, 
-            args.dry_run, 
-            args.continue_on_error,
-            global_offset=offset,
-            mode=args.mode
-        )
+        batch_controller = None
+        if args.adaptive_batch:
+            batch_controller = AdaptiveBatchSize(
+                args.batch_size,
+                min_size=args.min_batch_size,
+                max_size=args.max_batch_size,
+                target_latency_sec=args.target_latency,
+            )
+            logger.info(
+                f"  Adaptive batch size: start={batch_controller.size}, "
+                f"range={batch_controller.min_size}-{batch_controller.max_size}, target latency={args.target_latency}s"
+            )
+
+        profiler = start_profiler(args, metrics)
+        stats = None
+        dead_letters = None
+        try:
+            if not args.dry_run:
+                # Opened inside the try so the finally below closes (or discards) it
+                dead_letters = DeadLetterStore(
+                    Path(args.replay or args.dead_letter_file),
+                    args.parquet_file,
+                    args.mode,
+                    schema=dataset.schema if dataset is not None else pq.read_schema(parquet_file),
+                    replay=bool(args.replay),
+                )
+            stats = process_parquet(
+                df, 
+                config["convex_url"], 
+                config["ingest_token"], 
+                args.batch_size, 
+                args.dry_run, 
+                args.continue_on_error,
+                mode=args.mode,
+                concurrency=args.concurrency,
+                compression=args.compression,
+                max_batch_bytes=args.max_batch_bytes,
+                plan=profile.plan,
+                max_poison_rows=args.max_poison_rows,
+                run=IngestRun(
+                    journal=None if args.dry_run else journal,
+                    manifest=manifest,
+                    validator=validator,
+                    metrics=metrics,
+                    memory_budget=memory_budget,
+                    retry_policy=retry_policy,
+                    dead_letters=dead_letters,
+                    rate_limiter=rate_limiter,
+                    batch_controller=batch_controller,
+                ),
+            )
+        finally:
+            finish_profiler(profiler, args, metrics)
+            if dead_letters is not None:
+                if dead_letters.replay and stats is None:
+                    # The replay stopped early: the file still holds every dead letter
+                    dead_letters.discard()
+                else:
+                    dead_letters.close()
+            record_run_sections(metrics, memory_budget, retry_policy.breaker, rate_limiter)
+            if validator is not None:
+                # Rows rejected before a failure are kept
+                validator.close()
+            # Also after a failure: the report shows how far the run got
+            metrics.write()
+        if validator is not None:
+            validator.log_summary()
+        if dead_letters is not None:
+            dead_letters.log_summary()
         
         # Print summary
         logger.info("")
@@ -744,7 +1741,17 @@ OPERATION MODES:
             logger.info(f"Successfully inserted: {stats['inserted']}")
             logger.info(f"Successfully updated: {stats['updated']}")
         
+        if manifest is not None:
+            logger.info(f"Unchanged (not sent): {stats['unchanged']}")
+        if validator is not None:
+            logger.info(f"Rejected by validation (not sent): {stats['rejected']}")
         logger.info(f"Errors: {stats['errors']}")
+        if stats["quarantined"]:
+            logger.warning(f"⚠ Quarantined (failed on their own, not committed): {stats['quarantined']}")
+            for row in stats["poison_rows"][:MAX_LISTED_POISON_ROWS]:
+                logger.warning(f"  global row {row['global_row']}, id {row['id']}: {row['detail']}")
+            if stats["quarantined"] > MAX_LISTED_POISON_ROWS:
+                logger.warning(f"  ... and {stats['quarantined'] - MAX_LISTED_POISON_ROWS} more")
         
         if stats.get("failed_at"):
             logger.error("")
@@ -760,18 +1767,31 @@ OPERATION MODES:
             else:
                 resume_offset = offset
             logger.error(f"  --offset {resume_offset}")
+            if journal is not None:
+                logger.error(f"  or --resume (journal: {journal.path})")
+
+        if journal is not None and not args.dry_run:
+            logger.info(f"Journal: {journal.recorded} committed batch(es) recorded in {journal.path}")
+        log_metrics_summary(metrics)
         
         logger.info("=" * 60)
 
     except RuntimeError as e:
         logger.error(f"❌ Error: {e}")
         logger.error("(Fail-fast stopped ingestion at first failed batch. Use --continue-on-error to continue.)")
+        if not args.no_journal:
+            logger.error(f"(Committed batches are in the journal {args.journal}; rerun with --resume to continue.)")
         sys.exit(1)
     except Exception as e:
         logger.error(f"❌ Error: {e}")
         import traceback
         print(f"\n❌ Exception detail:\n{traceback.format_exc()}\n")
         sys.exit(1)
+    finally:
+        if journal is not None:
+            journal.close()
+        if manifest is not None:
+            manifest.close()
 
 
 if __name__ == "__main__":
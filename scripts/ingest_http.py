@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+HTTP transport helpers for the galaxy ingest scripts.
+
+- one pooled keep-alive `requests.Session` shared by every ingest call, so
+  batches reuse TCP+TLS connections instead of paying a handshake each time
+- JSON request bodies optionally compressed with gzip or deflate
+  (`Content-Encoding`); `ingestGalaxiesHttp` in convex/galaxies/batch_ingest.ts
+  decompresses them
+- JSON encoding with orjson when it is installed (stdlib json otherwise), and
+  ingest bodies assembled from per-galaxy fragments that were already encoded
+  while the batch was built, so nothing is serialized twice
+- both encoders follow one rule for NaN and +/-inf, which JSON cannot
+  represent: they are written as null (orjson's behavior; the stdlib encoder
+  would write the invalid token Infinity). The columnar plan already drops
+  non-finite floats from galaxies (ingest_mapping), so this only matters for
+  values built elsewhere
+"""
+
+import gzip
+import json
+import math
+import threading
+import zlib
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used instead
+    orjson = None
+
+
+COMPRESSION_CHOICES = ("none", "gzip", "deflate")
+DEFAULT_POOL_SIZE = 10
+COMPRESSION_LEVEL = 6
+
+_session: Optional[requests.Session] = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """Return the shared keep-alive session, growing its connection pool to `pool_size` if needed."""
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is None or pool_size > _session_pool_size:
+            session = _session or requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+            _session_pool_size = pool_size
+        return _session
+
+
+def describe_body(body: bytes, compression: str = "none") -> str:
+    """Short size description for logs, e.g. '12.3 KB gzip'."""
+    suffix = f" {compression}" if compression != "none" else ""
+    return f"{len(body) / 1024:.1f} KB{suffix}"
+
+
+def _finite_or_none(value: Any) -> Any:
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite_or_none(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite_or_none(v) for v in value]
+    return value
+
+
+def encode_json(value: Any) -> bytes:
+    """Compact UTF-8 JSON encoding of `value` (orjson if available); NaN and +/-inf become null either way."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    try:
+        return json.dumps(value, separators=(",", ":"), allow_nan=False).encode("utf-8")
+    except ValueError:
+        # Rare: walk the value only when it holds a non-finite float
+        return json.dumps(_finite_or_none(value), separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def decode_json(data: bytes) -> Any:
+    """Inverse of encode_json."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def build_ingest_body(fragments: Sequence[bytes], mode: Optional[str] = None) -> bytes:
+    """Assemble an `/ingest/galaxies` JSON body from pre-encoded galaxy fragments."""
+    body = b'{"galaxies":[' + b",".join(fragments) + b"]"
+    if mode is not None:
+        body += b',"mode":' + encode_json(mode)
+    return body + b"}"
+
+
+def encode_json_body(payload: Any, compression: str = "none") -> Tuple[bytes, Dict[str, str]]:
+    """
+    Serialize payload to JSON and optionally compress it.
+
+    Returns:
+        (body bytes, extra headers to send with it)
+    """
+    return compress_body(encode_json(payload), compression)
+
+
+def compress_body(raw: bytes, compression: str = "none") -> Tuple[bytes, Dict[str, str]]:
+    """Compress an encoded JSON body; returns (body bytes, extra headers to send with it)."""
+    if compression == "gzip":
+        return gzip.compress(raw, compresslevel=COMPRESSION_LEVEL), {"Content-Encoding": "gzip"}
+    if compression == "deflate":
+        # HTTP "deflate" is the zlib-wrapped format
+        return zlib.compress(raw, COMPRESSION_LEVEL), {"Content-Encoding": "deflate"}
+    if compression != "none":
+        raise ValueError(f"Unsupported compression: {compression}")
+    return raw, {}
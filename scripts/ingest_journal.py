@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Durable checkpoint journal for the galaxy ingest scripts.
+
+Every batch the server reports as committed is written to a local SQLite
+database (WAL mode, synchronous=FULL) together with the parquet file
+fingerprint, the mode, the row selection, the file row ranges it covered and the
+server's inserted/skipped/updated/notFound counts. `--resume` reads the journal
+back: the committed prefix from `--offset` is skipped by seeking past it, and
+committed ranges further on (e.g. batches that were in flight when a run
+stopped) are dropped before they are transformed or sent.
+
+Row numbers are positions in the parquet file (or in the sorted files of a
+dataset), independent of `--offset`.
+"""
+
+import hashlib
+import sqlite3
+import struct
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_JOURNAL_PATH = ".ingest_journal.sqlite"
+
+RowRange = Tuple[int, int]  # inclusive file row range
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    selection TEXT NOT NULL,
+    source TEXT,
+    batch_num INTEGER,
+    rows INTEGER NOT NULL,
+    inserted INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    updated INTEGER NOT NULL DEFAULT 0,
+    not_found INTEGER NOT NULL DEFAULT 0,
+    committed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_ranges (
+    batch_id INTEGER NOT NULL REFERENCES batches(id),
+    row_start INTEGER NOT NULL,
+    row_end INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_batches_run ON batches (fingerprint, mode, selection);
+CREATE INDEX IF NOT EXISTS idx_batch_ranges_batch ON batch_ranges (batch_id);
+"""
+
+
+# --------------------------------------------------------------------------------------
+# Fingerprints / selections
+# --------------------------------------------------------------------------------------
+def file_fingerprint(path: Path) -> str:
+    """
+    Identify a parquet file by its size and footer (schema, row groups, statistics).
+
+    Reads only the footer, so it is cheap for multi-GB files and stable across copies.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        if size >= 12:
+            f.seek(size - 8)
+            tail = f.read(8)
+            footer_len = struct.unpack("<I", tail[:4])[0] if tail[4:] == b"PAR1" else 0
+            footer_len = min(footer_len, size - 8)
+            f.seek(size - 8 - footer_len)
+            digest.update(f.read(footer_len + 8))
+        else:
+            digest.update(f.read())
+    return digest.hexdigest()[:32]
+
+
+def dataset_fingerprint(paths: Sequence[Path]) -> str:
+    """Identify a multi-file dataset by the sorted names and fingerprints of its files."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        digest.update(f"{path.name}:{file_fingerprint(path)}\n".encode())
+    return f"ds:{digest.hexdigest()[:29]}"
+
+
+def selection_key(object_ids: Optional[Iterable[str]] = None, where: Optional[str] = None) -> str:
+    """Key for the row selection applied on top of the input ('all', object IDs and/or --where)."""
+    parts = []
+    if object_ids:
+        digest = hashlib.sha256("\n".join(sorted(object_ids)).encode())
+        parts.append(f"ids:{digest.hexdigest()[:16]}")
+    if where:
+        digest = hashlib.sha256(" ".join(where.split()).encode())
+        parts.append(f"where:{digest.hexdigest()[:16]}")
+    return "+".join(parts) or "all"
+
+
+# --------------------------------------------------------------------------------------
+# Row ranges
+# --------------------------------------------------------------------------------------
+def rows_to_ranges(rows: Sequence[int]) -> List[RowRange]:
+    """Compress file row numbers into sorted inclusive ranges."""
+    ranges: List[RowRange] = []
+    for row in sorted(rows):
+        if ranges and row <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], row))
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
+def merge_ranges(ranges: Iterable[RowRange]) -> List[RowRange]:
+    merged: List[RowRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def first_uncommitted_row(ranges: List[RowRange], offset: int) -> int:
+    """Advance `offset` past the committed ranges that cover it (ranges must be merged)."""
+    for start, end in ranges:
+        if start <= offset <= end:
+            offset = end + 1
+        elif start > offset:
+            break
+    return offset
+
+
+def rows_in_ranges(rows: np.ndarray, ranges: List[RowRange]) -> np.ndarray:
+    """Boolean mask: which of `rows` fall inside the (merged) ranges."""
+    if not ranges or len(rows) == 0:
+        return np.zeros(len(rows), dtype=bool)
+    starts = np.fromiter((r[0] for r in ranges), dtype=np.int64, count=len(ranges))
+    ends = np.fromiter((r[1] for r in ranges), dtype=np.int64, count=len(ranges))
+    pos = np.searchsorted(starts, rows, side="right") - 1
+    valid = pos >= 0
+    mask = np.zeros(len(rows), dtype=bool)
+    mask[valid] = rows[valid] <= ends[pos[valid]]
+    return mask
+
+
+def drop_committed_rows(frame: pd.DataFrame, ranges: List[RowRange]) -> pd.DataFrame:
+    """Drop rows whose file row number (frame index) is already committed."""
+    if not ranges:
+        return frame
+    return frame[~rows_in_ranges(frame.index.to_numpy(dtype=np.int64), ranges)]
+
+
+# --------------------------------------------------------------------------------------
+# Journal
+# --------------------------------------------------------------------------------------
+class IngestJournal:
+    """SQLite journal of committed batches for one (file, mode, selection) run."""
+
+    def __init__(self, path: Path, fingerprint: str, mode: str, selection: str = "all", source: Optional[str] = None):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.mode = mode
+        self.selection = selection
+        self.source = source
+        self.recorded = 0
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def record_batch(self, batch_num: int, file_rows: Sequence[int], counts: Dict[str, int]) -> None:
+        """Durably record one committed batch (one SQLite transaction)."""
+        with self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO batches (fingerprint, mode, selection, source, batch_num, rows, "
+                "inserted, skipped, updated, not_found, committed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.fingerprint, self.mode, self.selection, self.source, batch_num, len(file_rows),
+                    int(counts.get("inserted", 0)), int(counts.get("skipped", 0)),
+                    int(counts.get("updated", 0)), int(counts.get("not_found", 0)),
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+            self._conn.executemany(
+                "INSERT INTO batch_ranges (batch_id, row_start, row_end) VALUES (?, ?, ?)",
+                [(cur.lastrowid, start, end) for start, end in rows_to_ranges(file_rows)],
+            )
+        self.recorded += 1
+
+    def committed_ranges(self) -> List[RowRange]:
+        """Merged file row ranges already committed for this run key."""
+        rows = self._conn.execute(
+            "SELECT r.row_start, r.row_end FROM batch_ranges r JOIN batches b ON b.id = r.batch_id "
+            "WHERE b.fingerprint = ? AND b.mode = ? AND b.selection = ?",
+            (self.fingerprint, self.mode, self.selection),
+        ).fetchall()
+        return merge_ranges(rows)
+
+    def totals(self) -> Dict[str, int]:
+        row = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(rows), 0), COALESCE(SUM(inserted), 0), COALESCE(SUM(skipped), 0), "
+            "COALESCE(SUM(updated), 0), COALESCE(SUM(not_found), 0) FROM batches "
+            "WHERE fingerprint = ? AND mode = ? AND selection = ?",
+            (self.fingerprint, self.mode, self.selection),
+        ).fetchone()
+        keys = ("batches", "rows", "inserted", "skipped", "updated", "not_found")
+        return dict(zip(keys, row))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the multiband ingester against the local stand-in server.
+
+Starts an IngestTestServer (ingest_test_server.py) with the given latency and
+fault profile, generates a catalog with the real multiband columns
+(ingest_benchmark.ensure_catalog, cached in --catalog-dir), and runs
+ingest_galaxies_from_file_multiband_fit.py against it as a subprocess, exactly
+as from the command line. Options after `--` go to the ingester:
+
+    python scripts/ingest_load_test.py --rows 100k --latency lognormal:0.2,0.5 \\
+        --fail-rate 0.05 --html-rate 0.5 -- --concurrency 4 --adaptive-batch
+
+Afterwards it reports the end-to-end throughput, the ingester's stage
+breakdown and request latencies (from its --report-json) and the server's
+counters, and checks that the run is consistent: the ingester finished, every
+row was accounted for, and the server holds exactly the galaxies of the
+catalog (insert/upsert into an empty server). The exit status is 1 if a check
+fails; --expect-failure inverts the first check for fail-fast scenarios.
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Also sets up the shared logger (stdout), through the ingester module
+from ingest_benchmark import DEFAULT_CATALOG_DIR, DEFAULT_PROFILE, ensure_catalog, parse_sizes
+from ingest_memory import format_size
+from ingest_profiles import load_profile
+from ingest_test_server import IngestTestServer, add_server_arguments, fault_profile_from_args
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+INGEST_SCRIPT = Path(__file__).resolve().parent / "ingest_galaxies_from_file_multiband_fit.py"
+DEFAULT_ROWS = "20k"
+
+
+def run_ingester(url: str, token: str, catalog: Path, mode: str, extra: List[str], workdir: Path) -> Tuple[int, float, Path]:
+    """Run the ingester to completion; returns (exit status, wall seconds, log path)."""
+    report = workdir / "report.json"
+    log_path = workdir / "ingest.log"
+    command = [
+        sys.executable, str(INGEST_SCRIPT),
+        "--parquet-file", str(catalog),
+        "--convex-http-actions-url", url,
+        "--ingest-token", token,
+        "--mode", mode,
+        "--journal", str(workdir / "journal.sqlite"),
+        "--manifest", str(workdir / "manifest.sqlite"),
+        "--reject-file", str(workdir / "rejects.parquet"),
+        "--dead-letter-file", str(workdir / "dead_letters.parquet"),
+        # A fresh rate limiter per run; a reused port would otherwise inherit an earlier run's rate
+        "--rate-state-file", str(workdir / "rate.json"),
+        "--report-json", str(report),
+        *extra,
+    ]
+    logger.info(f"▶ {' '.join(command[1:])}")
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        # Answers the confirmation prompts (batch size warning, proceed)
+        proc = subprocess.run(command, input="y\ny\n", stdout=log, stderr=subprocess.STDOUT, text=True)
+    return proc.returncode, time.perf_counter() - started, log_path
+
+
+def check_run(mode: str, rows: int, returncode: int, expect_failure: bool, report: Dict[str, Any], server: Dict[str, Any]) -> List[Tuple[str, bool]]:
+    """(description, passed) for each consistency check."""
+    counts = report.get("server_counts", {})
+    rejected = report.get("counters", {}).get("rows_rejected", 0)
+    # Isolated by bisecting rolled-back batches (e.g. --poison-ids); never stored
+    quarantined = report.get("counters", {}).get("rows_quarantined", 0)
+    checks = [(f"ingester exited with status {returncode}" + (" (failure expected)" if expect_failure else ""),
+               (returncode != 0) == expect_failure)]
+    if returncode == 0 and mode in ("insert", "upsert"):
+        accounted = sum(counts.get(key, 0) for key in ("inserted", "skipped", "updated")) + rejected + quarantined
+        checks.append((f"{accounted} of {rows} rows accounted for by the server's replies (or rejected/quarantined)",
+                       accounted == rows))
+        checks.append((f"server stores {server['stored']} galaxies, {rows - rejected - quarantined} expected",
+                       server["stored"] == rows - rejected - quarantined))
+    if mode in ("insert", "upsert"):
+        # Every stored galaxy was reported as inserted, unless its batch failed ambiguously (stored, then retried)
+        ambiguous = server.get("ambiguous_inserted", 0)
+        checks.append((f"server stores {server['stored']} = {counts.get('inserted', 0)} reported inserted "
+                       f"+ {ambiguous} committed by ambiguous failures",
+                       server["stored"] == counts.get("inserted", 0) + ambiguous))
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-test the multiband ingester against the local stand-in server",
+        usage="%(prog)s [options] [-- ingester options]",
+    )
+    parser.add_argument("--rows", default=DEFAULT_ROWS, help=f"Catalog size, e.g. 20k or 1M (default: {DEFAULT_ROWS})")
+    parser.add_argument("--mapping-profile", default=DEFAULT_PROFILE,
+                        help=f"Mapping profile of the generated catalog (default: {DEFAULT_PROFILE})")
+    parser.add_argument("--catalog-dir", default=DEFAULT_CATALOG_DIR,
+                        help=f"Where generated catalogs are cached (default: {DEFAULT_CATALOG_DIR})")
+    parser.add_argument("--mode", choices=["insert", "update", "upsert"], default="insert",
+                        help="Ingest mode (default: insert)")
+    parser.add_argument("--expect-failure", action="store_true",
+                        help="The ingester is expected to stop with an error (e.g. --poison-ids with --max-poison-rows 0)")
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory (log, report, journal)")
+    add_server_arguments(parser)
+    argv = sys.argv[1:]
+    extra: List[str] = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, extra = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = parse_sizes(args.rows)
+        if len(sizes) != 1:
+            raise ValueError("--rows takes a single size")
+        rows = sizes[0]
+        catalog = ensure_catalog(rows, load_profile(args.mapping_profile), Path(args.catalog_dir))
+        server = IngestTestServer(token=args.token, faults=fault_profile_from_args(args), export_token=args.export_token).start()
+    except Exception as e:
+        logger.error(f"❌ Error: {e}")
+        sys.exit(1)
+
+    workdir = Path(tempfile.mkdtemp(prefix="ingest_load_"))
+    try:
+        logger.info(f"✓ Stand-in server on {server.url}; catalog {catalog} ({rows} rows)")
+        returncode, seconds, log_path = run_ingester(server.url, args.token, catalog, args.mode, extra, workdir)
+        server_stats = server.stats()
+    finally:
+        server.stop()
+
+    report_path = workdir / "report.json"
+    report = json.loads(report_path.read_text(encoding="utf-8")) if report_path.exists() else {}
+    if returncode != 0:
+        tail = log_path.read_text(encoding="utf-8").splitlines()[-15:]
+        logger.warning("⚠ Ingester output (last lines):\n" + "\n".join(tail))
+
+    logger.info("=" * 60)
+    logger.info(f"LOAD TEST ({rows} rows, mode={args.mode})")
+    logger.info("=" * 60)
+    logger.info(f"End-to-end: {seconds:.1f}s, {rows / max(seconds, 1e-9):.0f} rows/s (including process start and read)")
+    if report:
+        logger.info(f"Ingester:   {report['rows_per_second']:.0f} rows/s; stages: " + ", ".join(
+            f"{name} {sec:.1f}s" for name, sec in sorted(report["stages_seconds"].items(), key=lambda item: -item[1])
+        ))
+        for h in report.get("request_latency", []):
+            mean = h["sum_seconds"] / max(h["count"], 1)
+            logger.info(f"  requests status={h['status']} retries={h['retries']}: {h['count']} (mean {mean:.3f}s)")
+        logger.info(f"  server counts: {report.get('server_counts', {})}")
+        if report.get("peak_rss_bytes") is not None:
+            logger.info(f"  peak RSS: {format_size(report['peak_rss_bytes'])}")
+    logger.info(f"Server:     {json.dumps(server_stats, sort_keys=True)}")
+
+    checks = check_run(args.mode, rows, returncode, args.expect_failure, report, server_stats)
+    for description, passed in checks:
+        logger.info(f"  {'✓' if passed else '❌'} {description}")
+    if args.keep:
+        logger.info(f"Work directory: {workdir}")
+    else:
+        for path in sorted(workdir.iterdir()):
+            path.unlink()
+        workdir.rmdir()
+    logger.info("=" * 60)
+    if not all(passed for _, passed in checks):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Content-hash manifest for `--mode update` / `--mode upsert` re-runs.
+
+Each committed galaxy payload (the object built by `row_to_galaxy`) is hashed
+and stored in a local SQLite manifest keyed by deployment URL and galaxy id
+(`coadd_object_id`). On later runs `ContentManifest.filter_changed` drops rows
+whose payload hash is unchanged, so only new or modified galaxies trigger
+`updateGalaxy` and its aggregate maintenance on the server.
+
+The manifest only knows what this machine sent: after edits made through other
+paths (web UI, another ingest host) run once without `--skip-unchanged`.
+"""
+
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+
+DEFAULT_MANIFEST_PATH = ".ingest_manifest.sqlite"
+LOOKUP_CHUNK = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS content_hashes (
+    target TEXT NOT NULL,
+    galaxy_id TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (target, galaxy_id)
+) WITHOUT ROWID;
+"""
+
+
+def content_hash(galaxy: Dict[str, Any]) -> bytes:
+    """Stable 128-bit hash of a galaxy payload (key order independent)."""
+    encoded = json.dumps(galaxy, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+def galaxy_id(galaxy: Dict[str, Any]) -> str:
+    return galaxy.get("galaxy", {}).get("id")
+
+
+class ContentManifest:
+    """SQLite manifest of the last committed payload hash per galaxy for one deployment."""
+
+    def __init__(self, path: Path, target: str):
+        self.path = Path(path)
+        self.target = target
+        self.unchanged = 0
+        self.recorded = 0
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _lookup(self, ids: Sequence[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._conn.execute(
+                f"SELECT galaxy_id, hash FROM content_hashes WHERE target = ? AND galaxy_id IN ({placeholders})",
+                (self.target, *part),
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    def filter_changed(self, items: Iterable[Tuple[Any, ...]]) -> Iterator[Tuple[Any, ...]]:
+        """
+        Pass through (file row, galaxy, ...) tuples whose payload is new or changed; count the rest.
+        """
+        pending: List[Tuple[Any, ...]] = []
+
+        def flush():
+            known = self._lookup([galaxy_id(item[1]) for item in pending if galaxy_id(item[1]) is not None])
+            for item in pending:
+                galaxy = item[1]
+                previous = known.get(galaxy_id(galaxy))
+                if previous is not None and previous == content_hash(galaxy):
+                    self.unchanged += 1
+                    continue
+                yield item
+
+        for item in items:
+            pending.append(item)
+            if len(pending) >= LOOKUP_CHUNK:
+                yield from flush()
+                pending = []
+        if pending:
+            yield from flush()
+
+    def record(self, galaxies: Sequence[Dict[str, Any]]) -> None:
+        """Store the hashes of committed galaxy payloads."""
+        now = datetime.now(timezone.utc).isoformat()
+        rows = [
+            (self.target, galaxy_id(g), content_hash(g), now)
+            for g in galaxies if galaxy_id(g) is not None
+        ]
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO content_hashes (target, galaxy_id, hash, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        self.recorded += len(rows)
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Shared mapping helpers for the galaxy ingest scripts.
+
+The ingest scripts describe the payload sent to /ingest/galaxies with a
+NESTED_COLUMN_MAPPING dict (database schema -> (parquet column, cast)), loaded
+from a mapping profile (see ingest_profiles.py). Walking
+that dict for every row (`extract_nested`) costs a `pd.notna` check and a Python
+cast per cell. `ColumnarPlan` compiles the mapping once and does the casting and
+null masking per column, so the per-row work is reduced to assembling dicts from
+already-cast values.
+
+The output of `ColumnarPlan.transform` is identical to calling the scripts'
+`row_to_galaxy` on every row, except for +/-inf in a float column: JSON has no
+encoding for it, so the plan leaves the field out (as for a null, with the
+cast-failure warning) where row_to_galaxy would keep the value.
+"""
+
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+# --------------------------------------------------------------------------------------
+# Casts
+# --------------------------------------------------------------------------------------
+def str_or_int_to_str(val):
+    """Special casting: first to int, then to string."""
+    try:
+        return str(int(val))
+    except Exception:
+        return str(val)
+
+
+def _cast_float(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype("float64")
+    floats = pd.to_numeric(values, errors="coerce").astype("float64")
+    # +/-inf has no JSON encoding: treated as a failed cast, so the field is left out like a null
+    return floats.where(~np.isinf(floats.to_numpy()), np.nan)
+
+
+def _cast_bool(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype(bool)
+    if pd.api.types.is_numeric_dtype(values):
+        return values != 0
+    return values.map(bool)
+
+
+def _cast_str(values: pd.Series) -> pd.Series:
+    return values.astype(str)
+
+
+# Floats at or above 2**63 do not fit int64; str(int(val)) is exact for them
+_INT64_LIMIT = float(2 ** 63)
+
+
+def _cast_str_or_int_to_str(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        # Straight to decimal strings: uint64 ids above 2**63 would wrap through int64
+        return values.astype(str)
+    if pd.api.types.is_float_dtype(values):
+        floats = values.to_numpy(dtype="float64")
+        fits = np.isfinite(floats) & (np.abs(floats) < _INT64_LIMIT)
+        if fits.all():
+            return values.astype("int64").astype(str)
+        out = values.map(str_or_int_to_str)
+        out[fits] = values[fits].astype("int64").astype(str)
+        return out
+    return values.map(str_or_int_to_str)
+
+
+def id_strings(values: pd.Series) -> pd.Series:
+    """Object IDs as the strings galaxies are stored under (str_or_int_to_str), None for nulls."""
+    out = np.full(len(values), None, dtype=object)
+    present = values.notna().to_numpy()
+    if present.any():
+        out[present] = _cast_str_or_int_to_str(values[present]).to_numpy(dtype=object)
+    return pd.Series(out, index=values.index, dtype=object)
+
+
+# Vectorized equivalents of the cast functions used in NESTED_COLUMN_MAPPING.
+# Any other cast falls back to an element-wise map over the non-null values.
+VECTORIZED_CASTS: Dict[Callable, Callable[[pd.Series], pd.Series]] = {
+    float: _cast_float,
+    bool: _cast_bool,
+    str: _cast_str,
+    str_or_int_to_str: _cast_str_or_int_to_str,
+}
+
+
+def _cast_elementwise(values: pd.Series, cast_fn: Callable) -> pd.Series:
+    def _apply(val):
+        try:
+            return cast_fn(val)
+        except Exception:
+            return None
+    return values.map(_apply)
+
+
+# --------------------------------------------------------------------------------------
+# Split-object assembly
+# --------------------------------------------------------------------------------------
+GALAXY_CORE_KEYS = [
+    'id', 'ra', 'dec', 'reff', 'reff_pixels', 'q', 'pa', 'nucleus', 'isActive', 'redshift_x', 'redshift_y', 'x', 'y', 'misc'
+]
+
+
+def split_nested(nested: Dict[str, Any]) -> Dict[str, Any]:
+    """Build split-object representation expected by new ingestion API from a nested dict."""
+    # Core galaxy fields
+    galaxy_core = {k: nested.get(k) for k in GALAXY_CORE_KEYS if k in nested}
+    # Photometry bands
+    phot = nested.get('photometry', {})
+    g_ser = phot.get('g', {}).get('sersic')
+    r_ser = phot.get('r', {}).get('sersic')
+    i_ser = phot.get('i', {}).get('sersic')
+    photometryBand = {'sersic': g_ser} if g_ser else None
+    photometryBandR = {'sersic': r_ser} if r_ser else None
+    photometryBandI = {'sersic': i_ser} if i_ser else None
+    # Source extractor unified
+    def se_band(b):
+        return phot.get(b, {}).get('source_extractor', {}) if phot.get(b) else {}
+    source_extractor = {
+        'g': se_band('g'),
+        'r': se_band('r'),
+        'i': se_band('i'),
+    }
+    y_se = se_band('y') if phot.get('y') else None
+    z_se = se_band('z') if phot.get('z') else None
+    if y_se: source_extractor['y'] = y_se
+    if z_se: source_extractor['z'] = z_se
+    # Remove empty dict bands
+    if not any(v for k, v in source_extractor.items() if isinstance(v, dict) and v):
+        source_extractor_out = None
+    else:
+        source_extractor_out = source_extractor
+    # Thuruthipilly
+    thuru = nested.get('thuruthipilly') or None
+    obj = {
+        'galaxy': galaxy_core,
+        'photometryBand': photometryBand,
+        'photometryBandR': photometryBandR,
+        'photometryBandI': photometryBandI,
+        'sourceExtractor': source_extractor_out,
+        'thuruthipilly': thuru,
+    }
+    return {k: v for k, v in obj.items() if v is not None}
+
+
+# --------------------------------------------------------------------------------------
+# Columnar plan
+# --------------------------------------------------------------------------------------
+# A compiled node is a pair (leaves, groups):
+#   leaves: list of (key, column index)
+#   groups: list of (key, compiled node)
+_Node = Tuple[List[Tuple[str, int]], List[Tuple[str, Any]]]
+
+
+class ColumnarPlan:
+    """NESTED_COLUMN_MAPPING compiled once into a per-column transform."""
+
+    def __init__(self, mapping: Dict[str, Any]):
+        self.mapping = mapping
+        self.columns: List[str] = []
+        self.casts: List[Callable] = []
+        self._column_index: Dict[Tuple[str, Callable], int] = {}
+        self._tree = self._compile(mapping)
+        self._bound: Dict[frozenset, _Node] = {}
+
+    def _compile(self, mapping: Dict[str, Any]) -> _Node:
+        leaves: List[Tuple[str, int]] = []
+        groups: List[Tuple[str, Any]] = []
+        for key, colmap in mapping.items():
+            if isinstance(colmap, dict):
+                groups.append((key, self._compile(colmap)))
+            elif isinstance(colmap, tuple):
+                colname, cast_fn = colmap
+                if colname is None:
+                    continue
+                slot = (colname, cast_fn)
+                if slot not in self._column_index:
+                    self._column_index[slot] = len(self.columns)
+                    self.columns.append(colname)
+                    self.casts.append(cast_fn)
+                leaves.append((key, self._column_index[slot]))
+        return leaves, groups
+
+    @property
+    def source_columns(self) -> List[str]:
+        """Distinct parquet columns referenced by the mapping, in mapping order."""
+        return list(dict.fromkeys(self.columns))
+
+    def _bind(self, present: frozenset) -> _Node:
+        """Drop leaves whose column is missing from the frame (cached per column set)."""
+        bound = self._bound.get(present)
+        if bound is None:
+            def prune(node: _Node) -> _Node:
+                leaves, groups = node
+                kept_leaves = [(k, idx) for k, idx in leaves if self.columns[idx] in present]
+                kept_groups = [(k, prune(child)) for k, child in groups]
+                kept_groups = [(k, child) for k, child in kept_groups if child[0] or child[1]]
+                return kept_leaves, kept_groups
+            bound = prune(self._tree)
+            self._bound[present] = bound
+        return bound
+
+    def _column_values(self, df: pd.DataFrame, idx: int) -> List[Any]:
+        """Cast one column and return a list of native Python values with None for nulls."""
+        colname, cast_fn = self.columns[idx], self.casts[idx]
+        values = df[colname]
+        mask = values.notna()
+        if not mask.any():
+            return [None] * len(values)
+
+        vectorized = VECTORIZED_CASTS.get(cast_fn)
+        non_null = values[mask]
+        casted = vectorized(non_null) if vectorized else _cast_elementwise(non_null, cast_fn)
+
+        failed = casted.isna()
+        if failed.any():
+            sample = non_null[failed].iloc[0]
+            logger.warning(f"⚠ Failed casting {colname} for {int(failed.sum())} value(s), e.g. {sample!r}")
+
+        out = np.full(len(values), None, dtype=object)
+        out[mask.to_numpy()] = casted.astype(object).where(~failed, None).to_numpy()
+        return out.tolist()
+
+    def transform(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Transform a frame into split galaxy objects (same output as row_to_galaxy per row)."""
+        n = len(df)
+        if n == 0:
+            return []
+        tree = self._bind(frozenset(df.columns))
+        columns = [self._column_values(df, idx) if colname in df.columns else None
+                   for idx, colname in enumerate(self.columns)]
+        columns = [col if col is not None else [None] * n for col in columns]
+
+        def build(node: _Node, row: Tuple[Any, ...]) -> Dict[str, Any]:
+            leaves, groups = node
+            obj: Dict[str, Any] = {}
+            for key, idx in leaves:
+                val = row[idx]
+                if val is not None:
+                    obj[key] = val
+            for key, child in groups:
+                nested_obj = build(child, row)
+                if nested_obj:
+                    obj[key] = nested_obj
+            return obj
+
+        return [split_nested(build(tree, row)) for row in zip(*columns)]
+
+    def iter_galaxies(self, df: pd.DataFrame, chunk_rows: int = 10000) -> Iterator[Dict[str, Any]]:
+        """Yield split galaxy objects for each row, transforming `chunk_rows` rows at a time."""
+        for start in range(0, len(df), chunk_rows):
+            yield from self.transform(df.iloc[start:start + chunk_rows])
+
+    def iter_indexed(self, df: pd.DataFrame, chunk_rows: int = 10000) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """Like iter_galaxies, but yields (index label, galaxy) pairs."""
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            yield from zip(chunk.index.tolist(), self.transform(chunk))
+
+
+def compile_mapping(mapping: Dict[str, Any]) -> ColumnarPlan:
+    """Compile a NESTED_COLUMN_MAPPING dict into a reusable columnar plan."""
+    return ColumnarPlan(mapping)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Memory budget for the galaxy ingest scripts (`--max-memory`).
+
+Streaming already keeps one record batch of the catalog in memory, but the
+stages in between have no notion of size: a fast reader can run ahead of a slow
+transform, and at high --concurrency the batches waiting for the server (each
+galaxy both as a dict and as encoded JSON) add up. With a budget:
+- `MemoryBudget` splits what is left of the limit above the process's current
+  RSS (interpreter, pandas, pyarrow) and the reader's own buffers into
+  read-ahead, in-flight and working memory, and shrinks the record batch size
+  so one frame's transform fits; parquet files are then read without
+  pre-buffering (ParquetStream(pre_buffer=False)), which otherwise holds
+  several row groups' column chunks
+- `read_ahead` reads frames on a separate thread into a `ByteBoundedQueue`:
+  the reader blocks while the queued frames exceed their share, and also while
+  the process as a whole is over the limit, so a slow transform or sender
+  stops the reader instead of piling up frames
+- OrderedBatchSender (ingest_sender) blocks new submissions while the batches
+  in flight exceed theirs
+
+The limit is a target for this process's resident set, not a hard cap: a single
+frame or batch is always admitted, and `--transform-workers` processes are
+outside it (they are bounded by their row-group queue; see ingest_parallel).
+`peak_rss` reports the high-water mark for the run summary.
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+from collections import deque
+from typing import Any, Deque, Iterable, Iterator, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+# Shares of the memory above the baseline RSS
+READ_AHEAD_SHARE = 0.25
+IN_FLIGHT_SHARE = 0.25
+# The rest is the working set: the frame being transformed, its galaxy dicts, the batch being built
+
+# Reading: pyarrow's decode buffers and memory pool plus lazily loaded code (~40-50 MiB without pre-buffering)
+READER_OVERHEAD_BYTES = 48 * 1024 ** 2
+# Transform working memory per row of a frame (galaxy dicts plus temporaries; ~11 KiB measured, multiband profile)
+WORKING_BYTES_PER_ROW = 12 * 1024
+# In-memory size of a built batch relative to its encoded JSON (dicts plus fragments)
+BATCH_MEMORY_FACTOR = 4
+MIN_BATCH_ROWS = 500
+MIN_AVAILABLE_BYTES = 32 * 1024 ** 2
+
+_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text: str) -> int:
+    """Bytes of a size like '2G', '512M', '1.5GiB' or '1000000' (binary units)."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*", str(text).upper())
+    if not match:
+        raise ValueError(f"Invalid size '{text}' (expected e.g. 512M, 2G)")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+
+def format_size(n: Optional[float]) -> str:
+    if n is None:
+        return "n/a"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (None where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def peak_rss(children: bool = False) -> Optional[int]:
+    """High-water RSS of this process (or of its finished child processes) in bytes."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # kilobytes on Linux, bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+class MemoryBudget:
+    """Split of a memory limit over the pipeline's queues (`limit - baseline - READER_OVERHEAD_BYTES`)."""
+
+    def __init__(self, limit: int, baseline: Optional[int] = None):
+        self.limit = limit
+        self.baseline = baseline if baseline is not None else (current_rss() or 0)
+        available = limit - self.baseline - READER_OVERHEAD_BYTES
+        if available < MIN_AVAILABLE_BYTES:
+            raise ValueError(
+                f"--max-memory {format_size(limit)} is too small: the process uses {format_size(self.baseline)} "
+                f"and reading needs about {format_size(READER_OVERHEAD_BYTES)}; at least "
+                f"{format_size(self.baseline + READER_OVERHEAD_BYTES + MIN_AVAILABLE_BYTES)} is needed"
+            )
+        self.read_ahead_bytes = int(available * READ_AHEAD_SHARE)
+        self.in_flight_bytes = int(available * IN_FLIGHT_SHARE)
+        self.working_bytes = available - self.read_ahead_bytes - self.in_flight_bytes
+        self.throttled = 0
+
+    def batch_rows(self, requested: int) -> int:
+        """Record batch size whose transform fits the working memory (at most `requested`)."""
+        return max(MIN_BATCH_ROWS, min(requested, self.working_bytes // WORKING_BYTES_PER_ROW))
+
+    def over_limit(self) -> bool:
+        rss = current_rss()
+        return rss is not None and rss > self.limit
+
+    def describe(self) -> str:
+        return (
+            f"limit {format_size(self.limit)}, baseline {format_size(self.baseline)}: "
+            f"read-ahead {format_size(self.read_ahead_bytes)}, in flight {format_size(self.in_flight_bytes)}, "
+            f"working {format_size(self.working_bytes)}"
+        )
+
+    def summary(self) -> dict:
+        """Section for the run report."""
+        return {
+            "memory": {
+                "limit_bytes": self.limit,
+                "baseline_bytes": self.baseline,
+                "read_ahead_bytes": self.read_ahead_bytes,
+                "in_flight_bytes": self.in_flight_bytes,
+                "working_bytes": self.working_bytes,
+                "reader_throttled": self.throttled,
+            }
+        }
+
+
+# --------------------------------------------------------------------------------------
+# Read-ahead
+# --------------------------------------------------------------------------------------
+_DONE = object()
+
+
+class ByteBoundedQueue:
+    """FIFO queue bounded by the total size of its items; one item is always admitted."""
+
+    def __init__(self, capacity: int, budget: Optional[MemoryBudget] = None, poll_sec: float = 0.05):
+        self.capacity = capacity
+        self.budget = budget
+        self.poll_sec = poll_sec
+        self.nbytes = 0
+        self.closed = False
+        self._items: Deque[Tuple[Any, int]] = deque()
+        self._cond = threading.Condition()
+
+    def _full(self, nbytes: int) -> bool:
+        if not self._items:
+            return False
+        if self.nbytes + nbytes > self.capacity:
+            return True
+        return self.budget is not None and self.budget.over_limit()
+
+    def put(self, item: Any, nbytes: int) -> bool:
+        """Add an item, blocking while the queue is full; False if the queue was closed."""
+        with self._cond:
+            throttled = False
+            while not self.closed and self._full(nbytes):
+                throttled = True
+                # Re-check the process RSS now and then, not only when an item is taken
+                self._cond.wait(self.poll_sec)
+            if self.closed:
+                return False
+            if throttled and self.budget is not None:
+                self.budget.throttled += 1
+            self._items.append((item, nbytes))
+            self.nbytes += nbytes
+            self._cond.notify_all()
+            return True
+
+    def get(self) -> Any:
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+            item, nbytes = self._items.popleft()
+            self.nbytes -= nbytes
+            self._cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        """Unblock and stop the producer; queued items are dropped."""
+        with self._cond:
+            self.closed = True
+            self._items.clear()
+            self.nbytes = 0
+            self._cond.notify_all()
+
+
+def frame_bytes(frame: pd.DataFrame) -> int:
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def read_ahead(frames: Iterable[pd.DataFrame], budget: MemoryBudget) -> Iterator[pd.DataFrame]:
+    """Iterate `frames` on a reader thread, at most `budget.read_ahead_bytes` ahead of the consumer."""
+    queue = ByteBoundedQueue(budget.read_ahead_bytes, budget)
+    failure = []
+
+    def produce():
+        try:
+            for frame in frames:
+                if not queue.put(frame, frame_bytes(frame)):
+                    return
+        except BaseException as exc:  # re-raised in the consumer
+            failure.append(exc)
+        queue.put(_DONE, 0)
+
+    reader = threading.Thread(target=produce, name="ingest-read", daemon=True)
+    reader.start()
+    try:
+        while True:
+            frame = queue.get()
+            if frame is _DONE:
+                break
+            yield frame
+        if failure:
+            raise failure[0]
+    finally:
+        queue.close()
+        reader.join()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Per-stage instrumentation for the galaxy ingest scripts (`--report-json`, `--prometheus-textfile`).
+
+`IngestMetrics` collects, for one run:
+- wall time per pipeline stage (read, validate, transform, manifest, serialize,
+  send_wait, account, plus idle pauses), measured exclusively: time spent in a nested stage
+  (e.g. reading the next frame while the transform pulls rows) is not counted
+  again in the outer one, so the stage times add up to the pipeline's wall time
+- counters (rows read/sent/rejected, bytes encoded/sent, batches, retries)
+- a latency histogram of ingest requests (including retries) per HTTP status and
+  retry count, observed by the sending threads
+- the server-reported inserted/skipped/updated/notFound counts, in total and for
+  the most recent batches (the journal keeps all of them)
+- throughput (rows/s) and ETA
+- the peak resident set size of the process (and of finished worker processes)
+
+`report()` returns everything as one JSON-serializable dict; `write()` writes it
+to `json_path` and, in the node_exporter textfile collector format, to
+`prometheus_path`. Both files are replaced atomically, and `maybe_write`
+refreshes them at most every `interval` seconds during the run so dashboards and
+alerts see a slowdown while it happens.
+
+Stages run in the main thread; the sending threads only feed the request
+histogram, whose latencies therefore overlap with the stage times.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ingest_memory import peak_rss
+
+
+# Pipeline stages in order (`idle`: watch mode waiting for shards)
+STAGES = ("read", "validate", "transform", "manifest", "serialize", "send_wait", "account", "idle")
+
+# Request latency histogram bucket bounds in seconds (Prometheus `le` labels)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+RECENT_BATCHES = 1000
+DEFAULT_METRICS_INTERVAL = 15.0
+
+METRIC_PREFIX = "galaxy_ingest"
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+    def cumulative(self) -> List[int]:
+        out, total = [], 0
+        for n in self.buckets:
+            total += n
+            out.append(total)
+        return out
+
+
+def _le(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else f"{bound:g}"
+
+
+class IngestMetrics:
+    """Stage timers, counters and request histograms for one ingest run (thread-safe)."""
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None, interval: float = DEFAULT_METRICS_INTERVAL):
+        self.labels = dict(labels or {})
+        self.interval = interval
+        self.json_path: Optional[Path] = None
+        self.prometheus_path: Optional[Path] = None
+        self.started = time.time()
+        self.stage_seconds: Dict[str, float] = defaultdict(float)
+        self.counters: Counter = Counter()
+        self.server_counts: Counter = Counter()
+        self.recent_batches: Deque[Dict[str, Any]] = deque(maxlen=RECENT_BATCHES)
+        self._histograms: Dict[Tuple[str, int], _Histogram] = {}
+        self._lock = threading.Lock()
+        # Thread ident -> stack of [stage, start]; readable from other threads (ingest_profiler)
+        self._stacks: Dict[int, List[list]] = {}
+        self._done = 0
+        self._done_before = 0
+        self._total = 0
+        self._run_total = 0
+        # Rows/s counts from the first begin(), not from before a confirmation prompt
+        self._rows_started: Optional[float] = None
+        self._last_write = 0.0
+        # Extra sections for the JSON report (e.g. the profile summary)
+        self.info: Dict[str, Any] = {}
+
+    # ----------------------------------------------------------------------------------
+    # Stages
+    # ----------------------------------------------------------------------------------
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block as `name`, excluding time spent in stages nested inside it."""
+        stack = self._stacks.get(threading.get_ident())
+        if stack is None:
+            stack = self._stacks[threading.get_ident()] = []
+        now = time.perf_counter()
+        if stack:
+            parent = stack[-1]
+            self.stage_seconds[parent[0]] += now - parent[1]
+        frame = [name, now]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.stage_seconds[name] += now - frame[1]
+            stack.pop()
+            if stack:
+                stack[-1][1] = now
+
+    def current_stage(self, thread_id: int) -> Optional[str]:
+        """Innermost stage the given thread is in (None outside any stage)."""
+        try:
+            return self._stacks[thread_id][-1][0]
+        except (KeyError, IndexError):
+            return None
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from `iterable`, timing each step (the producer's work) as stage `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    # ----------------------------------------------------------------------------------
+    # Counters
+    # ----------------------------------------------------------------------------------
+    def add(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def observe_request(self, seconds: float, status: Any, retries: int, body_bytes: int) -> None:
+        """One finished ingest request (all attempts); status is the final HTTP status or 'error'."""
+        key = (str(status), retries)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(seconds)
+            self.counters["requests"] += 1
+            self.counters["retries"] += retries
+            self.counters["bytes_sent"] += body_bytes
+
+    def record_batch(self, batch_num: int, rows: int, status: Any, counts: Dict[str, int]) -> None:
+        """Server-reported counts of one accounted batch."""
+        with self._lock:
+            self.counters["batches"] += 1
+            self.server_counts.update({k: int(v) for k, v in counts.items()})
+            self.recent_batches.append({"batch": batch_num, "rows": rows, "status": status, **counts})
+
+    def begin(self, total: int) -> None:
+        """Start a (partial) run of at most `total` rows; several runs (e.g. watch-mode slices) add up."""
+        if self._rows_started is None:
+            self._rows_started = time.time()
+        self._done_before = self._done
+        self._run_total = total
+        self._total += total
+
+    def progress(self, done: int) -> None:
+        """Rows done in the current run."""
+        self._done = self._done_before + done
+
+    def end(self, total: int) -> None:
+        """Finish the current run with its actual row count (streaming filters can make it smaller)."""
+        self._total += total - self._run_total
+        self._run_total = total
+        self.progress(total)
+
+    def throughput(self) -> Tuple[float, Optional[float]]:
+        """(rows/s since the start, ETA in seconds or None when unknown)."""
+        done, total = self._done, self._total
+        elapsed = max(time.time() - (self._rows_started or self.started), 1e-9)
+        rate = done / elapsed
+        eta = (total - done) / rate if rate > 0 and total >= done else None
+        return rate, eta
+
+    def describe_progress(self) -> str:
+        """Short suffix for progress logs, e.g. '1234 rows/s, ETA 0:05:12'."""
+        rate, eta = self.throughput()
+        if eta is None:
+            return f"{rate:.0f} rows/s"
+        return f"{rate:.0f} rows/s, ETA {int(eta) // 3600}:{int(eta) % 3600 // 60:02d}:{int(eta) % 60:02d}"
+
+    # ----------------------------------------------------------------------------------
+    # Output
+    # ----------------------------------------------------------------------------------
+    def report(self) -> Dict[str, Any]:
+        rate, eta = self.throughput()
+        done, total = self._done, self._total
+        with self._lock:
+            histograms = [
+                {
+                    "status": status,
+                    "retries": retries,
+                    "count": h.count,
+                    "sum_seconds": round(h.sum, 6),
+                    "buckets": {_le(b): n for b, n in zip(LATENCY_BUCKETS, h.cumulative())},
+                }
+                for (status, retries), h in sorted(self._histograms.items())
+            ]
+            return {
+                "labels": self.labels,
+                "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "rows_done": done,
+                "rows_total": total,
+                "rows_per_second": round(rate, 3),
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+                "peak_rss_bytes": peak_rss(),
+                "peak_rss_children_bytes": peak_rss(children=True),
+                "stages_seconds": {name: round(sec, 6) for name, sec in sorted(self.stage_seconds.items())},
+                "counters": dict(self.counters),
+                "server_counts": dict(self.server_counts),
+                "request_latency": histograms,
+                "recent_batches": list(self.recent_batches),
+                **self.info,
+            }
+
+    def prometheus_text(self) -> str:
+        report = self.report()
+        base = [f'{k}="{v}"' for k, v in sorted(self.labels.items())]
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, List[str], Any]]):
+            """samples: (metric name suffix, labels, value)"""
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}_{name}{suffix}{{{','.join(labels + base)}}} {value}")
+
+        eta = report["eta_seconds"]
+        metric("rows_done", "gauge", "Rows processed so far", [("", [], report["rows_done"])])
+        metric("rows_total", "gauge", "Rows selected for the run", [("", [], report["rows_total"])])
+        metric("rows_per_second", "gauge", "Average throughput since the start", [("", [], report["rows_per_second"])])
+        metric("eta_seconds", "gauge", "Estimated seconds until the run finishes (-1 if unknown)",
+               [("", [], eta if eta is not None else -1)])
+        if report["peak_rss_bytes"] is not None:
+            metric("peak_rss_bytes", "gauge", "Peak resident set size of the ingest process",
+                   [("", [], report["peak_rss_bytes"])])
+        metric("stage_seconds_total", "counter", "Exclusive wall time per pipeline stage",
+               [("", [f'stage="{name}"'], sec) for name, sec in report["stages_seconds"].items()])
+        metric("events_total", "counter", "Ingest counters (rows, bytes, batches, requests, retries)",
+               [("", [f'name="{name}"'], value) for name, value in sorted(report["counters"].items())])
+        metric("server_rows_total", "counter", "Rows by server-reported outcome",
+               [("", [f'outcome="{name}"'], value) for name, value in sorted(report["server_counts"].items())])
+        samples = []
+        for h in report["request_latency"]:
+            labels = [f'status="{h["status"]}"', f'retries="{h["retries"]}"']
+            for le, n in h["buckets"].items():
+                samples.append(("_bucket", labels + [f'le="{le}"'], n))
+            samples.append(("_sum", labels, h["sum_seconds"]))
+            samples.append(("_count", labels, h["count"]))
+        metric("request_seconds", "histogram", "Ingest request latency including retries", samples)
+        metric("last_update_timestamp_seconds", "gauge", "Unix time of this report", [("", [], round(time.time(), 3))])
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _replace(path: Path, text: str) -> None:
+        if path.parent != Path("."):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+
+    def write(self) -> None:
+        """Write the JSON report and/or Prometheus textfile, if configured."""
+        self._last_write = time.monotonic()
+        if self.json_path is not None:
+            self._replace(self.json_path, json.dumps(self.report(), indent=2) + "\n")
+        if self.prometheus_path is not None:
+            self._replace(self.prometheus_path, self.prometheus_text())
+
+    def maybe_write(self) -> None:
+        if (self.json_path or self.prometheus_path) and time.monotonic() - self._last_write >= self.interval:
+            self.write()
+
+    def summary_lines(self) -> List[str]:
+        """Human-readable stage breakdown for the run summary."""
+        total = sum(self.stage_seconds.values()) or 1e-9
+        order = {name: i for i, name in enumerate(STAGES)}
+        lines = []
+        for name, sec in sorted(self.stage_seconds.items(), key=lambda item: order.get(item[0], len(order))):
+            lines.append(f"  {name:<10} {sec:9.2f}s  {sec / total * 100:5.1f}%")
+        return lines
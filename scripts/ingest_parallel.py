@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Multi-process transform for the galaxy ingest scripts (`--transform-workers`).
+
+The columnar transform (ingest_mapping.ColumnarPlan) plus JSON encoding is CPU
+bound and runs in one process. `ParallelTransform` fans it out over a process
+pool with one parquet row group per task (ingest_reader.RowGroupSlice): each
+worker reads its row group (projected columns only), applies `--where` and the
+row filter (and the stateless checks of a PreflightValidator), transforms the
+rows with the mapping profile and JSON-encodes every galaxy. Results come back as one bytes
+buffer plus offsets per row group, which is much cheaper to pass between
+processes than pickled dicts, and are yielded strictly in row order. Duplicate
+IDs across row groups and the reject file are handled in the parent process.
+
+At most `max_pending` row groups are in flight, so memory is bounded by
+(workers + max_pending) decoded row groups; write large catalogs with row groups
+of ~10^5 rows rather than one huge group to keep that small.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from ingest_http import encode_json
+from ingest_profiles import load_profile
+from ingest_reader import ParquetDataset, ParquetStream, RowGroupSlice, iter_row_group_slice
+from ingest_validation import PreflightValidator
+
+
+# (row numbers, fragment end offsets, concatenated JSON fragments,
+#  object IDs of the encoded rows and rejected rows when validating) for one row group
+EncodedRows = Tuple[np.ndarray, np.ndarray, bytes, Optional[np.ndarray], Optional[pd.DataFrame]]
+
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(
+    profile_path: str,
+    columns: Optional[List[str]],
+    where: Optional[pc.Expression],
+    schema: Optional[pa.Schema],
+    batch_rows: int,
+    row_filter: Optional[Callable],
+    validator: Optional[PreflightValidator] = None,
+) -> None:
+    _worker.update(
+        plan=load_profile(profile_path).plan,
+        columns=columns,
+        where=where,
+        schema=schema,
+        batch_rows=batch_rows,
+        row_filter=row_filter,
+        validator=validator,
+        files={},
+    )
+
+
+def _transform_row_group(part: RowGroupSlice) -> EncodedRows:
+    """Read, filter, transform and encode one row group slice."""
+    parquet_file = _worker["files"].get(part.path)
+    if parquet_file is None:
+        parquet_file = _worker["files"][part.path] = pq.ParquetFile(part.path)
+
+    validator = _worker["validator"]
+    rows: List[int] = []
+    fragments: List[bytes] = []
+    ids: List[np.ndarray] = []
+    rejected: List[pd.DataFrame] = []
+    for frame in iter_row_group_slice(
+        part, _worker["columns"], _worker["where"], _worker["batch_rows"], _worker["schema"], parquet_file
+    ):
+        if _worker["row_filter"] is not None:
+            frame = _worker["row_filter"](frame)
+        if validator is not None:
+            frame, bad = validator.check(frame)
+            rejected.append(bad)
+            ids.append(validator.ids(frame))
+        for row, galaxy in _worker["plan"].iter_indexed(frame):
+            rows.append(row)
+            fragments.append(encode_json(galaxy))
+    offsets = np.cumsum([len(f) for f in fragments], dtype=np.int64)
+    if validator is None:
+        return np.asarray(rows, dtype=np.int64), offsets, b"".join(fragments), None, None
+    return (
+        np.asarray(rows, dtype=np.int64),
+        offsets,
+        b"".join(fragments),
+        np.concatenate(ids) if ids else np.empty(0, dtype=object),
+        pd.concat(rejected) if rejected else None,
+    )
+
+
+class ParallelTransform:
+    """
+    Iterate a ParquetStream's or ParquetDataset's selection as (row, None, JSON fragment)
+    triples, transformed by `workers` processes, one row group per task, in row order.
+
+    With a `validator`, workers drop invalid rows and the parent drops IDs already
+    seen in earlier row groups; both end up in the validator's reject file.
+    """
+
+    def __init__(
+        self,
+        source: Union[ParquetStream, ParquetDataset],
+        profile_path: Path,
+        workers: int,
+        max_pending: Optional[int] = None,
+        validator: Optional[PreflightValidator] = None,
+    ):
+        self.source = source
+        self.validator = validator
+        self.profile_path = Path(profile_path)
+        self.workers = max(1, workers)
+        self.max_pending = max_pending or 2 * self.workers
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def tasks(self) -> List[RowGroupSlice]:
+        return self.source.units()
+
+    def iter_encoded(self) -> Iterator[EncodedRows]:
+        """Encoded row groups in row order."""
+        pending: Deque = deque()
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(
+                str(self.profile_path),
+                self.source.columns,
+                self.source.where,
+                self.source.schema,
+                self.source.batch_rows,
+                self.source.row_filter,
+                self.validator,
+            ),
+        ) as pool:
+            try:
+                for task in self.tasks():
+                    if len(pending) >= self.max_pending:
+                        yield pending.popleft().result()
+                    pending.append(pool.submit(_transform_row_group, task))
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def __iter__(self) -> Iterator[Tuple[int, None, bytes]]:
+        for rows, offsets, blob, ids, rejected in self.iter_encoded():
+            keep = None
+            if self.validator is not None:
+                self.validator.reject(rejected)
+                keep = self.validator.keep_unseen(rows, ids)
+            start = 0
+            for k, (row, end) in enumerate(zip(rows.tolist(), offsets.tolist())):
+                if keep is None or keep[k]:
+                    yield row, None, blob[start:end]
+                start = end
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Whole-run profiling for the galaxy ingest scripts (`--profile`).
+
+The run report (ingest_metrics) says which pipeline stage the time goes to;
+`StageProfiler` says which functions inside it. It is a sampling profiler:
+- a daemon thread takes the Python stack of the main thread every `interval`
+  seconds (sys._current_frames) and tags the sample with the stage the main
+  thread is in (IngestMetrics.current_stage: read, validate, transform,
+  manifest, serialize, send_wait, ...; `other` outside any stage)
+- the sending threads (ingest_sender, `ingest-send_*`) are sampled as stage
+  `send` while they run a request; idle workers are skipped
+- `delay` / `window` restrict sampling to part of a long run (e.g. one minute
+  after warm-up) so the overhead stays negligible
+- `write()` produces PREFIX.collapsed (one `stage;frame;...;frame count` line
+  per distinct stack, the input format of flamegraph.pl, speedscope and
+  inferno) and PREFIX.pstats, readable with `python -m pstats` / snakeviz, in
+  which "calls" are samples, times are samples × interval and every stage is a
+  root function `<stage NAME>`
+
+With mode "cprofile", PREFIX.pstats comes from cProfile instead (deterministic,
+exact call counts, main thread only, for the whole run and with noticeable
+overhead on the per-row transform); the sampler still writes the collapsed
+stacks. Worker processes of --transform-workers are not profiled in either mode.
+"""
+
+import argparse
+import cProfile
+import logging
+import marshal
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any, Dict, List, Optional, Tuple
+
+from ingest_metrics import IngestMetrics
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+PROFILE_MODES = ("sample", "cprofile")
+DEFAULT_PROFILE_INTERVAL = 0.005
+DEFAULT_PROFILE_PREFIX = "ingest_profile"
+MAX_STACK_DEPTH = 200
+
+SEND_THREAD_PREFIX = "ingest-send"
+_EXECUTOR_FILE = "concurrent/futures/thread.py"
+
+# pstats key: (filename, first line, function name)
+FuncKey = Tuple[str, int, str]
+
+
+def _func_key(code: CodeType) -> FuncKey:
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def _label(key: FuncKey) -> str:
+    """Frame name in collapsed stacks; `;` separates frames and the last space the count."""
+    filename, line, name = key
+    return f"{name} ({Path(filename).name}:{line})".replace(";", ",")
+
+
+class StageProfiler:
+    """Sample the main thread and the sending threads during a run, tagged by pipeline stage."""
+
+    def __init__(
+        self,
+        metrics: IngestMetrics,
+        mode: str = "sample",
+        interval: float = DEFAULT_PROFILE_INTERVAL,
+        delay: float = 0.0,
+        window: Optional[float] = None,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}' (expected one of {', '.join(PROFILE_MODES)})")
+        if interval <= 0:
+            raise ValueError("--profile-interval must be positive")
+        self.metrics = metrics
+        self.mode = mode
+        self.interval = interval
+        self.delay = max(0.0, delay)
+        self.window = window
+        # (stage, stack of code objects, outermost first) -> samples
+        self.samples: Counter = Counter()
+        self.ticks = 0
+        self.sampled_seconds = 0.0
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._main_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ----------------------------------------------------------------------------------
+    # Sampling
+    # ----------------------------------------------------------------------------------
+    def start(self) -> "StageProfiler":
+        """Start profiling; call from the thread that runs the pipeline."""
+        self._main_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="ingest-profiler", daemon=True)
+        self._thread.start()
+        if self.mode == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        return self
+
+    def stop(self) -> None:
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        if self._stop.wait(self.delay):
+            return
+        began = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            if self.window is not None and time.perf_counter() - began >= self.window:
+                break
+            self._sample()
+            self.ticks += 1
+        self.sampled_seconds = time.perf_counter() - began
+
+    def _sample(self) -> None:
+        senders = {
+            t.ident for t in threading.enumerate()
+            if t.ident is not None and t.name.startswith(SEND_THREAD_PREFIX)
+        }
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self._main_id:
+                stage = self.metrics.current_stage(thread_id) or "other"
+            elif thread_id in senders:
+                stage = "send"
+            else:
+                continue
+            stack = self._stack(frame)
+            if stage == "send" and not self._running_work_item(stack):
+                # Executor worker waiting for the next batch
+                continue
+            self.samples[(stage, stack)] += 1
+
+    @staticmethod
+    def _stack(frame: Optional[FrameType]) -> Tuple[CodeType, ...]:
+        codes: List[CodeType] = []
+        while frame is not None and len(codes) < MAX_STACK_DEPTH:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        return tuple(codes)
+
+    @staticmethod
+    def _running_work_item(stack: Tuple[CodeType, ...]) -> bool:
+        return any(
+            code.co_name == "run" and code.co_filename.replace("\\", "/").endswith(_EXECUTOR_FILE)
+            for code in stack
+        )
+
+    # ----------------------------------------------------------------------------------
+    # Output
+    # ----------------------------------------------------------------------------------
+    def stage_samples(self) -> Dict[str, int]:
+        counts: Counter = Counter()
+        for (stage, _), n in self.samples.items():
+            counts[stage] += n
+        return dict(counts.most_common())
+
+    def top_functions(self, limit: int = 15) -> List[Tuple[str, int]]:
+        """(function, samples) by self samples (innermost frame)."""
+        counts: Counter = Counter()
+        for (_, stack), n in self.samples.items():
+            if stack:
+                counts[_label(_func_key(stack[-1]))] += n
+        return counts.most_common(limit)
+
+    def collapsed_lines(self) -> List[str]:
+        merged: Counter = Counter()
+        for (stage, stack), n in self.samples.items():
+            merged[";".join([stage] + [_label(_func_key(code)) for code in stack])] += n
+        return [f"{line} {n}" for line, n in sorted(merged.items())]
+
+    def sampled_stats(self) -> Dict[FuncKey, Tuple[int, int, float, float, Dict[FuncKey, Tuple[int, int, float, float]]]]:
+        """pstats' marshalled format built from the samples: {func: (cc, nc, tt, ct, {caller: (cc, nc, tt, ct)})}."""
+        self_n: Counter = Counter()
+        total_n: Counter = Counter()
+        edges: Dict[FuncKey, Counter] = defaultdict(Counter)
+        for (stage, stack), n in self.samples.items():
+            keys = [("~", 0, f"<stage {stage}>")] + [_func_key(code) for code in stack]
+            self_n[keys[-1]] += n
+            for key in set(keys):
+                total_n[key] += n
+            for caller, callee in set(zip(keys, keys[1:])):
+                edges[callee][caller] += n
+        dt = self.interval
+        stats = {}
+        for key, n in total_n.items():
+            callers = {caller: (c, c, 0.0, c * dt) for caller, c in edges[key].items()}
+            stats[key] = (n, n, self_n[key] * dt, n * dt, callers)
+        return stats
+
+    def write(self, prefix: Path) -> List[Path]:
+        """Write PREFIX.collapsed and PREFIX.pstats; returns the paths written."""
+        prefix = Path(prefix)
+        if prefix.parent != Path("."):
+            prefix.parent.mkdir(parents=True, exist_ok=True)
+        collapsed = prefix.with_name(prefix.name + ".collapsed")
+        pstats_path = prefix.with_name(prefix.name + ".pstats")
+        collapsed.write_text("\n".join(self.collapsed_lines()) + "\n", encoding="utf-8")
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(str(pstats_path))
+        else:
+            with open(pstats_path, "wb") as f:
+                marshal.dump(self.sampled_stats(), f)
+        return [collapsed, pstats_path]
+
+    def summary(self, paths: Optional[List[Path]] = None) -> Dict[str, Any]:
+        """Section for the run report."""
+        return {
+            "profile": {
+                "mode": self.mode,
+                "interval_seconds": self.interval,
+                "sampled_seconds": round(self.sampled_seconds, 3),
+                "ticks": self.ticks,
+                "samples_by_stage": self.stage_samples(),
+                "top_functions": [{"function": name, "samples": n} for name, n in self.top_functions()],
+                "files": [str(p) for p in paths or []],
+            }
+        }
+
+    def log_summary(self, paths: List[Path]) -> None:
+        stages = self.stage_samples()
+        ticks = self.ticks or 1
+        logger.info(f"Profile ({self.mode}, {self.ticks} samples over {self.sampled_seconds:.1f}s), main thread by stage:")
+        for stage, n in stages.items():
+            if stage != "send":
+                logger.info(f"  {stage:<10} {n:7d}  {n / ticks * 100:5.1f}%")
+        if "send" in stages:
+            logger.info(f"  sending threads busy on average: {stages['send'] / ticks:.1f}")
+        total = sum(stages.values()) or 1
+        logger.info("Top functions (self, % of all thread samples):")
+        for name, n in self.top_functions(5):
+            logger.info(f"  {n / total * 100:5.1f}%  {name}")
+        for path in paths:
+            logger.info(f"  ✓ {path}")
+
+
+# --------------------------------------------------------------------------------------
+# Command line (shared by the ingest scripts)
+# --------------------------------------------------------------------------------------
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """--profile and its options; the script needs --report-json too (default output prefix)."""
+    parser.add_argument("--profile", nargs="?", const="sample", choices=PROFILE_MODES,
+                        help="Profile the run, tagged by pipeline stage: 'sample' (default, low overhead) or "
+                             "'cprofile' (exact, slower); writes PREFIX.pstats and PREFIX.collapsed (flamegraph input)")
+    parser.add_argument("--profile-output", metavar="PREFIX",
+                        help=f"Profile output prefix (default: the --report-json path without suffix, "
+                             f"else {DEFAULT_PROFILE_PREFIX})")
+    parser.add_argument("--profile-interval", type=float, default=DEFAULT_PROFILE_INTERVAL,
+                        help=f"Seconds between stack samples (default: {DEFAULT_PROFILE_INTERVAL:g})")
+    parser.add_argument("--profile-delay", type=float, default=0.0,
+                        help="Start sampling this many seconds into the run (default: 0)")
+    parser.add_argument("--profile-window", type=float,
+                        help="Stop sampling after this many seconds (default: the whole run)")
+
+
+def start_profiler(args, metrics: IngestMetrics) -> Optional[StageProfiler]:
+    """Start --profile sampling (None without --profile); call right before the pipeline runs."""
+    if not args.profile:
+        return None
+    profiler = StageProfiler(
+        metrics,
+        mode=args.profile,
+        interval=args.profile_interval,
+        delay=args.profile_delay,
+        window=args.profile_window,
+    )
+    logger.info(f"🔍 Profiling ({args.profile}, every {args.profile_interval * 1000:g} ms)")
+    return profiler.start()
+
+
+def finish_profiler(profiler: Optional[StageProfiler], args, metrics: IngestMetrics):
+    """Stop profiling and write PREFIX.collapsed / PREFIX.pstats next to the run report."""
+    if profiler is None:
+        return
+    profiler.stop()
+    if args.profile_output:
+        prefix = Path(args.profile_output)
+    elif args.report_json:
+        prefix = Path(args.report_json).with_suffix("")
+    else:
+        prefix = Path(DEFAULT_PROFILE_PREFIX)
+    paths = profiler.write(prefix)
+    metrics.info.update(profiler.summary(paths))
+    profiler.log_summary(paths)
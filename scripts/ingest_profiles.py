@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Versioned mapping profiles for the galaxy ingest scripts.
+
+A profile is a JSON file in scripts/mapping_profiles/ named `<profile>.v<version>.json`
+that holds a NESTED_COLUMN_MAPPING (database schema -> [parquet column, cast name]).
+A profile can `extends` another one and replace single leaves through `overrides`
+(dotted key path -> [column, cast]), so catalogs that only differ in a few column
+choices share one base mapping.
+
+`load_profile` validates the file and compiles the mapping once into a
+`ColumnarPlan`. `check_parquet` compares the plan with the parquet schema from
+the file footer alone (no row data is read) and reports:
+- missing columns: mapped columns the file does not have
+- type mismatches: columns whose Arrow type the cast cannot handle
+- unused columns: file columns no profile leaf reads
+so a wrong file/profile pairing fails before the first batch is sent.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingest_mapping import ColumnarPlan, compile_mapping, str_or_int_to_str
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+PROFILES_DIR = Path(__file__).resolve().parent / "mapping_profiles"
+
+CASTS_BY_NAME: Dict[str, Callable] = {
+    "float": float,
+    "bool": bool,
+    "str": str,
+    "str_or_int_to_str": str_or_int_to_str,
+}
+CAST_NAMES: Dict[Callable, str] = {fn: name for name, fn in CASTS_BY_NAME.items()}
+
+
+class MappingProfileError(ValueError):
+    """A profile file is malformed or does not fit the parquet file it is used with."""
+
+
+# --------------------------------------------------------------------------------------
+# Profiles
+# --------------------------------------------------------------------------------------
+@dataclass
+class MappingProfile:
+    name: str
+    version: int
+    path: Path
+    mapping: Dict[str, Any]
+    description: str = ""
+    plan: ColumnarPlan = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.plan = compile_mapping(self.mapping)
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}.v{self.version}"
+
+
+def resolve_profile_path(ref: Union[str, Path]) -> Path:
+    """A profile reference is a file path or a name like 'galaxy.v1' in PROFILES_DIR."""
+    path = Path(ref)
+    if path.suffix == ".json" or path.exists():
+        return path
+    return PROFILES_DIR / f"{ref}.json"
+
+
+def _parse_leaf(value: Any, where: str) -> Tuple[Optional[str], Callable]:
+    if not (isinstance(value, list) and len(value) == 2):
+        raise MappingProfileError(f"{where}: expected [column, cast], got {value!r}")
+    column, cast_name = value
+    if column is not None and not isinstance(column, str):
+        raise MappingProfileError(f"{where}: column must be a string or null, got {column!r}")
+    if cast_name not in CASTS_BY_NAME:
+        raise MappingProfileError(f"{where}: unknown cast {cast_name!r} (expected one of {sorted(CASTS_BY_NAME)})")
+    return column, CASTS_BY_NAME[cast_name]
+
+
+def _parse_mapping(raw: Dict[str, Any], where: str) -> Dict[str, Any]:
+    if not isinstance(raw, dict):
+        raise MappingProfileError(f"{where}: expected an object, got {type(raw).__name__}")
+    mapping: Dict[str, Any] = {}
+    for key, value in raw.items():
+        path = f"{where}.{key}"
+        mapping[key] = _parse_mapping(value, path) if isinstance(value, dict) else _parse_leaf(value, path)
+    return mapping
+
+
+def _apply_override(mapping: Dict[str, Any], dotted: str, leaf: Tuple[Optional[str], Callable], where: str) -> None:
+    *parents, key = dotted.split(".")
+    node = mapping
+    for part in parents:
+        node = node.get(part)
+        if not isinstance(node, dict):
+            raise MappingProfileError(f"{where}: override {dotted!r} does not match a group in the base profile")
+    if not isinstance(node.get(key), tuple):
+        raise MappingProfileError(f"{where}: override {dotted!r} does not match a field in the base profile")
+    node[key] = leaf
+
+
+def _load_mapping(path: Path, seen: Tuple[Path, ...]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Return (raw profile document, resolved mapping) following `extends`."""
+    if path in seen:
+        raise MappingProfileError(f"{path}: circular 'extends' chain")
+    if not path.exists():
+        raise MappingProfileError(f"Mapping profile not found: {path}")
+    try:
+        doc = json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError as exc:
+        raise MappingProfileError(f"{path}: invalid JSON ({exc})") from exc
+    for required in ("profile", "version"):
+        if required not in doc:
+            raise MappingProfileError(f"{path}: missing '{required}'")
+    if not isinstance(doc["version"], int):
+        raise MappingProfileError(f"{path}: 'version' must be an integer")
+
+    if "extends" in doc:
+        _, mapping = _load_mapping(resolve_profile_path(doc["extends"]), seen + (path,))
+        if "mapping" in doc:
+            raise MappingProfileError(f"{path}: use 'overrides' (not 'mapping') together with 'extends'")
+        for dotted, value in doc.get("overrides", {}).items():
+            _apply_override(mapping, dotted, _parse_leaf(value, f"{path.name}:{dotted}"), path.name)
+    else:
+        if "mapping" not in doc:
+            raise MappingProfileError(f"{path}: missing 'mapping'")
+        mapping = _parse_mapping(doc["mapping"], path.name)
+    return doc, mapping
+
+
+def load_profile(ref: Union[str, Path]) -> MappingProfile:
+    """Load, validate and compile a mapping profile (name like 'galaxy.v1' or a path)."""
+    path = resolve_profile_path(ref)
+    doc, mapping = _load_mapping(path, ())
+    return MappingProfile(
+        name=doc["profile"],
+        version=doc["version"],
+        path=path,
+        mapping=mapping,
+        description=doc.get("description", ""),
+    )
+
+
+# --------------------------------------------------------------------------------------
+# Schema check (parquet footer only)
+# --------------------------------------------------------------------------------------
+def _cast_accepts(cast_name: str, arrow_type: pa.DataType) -> bool:
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_null(arrow_type):
+        return True
+    numeric = pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type)
+    text = pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+    if cast_name == "float":
+        return numeric or pa.types.is_boolean(arrow_type)
+    if cast_name == "bool":
+        return pa.types.is_boolean(arrow_type) or numeric
+    if cast_name == "str_or_int_to_str":
+        return numeric or text
+    if cast_name == "str":
+        return not pa.types.is_nested(arrow_type)
+    return True
+
+
+@dataclass
+class SchemaReport:
+    missing: List[str]
+    mismatched: List[Tuple[str, str, str]]  # (column, arrow type, cast)
+    unused: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.mismatched
+
+
+def check_schema(plan: ColumnarPlan, schema: pa.Schema) -> SchemaReport:
+    """Compare the plan's columns and casts with an Arrow schema."""
+    types = {f.name: f.type for f in schema}
+    missing = [c for c in plan.source_columns if c not in types]
+    mismatched = []
+    for column, cast_fn in dict.fromkeys(zip(plan.columns, plan.casts)):
+        cast_name = CAST_NAMES.get(cast_fn)
+        if column in types and cast_name is not None and not _cast_accepts(cast_name, types[column]):
+            mismatched.append((column, str(types[column]), cast_name))
+    referenced = set(plan.columns)
+    unused = [name for name in types if name not in referenced and not name.startswith("__index_level_")]
+    return SchemaReport(missing, mismatched, unused)
+
+
+def check_parquet(
+    profile: MappingProfile,
+    parquet_file: Path,
+    allow_missing: bool = False,
+    schema: Optional[pa.Schema] = None,
+) -> SchemaReport:
+    """
+    Check a profile against a parquet file's footer schema and log the result.
+
+    `schema` (e.g. a dataset's unified schema including partition columns) is used
+    instead of reading the footer of `parquet_file` when given.
+
+    Raises:
+        MappingProfileError: on type mismatches, or on missing columns unless allow_missing
+    """
+    report = check_schema(profile.plan, schema if schema is not None else pq.read_schema(parquet_file))
+    if report.unused:
+        preview = ", ".join(report.unused[:10]) + (" ..." if len(report.unused) > 10 else "")
+        logger.info(f"  {len(report.unused)} file column(s) not used by profile {profile.label}: {preview}")
+    if report.missing:
+        if allow_missing:
+            logger.warning(f"⚠ Profile {profile.label} columns missing from {parquet_file} (skipped): {report.missing}")
+        else:
+            logger.error(f"❌ Profile {profile.label} columns missing from {parquet_file}: {report.missing}")
+    for column, arrow_type, cast_name in report.mismatched:
+        logger.error(f"❌ Column {column} has type {arrow_type}, which the '{cast_name}' cast cannot handle")
+    if report.mismatched or (report.missing and not allow_missing):
+        problems = []
+        if report.missing and not allow_missing:
+            problems.append(f"{len(report.missing)} missing column(s)")
+        if report.mismatched:
+            problems.append(f"{len(report.mismatched)} type mismatch(es)")
+        hint = " (--allow-missing-columns skips missing ones)" if report.missing and not allow_missing else ""
+        raise MappingProfileError(
+            f"{parquet_file} does not match mapping profile {profile.label}: {', '.join(problems)}{hint}"
+        )
+    logger.info(f"✓ Schema matches mapping profile {profile.label} ({len(profile.plan.source_columns)} mapped columns)")
+    return report
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Request rate limiting for the galaxy ingest scripts, shared by every ingest
+process on a host.
+
+The scripts used to pause a fixed 0.1 s after every batch: too slow when the
+deployment is idle, and no help when several catalogs are ingested at once and
+the jobs together trip 429s. `RateLimiter` replaces it:
+- token buckets for requests/s and galaxies/s (`--max-requests-per-sec`,
+  `--max-galaxies-per-sec`; both optional), whose state lives in a small JSON
+  file under an exclusive lock (fcntl.flock), one per deployment URL, so all
+  processes (and their sending threads) draw from the same buckets
+- the request rate adapts to the deployment (AIMD): a 429 halves it, a request
+  slower than the target latency cuts it by a fifth (at most one cut per
+  `cooldown` seconds, however many requests report it), and every successful
+  request raises it by step/rate, about `step` req/s per second across all
+  processes, up to the configured cap. Without a cap the limiter starts
+  unlimited, takes the rate of successful requests as its starting point on the
+  first cut and lets go again once the rate is well above what is used and
+  nothing has cut it for a while
+- a Retry-After on 429 pauses every process until it has passed
+
+Without fcntl (Windows) the state is kept in memory, shared by the threads of
+one process only. Times in the state file are time.monotonic(), the same clock
+for every process on Linux and macOS.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+DEFAULT_RATE_STEP = 1.0
+DEFAULT_RATE_COOLDOWN_SEC = 2.0
+MIN_REQUESTS_PER_SEC = 0.2
+# Factors applied to the request rate on a 429 / on a request above the target latency
+THROTTLED_FACTOR = 0.5
+SLOW_FACTOR = 0.8
+# Without a cap, the limit is lifted once it is this many times the observed request rate
+# and nothing has cut it for this long
+UNLIMITED_HEADROOM = 2.0
+UNLIMITED_AFTER_SEC = 30.0
+# Seconds of galaxies the galaxy bucket holds (burst size); requests are paced one at a time
+BURST_SEC = 1.0
+# The observed rate counts successful requests over windows of this length (EWMA of the windows)
+OBSERVED_WINDOW_SEC = 2.0
+OBSERVED_ALPHA = 0.3
+MIN_WAIT_SEC = 0.005
+
+
+def default_state_path(convex_url: str) -> Path:
+    """Per-deployment state file in the temp directory, the same for every process of the user."""
+    digest = hashlib.sha1(convex_url.rstrip("/").encode("utf-8")).hexdigest()[:12]
+    return Path(tempfile.gettempdir()) / f"ingest_rate_{digest}.json"
+
+
+def _refill(tokens: float, rate: Optional[float], elapsed: float, capacity: float) -> float:
+    if rate is None:
+        return capacity
+    return min(capacity, tokens + elapsed * rate)
+
+
+class RateLimiter:
+    """Shared token buckets (requests/s, galaxies/s) with an adaptive request rate."""
+
+    def __init__(
+        self,
+        state_path: Optional[Path] = None,
+        max_requests_per_sec: Optional[float] = None,
+        max_galaxies_per_sec: Optional[float] = None,
+        target_latency_sec: float = 5.0,
+        step: float = DEFAULT_RATE_STEP,
+        cooldown_sec: float = DEFAULT_RATE_COOLDOWN_SEC,
+    ):
+        self.state_path = Path(state_path) if state_path is not None and fcntl is not None else None
+        self.max_requests_per_sec = max_requests_per_sec or None
+        self.max_galaxies_per_sec = max_galaxies_per_sec or None
+        self.target_latency_sec = target_latency_sec
+        self.step = step
+        self.cooldown_sec = cooldown_sec
+        # This process only
+        self.waited_sec = 0.0
+        self.throttled = 0
+        self.slowed = 0
+        self._memory: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------------
+    # Shared state
+    # ----------------------------------------------------------------------------------
+    def _initial_state(self, now: float) -> Dict[str, Any]:
+        return {
+            "rate": self.max_requests_per_sec,
+            "tokens": 1.0,
+            "galaxy_tokens": 0.0,
+            "updated": now,
+            "paused_until": 0.0,
+            "last_cut": 0.0,
+            "ok_since": None,
+            "ok_count": 0,
+            "observed": None,
+        }
+
+    @contextmanager
+    def _state(self) -> Iterator[Dict[str, Any]]:
+        """The shared state, locked against other threads and processes; changes are saved on exit."""
+        with self._lock:
+            if self.state_path is None:
+                if not self._memory:
+                    self._memory.update(self._initial_state(time.monotonic()))
+                yield self._memory
+                return
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.read(fd, 4096)
+                try:
+                    state = json.loads(raw) if raw else None
+                except ValueError:
+                    state = None
+                now = time.monotonic()
+                if not isinstance(state, dict) or state.get("updated", math.inf) > now:
+                    # New file, or left over from before a reboot
+                    state = self._initial_state(now)
+                yield state
+                data = json.dumps(state).encode("utf-8")
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+
+    def _request_cap(self, state: Dict[str, Any]) -> Optional[float]:
+        rate = state["rate"]
+        if self.max_requests_per_sec is not None:
+            rate = self.max_requests_per_sec if rate is None else min(rate, self.max_requests_per_sec)
+        return rate
+
+    # ----------------------------------------------------------------------------------
+    # Sending
+    # ----------------------------------------------------------------------------------
+    def acquire(self, galaxies: int) -> float:
+        """Block until a request with `galaxies` galaxies may be sent; returns the seconds waited."""
+        started = time.monotonic()
+        while True:
+            with self._state() as state:
+                now = time.monotonic()
+                elapsed = max(0.0, now - state["updated"])
+                rate = self._request_cap(state)
+                galaxy_rate = self.max_galaxies_per_sec
+                state["tokens"] = _refill(state["tokens"], rate, elapsed, 1.0)
+                # A batch larger than a second's worth of galaxies still goes through, once the bucket is full
+                galaxy_capacity = max(float(galaxies), (galaxy_rate or 0) * BURST_SEC)
+                state["galaxy_tokens"] = _refill(state["galaxy_tokens"], galaxy_rate, elapsed, galaxy_capacity)
+                state["updated"] = now
+                wait = state["paused_until"] - now
+                if wait <= 0:
+                    waits = [0.0]
+                    if state["tokens"] < 1:
+                        waits.append((1 - state["tokens"]) / rate)
+                    if galaxy_rate is not None and state["galaxy_tokens"] < galaxies:
+                        waits.append((galaxies - state["galaxy_tokens"]) / galaxy_rate)
+                    wait = max(waits)
+                if wait <= 0:
+                    state["tokens"] -= 1
+                    if galaxy_rate is not None:
+                        state["galaxy_tokens"] -= galaxies
+                    waited = now - started
+                    self.waited_sec += waited
+                    return waited
+            time.sleep(max(wait, MIN_WAIT_SEC))
+
+    def on_response(self, status: Any, latency_sec: float, retry_after: Optional[float] = None) -> None:
+        """Adapt the shared request rate to one finished attempt (HTTP status or 'error')."""
+        throttled = status == 429
+        slow = not throttled and latency_sec > self.target_latency_sec
+        if not (throttled or slow or status == 200):
+            return
+        with self._state() as state:
+            now = time.monotonic()
+            if throttled and retry_after:
+                state["paused_until"] = max(state["paused_until"], now + retry_after)
+            rate = self._request_cap(state)
+            if throttled or slow:
+                if now - state["last_cut"] < self.cooldown_sec:
+                    return
+                base = rate if rate is not None else self._observed(state, now)
+                new_rate = max(MIN_REQUESTS_PER_SEC, base * (THROTTLED_FACTOR if throttled else SLOW_FACTOR))
+                state.update(rate=new_rate, last_cut=now)
+                if throttled:
+                    self.throttled += 1
+                else:
+                    self.slowed += 1
+                reason = "HTTP 429" if throttled else f"latency {latency_sec:.1f}s > {self.target_latency_sec:g}s"
+                logger.info(f"↓ Request rate {new_rate:.1f}/s for all ingest processes ({reason})")
+                return
+            self._count_success(state, now)
+            if rate is not None:
+                new_rate = rate + self.step / rate
+                if self.max_requests_per_sec is not None:
+                    state["rate"] = min(new_rate, self.max_requests_per_sec)
+                elif (
+                    state["observed"]
+                    and new_rate > UNLIMITED_HEADROOM * state["observed"]
+                    and now - state["last_cut"] > UNLIMITED_AFTER_SEC
+                ):
+                    # Far above what is used: not limiting anything any more
+                    state["rate"] = None
+                    logger.info("↑ Request rate no longer limited")
+                else:
+                    state["rate"] = new_rate
+
+    @staticmethod
+    def _count_success(state: Dict[str, Any], now: float) -> None:
+        if state["ok_since"] is None:
+            state["ok_since"] = now
+        state["ok_count"] += 1
+        elapsed = now - state["ok_since"]
+        if elapsed >= OBSERVED_WINDOW_SEC:
+            window = state["ok_count"] / elapsed
+            previous = state["observed"]
+            state["observed"] = window if previous is None else OBSERVED_ALPHA * window + (1 - OBSERVED_ALPHA) * previous
+            state.update(ok_since=now, ok_count=0)
+
+    @staticmethod
+    def _observed(state: Dict[str, Any], now: float) -> float:
+        """Successful requests/s of all processes (the current window until a full one has passed)."""
+        if state["observed"]:
+            return state["observed"]
+        if state["ok_since"] is None:
+            return MIN_REQUESTS_PER_SEC
+        return max(MIN_REQUESTS_PER_SEC, state["ok_count"] / max(1.0, now - state["ok_since"]))
+
+    def current_rate(self) -> Optional[float]:
+        with self._state() as state:
+            return self._request_cap(state)
+
+    def describe(self) -> str:
+        caps = []
+        caps.append(f"{self.max_requests_per_sec:g} requests/s" if self.max_requests_per_sec else "no request cap")
+        if self.max_galaxies_per_sec:
+            caps.append(f"{self.max_galaxies_per_sec:g} galaxies/s")
+        where = self.state_path or "this process only"
+        return f"{', '.join(caps)}; adaptive (429, latency > {self.target_latency_sec:g}s); shared via {where}"
+
+    def summary(self) -> dict:
+        """Section for the run report."""
+        rate = self.current_rate()
+        return {
+            "rate_limit": {
+                "requests_per_sec": None if rate is None else round(rate, 3),
+                "max_requests_per_sec": self.max_requests_per_sec,
+                "max_galaxies_per_sec": self.max_galaxies_per_sec,
+                "waited_seconds": round(self.waited_sec, 3),
+                "cuts_on_429": self.throttled,
+                "cuts_on_latency": self.slowed,
+            }
+        }
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Streaming parquet input for the galaxy ingest scripts.
+
+`pd.read_parquet` loads the whole file before `--offset`/`--limit` are applied,
+so peak memory grows with the file size. `ParquetStream` instead:
+- reads only the projected columns (those referenced by NESTED_COLUMN_MAPPING)
+- uses row-group metadata to skip straight to the row group holding `offset`
+- yields pandas frames of at most `batch_rows` rows from pyarrow record batches
+
+Peak memory is therefore proportional to `batch_rows` (plus one decoded row
+group inside pyarrow), not to the file size. Yielded frames are indexed by
+their row number in the file.
+
+`ParquetDataset` does the same for a directory of (hive-partitioned) parquet
+files, a glob, or a single file with a `--where` filter. Files are numbered in
+sorted path order, so a row's number is its position in the concatenated
+files. Partitions and row groups whose statistics cannot match the filter are
+skipped before any data is decoded; the filter is applied to the remaining
+rows as they are read.
+
+Both readers describe their work as `RowGroupSlice`s (one row group each),
+which ingest_parallel.ParallelTransform distributes over processes.
+"""
+
+import ast
+import glob
+import operator
+from dataclasses import dataclass, replace
+from functools import reduce
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+DEFAULT_STREAM_BATCH_ROWS = 10000
+
+_ROW_COLUMN = "__ingest_row"
+
+
+@dataclass(frozen=True)
+class RowGroupSlice:
+    """Rows [start, stop) of one row group; row numbers are global (file or dataset) positions."""
+    path: str
+    row_group: int
+    group_start: int  # row number of the row group's first row
+    start: int
+    stop: int
+    partition: Tuple[Tuple[str, Any], ...] = ()
+    rows: Tuple[int, ...] = ()  # when set, only these (sorted) rows within [start, stop)
+
+
+def iter_row_group_slice(
+    part: RowGroupSlice,
+    columns: Optional[Sequence[str]] = None,
+    where: Optional[pc.Expression] = None,
+    batch_rows: int = DEFAULT_STREAM_BATCH_ROWS,
+    schema: Optional[pa.Schema] = None,
+    parquet_file: Optional[pq.ParquetFile] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read one RowGroupSlice as frames of at most `batch_rows` rows, indexed by row number.
+
+    Partition values are added as constant columns (typed from `schema`) before `where` is applied.
+    """
+    parquet_file = parquet_file or pq.ParquetFile(part.path)
+    file_names = set(parquet_file.schema_arrow.names)
+    file_columns = None if columns is None else [c for c in columns if c in file_names]
+    wanted = np.asarray(part.rows, dtype=np.int64)
+    position = part.group_start
+    for record_batch in parquet_file.iter_batches(
+        batch_size=batch_rows,
+        row_groups=[part.row_group],
+        columns=file_columns,
+        use_pandas_metadata=False,
+    ):
+        lo, hi = max(position, part.start), min(position + record_batch.num_rows, part.stop)
+        if lo < hi:
+            if part.rows:
+                # Explicit rows: take them before anything is converted
+                rows = wanted[(wanted >= lo) & (wanted < hi)]
+                table = pa.Table.from_batches([record_batch.take(pa.array(rows - position))])
+            else:
+                rows = np.arange(lo, hi, dtype=np.int64)
+                table = pa.Table.from_batches([record_batch.slice(lo - position, hi - lo)])
+            for name, value in part.partition:
+                field_type = schema.field(name).type if schema is not None else None
+                table = table.append_column(name, pa.array([value] * table.num_rows, type=field_type))
+            if where is not None:
+                table = table.append_column(_ROW_COLUMN, pa.array(rows))
+                table = table.filter(where)
+                rows = table.column(_ROW_COLUMN).to_numpy()
+                table = table.drop_columns([_ROW_COLUMN])
+            frame = table.to_pandas()
+            frame.index = pd.RangeIndex(lo, hi) if len(rows) == hi - lo and not part.rows and where is None else pd.Index(rows)
+            if len(frame):
+                yield frame
+        position += record_batch.num_rows
+        if position >= part.stop:
+            break
+
+
+# --------------------------------------------------------------------------------------
+# --where expressions
+# --------------------------------------------------------------------------------------
+_COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+def _where_operand(node: ast.AST, columns: List[str]) -> Any:
+    if isinstance(node, ast.Name):
+        columns.append(node.id)
+        return pc.field(node.id)
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        return -node.operand.value
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return [_where_operand(elt, columns) for elt in node.elts]
+    raise ValueError(f"Unsupported --where operand: {ast.unparse(node)}")
+
+
+def _where_node(node: ast.AST, columns: List[str]) -> pc.Expression:
+    if isinstance(node, ast.BoolOp):
+        parts = [_where_node(value, columns) for value in node.values]
+        return reduce(operator.and_ if isinstance(node.op, ast.And) else operator.or_, parts)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return ~_where_node(node.operand, columns)
+    if isinstance(node, ast.Name):
+        columns.append(node.id)
+        return pc.field(node.id)  # boolean column
+    if isinstance(node, ast.Compare):
+        parts = []
+        left = _where_operand(node.left, columns)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _where_operand(comparator, columns)
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if not isinstance(left, pc.Expression) or not isinstance(right, list):
+                    raise ValueError("--where 'in' needs a column on the left and a list of values on the right")
+                part = left.isin(right)
+                parts.append(~part if isinstance(op, ast.NotIn) else part)
+            elif isinstance(op, (ast.Is, ast.IsNot)) or right is None:
+                if not isinstance(left, pc.Expression) or right is not None or isinstance(op, (ast.Lt, ast.LtE, ast.Gt, ast.GtE)):
+                    raise ValueError("--where null checks look like 'column == None' or 'column is not None'")
+                part = left.is_null()
+                parts.append(~part if isinstance(op, (ast.IsNot, ast.NotEq)) else part)
+            elif type(op) in _COMPARISONS:
+                parts.append(_COMPARISONS[type(op)](left, right))
+            else:
+                raise ValueError(f"Unsupported --where operator: {type(op).__name__}")
+            left = right
+        return reduce(operator.and_, parts)
+    raise ValueError(f"Unsupported --where expression: {ast.unparse(node)}")
+
+
+def parse_where(text: str) -> Tuple[pc.Expression, List[str]]:
+    """
+    Parse a Python-style filter into a pyarrow expression and the columns it references.
+
+    Supported: comparisons (==, !=, <, <=, >, >=, chained), `in`/`not in` with a list,
+    `== None`/`is None`, bare boolean columns, and/or/not with parentheses. Example:
+        paper == 'Thuruthipilly+2024' and tilename in ('DES0001-0001', 'DES0002-0001')
+    """
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as exc:
+        raise ValueError(f"Invalid --where expression {text!r}: {exc.msg} (use == for equality)") from exc
+    columns: List[str] = []
+    expression = _where_node(tree.body, columns)
+    return expression, list(dict.fromkeys(columns))
+
+
+# --------------------------------------------------------------------------------------
+# Input resolution
+# --------------------------------------------------------------------------------------
+def is_dataset_source(source: str) -> bool:
+    """True for a directory or glob (anything but a single existing file)."""
+    return not Path(source).is_file()
+
+
+def open_parquet_dataset(source: str) -> ds.FileSystemDataset:
+    """Open a parquet file, directory (hive partitioning) or glob as a pyarrow dataset."""
+    path = Path(source)
+    if path.is_file():
+        return ds.dataset([str(path)], format="parquet")
+    if path.is_dir():
+        return ds.dataset(str(path), format="parquet", partitioning="hive", exclude_invalid_files=True)
+    if glob.has_magic(source):
+        files = sorted(p for p in glob.glob(source, recursive=True) if Path(p).is_file())
+        if not files:
+            raise FileNotFoundError(f"No files match {source}")
+        base = source
+        while glob.has_magic(base):
+            base = str(Path(base).parent)
+        return ds.dataset(files, format="parquet", partitioning="hive", partition_base_dir=base)
+    raise FileNotFoundError(f"File not found: {source}")
+
+
+class ParquetStream:
+    """Iterate a parquet file as projected pandas frames within [offset, offset+limit)."""
+
+    def __init__(
+        self,
+        path: Path,
+        columns: Optional[Sequence[str]] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        batch_rows: int = DEFAULT_STREAM_BATCH_ROWS,
+        row_filter: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+        pre_buffer: bool = True,
+    ):
+        self.path = Path(path)
+        self.where: Optional[pc.Expression] = None
+        self.schema: Optional[pa.Schema] = None
+        # pre_buffer=False reads column chunks as they are decoded (less memory, see ingest_memory)
+        self.parquet_file = pq.ParquetFile(self.path, pre_buffer=pre_buffer)
+        self.metadata = self.parquet_file.metadata
+        self.file_rows = self.metadata.num_rows
+        self.offset = min(max(offset, 0), self.file_rows)
+        end = self.file_rows if limit is None else min(self.offset + limit, self.file_rows)
+        self.end = max(end, self.offset)
+        self.batch_rows = batch_rows
+        self.row_filter = row_filter
+
+        schema_names = set(self.parquet_file.schema_arrow.names)
+        if columns is None:
+            self.columns: Optional[List[str]] = None
+            self.missing_columns: List[str] = []
+        else:
+            self.columns = [c for c in dict.fromkeys(columns) if c in schema_names]
+            self.missing_columns = [c for c in dict.fromkeys(columns) if c not in schema_names]
+
+    def __len__(self) -> int:
+        """Number of rows selected by offset/limit (before `row_filter`)."""
+        return self.end - self.offset
+
+    def _row_group_span(self) -> Tuple[List[int], int]:
+        """Row groups overlapping [offset, end) and the number of rows to skip in the first one."""
+        groups: List[int] = []
+        skip = 0
+        group_start = 0
+        for rg in range(self.metadata.num_row_groups):
+            group_rows = self.metadata.row_group(rg).num_rows
+            group_end = group_start + group_rows
+            if group_end > self.offset and group_start < self.end:
+                if not groups:
+                    skip = self.offset - group_start
+                groups.append(rg)
+            group_start = group_end
+            if group_start >= self.end:
+                break
+        return groups, skip
+
+    def units(self) -> List[RowGroupSlice]:
+        """One RowGroupSlice per row group overlapping [offset, end)."""
+        parts = []
+        group_start = 0
+        for rg in range(self.metadata.num_row_groups):
+            group_end = group_start + self.metadata.row_group(rg).num_rows
+            start, stop = max(group_start, self.offset), min(group_end, self.end)
+            if start < stop:
+                parts.append(RowGroupSlice(str(self.path), rg, group_start, start, stop))
+            group_start = group_end
+            if group_start >= self.end:
+                break
+        return parts
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        remaining = len(self)
+        if remaining <= 0:
+            return
+        groups, skip = self._row_group_span()
+        batches = self.parquet_file.iter_batches(
+            batch_size=self.batch_rows,
+            row_groups=groups,
+            columns=self.columns,
+            use_pandas_metadata=False,
+        )
+        file_row = self.offset
+        for record_batch in batches:
+            if skip:
+                if record_batch.num_rows <= skip:
+                    skip -= record_batch.num_rows
+                    continue
+                record_batch = record_batch.slice(skip)
+                skip = 0
+            if record_batch.num_rows > remaining:
+                record_batch = record_batch.slice(0, remaining)
+            remaining -= record_batch.num_rows
+
+            frame = record_batch.to_pandas()
+            frame.index = pd.RangeIndex(file_row, file_row + len(frame))
+            file_row += len(frame)
+            if self.row_filter is not None:
+                frame = self.row_filter(frame)
+            if len(frame):
+                yield frame
+            if remaining <= 0:
+                break
+
+
+class ParquetDataset:
+    """
+    Iterate a parquet dataset as projected pandas frames within [offset, offset+limit),
+    skipping partitions and row groups that cannot match `where`.
+    """
+
+    def __init__(
+        self,
+        dataset: ds.FileSystemDataset,
+        columns: Optional[Sequence[str]] = None,
+        where: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        batch_rows: int = DEFAULT_STREAM_BATCH_ROWS,
+        row_filter: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    ):
+        self.dataset = dataset
+        self.schema = dataset.schema
+        self.files = sorted(dataset.files)
+        self.batch_rows = batch_rows
+        self.row_filter = row_filter
+        self.where_text = where
+        self.where, where_columns = parse_where(where) if where else (None, [])
+        unknown = [c for c in where_columns if c not in self.schema.names]
+        if unknown:
+            raise ValueError(f"--where references columns not in the dataset: {unknown}")
+
+        self._fragments = {f.path: f for f in dataset.get_fragments()}
+        self._file_starts: Dict[str, int] = {}
+        total = 0
+        for path in self.files:
+            self._file_starts[path] = total
+            total += self._fragments[path].metadata.num_rows
+        self.file_rows = total
+        self.offset = min(max(offset, 0), self.file_rows)
+        end = self.file_rows if limit is None else min(self.offset + limit, self.file_rows)
+        self.end = max(end, self.offset)
+
+        if columns is None:
+            self.columns: Optional[List[str]] = None
+            self.missing_columns: List[str] = []
+        else:
+            wanted = list(dict.fromkeys([*columns, *where_columns]))
+            self.columns = [c for c in wanted if c in self.schema.names]
+            self.missing_columns = [c for c in dict.fromkeys(columns) if c not in self.schema.names]
+        self._units: Optional[List[RowGroupSlice]] = None
+
+    def units(self) -> List[RowGroupSlice]:
+        """Row groups within [offset, end) that survive partition and statistics pruning, in row order."""
+        if self._units is not None:
+            return self._units
+        if self.where is not None:
+            kept = {f.path for f in self.dataset.get_fragments(filter=self.where)}
+        else:
+            kept = set(self.files)
+        parts: List[RowGroupSlice] = []
+        for path in self.files:
+            file_start = self._file_starts[path]
+            fragment = self._fragments[path]
+            metadata = fragment.metadata
+            if path not in kept or file_start >= self.end or file_start + metadata.num_rows <= self.offset:
+                continue
+            group_starts = np.concatenate(
+                [[0], np.cumsum([metadata.row_group(rg).num_rows for rg in range(metadata.num_row_groups)])]
+            )
+            if self.where is not None:
+                groups = sorted(rg.id for piece in fragment.split_by_row_group(filter=self.where, schema=self.schema)
+                                for rg in piece.row_groups)
+            else:
+                groups = range(metadata.num_row_groups)
+            partition = tuple(sorted(ds.get_partition_keys(fragment.partition_expression).items()))
+            for rg in groups:
+                group_start = file_start + int(group_starts[rg])
+                start = max(group_start, self.offset)
+                stop = min(file_start + int(group_starts[rg + 1]), self.end)
+                if start < stop:
+                    parts.append(RowGroupSlice(path, rg, group_start, start, stop, partition))
+        self._units = parts
+        return parts
+
+    def __len__(self) -> int:
+        """Rows in the row groups left after pruning (an upper bound when `where` is set)."""
+        return sum(part.stop - part.start for part in self.units())
+
+    @property
+    def pruned_rows(self) -> int:
+        """Rows within [offset, end) skipped without decoding."""
+        return (self.end - self.offset) - len(self)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        for part in self.units():
+            for frame in iter_row_group_slice(part, self.columns, self.where, self.batch_rows, self.schema):
+                if self.row_filter is not None:
+                    frame = self.row_filter(frame)
+                if len(frame):
+                    yield frame
+
+
+class RowGroupSlices:
+    """Read an explicit list of RowGroupSlices (e.g. from ingest_id_index) with the reader interface above."""
+
+    def __init__(
+        self,
+        parts: Sequence[RowGroupSlice],
+        columns: Optional[Sequence[str]] = None,
+        schema: Optional[pa.Schema] = None,
+        where: Optional[pc.Expression] = None,
+        batch_rows: int = DEFAULT_STREAM_BATCH_ROWS,
+        row_filter: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    ):
+        self.parts = list(parts)
+        self.columns = list(columns) if columns is not None else None
+        self.schema = schema
+        self.where = where
+        self.batch_rows = batch_rows
+        self.row_filter = row_filter
+
+    def units(self) -> List[RowGroupSlice]:
+        return self.parts
+
+    def __len__(self) -> int:
+        return sum(part.stop - part.start for part in self.parts)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        files: Dict[str, pq.ParquetFile] = {}
+        for part in self.parts:
+            parquet_file = files.get(part.path) or files.setdefault(part.path, pq.ParquetFile(part.path))
+            for frame in iter_row_group_slice(part, self.columns, self.where, self.batch_rows, self.schema, parquet_file):
+                if self.row_filter is not None:
+                    frame = self.row_filter(frame)
+                if len(frame):
+                    yield frame
+
+
+def read_rows(source: str, rows: Iterable[int], columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Rows of a parquet file, directory or glob by row number (as ParquetStream/ParquetDataset number
+    them), indexed by row number; all columns (with partition values) unless `columns` is given.
+    """
+    if is_dataset_source(source):
+        reader = ParquetDataset(open_parquet_dataset(source))
+        schema = reader.schema
+    else:
+        reader = ParquetStream(Path(source), pre_buffer=False)
+        schema = reader.parquet_file.schema_arrow
+    wanted = np.unique(np.fromiter(rows, dtype=np.int64))
+    parts = []
+    for unit in reader.units():
+        inside = wanted[(wanted >= unit.start) & (wanted < unit.stop)]
+        if len(inside):
+            parts.append(replace(unit, start=int(inside[0]), stop=int(inside[-1]) + 1, rows=tuple(int(r) for r in inside)))
+    frames = list(RowGroupSlices(parts, columns, schema=schema))
+    if not frames:
+        return schema.empty_table().to_pandas()
+    return pd.concat(frames) if len(frames) > 1 else frames[0]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Retry policy and circuit breaker for ingest requests.
+
+`send_ingest` used to retry three times after a fixed 1 s, 2 s pause. With
+several ingesters (or --concurrency) those pauses are synchronized, so every
+client hits a throttled deployment again at the same moment, and during an
+outage each batch burns its attempts and the run stops at the first one.
+`RetryPolicy` makes this configurable:
+- exponential backoff with full jitter: attempt n sleeps uniform(0, min(cap,
+  base * 2**(n-1))) ("Exponential Backoff And Jitter", AWS architecture blog)
+- a Retry-After header (seconds or HTTP date) on 429/503 is honored: the
+  client sleeps at least that long, plus jitter
+- `classify_exception`: only connection errors, timeouts and broken responses
+  are retried; configuration errors (bad URL, TLS certificate, too many
+  redirects, ...) fail at once
+- an optional `CircuitBreaker`, shared by all sending threads: after
+  `threshold` consecutive transient failures (5xx gateway errors, connection
+  errors, timeouts; not 429) it opens, every sender waits, and one of them
+  probes GET /ping with growing pauses until the deployment answers. Attempts
+  that fail while the breaker is open are not counted against a batch's
+  retries, and the breaker gives up after `max_open_sec` with `CircuitOpenError`
+"""
+
+import email.utils
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import requests
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_BASE_SEC = 1.0
+DEFAULT_BACKOFF_MAX_SEC = 30.0
+# Longest Retry-After the client honors; a server asking for more gets this
+MAX_RETRY_AFTER_SEC = 300.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_MAX_OPEN_SEC = 900.0
+
+# Statuses retried after a pause; all but 429 also count as an outage for the breaker
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+OUTAGE_STATUSES = frozenset({502, 503, 504})
+
+# Checked before the retryable classes: SSLError and the proxy/URL errors subclass ConnectionError/ValueError
+_FATAL_EXCEPTIONS = (
+    requests.exceptions.SSLError,
+    requests.exceptions.InvalidURL,
+    requests.exceptions.InvalidSchema,
+    requests.exceptions.MissingSchema,
+    requests.exceptions.InvalidHeader,
+    requests.exceptions.URLRequired,
+    requests.exceptions.TooManyRedirects,
+    requests.exceptions.InvalidJSONError,
+)
+_RETRYABLE_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+)
+
+
+def classify_exception(exc: BaseException) -> bool:
+    """True if a request exception is worth retrying (transient network trouble)."""
+    if isinstance(exc, _FATAL_EXCEPTIONS):
+        return False
+    return isinstance(exc, _RETRYABLE_EXCEPTIONS)
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta seconds or HTTP date); None if absent or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+class CircuitOpenError(RuntimeError):
+    """The deployment stayed unreachable for longer than the breaker waits."""
+
+
+class CircuitBreaker:
+    """Pause all senders during an outage; one of them probes a health URL until it answers."""
+
+    def __init__(
+        self,
+        probe: Callable[[], bool],
+        threshold: int = DEFAULT_BREAKER_THRESHOLD,
+        max_open_sec: float = DEFAULT_BREAKER_MAX_OPEN_SEC,
+        probe_base_sec: float = DEFAULT_BACKOFF_BASE_SEC,
+        probe_max_sec: float = DEFAULT_BACKOFF_MAX_SEC,
+    ):
+        self.probe = probe
+        self.threshold = max(1, threshold)
+        self.max_open_sec = max_open_sec
+        self.probe_base_sec = probe_base_sec
+        self.probe_max_sec = probe_max_sec
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.open_seconds = 0.0
+        self._probing = False
+        self._cond = threading.Condition()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def record_success(self) -> None:
+        with self._cond:
+            self.failures = 0
+
+    def record_failure(self, reason: str) -> bool:
+        """Count a transient failure; True if the breaker is open (now or already)."""
+        with self._cond:
+            if self.opened_at is not None:
+                return True
+            self.failures += 1
+            if self.failures < self.threshold:
+                return False
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(
+                f"⚠ Circuit open after {self.failures} consecutive failures ({reason}); "
+                f"pausing all requests and probing the deployment"
+            )
+            return True
+
+    def wait(self) -> float:
+        """Block while the breaker is open; returns the seconds waited. Raises CircuitOpenError after max_open_sec."""
+        started = time.monotonic()
+        with self._cond:
+            while self.opened_at is not None:
+                if time.monotonic() - self.opened_at > self.max_open_sec:
+                    raise CircuitOpenError(
+                        f"Deployment unreachable for more than {self.max_open_sec:.0f}s (circuit breaker gave up)"
+                    )
+                if self._probing:
+                    self._cond.wait(1.0)
+                    continue
+                self._probing = True
+                self._cond.release()
+                try:
+                    healthy = self._probe_until_healthy()
+                finally:
+                    self._cond.acquire()
+                    self._probing = False
+                if healthy:
+                    self.open_seconds += time.monotonic() - self.opened_at
+                    logger.info(f"↻ Deployment answers again after {time.monotonic() - self.opened_at:.1f}s; circuit closed")
+                    self.opened_at = None
+                    self.failures = 0
+                self._cond.notify_all()
+        return time.monotonic() - started
+
+    def _probe_until_healthy(self) -> bool:
+        """Probe with growing, jittered pauses; False once max_open_sec has passed."""
+        attempt = 0
+        while time.monotonic() - self.opened_at <= self.max_open_sec:
+            attempt += 1
+            pause = random.uniform(0.5, 1.0) * min(self.probe_max_sec, self.probe_base_sec * 2 ** (attempt - 1))
+            time.sleep(pause)
+            try:
+                if self.probe():
+                    return True
+            except Exception as exc:
+                logger.debug(f"Probe failed: {exc}")
+            logger.info(f"↻ Deployment still unavailable ({time.monotonic() - self.opened_at:.0f}s); probing again")
+        return False
+
+    def summary(self) -> dict:
+        """Section for the run report."""
+        return {"circuit_breaker": {"opened": self.times_opened, "open_seconds": round(self.open_seconds, 3)}}
+
+
+def ping_probe(convex_url: str, session_factory: Callable[[], requests.Session], timeout_sec: float = 10.0) -> Callable[[], bool]:
+    """Breaker probe: GET {convex_url}/ping answers 200."""
+    def probe() -> bool:
+        return session_factory().get(f"{convex_url}/ping", timeout=timeout_sec).status_code == 200
+    return probe
+
+
+@dataclass
+class RetryPolicy:
+    """How send_ingest retries: attempts, jittered exponential backoff and an optional circuit breaker."""
+
+    max_retries: int = DEFAULT_MAX_RETRIES
+    base_sec: float = DEFAULT_BACKOFF_BASE_SEC
+    max_sec: float = DEFAULT_BACKOFF_MAX_SEC
+    breaker: Optional[CircuitBreaker] = None
+    rng: random.Random = field(default_factory=random.Random, repr=False)
+
+    @property
+    def max_attempts(self) -> int:
+        return max(0, self.max_retries) + 1
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Pause before retrying after failed `attempt` (1-based): full jitter, at least Retry-After."""
+        ceiling = min(self.max_sec, self.base_sec * 2 ** (attempt - 1))
+        pause = self.rng.uniform(0, ceiling)
+        if retry_after is not None:
+            # Honor the server, but spread the clients that got the same header
+            pause = min(retry_after, MAX_RETRY_AFTER_SEC) + self.rng.uniform(0, self.base_sec)
+        return pause
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Pipelined batch sending for the galaxy ingest scripts.
+
+`OrderedBatchSender` keeps up to `concurrency` ingest requests in flight on a
+thread pool while the caller keeps building the next batches, and hands the
+finished batches back strictly in submission (= source) order. Accounting such
+as `stats`/`failed_at` can therefore stay exact even when requests complete out
+of order: everything before the first failed batch is known to be committed, so
+its start row remains a correct resume offset.
+
+With `max_pending_bytes` (--max-memory, see ingest_memory), submitting also
+blocks while the batches held by the sender exceed that many bytes.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, List, Optional
+
+
+@dataclass
+class SentBatch:
+    """A finished batch: caller metadata, the payload and either the send result or the exception."""
+    meta: Any
+    batch: List[Any]
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class OrderedBatchSender:
+    """Bounded in-flight sender that returns finished batches in submission order."""
+
+    def __init__(
+        self,
+        send_fn: Callable[[List[Any]], Any],
+        concurrency: int = 1,
+        max_pending: Optional[int] = None,
+        max_pending_bytes: Optional[int] = None,
+    ):
+        self.send_fn = send_fn
+        self.concurrency = max(1, concurrency)
+        # Finished batches wait behind a slow head-of-line batch; cap how many may pile up.
+        self.max_pending = max_pending or self.concurrency * 2
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest-send")
+        self._pending: Deque[tuple] = deque()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, meta: Any, batch: List[Any], nbytes: int = 0) -> List[SentBatch]:
+        """Queue a batch (of `nbytes` in memory) for sending; returns batches that finished in order so far."""
+        future = self._executor.submit(self.send_fn, batch)
+        self._pending.append((meta, batch, future, nbytes))
+        self.pending_bytes += nbytes
+        finished = self._collect_ready()
+        while len(self._pending) >= self.max_pending or self._over_bytes():
+            finished.append(self._pop_head())
+            finished.extend(self._collect_ready())
+        return finished
+
+    def _over_bytes(self) -> bool:
+        # One batch may always be in flight, whatever its size
+        return (
+            self.max_pending_bytes is not None
+            and len(self._pending) > 1
+            and self.pending_bytes > self.max_pending_bytes
+        )
+
+    def drain(self) -> List[SentBatch]:
+        """Wait for every in-flight batch and return them in order."""
+        finished = []
+        while self._pending:
+            finished.append(self._pop_head())
+        return finished
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _collect_ready(self) -> List[SentBatch]:
+        finished = []
+        while self._pending and self._pending[0][2].done():
+            finished.append(self._pop_head())
+        return finished
+
+    def _pop_head(self) -> SentBatch:
+        meta, batch, future, nbytes = self._pending.popleft()
+        self.pending_bytes -= nbytes
+        return self._resolve(meta, batch, future)
+
+    @staticmethod
+    def _resolve(meta: Any, batch: List[Any], future: Future) -> SentBatch:
+        try:
+            return SentBatch(meta, batch, result=future.result())
+        except Exception as exc:
+            return SentBatch(meta, batch, error=exc)
+
+    def __enter__(self) -> "OrderedBatchSender":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
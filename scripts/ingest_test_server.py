@@ -0,0 +1,837 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Convex ingest HTTP actions, for load and fault-injection tests.
+
+Production cannot be load-tested, and the retry, adaptive-batch and
+rollback/`failed_at` paths of the ingest scripts only run when something goes
+wrong. `IngestTestServer` serves the same contract as
+convex/galaxies/batch_ingest.ts from memory:
+- GET /ping -> {"message": "pong"}
+- POST /ingest/galaxies with `Authorization: Bearer <token>`, identity/gzip/deflate
+  bodies and {galaxies: [...], mode?: insert|update|upsert}
+- 200 {success, mode, inserted/skipped | updated/notFound | inserted/updated, totalInBatch};
+  401/400/415 JSON errors; 500 {success: false, mode, error, detail, rollback: true}
+  when the batch fails, in which case nothing of it is stored
+- galaxies are checked like the mutation's argument validator (required core
+  fields and their types, no unknown keys)
+- POST /export/galaxies/bounds and POST /export/galaxies (convex/galaxies/export.ts),
+  with the export token (`Authorization: Bearer <export token>`): key ranges of a sort field, paged with a cursor and the search filters, over
+  the stored galaxies (their exported fields; the aggregates stay unset, as for
+  freshly ingested galaxies)
+- POST /export/classifications (convex/classifications/export.ts), also with the
+  export token: classifications created in (after, upTo], oldest first; the table is filled with
+  `add_classifications` (or `--classifications N` standalone), since nothing
+  else writes it here
+
+On top of that it simulates (see `FaultProfile`):
+- request latency: a distribution per request plus a cost per galaxy
+- Convex's per-mutation read limit: batches whose simulated read cost exceeds
+  it fail with "Too many bytes read" and are rolled back
+- a request body size limit (413)
+- injected 429/502/503/504 responses, optionally as HTML error pages, with
+  Retry-After, and "ambiguous" failures where the batch was stored before the
+  error was returned (as when a gateway times out after the commit)
+- 200 responses with an HTML body, as from a misconfigured proxy
+- poison galaxies (ids that always make their batch fail)
+- a limit on concurrent requests (429 above it)
+- an outage window in which every request, /ping included, gets a 503 page
+
+GET /stats returns request counters and the number of stored galaxies. Run
+standalone with:
+    python scripts/ingest_test_server.py --port 8787 --fail-rate 0.05
+or use ingest_load_test.py, which starts it, runs the ingester against it and
+checks the result.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+DEFAULT_TOKEN = "test-token"
+DEFAULT_EXPORT_TOKEN = "test-export-token"
+DEFAULT_PORT = 8787
+TRANSIENT_STATUSES = (429, 502, 503, 504)
+
+# Convex's per-function read limit
+READ_LIMIT_BYTES = 16 * 1024 * 1024
+
+# galaxySchemaDefinition (convex/schema.ts): required core fields and their JSON types
+REQUIRED_GALAXY_FIELDS: Dict[str, Tuple[type, ...]] = {
+    "id": (str,),
+    "ra": (int, float),
+    "dec": (int, float),
+    "reff": (int, float),
+    "reff_pixels": (int, float),
+    "q": (int, float),
+    "pa": (int, float),
+    "nucleus": (bool,),
+    "misc": (dict,),
+}
+# formatGalaxyForExport (convex/galaxies/export.ts): fields of an exported galaxy; the aggregates default to 0
+EXPORT_FIELDS = ("id", "numericId", "ra", "dec", "reff", "q", "pa", "mag", "mean_mue", "nucleus")
+EXPORT_AGGREGATE_FIELDS = ("totalClassifications", "numVisibleNucleus", "numAwesomeFlag", "numFailedFitting", "totalAssigned")
+# SORT_FIELDS (convex/galaxies/export.ts): sort key (also the field name) -> value kind
+EXPORT_SORT_KINDS = {
+    "numericId": "int64", "id": "string", "ra": "number", "dec": "number", "reff": "number", "q": "number",
+    "pa": "number", "mag": "number", "mean_mue": "number", "nucleus": "boolean",
+    **{name: "int64" for name in EXPORT_AGGREGATE_FIELDS},
+}
+MAX_EXPORT_PAGE_SIZE = 2000
+# exportClassificationsSinceInternal: how far behind now the first page of a run stops by default
+DEFAULT_SETTLE_MS = 60_000
+
+
+def _parse_int(text: str) -> int:
+    # parseInt keeps the integer part: "3.0" -> 3
+    return int(float(text))
+
+
+# applySearchFilters: search argument stem -> (field, parser); aggregates count as 0 when unset
+_SEARCH_RANGES = {
+    "Ra": ("ra", float), "Dec": ("dec", float), "Reff": ("reff", float), "Q": ("q", float), "Pa": ("pa", float),
+    "Mag": ("mag", float), "MeanMue": ("mean_mue", float),
+    "TotalClassifications": ("totalClassifications", _parse_int), "NumVisibleNucleus": ("numVisibleNucleus", _parse_int),
+    "NumAwesomeFlag": ("numAwesomeFlag", _parse_int), "NumFailedFitting": ("numFailedFitting", _parse_int),
+    "TotalAssigned": ("totalAssigned", _parse_int),
+}
+BATCH_ITEM_KEYS = frozenset(
+    ("galaxy", "photometryBand", "photometryBandR", "photometryBandI", "sourceExtractor", "thuruthipilly")
+)
+
+_HTML_ERROR_PAGE = (
+    "<html>\r\n<head><title>{status} {reason}</title></head>\r\n<body>\r\n"
+    "<center><h1>{status} {reason}</h1></center>\r\n<hr><center>nginx</center>\r\n</body>\r\n</html>\r\n"
+)
+
+
+# --------------------------------------------------------------------------------------
+# Configuration
+# --------------------------------------------------------------------------------------
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Latency distribution in seconds from a spec:
+    'fixed:S', 'uniform:LO,HI' or 'lognormal:MEDIAN,SIGMA'.
+    """
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(p) for p in params.split(",")] if params else []
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: values[0]
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if kind == "lognormal" and len(values) == 2:
+            return lambda rng: rng.lognormvariate(0, values[1]) * values[0]
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency spec {spec!r}; expected fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+
+
+@dataclass
+class FaultProfile:
+    """What the stand-in simulates; the defaults behave like a healthy, fast deployment."""
+
+    latency: str = "fixed:0"
+    latency_per_galaxy: float = 0.0
+    # Simulated bytes read per galaxy (existence check, aggregates); READ_LIMIT_BYTES per batch
+    read_bytes_per_galaxy: int = 0
+    max_body_bytes: int = 20 * 1024 * 1024
+    fail_rate: float = 0.0
+    fail_statuses: Tuple[int, ...] = TRANSIENT_STATUSES
+    html_rate: float = 0.0
+    ambiguous_rate: float = 0.0
+    retry_after: Optional[float] = None
+    html_ok_rate: float = 0.0
+    poison_ids: FrozenSet[str] = field(default_factory=frozenset)
+    max_in_flight: int = 0
+    # (start, duration) in seconds after the server started
+    outage: Optional[Tuple[float, float]] = None
+    seed: Optional[int] = None
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """FaultProfile options, shared with ingest_load_test.py."""
+    group = parser.add_argument_group("stand-in server")
+    group.add_argument("--token", default=DEFAULT_TOKEN, help=f"Accepted ingest token (default: {DEFAULT_TOKEN})")
+    group.add_argument("--export-token", default=DEFAULT_EXPORT_TOKEN,
+                       help=f"Accepted export token (default: {DEFAULT_EXPORT_TOKEN})")
+    group.add_argument("--latency", default="fixed:0",
+                       help="Request latency: fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA in seconds (default: fixed:0)")
+    group.add_argument("--latency-per-galaxy", type=float, default=0.0,
+                       help="Extra latency per galaxy in the batch, in seconds (default: 0)")
+    group.add_argument("--read-bytes-per-galaxy", type=int, default=0,
+                       help=f"Simulated bytes read per galaxy; batches above {READ_LIMIT_BYTES} bytes fail with "
+                            "'Too many bytes read' (default: 0, off). 600000 makes batches above ~27 fail")
+    group.add_argument("--max-body-bytes", type=int, default=FaultProfile.max_body_bytes,
+                       help=f"Largest accepted request body; larger ones get 413 (default: {FaultProfile.max_body_bytes})")
+    group.add_argument("--fail-rate", type=float, default=0.0,
+                       help="Fraction of ingest requests answered with an injected --fail-statuses error (default: 0)")
+    group.add_argument("--fail-statuses", default=",".join(str(s) for s in TRANSIENT_STATUSES),
+                       help="Comma-separated statuses to inject (default: 429,502,503,504)")
+    group.add_argument("--html-rate", type=float, default=0.0,
+                       help="Fraction of injected errors sent as HTML error pages instead of JSON (default: 0)")
+    group.add_argument("--ambiguous-rate", type=float, default=0.0,
+                       help="Fraction of injected errors for which the batch was stored anyway (default: 0)")
+    group.add_argument("--retry-after", type=float, help="Retry-After seconds sent with injected 429/503 responses")
+    group.add_argument("--html-ok-rate", type=float, default=0.0,
+                       help="Fraction of requests answered 200 with an HTML page and nothing stored (default: 0)")
+    group.add_argument("--poison-ids", default="",
+                       help="Comma-separated galaxy ids that make their batch fail (and roll back) every time")
+    group.add_argument("--max-in-flight", type=int, default=0,
+                       help="Concurrent ingest requests above which 429 is returned (default: 0, unlimited)")
+    group.add_argument("--outage", metavar="START,DURATION",
+                       help="Answer everything (including /ping) with 503 from START to START+DURATION seconds "
+                            "after the server started")
+    group.add_argument("--seed", type=int, help="Seed for latency and fault injection")
+
+
+def parse_outage(spec: str) -> Tuple[float, float]:
+    try:
+        start, duration = (float(v) for v in spec.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid outage spec {spec!r}; expected START,DURATION in seconds")
+    return start, duration
+
+
+def fault_profile_from_args(args: argparse.Namespace) -> FaultProfile:
+    profile = FaultProfile(
+        latency=args.latency,
+        latency_per_galaxy=args.latency_per_galaxy,
+        read_bytes_per_galaxy=args.read_bytes_per_galaxy,
+        max_body_bytes=args.max_body_bytes,
+        fail_rate=args.fail_rate,
+        fail_statuses=tuple(int(s) for s in args.fail_statuses.split(",") if s.strip()),
+        html_rate=args.html_rate,
+        ambiguous_rate=args.ambiguous_rate,
+        retry_after=args.retry_after,
+        html_ok_rate=args.html_ok_rate,
+        poison_ids=frozenset(s.strip() for s in args.poison_ids.split(",") if s.strip()),
+        max_in_flight=args.max_in_flight,
+        outage=parse_outage(args.outage) if args.outage else None,
+        seed=args.seed,
+    )
+    parse_latency(profile.latency)
+    return profile
+
+
+# --------------------------------------------------------------------------------------
+# Ingest semantics
+# --------------------------------------------------------------------------------------
+class BatchError(Exception):
+    """The mutation failed; the whole batch is rolled back."""
+
+
+def check_batch_item(item: Any, index: int) -> str:
+    """Mirror of the mutation's argument validator for one batch item; returns the galaxy id."""
+    where = f"Path: .galaxies[{index}]"
+    if not isinstance(item, dict):
+        raise BatchError(f"ArgumentValidationError: Value does not match validator. {where}")
+    unknown = sorted(set(item) - BATCH_ITEM_KEYS)
+    if unknown:
+        raise BatchError(f"ArgumentValidationError: Object contains extra field `{unknown[0]}` that is not in the validator. {where}")
+    galaxy = item.get("galaxy")
+    if not isinstance(galaxy, dict):
+        raise BatchError(f"ArgumentValidationError: Object is missing the required field `galaxy`. {where}")
+    for name, types in REQUIRED_GALAXY_FIELDS.items():
+        value = galaxy.get(name)
+        if value is None:
+            raise BatchError(f"ArgumentValidationError: Object is missing the required field `{name}`. {where}.galaxy")
+        # bool is an int in Python, but not a number for Convex
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            raise BatchError(f"ArgumentValidationError: Value does not match validator. {where}.galaxy.{name}")
+    return galaxy["id"]
+
+
+class GalaxyStore:
+    """In-memory galaxies table: external id -> exported fields (with numericId). Batches are applied atomically."""
+
+    def __init__(self):
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._next_numeric_id = 1
+        self._version = 0
+        self._sorted: Dict[str, Tuple[int, int, List[Any], List[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, galaxy_id: str) -> bool:
+        return galaxy_id in self._rows
+
+    def apply(self, mode: str, galaxies: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Counts as the mutation returns them; nothing is stored if this raises."""
+        ids = [galaxy["id"] for galaxy in galaxies]
+        with self._lock:
+            self._version += 1
+            if mode == "insert":
+                new = [gid for gid in dict.fromkeys(ids) if gid not in self._rows]
+                result = {"inserted": len(new), "skipped": len(ids) - len(new)}
+            elif mode == "update":
+                found = [galaxy for galaxy in galaxies if galaxy["id"] in self._rows]
+                for galaxy in found:
+                    self._set_fields(self._rows[galaxy["id"]], galaxy)
+                return {"updated": len(found), "notFound": len(ids) - len(found), "totalInBatch": len(ids)}
+            else:
+                new = [gid for gid in dict.fromkeys(ids) if gid not in self._rows]
+                result = {"inserted": len(new), "updated": len(ids) - len(new)}
+            fresh = set(new)
+            for galaxy in galaxies:
+                gid = galaxy["id"]
+                if gid in fresh:
+                    fresh.discard(gid)
+                    self._rows[gid] = {"numericId": self._next_numeric_id}
+                    self._next_numeric_id += 1
+                elif mode == "insert":
+                    continue
+                self._set_fields(self._rows[gid], galaxy)
+            result["totalInBatch"] = len(ids)
+            return result
+
+    @staticmethod
+    def _set_fields(row: Dict[str, Any], galaxy: Dict[str, Any]) -> None:
+        for name in EXPORT_FIELDS:
+            if name != "numericId" and name in galaxy:
+                row[name] = galaxy[name]
+
+    # Export
+    def sorted_by(self, field: str) -> Tuple[int, List[Any], List[Dict[str, Any]]]:
+        """(galaxies without the field, the field's values, rows) in index order: unset first, then by value, numericId."""
+        with self._lock:
+            cached = self._sorted.get(field)
+            if cached is None or cached[0] != self._version:
+                rows = sorted(
+                    self._rows.values(),
+                    key=lambda row: (row.get(field) is not None, row.get(field) if row.get(field) is not None else 0, row["numericId"]),
+                )
+                missing = sum(1 for row in rows if row.get(field) is None)
+                cached = (self._version, missing, [row[field] for row in rows[missing:]], rows)
+                self._sorted[field] = cached
+            return cached[1:]
+
+
+class ClassificationStore:
+    """In-memory classifications table, in _creationTime order (milliseconds, as Convex sets it)."""
+
+    def __init__(self):
+        self._rows: List[Dict[str, Any]] = []
+        self._times: List[float] = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, count: int, rng: random.Random, created_ms: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Insert `count` random classifications, created now (or at `created_ms`, e.g. in the past)."""
+        added = []
+        with self._lock:
+            for _ in range(count):
+                created = time.time() * 1000 if created_ms is None else created_ms
+                if self._times and created <= self._times[-1]:
+                    created = self._times[-1] + 0.001
+                row = {
+                    "_id": f"c{self._next_id:09d}",
+                    "_creationTime": created,
+                    "userId": f"u{rng.randrange(50):04d}",
+                    "galaxyExternalId": f"G{rng.randrange(1_000_000):07d}",
+                    "lsb_class": rng.choice((-1, 0, 1)),
+                    "morphology": rng.choice((-1, 0, 1, 2)),
+                    "awesome_flag": rng.random() < 0.05,
+                    "valid_redshift": rng.random() < 0.5,
+                    "visible_nucleus": rng.random() < 0.2,
+                    "timeSpent": rng.randrange(1000, 120_000),
+                }
+                if rng.random() < 0.1:
+                    row["comments"] = "looks like a merger"
+                self._next_id += 1
+                self._rows.append(row)
+                self._times.append(created)
+                added.append(row)
+        return added
+
+    def page(self, after: float, up_to: float, offset: int, size: int) -> Tuple[List[Dict[str, Any]], bool]:
+        with self._lock:
+            start, end = bisect_right(self._times, after), bisect_right(self._times, up_to)
+            page = self._rows[start + offset:min(end, start + offset + size)]
+            return [dict(row) for row in page], start + offset + size >= end
+
+
+def format_export_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    out = {name: row.get(name) for name in EXPORT_FIELDS}
+    out["numericId"] = str(row["numericId"])
+    for name in EXPORT_AGGREGATE_FIELDS:
+        out[name] = row.get(name) or 0
+    return out
+
+
+def matches_search_filters(row: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Mirror of applySearchFilters in convex/galaxies/export.ts."""
+    search_id = filters.get("searchId")
+    if search_id and search_id.lower().strip() not in str(row.get("id", "")).lower():
+        return False
+    for stem, (name, parse) in _SEARCH_RANGES.items():
+        value = row.get(name)
+        if name in EXPORT_AGGREGATE_FIELDS:
+            value = value or 0
+        elif value is None:
+            continue
+        low, high = filters.get(f"search{stem}Min"), filters.get(f"search{stem}Max")
+        if low and value < parse(low):
+            return False
+        if high and value > parse(high):
+            return False
+    nucleus = filters.get("searchNucleus")
+    return nucleus is None or row.get("nucleus") == nucleus
+
+
+def search_index_range(sort_by: str, body: Dict[str, Any]) -> Optional[Tuple[Any, Any, bool]]:
+    """Mirror of searchIndexRange: (lower, upper, include_upper) narrowed to the filter on the sort field, None if empty."""
+    filters = body.get("filters") or {}
+    lower, upper, include_upper = body.get("lower"), body.get("upper"), bool(body.get("includeUpper"))
+    low = high = None
+    if sort_by == "nucleus":
+        low = high = filters.get("searchNucleus")
+    for stem, (name, parse) in _SEARCH_RANGES.items():
+        if name == sort_by:
+            low, high = (_search_bound(filters.get(f"search{stem}{end}"), parse) for end in ("Min", "Max"))
+    if low is not None and (lower is None or low > lower):
+        lower = low
+    if high is not None and (upper is None or high < upper):
+        upper, include_upper = high, True
+    if lower is not None and upper is not None and (lower > upper or (lower == upper and not include_upper)):
+        return None
+    return lower, upper, include_upper
+
+
+def _search_bound(text: Any, parse: Callable[[str], Any]) -> Any:
+    if not text:
+        return None
+    try:
+        return parse(text)
+    except ValueError:
+        return None
+
+
+# --------------------------------------------------------------------------------------
+# HTTP
+# --------------------------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    server: "_HTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("stand-in: " + format % args)
+
+    def _send(self, status: int, payload: Any = None, html: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        if html is not None:
+            body, content_type = html.encode("utf-8"), "text/html"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.owner.count(status)
+
+    def _outage(self) -> bool:
+        if not self.server.owner.in_outage():
+            return False
+        self._send(503, html=_HTML_ERROR_PAGE.format(status=503, reason="Service Temporarily Unavailable"))
+        return True
+
+    def do_GET(self):
+        if self.path != "/stats" and self._outage():
+            return
+        if self.path == "/ping":
+            self._send(200, {"message": "pong"})
+        elif self.path == "/stats":
+            self._send(200, self.server.owner.stats())
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if self.path not in ("/ingest/galaxies", "/export/galaxies", "/export/galaxies/bounds", "/export/classifications"):
+            self._send(404, {"error": "Not found"})
+            return
+        if self._outage():
+            return
+        if self.path.startswith("/export/"):
+            self._export(raw)
+            return
+        owner = self.server.owner
+        if not owner.enter():
+            self._send(429, {"error": "Too many concurrent requests"}, headers=owner.retry_after_header(429))
+            return
+        try:
+            self._ingest(raw)
+        finally:
+            owner.leave()
+
+    def _authorized(self, token: str) -> bool:
+        auth = self.headers.get("Authorization") or ""
+        if not auth.startswith("Bearer "):
+            self._send(401, {"error": "Missing Bearer token"})
+            return False
+        if auth[7:].strip() != token:
+            self._send(401, {"error": "Unauthorized"})
+            return False
+        return True
+
+    def _export(self, raw: bytes):
+        owner = self.server.owner
+        owner.add("export_requests")
+        if not self._authorized(owner.export_token):
+            return
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            self._send(400, {"error": "Invalid JSON body"})
+            return
+        if not isinstance(body, dict):
+            self._send(400, {"error": "Invalid body structure", "detail": "Expected a JSON object"})
+            return
+        if self.path == "/export/classifications":
+            sort_by = None
+        else:
+            sort_by = body.get("sortBy") or "numericId"
+        if sort_by is not None and sort_by not in EXPORT_SORT_KINDS:
+            self._send(400, {"error": "Invalid sortBy", "detail": f"Expected one of: {', '.join(EXPORT_SORT_KINDS)}"})
+            return
+
+        time.sleep(owner.latency(0))
+        if owner.draw_fault() == "error":
+            status = owner.draw_status()
+            self._send(status, {"error": f"Injected HTTP {status}"}, headers=owner.retry_after_header(status))
+            return
+        if sort_by is None:
+            self._send(200, owner.export_classifications(body))
+        elif self.path.endswith("/bounds"):
+            self._send(200, owner.export_bounds(sort_by, body.get("partitions")))
+        else:
+            self._send(200, owner.export_page(sort_by, body))
+
+    def _ingest(self, raw: bytes):
+        owner = self.server.owner
+        if not self._authorized(owner.token):
+            return
+        if len(raw) > owner.faults.max_body_bytes:
+            self._send(413, html=_HTML_ERROR_PAGE.format(status=413, reason="Request Entity Too Large"))
+            return
+
+        encoding = (self.headers.get("Content-Encoding") or "identity").strip().lower()
+        if encoding not in ("identity", "gzip", "deflate"):
+            self._send(415, {"error": "Unsupported Content-Encoding", "detail": "Expected one of: identity, gzip, deflate"})
+            return
+        try:
+            if encoding == "gzip":
+                raw = gzip.decompress(raw)
+            elif encoding == "deflate":
+                raw = zlib.decompress(raw)
+            body = json.loads(raw)
+        except (OSError, zlib.error, ValueError):
+            self._send(400, {"error": "Invalid JSON body"})
+            return
+        if not isinstance(body, dict) or "galaxies" not in body:
+            self._send(400, {"error": "Invalid body structure",
+                             "detail": "Expected { galaxies: [...], mode?: 'insert'|'update'|'upsert' }"})
+            return
+        galaxies = body["galaxies"]
+        if not isinstance(galaxies, list):
+            self._send(400, {"error": "Invalid body structure", "detail": "'galaxies' must be an array"})
+            return
+        mode = str(body.get("mode") or "insert").lower()
+        if mode not in ("insert", "update", "upsert"):
+            self._send(400, {"error": "Invalid mode", "detail": "mode must be 'insert', 'update', or 'upsert'"})
+            return
+
+        time.sleep(owner.latency(len(galaxies)))
+        fault = owner.draw_fault()
+        if fault == "html_ok":
+            self._send(200, html="<html><body><h1>Welcome</h1></body></html>")
+            return
+
+        # An injected error normally means nothing was stored; an ambiguous one comes after the commit
+        commit = fault != "error" or owner.ambiguous()
+        try:
+            result = owner.run_mutation(mode, galaxies) if commit else None
+        except BatchError as exc:
+            self._send(500, {"success": False, "mode": mode, "error": f"Batch {mode} failed",
+                             "detail": f"Uncaught Error: {exc}", "rollback": True})
+            return
+        if fault == "error":
+            if result is not None:
+                owner.add("ambiguous_inserted", result.get("inserted", 0))
+            status = owner.draw_status()
+            headers = owner.retry_after_header(status)
+            if owner.draw_html():
+                reason = {429: "Too Many Requests", 502: "Bad Gateway", 503: "Service Temporarily Unavailable",
+                          504: "Gateway Time-out"}.get(status, "Error")
+                self._send(status, html=_HTML_ERROR_PAGE.format(status=status, reason=reason), headers=headers)
+            else:
+                self._send(status, {"error": f"Injected HTTP {status}"}, headers=headers)
+            return
+        self._send(200, {"success": True, "mode": mode, **result})
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    owner: "IngestTestServer"
+
+
+class IngestTestServer:
+    """The stand-in server; `start()` serves in a background thread, `serve_forever()` in the caller's."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token: str = DEFAULT_TOKEN, faults: Optional[FaultProfile] = None,
+                 export_token: str = DEFAULT_EXPORT_TOKEN):
+        self.token = token
+        self.export_token = export_token
+        self.faults = faults or FaultProfile()
+        self.store = GalaxyStore()
+        self.classifications = ClassificationStore()
+        self._latency = parse_latency(self.faults.latency)
+        self._rng = random.Random(self.faults.seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.counters: Counter = Counter()
+        self._httpd = _HTTPServer((host, port), _Handler)
+        self._httpd.owner = self
+        self._thread: Optional[threading.Thread] = None
+        self.started = time.monotonic()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "IngestTestServer":
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="ingest-test-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self.started = time.monotonic()
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    # Request bookkeeping (called from handler threads)
+    def add(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def count(self, status: int) -> None:
+        self.add(f"status_{status}")
+
+    def enter(self) -> bool:
+        with self._lock:
+            self.counters["ingest_requests"] += 1
+            if self.faults.max_in_flight and self._in_flight >= self.faults.max_in_flight:
+                self.counters["rejected_in_flight"] += 1
+                return False
+            self._in_flight += 1
+            self.counters["max_in_flight_seen"] = max(self.counters["max_in_flight_seen"], self._in_flight)
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def in_outage(self) -> bool:
+        if self.faults.outage is None:
+            return False
+        start, duration = self.faults.outage
+        if start <= time.monotonic() - self.started < start + duration:
+            self.add("outage_responses")
+            return True
+        return False
+
+    def _draw(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self._rng.random() < rate
+
+    def latency(self, galaxies: int) -> float:
+        with self._lock:
+            base = self._latency(self._rng)
+        return max(0.0, base + self.faults.latency_per_galaxy * galaxies)
+
+    def draw_fault(self) -> Optional[str]:
+        if self._draw(self.faults.html_ok_rate):
+            return "html_ok"
+        if self._draw(self.faults.fail_rate):
+            return "error"
+        return None
+
+    def draw_status(self) -> int:
+        with self._lock:
+            status = self._rng.choice(self.faults.fail_statuses)
+        self.add("injected_errors")
+        return status
+
+    def draw_html(self) -> bool:
+        return self._draw(self.faults.html_rate)
+
+    def ambiguous(self) -> bool:
+        if self._draw(self.faults.ambiguous_rate):
+            self.add("ambiguous_commits")
+            return True
+        return False
+
+    def retry_after_header(self, status: int) -> Dict[str, str]:
+        if self.faults.retry_after is None or status not in (429, 503):
+            return {}
+        return {"Retry-After": f"{self.faults.retry_after:g}"}
+
+    def run_mutation(self, mode: str, galaxies: List[Any]) -> Dict[str, int]:
+        ids = [check_batch_item(item, index) for index, item in enumerate(galaxies)]
+        for index, gid in enumerate(ids):
+            if gid in self.faults.poison_ids:
+                raise BatchError(f"Failed at batch index {index}, galaxy external ID \"{gid}\": injected poison row")
+        read_bytes = self.faults.read_bytes_per_galaxy * len(ids)
+        if read_bytes > READ_LIMIT_BYTES:
+            self.add("read_limit_errors")
+            raise BatchError(
+                f"Too many bytes read in a single function execution (limit: {READ_LIMIT_BYTES} bytes). "
+                "Consider using smaller limits in your queries, paginating your queries, or using indexed queries "
+                "with a selective index range expressions."
+            )
+        result = self.store.apply(mode, [item["galaxy"] for item in galaxies])
+        self.add("galaxies_committed", len(ids))
+        return result
+
+    def export_bounds(self, sort_by: str, partitions: Any) -> Dict[str, Any]:
+        missing, values, _ = self.store.sorted_by(sort_by)
+        splits: List[int] = []
+        if sort_by == "numericId" and values:
+            # The galaxyIds aggregate: numericIds at evenly spaced ranks
+            count = min(max(1, int(partitions or 1)), 1024)
+            for i in range(1, count):
+                key = values[len(values) * i // count]
+                if not splits or key > splits[-1]:
+                    splits.append(key)
+        return {
+            "sortBy": sort_by,
+            "kind": EXPORT_SORT_KINDS[sort_by],
+            "min": values[0] if values else None,
+            "max": values[-1] if values else None,
+            "hasMissing": missing > 0,
+            "total": len(self.store),
+            "splits": splits,
+        }
+
+    def export_page(self, sort_by: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        missing, values, rows = self.store.sorted_by(sort_by)
+        keys = None if body.get("missing") else search_index_range(sort_by, body)
+        if body.get("missing"):
+            start, end = 0, missing
+        elif keys is None:
+            start = end = 0
+        elif keys[0] is None and keys[1] is None:
+            start, end = 0, len(rows)
+        else:
+            lower, upper, include_upper = keys
+            start = missing + (bisect_left(values, lower) if lower is not None else 0)
+            end = missing + len(values)
+            if upper is not None:
+                end = missing + (bisect_right(values, upper) if include_upper else bisect_left(values, upper))
+        selected = rows[start:end]
+        if body.get("sortOrder") == "desc":
+            selected = selected[::-1]
+        offset = int(body.get("cursor") or 0)
+        size = min(max(1, int(body.get("batchSize") or 500)), MAX_EXPORT_PAGE_SIZE)
+        page = selected[offset:offset + size]
+        filters = body.get("filters") or {}
+        done = offset + size >= len(selected)
+        self.add("export_rows_scanned", len(page))
+        return {
+            "galaxies": [format_export_row(row) for row in page if matches_search_filters(row, filters)],
+            "scanned": len(page),
+            "cursor": None if done else str(offset + size),
+            "isDone": done,
+        }
+
+    def add_classifications(self, count: int, created_ms: Optional[float] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            rng = random.Random(self._rng.random())
+        return self.classifications.add(count, rng, created_ms)
+
+    def export_classifications(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        after = float(body.get("after") or 0)
+        up_to = body.get("upTo")
+        if up_to is None:
+            up_to = time.time() * 1000 - max(0.0, float(body.get("settleMs", DEFAULT_SETTLE_MS)))
+        if up_to <= after:
+            return {"classifications": [], "upTo": after, "cursor": None, "isDone": True}
+        offset = int(body.get("cursor") or 0)
+        size = min(max(1, int(body.get("batchSize") or 1000)), MAX_EXPORT_PAGE_SIZE)
+        page, done = self.classifications.page(after, float(up_to), offset, size)
+        self.add("export_classifications_read", len(page))
+        return {"classifications": page, "upTo": up_to, "cursor": None if done else str(offset + size), "isDone": done}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"stored": len(self.store), "classifications": len(self.classifications), **self.counters}
+
+
+# --------------------------------------------------------------------------------------
+# Main
+# --------------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Convex /ingest/galaxies, /export/* and /ping endpoints")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    add_server_arguments(parser)
+    parser.add_argument("--classifications", type=int, default=0,
+                        help="Random classifications to fill the classifications table with (default: 0)")
+    args = parser.parse_args()
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s", "%Y-%m-%d %H:%M:%S"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    try:
+        server = IngestTestServer(args.host, args.port, args.token, fault_profile_from_args(args), args.export_token)
+        # Spread over the last 30 days, all past the settle time of the first export
+        for day in range(30, 0, -1):
+            share = args.classifications * (31 - day) // 30 - args.classifications * (30 - day) // 30
+            server.add_classifications(share, created_ms=(time.time() - day * 86_400) * 1000)
+    except Exception as e:
+        logger.error(f"❌ Error: {e}")
+        sys.exit(1)
+    logger.info(f"✓ Stand-in ingest server on {server.url} (token {args.token}); GET /stats for counters")
+    logger.info(f"  Use: --convex-http-actions-url {server.url} --ingest-token {args.token}")
+    logger.info(f"  Exports: --export-token {args.export_token}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info(f"Stopped; {json.dumps(server.stats())}")
+
+
+if __name__ == "__main__":
+    main()
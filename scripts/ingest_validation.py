@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Pre-flight validation for the galaxy ingest scripts (`--validate`).
+
+The ingest mutation is atomic: one bad galaxy rolls back its whole batch, and the
+client only learns about it after the round trip. `PreflightValidator` checks every
+frame column by column before any galaxy is built and routes failing rows to a
+parquet reject file, so only rows the server can accept are batched:
+- required galaxy fields (id, ra, dec, reff, reff_pixels, q, pa, nucleus) missing/NaN
+- +/-inf in any float-cast column (JSON has no encoding for it)
+- values outside DEFAULT_RANGES (ra, dec, q, pa)
+- values the mapping's cast cannot convert (e.g. text in a float column)
+- object IDs that occur more than once in the input (the first occurrence is kept)
+
+Each check is a vectorized mask over the frame; only the rejected rows get a
+per-row reason string. The reject file holds the rejected rows' source columns
+plus `_row` (file/dataset row number) and `_reasons` ("; "-separated).
+
+Duplicate detection keeps every object ID seen so far, as the string it is
+stored under (str_or_int_to_str), so an ID read as int64 in one batch and as
+float64 in the next (an integer column with nulls) is still one ID. `SeenIds`
+holds them in memory up to DEFAULT_MAX_SEEN_IDS (with `--max-memory`, up to a
+share of the working memory) and then moves them to a temporary SQLite file, so
+a catalog of any size is checked with bounded memory, more slowly past the limit.
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingest_mapping import VECTORIZED_CASTS, ColumnarPlan, _cast_elementwise, id_strings
+from ingest_memory import MemoryBudget, format_size
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+DEFAULT_REJECT_PATH = "ingest_rejects.parquet"
+
+# Galaxy fields the server schema requires (convex/schema.ts galaxySchemaDefinition)
+REQUIRED_FIELDS = ("id", "ra", "dec", "reff", "reff_pixels", "q", "pa", "nucleus")
+
+# Inclusive bounds for galaxy fields
+DEFAULT_RANGES: Dict[str, Tuple[float, float]] = {
+    "ra": (0.0, 360.0),
+    "dec": (-90.0, 90.0),
+    "q": (0.0, 1.0),
+    "pa": (-180.0, 360.0),
+}
+
+ROW_COLUMN = "_row"
+REASONS_COLUMN = "_reasons"
+REASON_SEPARATOR = "; "
+
+# Rejected rows are buffered and written as one row group
+_REJECT_FLUSH_ROWS = 10000
+
+# Seen object IDs kept in memory before they move to SQLite
+DEFAULT_MAX_SEEN_IDS = 2_000_000
+# Memory per seen ID: the string (~60 bytes for a 19-digit ID) plus its set slot
+SEEN_ID_BYTES = 100
+# Share of the MemoryBudget's working memory the seen IDs may take
+SEEN_IDS_SHARE = 0.25
+# IDs per SQLite lookup (below the default limit of 999 host parameters)
+_SQLITE_CHUNK = 900
+
+
+# --------------------------------------------------------------------------------------
+# Reject file
+# --------------------------------------------------------------------------------------
+class RejectFile:
+    """Parquet file of rejected rows (source columns + _row + _reasons), written incrementally."""
+
+    def __init__(
+        self,
+        path: Path,
+        schema: Optional[pa.Schema] = None,
+        text_columns: Sequence[str] = (),
+        trailing_columns: Sequence[str] = (ROW_COLUMN, REASONS_COLUMN),
+    ):
+        self.path = Path(path)
+        self.source_schema = schema
+        self.text_columns = set(text_columns)
+        # Written after the source columns; object-typed ones as text
+        self.trailing_columns = list(trailing_columns)
+        self.rows = 0
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._schema: Optional[pa.Schema] = None
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows = 0
+        # A reject file always describes the last run only
+        self.path.unlink(missing_ok=True)
+
+    def _table_schema(self, frame: pd.DataFrame) -> pa.Schema:
+        fields = []
+        for name in frame.columns:
+            if name == ROW_COLUMN:
+                fields.append(pa.field(name, pa.int64()))
+            elif name in (REASONS_COLUMN, *self.text_columns) or frame[name].dtype == object:
+                # Object columns may mix types (that is often why the row was rejected): kept as text
+                fields.append(pa.field(name, pa.string()))
+            elif self.source_schema is not None and name in self.source_schema.names:
+                fields.append(self.source_schema.field(name))
+            else:
+                fields.append(pa.field(name, pa.Schema.from_pandas(frame[[name]], preserve_index=False).field(0).type))
+        return pa.schema(fields)
+
+    def write(self, rejected: pd.DataFrame) -> None:
+        if len(rejected) == 0:
+            return
+        self._pending.append(rejected)
+        self._pending_rows += len(rejected)
+        self.rows += len(rejected)
+        if self._pending_rows >= _REJECT_FLUSH_ROWS:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        frame = pd.concat(self._pending, ignore_index=True)
+        self._pending, self._pending_rows = [], 0
+        if self._writer is None:
+            # Source columns first, then the row number and the reasons
+            columns = [c for c in frame.columns if c not in self.trailing_columns] + self.trailing_columns
+            self._schema = self._table_schema(frame[columns])
+            self._writer = pq.ParquetWriter(str(self.path), self._schema)
+        frame = frame.reindex(columns=self._schema.names)
+        for field in self._schema:
+            values = frame[field.name]
+            if pa.types.is_string(field.type) and values.dtype == object:
+                frame[field.name] = values.map(str).where(values.notna(), None)
+        self._writer.write_table(pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False))
+
+    def close(self) -> None:
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+# --------------------------------------------------------------------------------------
+# Validator
+# --------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------
+# Seen IDs
+# --------------------------------------------------------------------------------------
+class SeenIds:
+    """
+    Set of object IDs that spills to a temporary SQLite file past `max_memory_ids`.
+
+    `add_new` takes the (distinct) IDs of one frame and returns which were not seen
+    before. Once spilled, every ID lives in SQLite and the in-memory set stays empty.
+    """
+
+    def __init__(self, max_memory_ids: int = DEFAULT_MAX_SEEN_IDS, spill_dir: Optional[Path] = None):
+        self.max_memory_ids = max_memory_ids
+        self.spill_dir = spill_dir
+        self.count = 0
+        self._memory: set = set()
+        self._db: Optional[sqlite3.Connection] = None
+        self.spill_path: Optional[Path] = None
+
+    def add_new(self, ids: List[Optional[str]]) -> np.ndarray:
+        """Mask of the IDs not seen before (None counts as unseen and is not remembered)."""
+        if self._db is None and len(self._memory) + len(ids) > self.max_memory_ids:
+            self._spill()
+        if self._db is None:
+            seen = self._memory
+            keep = np.fromiter((oid is None or oid not in seen for oid in ids), dtype=bool, count=len(ids))
+            seen.update(ids)
+            seen.discard(None)
+            self.count = len(seen)
+            return keep
+        present = [oid for oid in ids if oid is not None]
+        found = set()
+        for start in range(0, len(present), _SQLITE_CHUNK):
+            chunk = present[start:start + _SQLITE_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            found.update(row[0] for row in self._db.execute(f"SELECT id FROM seen WHERE id IN ({marks})", chunk))
+        new = [(oid,) for oid in present if oid not in found]
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO seen (id) VALUES (?)", new)
+        self.count += len(new)
+        return np.fromiter((oid is None or oid not in found for oid in ids), dtype=bool, count=len(ids))
+
+    def _spill(self) -> None:
+        handle, name = tempfile.mkstemp(prefix="ingest-seen-ids-", suffix=".sqlite", dir=self.spill_dir)
+        os.close(handle)
+        self.spill_path = Path(name)
+        self._db = sqlite3.connect(name, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=OFF")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute("CREATE TABLE seen (id TEXT PRIMARY KEY) WITHOUT ROWID")
+        with self._db:
+            self._db.executemany("INSERT INTO seen (id) VALUES (?)", ((oid,) for oid in self._memory))
+        logger.warning(
+            f"⚠ Pre-flight validation: over {self.max_memory_ids} distinct object IDs "
+            f"(~{format_size(self.max_memory_ids * SEEN_ID_BYTES)}); duplicate detection continues in "
+            f"{self.spill_path}, more slowly"
+        )
+        self._memory = set()
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            self.spill_path.unlink(missing_ok=True)
+
+
+def _join_reasons(masks: Sequence[Tuple[str, np.ndarray]], n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Combine (reason, row mask) pairs into (any-failed mask, reason string per failed row)."""
+    failed = np.zeros(n, dtype=bool)
+    for _, mask in masks:
+        failed |= mask
+    reasons = np.full(int(failed.sum()), "", dtype=object)
+    for reason, mask in masks:
+        hit = mask[failed]
+        if hit.any():
+            reasons[hit] = np.where(reasons[hit] == "", reason, reasons[hit] + REASON_SEPARATOR + reason)
+    return failed, reasons
+
+
+class PreflightValidator:
+    """
+    Vectorized per-frame validation against a ColumnarPlan.
+
+    `check` is stateless (safe to run in worker processes); cross-frame duplicate
+    IDs are tracked by `keep_unseen`, and `reject` writes to the reject file.
+    `filter` does all three for one frame.
+    """
+
+    def __init__(
+        self,
+        plan: ColumnarPlan,
+        reject_path: Optional[Path] = None,
+        schema: Optional[pa.Schema] = None,
+        ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+        required: Sequence[str] = REQUIRED_FIELDS,
+        memory_budget: Optional[MemoryBudget] = None,
+        max_seen_ids: int = DEFAULT_MAX_SEEN_IDS,
+    ):
+        ranges = DEFAULT_RANGES if ranges is None else ranges
+        core = {key: leaf for key, leaf in plan.mapping.items() if isinstance(leaf, tuple) and leaf[0] is not None}
+        self.id_column: Optional[str] = core["id"][0] if "id" in core else None
+        self.required = [(field, core[field][0]) for field in required if field in core]
+        self.ranges = [(field, core[field][0], bounds) for field, bounds in ranges.items() if field in core]
+        # Distinct (column, cast) pairs, checked once each
+        self.casts = list(dict.fromkeys(zip(plan.columns, plan.casts)))
+        # IDs are stored as the strings galaxies are stored under
+        self.reject_file = RejectFile(reject_path, schema, text_columns=[self.id_column]) if reject_path else None
+        self.rejected = 0
+        self.reasons: Counter = Counter()
+        if memory_budget is not None:
+            # Charged against the working memory: past its share the IDs move to SQLite
+            max_seen_ids = min(max_seen_ids, int(memory_budget.working_bytes * SEEN_IDS_SHARE) // SEEN_ID_BYTES)
+        self._seen = SeenIds(max_seen_ids, reject_path.parent if reject_path else None)
+
+    def __getstate__(self):
+        # Workers only need the rules; the reject file and seen IDs stay in the parent
+        state = self.__dict__.copy()
+        state.update(reject_file=None, reasons=Counter(), _seen=SeenIds(self._seen.max_memory_ids))
+        return state
+
+    def ids(self, frame: pd.DataFrame) -> np.ndarray:
+        """
+        Object ID per row as the string it is stored under (None for nulls or without an ID column).
+        Always the string: to_pandas turns an integer column with nulls into float64 for that batch only.
+        """
+        if self.id_column not in frame.columns:
+            return np.full(len(frame), None, dtype=object)
+        return id_strings(frame[self.id_column]).to_numpy(dtype=object)
+
+    def check(self, frame: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Split a frame into (clean rows, rejected rows). Rejected rows carry `_row` and `_reasons`.
+        Duplicate IDs within the frame are rejected here; across frames see keep_unseen.
+        """
+        n = len(frame)
+        if n == 0:
+            return frame, frame.iloc[0:0]
+        masks: List[Tuple[str, np.ndarray]] = []
+        missing: Dict[str, np.ndarray] = {}
+
+        for field, column in self.required:
+            if column not in frame.columns:
+                masks.append((f"{field} missing (no column {column})", np.ones(n, dtype=bool)))
+                continue
+            mask = frame[column].isna().to_numpy()
+            missing[column] = mask
+            if mask.any():
+                masks.append((f"{field} missing", mask))
+
+        numeric: Dict[str, np.ndarray] = {}
+        for column, cast_fn in self.casts:
+            if column not in frame.columns:
+                continue
+            values = frame[column]
+            present = ~missing[column] if column in missing else values.notna().to_numpy()
+            if cast_fn is float:
+                if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                    casted = values.to_numpy(dtype=np.float64, na_value=np.nan)
+                else:
+                    casted = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+                    bad_type = present & np.isnan(casted)
+                    if bad_type.any():
+                        masks.append((f"{column} not a number", bad_type))
+                numeric[column] = casted
+                infinite = np.isinf(casted)
+                if infinite.any():
+                    masks.append((f"{column} not finite", infinite))
+            elif cast_fn is not str and cast_fn is not bool and values.dtype == object and present.any():
+                # Casts that can fail element-wise (str_or_int_to_str never does on numbers)
+                vectorized = VECTORIZED_CASTS.get(cast_fn)
+                non_null = values[present]
+                casted = vectorized(non_null) if vectorized else _cast_elementwise(non_null, cast_fn)
+                bad_type = np.zeros(n, dtype=bool)
+                bad_type[present] = casted.isna().to_numpy()
+                if bad_type.any():
+                    masks.append((f"{column} cannot be cast with {getattr(cast_fn, '__name__', cast_fn)}", bad_type))
+
+        for field, column, (low, high) in self.ranges:
+            values = numeric.get(column)
+            if values is None:
+                continue
+            with np.errstate(invalid="ignore"):
+                outside = (values < low) | (values > high)
+            if outside.any():
+                masks.append((f"{field} outside [{low:g}, {high:g}]", outside))
+
+        if self.id_column in frame.columns:
+            present = ~missing.get(self.id_column, frame[self.id_column].isna().to_numpy())
+            duplicated = np.zeros(n, dtype=bool)
+            duplicated[present] = pd.Series(self.ids(frame[present])).duplicated(keep="first").to_numpy()
+            if duplicated.any():
+                masks.append(("id duplicated in input", duplicated))
+
+        if not masks:
+            return frame, frame.iloc[0:0]
+        failed, reasons = _join_reasons(masks, n)
+        rejected = frame[failed].copy()
+        if self.id_column in rejected.columns:
+            rejected[self.id_column] = id_strings(rejected[self.id_column])
+        rejected[ROW_COLUMN] = rejected.index.to_numpy(dtype=np.int64)
+        rejected[REASONS_COLUMN] = reasons
+        return frame[~failed], rejected
+
+    def keep_unseen(self, rows: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """
+        Mask of rows whose ID was not seen in an earlier frame; remembers the IDs and
+        rejects the others (with only _row, the ID and the reason).
+        """
+        ids = ids.tolist()
+        keep = self._seen.add_new(ids)
+        if not keep.all():
+            duplicate = ~keep
+            self.reject(pd.DataFrame({
+                self.id_column: np.asarray(ids, dtype=object)[duplicate],
+                ROW_COLUMN: np.asarray(rows)[duplicate],
+                REASONS_COLUMN: "id duplicated in input",
+            }))
+        return keep
+
+    def reject(self, rejected: Optional[pd.DataFrame]) -> None:
+        """Count and store rejected rows."""
+        if rejected is None or len(rejected) == 0:
+            return
+        self.rejected += len(rejected)
+        # Few distinct combinations: count those, then split them
+        for combined, count in rejected[REASONS_COLUMN].value_counts().items():
+            for reason in combined.split(REASON_SEPARATOR):
+                self.reasons[reason] += count
+        if self.reject_file is not None:
+            self.reject_file.write(rejected)
+
+    def filter(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Validate one frame: reject failing and already seen rows, return the clean ones."""
+        clean, rejected = self.check(frame)
+        self.reject(rejected)
+        if len(clean) == 0:
+            return clean
+        keep = self.keep_unseen(clean.index.to_numpy(), self.ids(clean))
+        return clean if keep.all() else clean[keep]
+
+    def iter_clean(self, frames: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> Iterator[pd.DataFrame]:
+        """Validated frames of a DataFrame or an iterable of DataFrames (e.g. ParquetStream)."""
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        for frame in frames:
+            clean = self.filter(frame)
+            if len(clean):
+                yield clean
+
+    def close(self) -> None:
+        self._seen.close()
+        if self.reject_file is not None:
+            self.reject_file.close()
+
+    def log_summary(self) -> None:
+        if not self.rejected:
+            logger.info("✓ Pre-flight validation: no rows rejected")
+            return
+        where = f" → {self.reject_file.path}" if self.reject_file is not None else ""
+        logger.warning(f"⚠ Pre-flight validation rejected {self.rejected} row(s){where}")
+        for reason, count in self.reasons.most_common(10):
+            logger.warning(f"    {count:>8}  {reason}")
+        if len(self.reasons) > 10:
+            logger.warning(f"    ... and {len(self.reasons) - 10} more reason(s)")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Watch-folder support for the galaxy ingest scripts (`--watch DIR`).
+
+The fitting pipeline drops parquet shards into a directory every few minutes.
+Instead of one manual run per shard, the ingester can run as a daemon:
+- `FolderWatcher` polls the directory and reports shards that are new or whose
+  fingerprint (ingest_journal.file_fingerprint: size + footer) changed, once they
+  have not been modified for `settle_sec` and end in the parquet magic bytes, so
+  half-written files are never read
+- `ShardTracker` remembers in SQLite which fingerprint of each shard has been
+  ingested completely (and how far an unfinished one got), so restarts skip
+  finished shards and continue unfinished ones
+- `ShardQueue` hands out work in slices of `slice_rows` rows, round-robin over
+  the pending shards, so a large backlog shard cannot delay a fresh small one by
+  more than one slice
+
+The daemon itself (the ingest loop around process_parquet) lives in
+ingest_galaxies_from_file_multiband_fit.py; it keeps one HTTP session
+(ingest_http.get_session) warm for its whole lifetime.
+"""
+
+import fnmatch
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from ingest_journal import file_fingerprint
+
+
+logger = logging.getLogger("scripts.ingest_galaxies_from_table")
+
+
+DEFAULT_WATCH_STATE_PATH = ".ingest_watch.sqlite"
+DEFAULT_WATCH_PATTERN = "*.parquet"
+DEFAULT_WATCH_INTERVAL = 5.0
+DEFAULT_SETTLE_SEC = 2.0
+DEFAULT_SLICE_ROWS = 5000
+
+_PARQUET_MAGIC = b"PAR1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    path TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0,
+    next_row INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+# --------------------------------------------------------------------------------------
+# State
+# --------------------------------------------------------------------------------------
+class ShardTracker:
+    """SQLite record of each shard's last seen fingerprint, status ('pending', 'done', 'failed') and progress."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def get(self, shard: Path) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT fingerprint, status, rows, next_row, error FROM shards WHERE path = ?", (str(shard),)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("fingerprint", "status", "rows", "next_row", "error"), row))
+
+    def mark(self, shard: Path, fingerprint: str, status: str, rows: int = 0, next_row: int = 0, error: Optional[str] = None) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shards (path, fingerprint, status, rows, next_row, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(shard), fingerprint, status, rows, next_row, error, datetime.now(timezone.utc).isoformat()),
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# --------------------------------------------------------------------------------------
+# Directory polling
+# --------------------------------------------------------------------------------------
+def _complete_parquet(path: Path, size: int) -> bool:
+    """A parquet file that is still being written does not end in the magic bytes yet."""
+    if size < 12:
+        return False
+    with open(path, "rb") as f:
+        f.seek(size - 4)
+        return f.read(4) == _PARQUET_MAGIC
+
+
+def shard_output_name(shard: Path, directory: Path, suffix: str = ".parquet") -> str:
+    """
+    File name for a shard's own output (reject file, dead letters) in a flat directory:
+    its path below the watched directory with '/' as '__', e.g. a/part-0.parquet -> a__part-0.parquet,
+    so shards with the same name in different subdirectories do not share one file.
+    """
+    relative = Path(os.path.relpath(shard, directory)).with_suffix("")
+    return "__".join(part for part in relative.parts if part not in ("", ".")) + suffix
+
+
+class FolderWatcher:
+    """Poll a directory for new or modified parquet shards."""
+
+    def __init__(
+        self,
+        directory: Path,
+        tracker: ShardTracker,
+        pattern: str = DEFAULT_WATCH_PATTERN,
+        settle_sec: float = DEFAULT_SETTLE_SEC,
+        ignore: Sequence[Path] = (),
+    ):
+        self.directory = Path(directory)
+        self.tracker = tracker
+        self.pattern = pattern
+        self.settle_sec = settle_sec
+        # Our own outputs (e.g. the reject directory) may live below the watched one
+        self.ignore = {Path(p).resolve() for p in ignore}
+        # Shards seen in the last poll that have not settled yet
+        self.unsettled = 0
+        # path -> ((size, mtime_ns), fingerprint) already looked at in this process
+        self._reported: Dict[Path, Tuple[Tuple[int, int], str]] = {}
+
+    def _candidates(self) -> List[Path]:
+        found = []
+        for root, dirs, files in os.walk(self.directory):
+            # Same convention as pyarrow dataset discovery: skip hidden and _-prefixed entries
+            dirs[:] = sorted(
+                d for d in dirs
+                if not d.startswith((".", "_")) and (Path(root) / d).resolve() not in self.ignore
+            )
+            for name in sorted(files):
+                if not name.startswith((".", "_")) and fnmatch.fnmatch(name, self.pattern):
+                    found.append(Path(root) / name)
+        return found
+
+    def poll(self) -> List[Tuple[Path, str]]:
+        """(shard, fingerprint) for every settled shard that is new or changed since it was last reported/ingested."""
+        now = time.time()
+        ready = []
+        seen = set()
+        self.unsettled = 0
+        for path in self._candidates():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            seen.add(path)
+            if now - st.st_mtime < self.settle_sec:
+                # Possibly still being written
+                self.unsettled += 1
+                continue
+            stat = (st.st_size, st.st_mtime_ns)
+            reported = self._reported.get(path)
+            if reported is not None and reported[0] == stat:
+                continue
+            if not _complete_parquet(path, st.st_size):
+                # Settled but truncated: report once per version of the file
+                logger.warning(f"⚠ {path} is not a complete parquet file; waiting for it to change")
+                self._reported[path] = (stat, "")
+                continue
+            fingerprint = file_fingerprint(path)
+            self._reported[path] = (stat, fingerprint)
+            if reported is not None and reported[1] == fingerprint:
+                # Touched but unchanged
+                continue
+            state = self.tracker.get(path)
+            if state is not None and state["fingerprint"] == fingerprint and state["status"] == "done":
+                continue
+            ready.append((path, fingerprint))
+        for gone in set(self._reported) - seen:
+            del self._reported[gone]
+        return ready
+
+
+# --------------------------------------------------------------------------------------
+# Fair scheduling
+# --------------------------------------------------------------------------------------
+@dataclass
+class ShardJob:
+    path: Path
+    fingerprint: str
+    rows: int
+    next_row: int = 0
+    detected_at: float = field(default_factory=time.time)
+    # Per-shard resources owned by the daemon (journal, validator, ...)
+    context: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def done(self) -> bool:
+        return self.next_row >= self.rows
+
+
+class ShardQueue:
+    """Round-robin queue of shards, consumed in slices of at most `slice_rows` rows."""
+
+    def __init__(self, slice_rows: int = DEFAULT_SLICE_ROWS):
+        self.slice_rows = max(1, slice_rows)
+        self._jobs: Deque[ShardJob] = deque()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def add(self, job: ShardJob) -> Optional[ShardJob]:
+        """Queue a shard; a queued job for the same path (older version of the file) is replaced and returned."""
+        replaced = None
+        for queued in self._jobs:
+            if queued.path == job.path:
+                replaced = queued
+                break
+        if replaced is not None:
+            self._jobs.remove(replaced)
+        self._jobs.append(job)
+        return replaced
+
+    def next_slice(self) -> Optional[Tuple[ShardJob, int, int]]:
+        """(job, offset, limit) for the shard at the head; the job moves to the back if rows remain."""
+        if not self._jobs:
+            return None
+        job = self._jobs.popleft()
+        offset = job.next_row
+        limit = min(self.slice_rows, job.rows - offset)
+        return job, offset, limit
+
+    def requeue(self, job: ShardJob) -> None:
+        if not job.done:
+            self._jobs.append(job)
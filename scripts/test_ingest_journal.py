@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Resume arithmetic of the ingest journal (ingest_journal): committed row ranges, the
+resume offset over them, and the catalog fingerprint a journal is keyed on.
+
+Run with:
+    python -m pytest scripts/test_ingest_journal.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).parent))
+
+from ingest_benchmark import generate_catalog
+from ingest_journal import (
+    IngestJournal,
+    drop_committed_rows,
+    file_fingerprint,
+    first_uncommitted_row,
+    merge_ranges,
+    rows_in_ranges,
+    rows_to_ranges,
+)
+from ingest_profiles import load_profile
+
+
+def test_rows_to_ranges_and_merge():
+    assert rows_to_ranges([5, 3, 4, 9, 10, 1]) == [(1, 1), (3, 5), (9, 10)]
+    assert rows_to_ranges([]) == []
+    # Batches committed out of order (--concurrency) merge into contiguous runs
+    assert merge_ranges([(10, 19), (0, 9), (30, 39), (20, 25)]) == [(0, 25), (30, 39)]
+    assert merge_ranges([(0, 10), (5, 7)]) == [(0, 10)]
+
+
+@pytest.mark.parametrize("offset, expected", [
+    (0, 26),     # inside the first run: resume after it
+    (26, 26),    # in the gap: nothing to skip
+    (30, 40),    # at the start of the second run
+    (39, 40),    # at its end
+    (100, 100),  # past every range
+])
+def test_first_uncommitted_row(offset, expected):
+    assert first_uncommitted_row([(0, 25), (30, 39)], offset) == expected
+
+
+def test_first_uncommitted_row_skips_adjacent_ranges():
+    # Unmerged but touching ranges are skipped one after the other
+    assert first_uncommitted_row([(0, 9), (10, 19)], 0) == 20
+    assert first_uncommitted_row([], 7) == 7
+
+
+def test_rows_in_ranges():
+    rows = np.array([0, 5, 25, 26, 29, 30, 39, 40, -1], dtype=np.int64)
+    mask = rows_in_ranges(rows, [(0, 25), (30, 39)])
+    assert mask.tolist() == [True, True, True, False, False, True, True, False, False]
+    assert rows_in_ranges(rows, []).tolist() == [False] * len(rows)
+    assert len(rows_in_ranges(np.array([], dtype=np.int64), [(0, 1)])) == 0
+
+
+def test_drop_committed_rows_uses_the_file_row_index():
+    # A frame read from --offset 20: its index holds file row numbers
+    frame = pd.DataFrame({"value": range(10)}, index=pd.RangeIndex(20, 30))
+    kept = drop_committed_rows(frame, [(0, 22), (25, 26)])
+    assert kept.index.tolist() == [23, 24, 27, 28, 29]
+    assert drop_committed_rows(frame, []) is frame
+
+
+def test_journal_resumes_after_committed_batches(tmp_path):
+    journal = IngestJournal(tmp_path / "journal.sqlite", "fp", "insert")
+    journal.record_batch(2, range(10, 20), {"inserted": 10})
+    journal.record_batch(1, range(0, 10), {"inserted": 8, "skipped": 2})
+    journal.record_batch(4, [30, 31, 33], {"inserted": 3})
+    assert journal.committed_ranges() == [(0, 19), (30, 31), (33, 33)]
+    assert first_uncommitted_row(journal.committed_ranges(), 0) == 20
+    assert journal.totals() == {"batches": 3, "rows": 23, "inserted": 21, "skipped": 2, "updated": 0, "not_found": 0}
+    # Another mode or fingerprint does not see these batches
+    other = IngestJournal(tmp_path / "journal.sqlite", "fp", "update")
+    assert other.committed_ranges() == []
+    other.close()
+    journal.close()
+
+
+def test_file_fingerprint(tmp_path):
+    frame = generate_catalog(20, load_profile("galaxy.v1"), seed=1)
+    first, copy, changed = tmp_path / "a.parquet", tmp_path / "b.parquet", tmp_path / "c.parquet"
+    frame.to_parquet(first, index=False)
+    copy.write_bytes(first.read_bytes())
+    frame.iloc[:19].to_parquet(changed, index=False)
+    assert file_fingerprint(first) == file_fingerprint(copy)
+    assert file_fingerprint(first) != file_fingerprint(changed)
+    # Files too small to have a footer are hashed whole
+    tiny = tmp_path / "tiny.parquet"
+    tiny.write_bytes(b"PAR1")
+    assert len(file_fingerprint(tiny)) == 32
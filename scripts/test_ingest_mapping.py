@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+ColumnarPlan must produce exactly what the per-row `row_to_galaxy` path does.
+
+Run with:
+    python -m pytest scripts/test_ingest_mapping.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).parent))
+
+import ingest_http
+from ingest_benchmark import generate_catalog
+from ingest_galaxies_from_file_multiband_fit import extract_nested
+from ingest_id_index import ObjectIdIndex, build_index
+from ingest_mapping import id_strings, split_nested, str_or_int_to_str
+from ingest_profiles import load_profile
+from ingest_validation import PreflightValidator
+
+
+PROFILES = ["galaxy.v1", "galaxy_multiband_fit.v1"]
+ID_COLUMN = "coadd_object_id"
+# Around and above 2**63, where an int64 step wraps
+BIG_IDS = [2 ** 63 - 1, 2 ** 63, 2 ** 63 + 5, 2 ** 64 - 1]
+
+
+def row_to_galaxy(row: pd.Series, mapping) -> dict:
+    return split_nested(extract_nested(row, mapping))
+
+
+def assert_same_as_rows(profile, frame: pd.DataFrame) -> None:
+    expected = [row_to_galaxy(row, profile.mapping) for _, row in frame.iterrows()]
+    assert profile.plan.transform(frame) == expected
+
+
+@pytest.mark.parametrize("name", PROFILES)
+def test_generated_catalog(name):
+    profile = load_profile(name)
+    assert_same_as_rows(profile, generate_catalog(50, profile, seed=1))
+
+
+@pytest.mark.parametrize("name", PROFILES)
+def test_nulls(name):
+    profile = load_profile(name)
+    frame = generate_catalog(20, profile, seed=2)
+    rng = np.random.default_rng(3)
+    for column in frame.columns:
+        if column == ID_COLUMN:
+            continue
+        holes = rng.random(len(frame)) < 0.3
+        frame[column] = frame[column].astype(object).where(~holes, None)
+    # A column that is null everywhere drops its keys (and empty groups)
+    frame[frame.columns[-1]] = None
+    assert_same_as_rows(profile, frame)
+
+
+@pytest.mark.parametrize(
+    "ids",
+    [
+        pd.Series(np.array(BIG_IDS, dtype="uint64")),
+        pd.Series(pd.array(BIG_IDS[:2] + [None, BIG_IDS[3]], dtype="UInt64")),
+        pd.Series(pd.array([1, None, -(2 ** 63), 2 ** 63 - 1], dtype="Int64")),
+        pd.Series([1e15, 2.0 ** 63, 1e20, -3.0, np.nan]),
+        pd.Series(["42", "0042", "abc", None], dtype=object),
+    ],
+    ids=["uint64", "UInt64 with nulls", "Int64 with nulls", "float", "text"],
+)
+def test_id_casts(ids):
+    profile = load_profile("galaxy.v1")
+    frame = generate_catalog(len(ids), profile)
+    frame[ID_COLUMN] = ids
+    assert_same_as_rows(profile, frame)
+    expected = [None if pd.isna(v) else str_or_int_to_str(v) for v in ids.astype(object)]
+    assert id_strings(ids).tolist() == expected
+
+
+def test_big_ids_in_index(tmp_path):
+    profile = load_profile("galaxy.v1")
+    frame = generate_catalog(len(BIG_IDS), profile)
+    frame[ID_COLUMN] = np.array(BIG_IDS, dtype="uint64")
+    catalog = tmp_path / "catalog.parquet"
+    frame.to_parquet(catalog, index=False)
+    build_index(str(catalog), tmp_path / "catalog.idx", ID_COLUMN)
+    found, missing = ObjectIdIndex(tmp_path / "catalog.idx").lookup([str(v) for v in BIG_IDS])
+    assert not missing and len(found) == len(BIG_IDS)
+
+
+def test_infinite_floats_are_left_out():
+    profile = load_profile("galaxy.v1")
+    frame = generate_catalog(3, profile)
+    column = profile.mapping["ra"][0]
+    frame[column] = [np.inf, -np.inf, 10.5]
+    galaxies = profile.plan.transform(frame)
+    assert [g["galaxy"].get("ra") for g in galaxies] == [None, None, 10.5]
+
+
+def test_encoders_agree_on_non_finite(monkeypatch):
+    value = {"a": float("inf"), "b": [float("-inf"), float("nan"), 1.5], "c": "x"}
+    encoded = ingest_http.encode_json(value)
+    monkeypatch.setattr(ingest_http, "orjson", None)
+    assert ingest_http.encode_json(value) == encoded == b'{"a":null,"b":[null,null,1.5],"c":"x"}'
+
+
+def test_duplicate_ids_across_int_and_float_batches():
+    profile = load_profile("galaxy.v1")
+    first = generate_catalog(3, profile)
+    second = generate_catalog(3, profile, start=10)
+    # An integer column with a null in this batch only arrives as float64
+    second[ID_COLUMN] = [1e15, np.nan, 1e15 + 50]
+    validator = PreflightValidator(profile.plan)
+    clean = list(validator.iter_clean([first, second]))
+    assert [len(frame) for frame in clean] == [3, 1]
+    assert validator.reasons["id duplicated in input"] == 1
+
+
+def test_duplicate_ids_after_spilling_to_sqlite(tmp_path):
+    profile = load_profile("galaxy.v1")
+    frames = [generate_catalog(3, profile), generate_catalog(3, profile, start=2), generate_catalog(3, profile, start=4)]
+    validator = PreflightValidator(profile.plan, max_seen_ids=4)
+    clean = list(validator.iter_clean(frames))
+    spill_path = validator._seen.spill_path
+    assert spill_path is not None and spill_path.exists()
+    assert [len(frame) for frame in clean] == [3, 2, 2]
+    assert validator.reasons["id duplicated in input"] == 2 and validator._seen.count == 7
+    validator.close()
+    assert not spill_path.exists()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+`--max-memory` building blocks (ingest_memory): size parsing, the budget split,
+the byte-bounded queue and read-ahead.
+
+Run with:
+    python -m pytest scripts/test_ingest_memory.py
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).parent))
+
+from ingest_memory import (
+    IN_FLIGHT_SHARE,
+    MIN_BATCH_ROWS,
+    READ_AHEAD_SHARE,
+    READER_OVERHEAD_BYTES,
+    WORKING_BYTES_PER_ROW,
+    ByteBoundedQueue,
+    MemoryBudget,
+    parse_size,
+    read_ahead,
+)
+
+MIB = 1024 ** 2
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1000000", 1_000_000),
+    ("64k", 64 * 1024),
+    ("512M", 512 * MIB),
+    ("2G", 2 * 1024 * MIB),
+    ("1.5GiB", 1536 * MIB),
+    (" 3 gb ", 3 * 1024 * MIB),
+    ("1T", 1024 ** 4),
+])
+def test_parse_size(text, expected):
+    assert parse_size(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "lots", "-1G", "2X", "1.5.0M", "G"])
+def test_parse_size_rejects(text):
+    with pytest.raises(ValueError, match="Invalid size"):
+        parse_size(text)
+
+
+def test_budget_split():
+    budget = MemoryBudget(1024 * MIB, baseline=100 * MIB)
+    available = 1024 * MIB - 100 * MIB - READER_OVERHEAD_BYTES
+    assert budget.read_ahead_bytes == int(available * READ_AHEAD_SHARE)
+    assert budget.in_flight_bytes == int(available * IN_FLIGHT_SHARE)
+    assert budget.read_ahead_bytes + budget.in_flight_bytes + budget.working_bytes == available
+    assert budget.batch_rows(10) == MIN_BATCH_ROWS
+    assert budget.batch_rows(10 ** 9) == budget.working_bytes // WORKING_BYTES_PER_ROW
+    assert budget.summary()["memory"]["limit_bytes"] == 1024 * MIB
+
+
+def test_budget_too_small():
+    with pytest.raises(ValueError, match="too small"):
+        MemoryBudget(100 * MIB, baseline=90 * MIB)
+
+
+def test_queue_blocks_until_bytes_are_taken():
+    queue = ByteBoundedQueue(100, poll_sec=0.01)
+    # One item is always admitted, however large
+    assert queue.put("big", 500)
+    assert queue.get() == "big"
+    assert queue.put("a", 60)
+    done = threading.Event()
+
+    def producer():
+        queue.put("b", 60)
+        done.set()
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    assert not done.wait(0.1)
+    assert queue.get() == "a"
+    assert done.wait(1.0)
+    thread.join()
+    assert queue.nbytes == 60 and queue.get() == "b"
+
+
+def test_queue_close_releases_the_producer():
+    queue = ByteBoundedQueue(10, poll_sec=0.01)
+    queue.put("a", 10)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(queue.put("b", 10)))
+    thread.start()
+    time.sleep(0.05)
+    queue.close()
+    thread.join(1.0)
+    assert results == [False] and queue.nbytes == 0
+
+
+def test_queue_throttles_while_the_process_is_over_the_limit(monkeypatch):
+    budget = MemoryBudget(1024 * MIB, baseline=0)
+    over = [True]
+    monkeypatch.setattr(budget, "over_limit", lambda: over[0])
+    queue = ByteBoundedQueue(10 ** 9, budget, poll_sec=0.01)
+    queue.put("a", 1)
+    threading.Timer(0.05, lambda: over.__setitem__(0, False)).start()
+    started = time.monotonic()
+    assert queue.put("b", 1)
+    assert time.monotonic() - started >= 0.04
+    assert budget.throttled == 1
+
+
+def frames(count, rows=100):
+    for start in range(0, count * rows, rows):
+        yield pd.DataFrame({"value": range(start, start + rows)})
+
+
+def test_read_ahead_keeps_order():
+    budget = MemoryBudget(1024 * MIB, baseline=0)
+    budget.read_ahead_bytes = 2000  # about one frame
+    read = list(read_ahead(frames(20), budget))
+    assert len(read) == 20
+    assert pd.concat(read)["value"].tolist() == list(range(2000))
+
+
+def test_read_ahead_reraises_reader_errors():
+    def failing():
+        yield from frames(2)
+        raise OSError("corrupt row group")
+
+    with pytest.raises(OSError, match="corrupt row group"):
+        list(read_ahead(failing(), MemoryBudget(1024 * MIB, baseline=0)))
+
+
+def test_read_ahead_stops_the_reader_when_abandoned():
+    budget = MemoryBudget(1024 * MIB, baseline=0)
+    budget.read_ahead_bytes = 1
+    stream = read_ahead(frames(1000), budget)
+    next(stream)
+    stream.close()
+    assert not [t for t in threading.enumerate() if t.name == "ingest-read"]
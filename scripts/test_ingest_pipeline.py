@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Bisection of rolled-back batches and dead-letter accounting in the multiband ingester,
+against a fake /ingest/galaxies that rolls back every batch holding a poison galaxy,
+and the error counts, concurrent sending, journal and run metrics of ingest_galaxies_from_file.py.
+
+Run with:
+    python -m pytest scripts/test_ingest_pipeline.py
+"""
+
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import requests
+
+sys.path.append(str(Path(__file__).parent))
+
+import ingest_galaxies_from_file
+from ingest_batching import EncodedBatch, PoisonRowError
+from ingest_benchmark import generate_catalog
+from ingest_dead_letter import DeadLetterStore, ERROR_COLUMN
+from ingest_galaxies_from_file_multiband_fit import (
+    IngestRun,
+    account_batch,
+    send_part,
+    settle_batch,
+)
+from ingest_http import encode_json
+from ingest_journal import IngestJournal
+from ingest_metrics import IngestMetrics
+from ingest_profiles import load_profile
+from ingest_validation import ROW_COLUMN
+
+
+ROWS = 12
+
+
+def response(status: int, payload: dict) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = encode_json(payload)
+    resp.elapsed = timedelta(seconds=0.01)
+    return resp
+
+
+def fake_server(poison_ids, name_index=True):
+    """send_fn for a deployment whose mutation fails on `poison_ids` (and says at which index, with name_index)."""
+    def send(chunk: EncodedBatch) -> requests.Response:
+        ids = [galaxy["galaxy"]["id"] for galaxy in chunk]
+        bad = [index for index, gid in enumerate(ids) if gid in poison_ids]
+        if not bad:
+            return response(200, {"success": True, "inserted": len(ids), "skipped": 0})
+        detail = f"Failed at batch index {bad[0]}, galaxy external ID \"{ids[bad[0]]}\"" if name_index else "bad value"
+        return response(500, {"error": "Batch insert failed", "detail": detail, "rollback": True})
+    return send
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    profile = load_profile("galaxy.v1")
+    frame = generate_catalog(ROWS, profile, seed=4)
+    path = tmp_path / "catalog.parquet"
+    frame.to_parquet(path, index=False)
+    galaxies = profile.plan.transform(frame)
+    batch = EncodedBatch(list(galaxies), [encode_json(g) for g in galaxies])
+    ids = [g["galaxy"]["id"] for g in galaxies]
+    return path, batch, ids
+
+
+def first_attempt(send_fn, batch):
+    return send_part(send_fn, (1, 0, len(batch) - 1, list(range(len(batch)))), batch)
+
+
+def new_stats():
+    return {"inserted": 0, "updated": 0, "skipped": 0, "not_found": 0, "errors": 0, "failed_at": None,
+            "quarantined": 0, "poison_rows": []}
+
+
+@pytest.mark.parametrize("name_index", [True, False], ids=["index in error", "halves"])
+def test_bisect_isolates_poison_rows(catalog, name_index):
+    _, batch, ids = catalog
+    send_fn = fake_server({ids[3], ids[10]}, name_index)
+    poison = {"found": 0}
+    parts = settle_batch(first_attempt(send_fn, batch), send_fn, IngestRun(), poison, max_poison_rows=10)
+    assert poison["found"] == 2
+    assert [p.meta[3] for p in parts if isinstance(p.error, PoisonRowError)] == [[3], [10]]
+    # Every row comes back exactly once, in order, with metadata matching its slice
+    assert [row for p in parts for row in p.meta[3]] == list(range(ROWS))
+    for part in parts:
+        assert part.meta[1:3] == (part.meta[3][0], part.meta[3][-1])
+        assert [g["galaxy"]["id"] for g in part.batch] == [ids[row] for row in part.meta[3]]
+
+
+def test_bisection_stops_at_max_poison_rows(catalog):
+    _, batch, ids = catalog
+    send_fn = fake_server({ids[3], ids[10]})
+    poison = {"found": 0}
+    parts = settle_batch(first_attempt(send_fn, batch), send_fn, IngestRun(), poison, max_poison_rows=1)
+    assert poison["found"] == 1
+    failed = [p for p in parts if p.error is None and p.result.status_code == 500]
+    assert len(failed) == 1 and 10 in failed[0].meta[3]
+
+
+def test_dead_letters(catalog):
+    path, batch, ids = catalog
+    dead_letters = DeadLetterStore(path.with_name("dead.parquet"), str(path), "insert", schema=None)
+    run = IngestRun(dead_letters=dead_letters)
+    send_fn = fake_server({ids[5], ids[6], ids[7]})
+    stats, fail_fast = new_stats(), {"error": None, "committed_after": 0}
+    # Two rows may be quarantined; the part holding the third fails as a batch
+    for part in settle_batch(first_attempt(send_fn, batch), send_fn, run, {"found": 0}, max_poison_rows=2):
+        account_batch(part, stats, fail_fast, run, continue_on_error=True)
+    dead_letters.close()
+
+    assert stats["quarantined"] == 2
+    assert [row["global_row"] for row in stats["poison_rows"]] == [5, 6]
+    assert stats["inserted"] + stats["errors"] == ROWS
+    assert fail_fast["error"] is None and stats["failed_at"]["rolled_back"]
+    letters = pd.read_parquet(dead_letters.path)
+    assert sorted(letters[ROW_COLUMN]) == sorted([5, 6, *range(stats["failed_at"]["global_row_range"][0],
+                                                                stats["failed_at"]["global_row_range"][1] + 1)])
+    assert set(letters[ERROR_COLUMN]) == {"Batch insert failed"}
+    assert run.metrics.counters["rows_dead_lettered"] == len(letters)
+
+
+def test_fail_fast_batches_are_not_dead_lettered(catalog):
+    path, batch, ids = catalog
+    dead_letters = DeadLetterStore(path.with_name("dead.parquet"), str(path), "insert", schema=None)
+    run = IngestRun(dead_letters=dead_letters)
+    send_fn = fake_server({ids[0]})
+    stats, fail_fast = new_stats(), {"error": None, "committed_after": 0}
+    account_batch(first_attempt(send_fn, batch), stats, fail_fast, run)
+    assert isinstance(fail_fast["error"], RuntimeError)
+    assert stats["errors"] == ROWS and dead_letters.added == 0
+    dead_letters.close()
+    assert not dead_letters.path.exists()
+
+
+@pytest.mark.parametrize("continue_on_error", [False, True], ids=["fail fast", "continue"])
+def test_failed_batch_counted_once(monkeypatch, continue_on_error):
+    frame = generate_catalog(ROWS, load_profile("galaxy.v1"), seed=4)
+    monkeypatch.setattr(ingest_galaxies_from_file, "send_ingest", lambda *args, **kwargs: response(
+        500, {"error": "Batch insert failed", "rollback": True}))
+    process = ingest_galaxies_from_file.process_parquet
+    if continue_on_error:
+        stats = process(frame, "http://convex", "token", batch_size=5, continue_on_error=True)
+        assert stats["errors"] == ROWS
+    else:
+        with pytest.raises(ingest_galaxies_from_file.BatchFailed):
+            process(frame, "http://convex", "token", batch_size=5)
+
+
+def test_failed_request_counts_its_rows(monkeypatch):
+    frame = generate_catalog(ROWS, load_profile("galaxy.v1"), seed=4)
+
+    def send(*args, **kwargs):
+        raise requests.ConnectionError("connection reset")
+    monkeypatch.setattr(ingest_galaxies_from_file, "send_ingest", send)
+    stats = ingest_galaxies_from_file.process_parquet(frame, "http://convex", "token", batch_size=5, continue_on_error=True)
+    assert stats["errors"] == ROWS and stats["inserted"] == 0
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_concurrent_batches_are_counted_in_order(monkeypatch, catalog, concurrency):
+    path, _, ids = catalog
+    send_fn = fake_server({ids[7]})
+    monkeypatch.setattr(ingest_galaxies_from_file, "send_ingest", lambda url, token, galaxies, **kwargs: send_fn(galaxies))
+    stats = ingest_galaxies_from_file.process_parquet(
+        pd.read_parquet(path), "http://convex", "token", batch_size=3, continue_on_error=True, concurrency=concurrency
+    )
+    assert (stats["inserted"], stats["errors"]) == (ROWS - 3, 3)
+
+
+def test_journal_records_committed_file_rows(monkeypatch, catalog, tmp_path):
+    path, _, ids = catalog
+    send_fn = fake_server({ids[6]})
+    monkeypatch.setattr(ingest_galaxies_from_file, "send_ingest", lambda url, token, galaxies, **kwargs: send_fn(galaxies))
+    journal = IngestJournal(tmp_path / "journal.sqlite", "fp", "insert")
+    # Read from --offset 2: the frame index holds file row numbers
+    frame = pd.read_parquet(path).iloc[2:]
+    ingest_galaxies_from_file.process_parquet(
+        frame, "http://convex", "token", batch_size=3, continue_on_error=True, concurrency=2, journal=journal
+    )
+    assert journal.committed_ranges() == [(2, 4), (8, ROWS - 1)]
+    journal.close()
+
+
+def test_run_metrics_count_rows_and_server_totals(monkeypatch, catalog):
+    path, _, ids = catalog
+    send_fn = fake_server({ids[0]})
+    monkeypatch.setattr(ingest_galaxies_from_file, "send_ingest", lambda url, token, galaxies, **kwargs: send_fn(galaxies))
+    metrics = IngestMetrics()
+    ingest_galaxies_from_file.process_parquet(
+        pd.read_parquet(path), "http://convex", "token", batch_size=5, continue_on_error=True, metrics=metrics
+    )
+    assert metrics.report()["rows_done"] == ROWS
+    assert metrics.counters["batches"] == -(-ROWS // 5)
+    # The rolled-back batch counts as errors, not as server inserts
+    assert metrics.server_counts["inserted"] == ROWS - 5
+    assert set(metrics.stage_seconds) >= {"transform", "send_wait", "account"}
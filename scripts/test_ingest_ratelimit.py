@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Shared request rate limiting (ingest_ratelimit): pacing, the AIMD rate and its
+cooldown, Retry-After pauses and the state file shared between processes.
+
+Run with:
+    python -m pytest scripts/test_ingest_ratelimit.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent))
+
+from ingest_ratelimit import MIN_REQUESTS_PER_SEC, SLOW_FACTOR, THROTTLED_FACTOR, RateLimiter, fcntl
+
+
+def test_requests_are_paced_at_the_cap():
+    limiter = RateLimiter(max_requests_per_sec=50)
+    started = time.monotonic()
+    waits = [limiter.acquire(10) for _ in range(6)]
+    # The first request goes at once, the other five one token (20 ms) apart
+    assert waits[0] == pytest.approx(0.0, abs=0.005)
+    assert time.monotonic() - started == pytest.approx(0.1, abs=0.05)
+    assert limiter.waited_sec == pytest.approx(sum(waits))
+
+
+def test_galaxy_bucket_limits_large_batches():
+    limiter = RateLimiter(max_galaxies_per_sec=1000)
+    # The galaxy bucket starts empty: 100 galaxies take 0.1 s to accumulate
+    assert limiter.acquire(100) == pytest.approx(0.1, abs=0.05)
+
+
+def test_429_halves_and_success_raises_the_rate():
+    limiter = RateLimiter(max_requests_per_sec=10, step=1.0, cooldown_sec=60)
+    limiter.on_response(429, 0.1)
+    assert limiter.current_rate() == pytest.approx(10 * THROTTLED_FACTOR)
+    # Within the cooldown further 429s and slow requests do not cut again
+    limiter.on_response(429, 0.1)
+    limiter.on_response(200, 30.0)
+    assert limiter.current_rate() == pytest.approx(5.0)
+    assert (limiter.throttled, limiter.slowed) == (1, 0)
+    limiter.on_response(200, 0.1)
+    assert limiter.current_rate() == pytest.approx(5.0 + 1.0 / 5.0)
+    for _ in range(200):
+        limiter.on_response(200, 0.1)
+    # Never above the configured cap
+    assert limiter.current_rate() == 10
+
+
+def test_slow_requests_cut_by_a_fifth():
+    limiter = RateLimiter(max_requests_per_sec=10, target_latency_sec=1.0, cooldown_sec=0)
+    limiter.on_response(200, 2.0)
+    assert limiter.current_rate() == pytest.approx(10 * SLOW_FACTOR)
+    limiter.on_response("error", 5.0)
+    assert limiter.current_rate() == pytest.approx(10 * SLOW_FACTOR * SLOW_FACTOR)
+    assert limiter.slowed == 2
+
+
+def test_uncapped_limiter_starts_unlimited():
+    limiter = RateLimiter()
+    assert limiter.current_rate() is None
+    limiter.on_response(429, 0.1)
+    # Nothing observed yet: the cut starts from the floor
+    assert limiter.current_rate() == MIN_REQUESTS_PER_SEC
+
+
+def test_retry_after_pauses_every_request():
+    limiter = RateLimiter(max_requests_per_sec=1000)
+    limiter.on_response(429, 0.1, retry_after=0.15)
+    assert limiter.acquire(1) == pytest.approx(0.15, abs=0.05)
+
+
+@pytest.mark.skipif(fcntl is None, reason="state file needs fcntl")
+def test_state_file_is_shared(tmp_path):
+    path = tmp_path / "rate.json"
+    first = RateLimiter(path, max_requests_per_sec=8)
+    second = RateLimiter(path, max_requests_per_sec=8)
+    first.on_response(429, 0.1)
+    assert second.current_rate() == pytest.approx(4.0)
+    # A file left over from before a reboot (times ahead of the clock) starts over
+    path.write_text('{"updated": 1e300, "rate": 0.5}')
+    assert second.current_rate() == 8
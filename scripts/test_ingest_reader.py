@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+`--where` parsing (ingest_reader.parse_where): the expressions it accepts, the rows
+they select, the columns they reference, and the ones it rejects.
+
+Run with:
+    python -m pytest scripts/test_ingest_reader.py
+"""
+
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+sys.path.append(str(Path(__file__).parent))
+
+from ingest_reader import parse_where
+
+
+TABLE = pa.table({
+    "id": [1, 2, 3, 4, 5],
+    "paper": ["A", "B", "A", None, "C"],
+    "mag": [17.5, 19.0, -1.0, 21.2, 18.0],
+    "nucleus": [True, False, True, False, None],
+})
+
+
+def selected(text):
+    expression, _ = parse_where(text)
+    return TABLE.filter(expression).column("id").to_pylist()
+
+
+@pytest.mark.parametrize("text, ids", [
+    ("paper == 'A'", [1, 3]),
+    ("paper != 'A'", [2, 5]),
+    ("mag < 18", [1, 3]),
+    ("mag >= 18", [2, 4, 5]),
+    ("17 < mag <= 19", [1, 2, 5]),
+    ("mag > -2 and mag < 0", [3]),
+    ("paper in ('A', 'C')", [1, 3, 5]),
+    # isin is false for nulls, so `not in` keeps them
+    ("paper not in ['A']", [2, 4, 5]),
+    ("paper == None", [4]),
+    ("paper is None", [4]),
+    ("paper is not None and mag > 18", [2]),
+    ("nucleus", [1, 3]),
+    ("not nucleus", [2, 4]),
+    ("(paper == 'A' or paper == 'B') and not (mag < 0)", [1, 2]),
+    ("  id == 5  ", [5]),
+])
+def test_where_selects(text, ids):
+    assert selected(text) == ids
+
+
+def test_where_columns():
+    _, columns = parse_where("paper == 'A' and (mag < 18 or mag > 20) and nucleus and id in (1, 2)")
+    # Each referenced column once, in order of appearance
+    assert columns == ["paper", "mag", "nucleus", "id"]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("paper = 'A'", "use == for equality"),
+    ("paper ==", "Invalid --where expression"),
+    ("len(paper) > 1", "Unsupported --where operand"),
+    ("mag + 1 > 18", "Unsupported --where operand"),
+    ("table.paper == 'A'", "Unsupported --where operand"),
+    ("'A' in paper", "'in' needs a column on the left"),
+    ("paper in mag", "'in' needs a column on the left"),
+    ("mag < None", "null checks"),
+    ("paper is 'A'", "null checks"),
+    ("'A'", "Unsupported --where expression"),
+    ("mag if nucleus else id", "Unsupported --where expression"),
+])
+def test_where_rejects(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_where(text)
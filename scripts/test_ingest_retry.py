@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Backoff, Retry-After parsing, exception classification and the circuit breaker (ingest_retry).
+
+Run with:
+    python -m pytest scripts/test_ingest_retry.py
+"""
+
+import email.utils
+import random
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+sys.path.append(str(Path(__file__).parent))
+
+from ingest_retry import (
+    MAX_RETRY_AFTER_SEC,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    classify_exception,
+    parse_retry_after,
+)
+
+
+def test_backoff_grows_to_the_cap():
+    policy = RetryPolicy(max_retries=8, base_sec=1.0, max_sec=8.0, rng=random.Random(1))
+    assert policy.max_attempts == 9
+    for attempt, ceiling in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (8, 8.0)]:
+        pauses = [policy.backoff(attempt) for _ in range(200)]
+        assert 0 <= min(pauses) and max(pauses) <= ceiling
+        # Full jitter: the pauses spread over the whole range
+        assert max(pauses) > ceiling * 0.9
+
+
+def test_backoff_honors_retry_after():
+    policy = RetryPolicy(base_sec=1.0, rng=random.Random(1))
+    assert 10.0 <= policy.backoff(1, retry_after=10.0) <= 11.0
+    assert MAX_RETRY_AFTER_SEC <= policy.backoff(1, retry_after=1e6) <= MAX_RETRY_AFTER_SEC + 1.0
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("120", 120.0), (" 1.5 ", 1.5), ("-3", 0.0), (None, None), ("", None), ("soon", None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    now = 1_800_000_000.0
+    assert parse_retry_after(email.utils.formatdate(now + 30, usegmt=True), now=now) == pytest.approx(30.0)
+    # A date in the past means now
+    assert parse_retry_after(email.utils.formatdate(now - 30, usegmt=True), now=now) == 0.0
+
+
+@pytest.mark.parametrize("exc, retryable", [
+    (requests.exceptions.ConnectionError("reset"), True),
+    (requests.exceptions.ReadTimeout("slow"), True),
+    (requests.exceptions.ChunkedEncodingError("cut"), True),
+    (requests.exceptions.SSLError("bad certificate"), False),
+    (requests.exceptions.InvalidURL("no host"), False),
+    (requests.exceptions.MissingSchema("no scheme"), False),
+    (requests.exceptions.TooManyRedirects("loop"), False),
+    (ValueError("not a request error"), False),
+])
+def test_classify_exception(exc, retryable):
+    assert classify_exception(exc) is retryable
+
+
+def breaker(probe, max_open_sec=5.0):
+    return CircuitBreaker(probe, threshold=3, max_open_sec=max_open_sec, probe_base_sec=0.001, probe_max_sec=0.002)
+
+
+def test_breaker_opens_after_threshold_and_closes_when_probe_answers():
+    answers = iter([False, False, True])
+    circuit = breaker(lambda: next(answers))
+    assert not circuit.record_failure("503")
+    circuit.record_success()
+    assert not circuit.record_failure("503") and not circuit.record_failure("503")
+    assert circuit.record_failure("503") and circuit.is_open
+    assert circuit.wait() >= 0
+    assert not circuit.is_open and circuit.failures == 0
+    assert circuit.summary()["circuit_breaker"]["opened"] == 1
+    # Closed: waiting returns at once
+    assert circuit.wait() == pytest.approx(0.0, abs=0.01)
+
+
+def test_breaker_gives_up_after_max_open_sec():
+    circuit = breaker(lambda: False, max_open_sec=0.05)
+    for _ in range(3):
+        circuit.record_failure("timeout")
+    with pytest.raises(CircuitOpenError):
+        circuit.wait()
+    assert circuit.is_open